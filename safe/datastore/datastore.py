@@ -5,10 +5,12 @@
 import logging
 
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 from qgis.core import QgsMapLayer, QgsRasterLayer, QgsVectorLayer, QGis
 
 from safe.utilities.keyword_io import KeywordIO
 from safe.utilities.i18n import tr
+from safe.utilities.profiling import profile
 from safe.utilities.utilities import monkey_patch_keywords
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -49,6 +51,12 @@ class DataStore(object):
         self._index = 1
         self._use_index = False
 
+        # In memory catalog of layers: name -> dict with the uri and the
+        # type. It's refreshed only when we write a layer or if the datastore
+        # has been modified by someone else.
+        self._catalog = None
+        self._catalog_mtime = None
+
     @property
     def use_index(self):
         """Return if we use an index to add the layer name.
@@ -89,6 +97,7 @@ class DataStore(object):
         """
         raise NotImplementedError
 
+    @profile
     def add_layer(self, layer, layer_name):
         """Add a layer to the datastore.
 
@@ -109,34 +118,65 @@ class DataStore(object):
             layer_name = '%s-%s' % (self._index, layer_name)
             self._index += 1
 
+        # It refreshes the catalog if someone else modified the datastore.
+        # Then only our own writes happen until the catalog is stamped.
         if self.layer_uri(layer_name):
             return False, tr('The layer already exists in the datastore.')
 
         if isinstance(layer, QgsRasterLayer):
+            layer_type = 'raster'
             result = self._add_raster_layer(layer, layer_name)
         else:
             if layer.wkbType() == QGis.WKBNoGeometry:
+                layer_type = 'tabular'
                 result = self._add_tabular_layer(layer, layer_name)
             else:
+                layer_type = 'vector'
                 result = self._add_vector_layer(layer, layer_name)
 
         if result[0]:
             LOGGER.info(
                 u'Layer saved {layer_name}'.format(layer_name=result[1]))
+            self._register_layer(result[1], layer_type)
 
         try:
-            real_layer = self.layer(result[1])
-            if isinstance(real_layer, bool):
-                message = ('{name} was not found in the datastore or the '
-                           'layer was not valid.'.format(name=result[1]))
-                LOGGER.debug(message)
-                return False, message
-            KeywordIO().write_keywords(real_layer, layer.keywords)
+            keywords = layer.keywords
         except AttributeError:
-            pass
+            return result
+
+        written = self._write_keywords(result[1], keywords)
+        if result[0]:
+            # The keywords file changed the datastore too, it is not a reason
+            # to scan it again.
+            self._catalog_mtime = self._modification_time()
+        if not written:
+            message = ('{name} was not found in the datastore or the '
+                       'layer was not valid.'.format(name=result[1]))
+            LOGGER.debug(message)
+            return False, message
 
         return result
 
+    def _write_keywords(self, layer_name, keywords):
+        """Write keywords for a layer which has been added to the datastore.
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param keywords: The keywords to write.
+        :type keywords: dict
+
+        :return: False if the layer could not be loaded from the datastore.
+        :rtype: bool
+
+        .. versionadded:: 4.2
+        """
+        real_layer = self.layer(layer_name)
+        if isinstance(real_layer, bool):
+            return False
+        KeywordIO().write_keywords(real_layer, keywords)
+        return True
+
     def layer(self, layer_name):
         """Get QGIS layer.
 
@@ -159,6 +199,89 @@ class DataStore(object):
 
         return layer
 
+    def _register_layer(self, layer_name, layer_type):
+        """Add a layer we have just written to the catalog.
+
+        The catalog has been refreshed before the layer was written, so we do
+        not scan the datastore again.
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param layer_type: The type of the layer : vector, raster or tabular.
+        :type layer_type: str
+
+        .. versionadded:: 4.2
+        """
+        self._catalog[layer_name] = {
+            'name': layer_name,
+            'uri': self._new_layer_uri(layer_name, layer_type),
+            'type': layer_type,
+        }
+        self._catalog_mtime = self._modification_time()
+
+    def _layers_catalog(self):
+        """Return the catalog of layers, scanning the datastore if needed.
+
+        :return: The catalog, layer name to the layer information.
+        :rtype: OrderedDict
+
+        .. versionadded:: 4.2
+        """
+        modification_time = self._modification_time()
+        if self._catalog is None or (
+                modification_time != self._catalog_mtime):
+            self._catalog = OrderedDict()
+            for layer_name, uri, layer_type in self._scan_layers():
+                self._catalog[layer_name] = {
+                    'name': layer_name,
+                    'uri': uri,
+                    'type': layer_type,
+                }
+            self._catalog_mtime = modification_time
+        return self._catalog
+
+    def _modification_time(self):
+        """Return the last modification time of the datastore.
+
+        Used to know if the catalog needs to be refreshed.
+
+        :return: The modification time or None if it's not available.
+        :rtype: float
+
+        .. versionadded:: 4.2
+        """
+        return None
+
+    @abstractmethod
+    def _scan_layers(self):
+        """List the layers stored in the datastore.
+
+        :return: List of (layer name, URI, layer type) tuples. The layer type
+            is vector, raster or tabular.
+        :rtype: list
+
+        .. versionadded:: 4.2
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _new_layer_uri(self, layer_name, layer_type):
+        """Get the URI of a layer which has just been added.
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param layer_type: The type of the layer : vector, raster or tabular.
+        :type layer_type: str
+
+        :return: The URI of the layer.
+        :rtype: str
+
+        .. versionadded:: 4.2
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def is_writable(self):
         """Check if the URI is writable.
@@ -2,7 +2,8 @@
 
 """Folder datastore implementation."""
 
-from itertools import product
+from os.path import getmtime
+from osgeo import gdal
 from PyQt4.QtCore import QFileInfo, QDir, QFile
 from qgis.core import (
     QgsVectorFileWriter,
@@ -13,6 +14,7 @@ from qgis.core import (
 
 from safe.datastore.datastore import DataStore
 from safe.common.exceptions import ErrorDataStore
+from safe.gis.raster.tools import is_virtual_raster
 from safe.utilities.utilities import human_sorting
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -106,20 +108,94 @@ class Folder(DataStore):
         """
         return True
 
-    def layers(self):
-        """Return a list of layers available.
+    def _modification_time(self):
+        """Return the last modification time of the folder.
 
-        :return: List of layers available in the datastore.
+        It changes when a file is added, removed or renamed.
+
+        :return: The modification time or None if it's not available.
+        :rtype: float
+
+        .. versionadded:: 4.2
+        """
+        try:
+            return getmtime(self.uri.absolutePath())
+        except OSError:
+            return None
+
+    def _scan_layers(self):
+        """List the layers stored in the folder.
+
+        If many files have the same base name, the extension coming first in
+        EXTENSIONS is used.
+
+        :return: List of (layer name, URI, layer type) tuples.
         :rtype: list
 
-        .. versionadded:: 4.0
+        .. versionadded:: 4.2
         """
         extensions = ['*.%s' % f for f in EXTENSIONS]
         self.uri.setNameFilters(extensions)
         files = self.uri.entryList()
         self.uri.setNameFilters('')
-        files = human_sorting([QFileInfo(f).baseName() for f in files])
-        return files
+
+        found = {}
+        for one_file in files:
+            one_file = QFileInfo(self.uri.filePath(one_file))
+            extension = one_file.completeSuffix()
+            if extension not in EXTENSIONS:
+                continue
+            layer_name = one_file.baseName()
+            previous = found.get(layer_name)
+            if previous and (
+                    EXTENSIONS.index(previous[1]) <
+                    EXTENSIONS.index(extension)):
+                continue
+            found[layer_name] = (one_file.absoluteFilePath(), extension)
+
+        layers = []
+        for layer_name in human_sorting(found.keys()):
+            uri, extension = found[layer_name]
+            if extension in RASTER_EXTENSIONS:
+                layer_type = 'raster'
+            elif extension in TABULAR_EXTENSIONS:
+                layer_type = 'tabular'
+            else:
+                layer_type = 'vector'
+            layers.append((layer_name, uri, layer_type))
+        return layers
+
+    def _new_layer_uri(self, layer_name, layer_type):
+        """Get the URI of a layer which has just been added.
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param layer_type: The type of the layer : vector, raster or tabular.
+        :type layer_type: str
+
+        :return: The URI of the layer.
+        :rtype: str
+
+        .. versionadded:: 4.2
+        """
+        extensions = {
+            'vector': self._default_vector_format,
+            'raster': 'tif',
+            'tabular': 'csv',
+        }
+        return QFileInfo(self.uri.filePath(
+            layer_name + '.' + extensions[layer_type])).absoluteFilePath()
+
+    def layers(self):
+        """Return a list of layers available.
+
+        :return: List of layers available in the datastore.
+        :rtype: list
+
+        .. versionadded:: 4.0
+        """
+        return human_sorting(self._layers_catalog().keys())
 
     def layer_uri(self, layer_name):
         """Get layer URI.
@@ -132,13 +208,9 @@ class Folder(DataStore):
 
         .. versionadded:: 4.0
         """
-        layers = self.layers()
-        for layer, extension in product(layers, EXTENSIONS):
-            one_file = QFileInfo(
-                self.uri.filePath(layer + '.' + extension))
-            if one_file.exists():
-                if one_file.baseName() == layer_name:
-                    return one_file.absoluteFilePath()
+        layer = self._layers_catalog().get(layer_name)
+        if layer:
+            return layer['uri']
         else:
             return None
 
@@ -236,6 +308,17 @@ class Folder(DataStore):
             # If it's tiff file based.
             QFile.copy(source.absoluteFilePath(), output.absoluteFilePath())
 
+        elif is_virtual_raster(raster_layer.source()):
+            # The intermediate rasters of the analysis are in memory or VRT
+            # windows, we write the pixels in the folder.
+            dataset = gdal.Translate(
+                output.absoluteFilePath(),
+                raster_layer.source(),
+                format='GTiff')
+            if dataset is None:
+                return False, gdal.GetLastErrorMsg()
+            del dataset
+
         else:
             # If it's not file based.
             renderer = raster_layer.renderer()
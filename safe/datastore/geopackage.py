@@ -11,23 +11,45 @@ Contact : ole.moller.nielsen@gmail.com
 
 """
 
+import logging
+from os.path import getmtime
+from Queue import Queue
+from threading import Thread, Event
+
 from osgeo import ogr, osr, gdal
-from PyQt4.QtCore import QFileInfo
-from qgis.core import (
-    QgsVectorLayer,
-    QgsRasterLayer,
-)
+from PyQt4.QtCore import QFileInfo, QPyNullVariant, Qt
 
-from safe.definitions.gis import QGIS_OGR_GEOMETRY_MAP
+from safe.definitions.gis import (
+    QGIS_OGR_GEOMETRY_MAP, QGIS_OGR_FIELD_TYPE_MAP)
 from safe.datastore.datastore import DataStore
 from safe.common.exceptions import ErrorDataStore
+from safe.utilities.metadata import write_iso19115_metadata
+
+LOGGER = logging.getLogger('InaSAFE')
 
 
 class GeoPackage(DataStore):
     """
     GeoPackage DataStore
 
+    Vector layers are written with OGR inside a transaction and without a
+    spatial index. Indexes are created in one go by `create_spatial_indexes`
+    or `close`, which is much cheaper than maintaining the R-tree on every
+    insert.
+
+    If `background_writing` is enabled, the features are read on the calling
+    thread and handed to a writer thread which keeps a single transaction
+    open on the file. The analysis can carry on while the encoding and the
+    disk IO happen. The transaction is committed only when a layer needs to
+    be read back, when a raster is added or when the datastore is closed.
+
+    Compared to the default folder of GeoJSON files, the GeoPackage avoids
+    the text serialisation of the geometries and one file per layer, and
+    each layer costs one insert statement per feature in a shared
+    transaction instead of a full file rewrite.
+
     .. versionadded:: 4.0
+    .. versionchanged:: 4.2 Transactional and background writing.
     """
 
     def __init__(self, uri):
@@ -65,6 +87,95 @@ class GeoPackage(DataStore):
             datasource = self.vector_driver.CreateDataSource(path)
             del datasource
 
+        # Vector layers without a spatial index yet.
+        self._pending_spatial_indexes = []
+        self._writer = None
+
+    @property
+    def background_writing(self):
+        """Return if vector layers are written by a background thread.
+
+        :return: If we use a background writer.
+        :rtype: bool
+
+        .. versionadded:: 4.2
+        """
+        return self._writer is not None
+
+    @background_writing.setter
+    def background_writing(self, enabled):
+        """Setter to enable or disable the background writer.
+
+        Disabling the background writer will commit all pending layers.
+
+        :param enabled: A boolean if we use a background writer.
+        :type enabled: bool
+
+        .. versionadded:: 4.2
+        """
+        if enabled and self._writer is None:
+            # From now, the catalog is the only source of truth.
+            self._layers_catalog()
+            self._writer = GeoPackageWriter(self.uri.absoluteFilePath())
+            self._writer.start()
+        elif not enabled and self._writer is not None:
+            writer = self._writer
+            self._writer = None
+            try:
+                writer.stop()
+            finally:
+                self._catalog_mtime = self._modification_time()
+
+    def flush(self):
+        """Wait for the background writer and commit its transaction.
+
+        It does nothing if the background writer is not enabled.
+
+        :raises: ErrorDataStore if a layer could not be written.
+
+        .. versionadded:: 4.2
+        """
+        if self._writer is not None:
+            self._writer.commit()
+
+    def create_spatial_indexes(self):
+        """Create the spatial indexes of all the vector layers we wrote.
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        if not self._pending_spatial_indexes:
+            return
+
+        datasource = self.vector_driver.Open(
+            self.uri.absoluteFilePath(), True)
+        for layer_name in self._pending_spatial_indexes:
+            layer = datasource.GetLayerByName(layer_name)
+            if layer is None or layer.GetGeomType() == ogr.wkbNone:
+                continue
+            sql = u"SELECT CreateSpatialIndex('{table}', '{column}')".format(
+                table=layer_name, column=layer.GetGeometryColumn())
+            result = datasource.ExecuteSQL(sql)
+            if result is not None:
+                datasource.ReleaseResultSet(result)
+        self._pending_spatial_indexes = []
+        del datasource
+
+        if self._writer is None:
+            # The catalog is still valid, the file changed because of us.
+            self._catalog_mtime = self._modification_time()
+
+    def close(self):
+        """Commit pending layers, build spatial indexes and stop the writer.
+
+        The datastore can still be used after, layers will be written
+        synchronously.
+
+        .. versionadded:: 4.2
+        """
+        self.create_spatial_indexes()
+        self.background_writing = False
+
     @property
     def uri_path(self):
         """Return the URI of the datastore as a path. It's not a layer URI.
@@ -100,20 +211,52 @@ class GeoPackage(DataStore):
         else:
             return True
 
-    def _vector_layers(self):
-        """Return a list of vector layers available.
+    def _modification_time(self):
+        """Return the last modification time of the geopackage.
+
+        :return: The modification time or None if it's not available.
+        :rtype: float
 
-        :return: List of vector layers available in the geopackage.
+        .. versionadded:: 4.2
+        """
+        if self._writer is not None:
+            # The writer thread owns the file, the catalog is up to date.
+            return self._catalog_mtime
+        try:
+            return getmtime(self.uri.absoluteFilePath())
+        except OSError:
+            return None
+
+    def _scan_layers(self):
+        """List the layers stored in the geopackage.
+
+        :return: List of (layer name, URI, layer type) tuples.
         :rtype: list
 
-        .. versionadded:: 4.0
+        .. versionadded:: 4.2
         """
         layers = []
         vector_datasource = self.vector_driver.Open(
             self.uri.absoluteFilePath())
         if vector_datasource:
             for i in range(vector_datasource.GetLayerCount()):
-                layers.append(vector_datasource.GetLayer(i).GetName())
+                vector_layer = vector_datasource.GetLayer(i)
+                if vector_layer.GetGeomType() == ogr.wkbNone:
+                    layer_type = 'tabular'
+                else:
+                    layer_type = 'vector'
+                layer_name = vector_layer.GetName()
+                layers.append((
+                    layer_name,
+                    self._new_layer_uri(layer_name, layer_type),
+                    layer_type))
+        del vector_datasource
+
+        for layer_name in self._raster_layers():
+            layers.append((
+                layer_name,
+                self._new_layer_uri(layer_name, 'raster'),
+                'raster'))
         return layers
 
     def _raster_layers(self):
@@ -138,6 +281,33 @@ class GeoPackage(DataStore):
 
         return layers
 
+    def _new_layer_uri(self, layer_name, layer_type):
+        """Get the URI of a layer in the geopackage.
+
+        For a vector layer :
+        /path/to/the/geopackage.gpkg|layername=my_vector_layer
+
+        For a raster :
+        GPKG:/path/to/the/geopackage.gpkg:my_raster_layer
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param layer_type: The type of the layer : vector, raster or tabular.
+        :type layer_type: str
+
+        :return: The URI of the layer.
+        :rtype: str
+
+        .. versionadded:: 4.2
+        """
+        if layer_type == 'raster':
+            return u'GPKG:{}:{}'.format(
+                self.uri.absoluteFilePath(), layer_name)
+        else:
+            return u'{}|layername={}'.format(
+                self.uri.absoluteFilePath(), layer_name)
+
     def layers(self):
         """Return a list of layers available.
 
@@ -146,7 +316,7 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
-        return self._vector_layers() + self._raster_layers()
+        return list(self._layers_catalog().keys())
 
     def layer_uri(self, layer_name):
         """Get layer URI.
@@ -165,19 +335,51 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
-        for layer in self._vector_layers():
-            if layer == layer_name:
-                uri = u'{}|layername={}'.format(
-                    self.uri.absoluteFilePath(), layer_name)
-                return uri
+        layer = self._layers_catalog().get(layer_name)
+        if layer:
+            return layer['uri']
         else:
-            for layer in self._raster_layers():
-                if layer == layer_name:
-                    uri = u'GPKG:{}:{}'.format(
-                        self.uri.absoluteFilePath(), layer_name)
-                    return uri
-            else:
-                return None
+            return None
+
+    def layer(self, layer_name):
+        """Get QGIS layer.
+
+        If the layer is still in the transaction of the background writer, the
+        transaction is committed first.
+
+        :param layer_name: The name of the layer to fetch.
+        :type layer_name: str
+
+        :return: The QGIS layer.
+        :rtype: QgsMapLayer
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        return super(GeoPackage, self).layer(layer_name)
+
+    def _write_keywords(self, layer_name, keywords):
+        """Write keywords for a layer which has been added to the datastore.
+
+        We do not need to open the layer to write its keywords, so the
+        background writer is not interrupted.
+
+        :param layer_name: The name of the layer in the datastore.
+        :type layer_name: str
+
+        :param keywords: The keywords to write.
+        :type keywords: dict
+
+        :return: False if the layer is not in the datastore.
+        :rtype: bool
+
+        .. versionadded:: 4.2
+        """
+        uri = self.layer_uri(layer_name)
+        if not uri:
+            return False
+        write_iso19115_metadata(uri, keywords)
+        return True
 
     def _add_vector_layer(self, vector_layer, layer_name):
         """Add a vector layer to the geopackage.
@@ -200,22 +402,25 @@ class GeoPackage(DataStore):
         # if not self.is_writable():
         #    return False, 'The destination is not writable.'
 
-        geometry = QGIS_OGR_GEOMETRY_MAP[vector_layer.wkbType()]
+        # QGIS layers can't be shared between threads, so we read the
+        # features now. Only the OGR part is done by the writer.
+        snapshot = layer_snapshot(vector_layer, layer_name)
+        self._pending_spatial_indexes.append(layer_name)
 
-        spatial_reference = osr.SpatialReference()
-        qgis_spatial_reference = vector_layer.crs().authid()
-        spatial_reference.ImportFromEPSG(
-            int(qgis_spatial_reference.split(':')[1]))
+        if self._writer is not None:
+            self._writer.write(snapshot)
+            return True, layer_name
 
         vector_datasource = self.vector_driver.Open(
             self.uri.absoluteFilePath(), True)
-        vector_datasource.CreateLayer(layer_name, spatial_reference, geometry)
-        uri = u'{}|layerid=0'.format(self.uri.absoluteFilePath())
-        vector_layer = QgsVectorLayer(uri, layer_name, u'ogr')
-
-        data_provider = vector_layer.dataProvider()
-        for feature in vector_layer.getFeatures():
-            data_provider.addFeatures([feature])
+        vector_datasource.StartTransaction()
+        try:
+            write_snapshot(vector_datasource, snapshot)
+        except RuntimeError as e:
+            vector_datasource.RollbackTransaction()
+            return False, str(e)
+        vector_datasource.CommitTransaction()
+        del vector_datasource
 
         return True, layer_name
 
@@ -235,6 +440,8 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
+        # GDAL needs to write in the file, the transaction must be closed.
+        self.flush()
 
         source = gdal.Open(raster_layer.source())
         array = source.GetRasterBand(1).ReadAsArray()
@@ -277,3 +484,214 @@ class GeoPackage(DataStore):
         .. versionadded:: 4.0
         """
         return self._add_vector_layer(tabular_layer, layer_name)
+
+
+def layer_snapshot(layer, layer_name):
+    """Read a QGIS vector layer into plain python objects.
+
+    The snapshot can be written later by `write_snapshot`, from any thread.
+
+    :param layer: The vector layer to read.
+    :type layer: QgsVectorLayer
+
+    :param layer_name: The name of the layer in the datastore.
+    :type layer_name: str
+
+    :return: A dictionary with the layer definition and the features as a
+        list of (WKB, attributes) tuples.
+    :rtype: dict
+
+    .. versionadded:: 4.2
+    """
+    crs = layer.crs()
+    if crs.isValid():
+        crs = crs.toWkt()
+    else:
+        crs = None
+
+    fields = [(field.name(), field.type()) for field in layer.fields()]
+
+    features = []
+    for feature in layer.getFeatures():
+        geometry = feature.geometry()
+        if geometry and not geometry.isEmpty():
+            wkb = geometry.asWkb()
+        else:
+            wkb = None
+
+        attributes = []
+        for (name, field_type), value in zip(fields, feature.attributes()):
+            if value is None or isinstance(value, QPyNullVariant):
+                value = None
+            elif field_type not in QGIS_OGR_FIELD_TYPE_MAP:
+                try:
+                    value = value.toString(Qt.ISODate)
+                except AttributeError:
+                    value = unicode(value)
+            attributes.append(value)
+
+        features.append((wkb, attributes))
+
+    return {
+        'name': layer_name,
+        'geometry': QGIS_OGR_GEOMETRY_MAP[layer.wkbType()],
+        'crs': crs,
+        'fields': fields,
+        'features': features,
+    }
+
+
+def write_snapshot(datasource, snapshot):
+    """Write a layer snapshot in an OGR datasource.
+
+    The layer is created without spatial index. The caller is responsible of
+    the transaction.
+
+    :param datasource: The OGR datasource, opened in update mode.
+    :type datasource: ogr.DataSource
+
+    :param snapshot: The snapshot created by `layer_snapshot`.
+    :type snapshot: dict
+
+    :raises: RuntimeError if the layer can't be created.
+
+    .. versionadded:: 4.2
+    """
+    spatial_reference = None
+    if snapshot['crs']:
+        spatial_reference = osr.SpatialReference()
+        spatial_reference.ImportFromWkt(snapshot['crs'])
+
+    layer = datasource.CreateLayer(
+        snapshot['name'],
+        spatial_reference,
+        snapshot['geometry'],
+        ['SPATIAL_INDEX=NO'])
+    if layer is None:
+        raise RuntimeError(
+            'Could not create the layer {name}.'.format(
+                name=snapshot['name']))
+
+    for name, field_type in snapshot['fields']:
+        ogr_type = QGIS_OGR_FIELD_TYPE_MAP.get(field_type, ogr.OFTString)
+        layer.CreateField(ogr.FieldDefn(name.encode('utf-8'), ogr_type))
+
+    definition = layer.GetLayerDefn()
+    for wkb, attributes in snapshot['features']:
+        feature = ogr.Feature(definition)
+        if wkb:
+            feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+        for index, value in enumerate(attributes):
+            if value is None:
+                continue
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            feature.SetField(index, value)
+        layer.CreateFeature(feature)
+        feature = None
+
+
+class GeoPackageWriter(Thread):
+
+    """Thread writing layer snapshots in a GeoPackage.
+
+    The thread owns its own OGR datasource. All the snapshots are written in
+    a single transaction until `commit` is called. If a snapshot can not be
+    written, the transaction is rolled back and `commit` raises the error.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, path):
+        """Constructor for the writer.
+
+        :param path: The path to the GeoPackage.
+        :type path: basestring
+        """
+        super(GeoPackageWriter, self).__init__(name='GeoPackageWriter')
+        self.daemon = True
+        self._path = path
+        self._queue = Queue()
+        self._errors = []
+
+    def write(self, snapshot):
+        """Queue a layer snapshot.
+
+        :param snapshot: The snapshot created by `layer_snapshot`.
+        :type snapshot: dict
+        """
+        self._queue.put(('write', snapshot))
+
+    def commit(self):
+        """Wait for all queued layers to be written and commit them.
+
+        :raises: ErrorDataStore if a layer could not be written.
+        """
+        done = Event()
+        self._queue.put(('commit', done))
+        done.wait()
+
+        if self._errors:
+            errors = self._errors
+            self._errors = []
+            raise ErrorDataStore('\n'.join(errors))
+
+    def stop(self):
+        """Commit the pending layers and stop the thread.
+
+        :raises: ErrorDataStore if a layer could not be written.
+        """
+        try:
+            self.commit()
+        finally:
+            self._queue.put(('stop', None))
+            self.join()
+
+    def run(self):
+        """Process the queue until `stop` is called."""
+        datasource = ogr.Open(self._path, True)
+        open_error = 'Could not open %s for writing.' % self._path
+        if datasource is None:
+            LOGGER.error(open_error)
+
+        in_transaction = False
+        while True:
+            action, argument = self._queue.get()
+
+            if action == 'stop':
+                datasource = None
+                break
+
+            try:
+                if datasource is None:
+                    # Fail fast, nothing can be written.
+                    if open_error not in self._errors:
+                        self._errors.append(open_error)
+                    continue
+
+                if action == 'write':
+                    if not in_transaction:
+                        datasource.StartTransaction()
+                        in_transaction = True
+                    try:
+                        write_snapshot(datasource, argument)
+                    except Exception:
+                        # Do not commit a partial layer.
+                        in_transaction = False
+                        datasource.RollbackTransaction()
+                        raise
+
+                elif action == 'commit':
+                    if in_transaction:
+                        in_transaction = False
+                        datasource.CommitTransaction()
+                    # Flush so other connections see the committed layers.
+                    datasource.SyncToDisk()
+
+            except Exception as e:  # pylint: disable=broad-except
+                LOGGER.exception('Background writing failed')
+                self._errors.append(str(e))
+
+            finally:
+                if action == 'commit':
+                    argument.set()
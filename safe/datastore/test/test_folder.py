@@ -109,5 +109,34 @@ class TestFolder(unittest.TestCase):
             data_store.layer_keyword('layer_purpose', 'hazard')
         )
 
+    def test_layers_catalog(self):
+        """Test the catalog of layers in the folder datastore."""
+        path = mkdtemp()
+        data_store = Folder(path)
+
+        vector_layer = load_test_vector_layer(
+            'hazard', 'flood_multipart_polygons.shp')
+        data_store.add_layer(vector_layer, 'flood_vector')
+        raster_layer = load_test_raster_layer(
+            'hazard', 'classified_hazard.tif')
+        data_store.add_layer(raster_layer, 'flood_raster')
+
+        self.assertEqual(
+            data_store.layers(), ['flood_raster', 'flood_vector'])
+        # The keywords written with the layer do not make the catalog stale.
+        self.assertEqual(
+            data_store._catalog_mtime, data_store._modification_time())
+
+        # A new datastore on the same folder reads the layers from the disk.
+        data_store = Folder(path)
+        self.assertEqual(
+            data_store.layers(), ['flood_raster', 'flood_vector'])
+
+        # A file added by someone else is found.
+        other_store = Folder(path)
+        other_store.add_layer(vector_layer, 'another_flood')
+        self.assertIn('another_flood', data_store.layers())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -16,7 +16,7 @@ import sys
 from tempfile import mktemp
 from qgis.core import QgsVectorLayer, QgsRasterLayer
 from PyQt4.QtCore import QFileInfo
-from osgeo import gdal
+from osgeo import gdal, ogr
 
 from safe.test.utilities import (
     get_qgis_app,
@@ -24,7 +24,8 @@ from safe.test.utilities import (
     standard_data_path)
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
-from safe.datastore.geopackage import GeoPackage
+from safe.common.exceptions import ErrorDataStore
+from safe.datastore.geopackage import GeoPackage, GeoPackageWriter
 
 
 # Decorator for expecting fails in windows but not other OS's
@@ -122,6 +123,58 @@ class TestGeoPackage(unittest.TestCase):
         result = data_store.add_layer(layer, tabular_layer_name)
         self.assertTrue(result[0])
 
+    @unittest.skipIf(
+        int(gdal.VersionInfo('VERSION_NUM')) < 2000000,
+        'GDAL 2.0 is required for geopackage.')
+    def test_background_writing(self):
+        """Test we can write layers with the background writer."""
+        path = QFileInfo(mktemp() + '.gpkg')
+        data_store = GeoPackage(path)
+        data_store.background_writing = True
+        self.assertTrue(data_store.background_writing)
+
+        layer = standard_data_path('hazard', 'flood_multipart_polygons.shp')
+        vector_layer = QgsVectorLayer(layer, 'Flood', 'ogr')
+        for layer_name in ['flood_1', 'flood_2', 'flood_3']:
+            result = data_store.add_layer(vector_layer, layer_name)
+            self.assertTrue(result[0])
+
+        # The same name can't be used twice, even if it is not committed.
+        result = data_store.add_layer(vector_layer, 'flood_1')
+        self.assertFalse(result[0])
+
+        # Loading a layer commits the transaction.
+        self.assertEqual(len(data_store.layers()), 3)
+        flood = data_store.layer('flood_2')
+        self.assertTrue(flood.isValid())
+        self.assertEqual(flood.featureCount(), vector_layer.featureCount())
+        self.assertEqual(
+            flood.fields().count(), vector_layer.fields().count())
+
+        data_store.close()
+        self.assertFalse(data_store.background_writing)
+        self.assertEqual(len(data_store.layers()), 3)
+
+        # The spatial index has been created at the end.
+        datasource = ogr.Open(path.absoluteFilePath())
+        result = datasource.ExecuteSQL(
+            "SELECT HasSpatialIndex('flood_3', '%s')" %
+            datasource.GetLayerByName('flood_3').GetGeometryColumn())
+        self.assertEqual(result.GetNextFeature().GetField(0), 1)
+        datasource.ReleaseResultSet(result)
+
+    def test_background_writing_errors(self):
+        """Test the writer reports errors instead of freezing."""
+        writer = GeoPackageWriter(mktemp() + '.gpkg')
+        writer.start()
+        writer.write({})
+        self.assertRaises(ErrorDataStore, writer.commit)
+
+        # The thread is stopped even if the commit fails.
+        writer.write({})
+        self.assertRaises(ErrorDataStore, writer.stop)
+        self.assertFalse(writer.is_alive())
+
     @unittest.skipIf(
         int(gdal.VersionInfo('VERSION_NUM')) < 2000000,
         'GDAL 2.0 is required for geopackage.')
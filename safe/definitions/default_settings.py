@@ -19,6 +19,10 @@ inasafe_default_settings = {
     'developer_mode': False,
     'generate_report': True,
     'memory_profile': False,
+    'geopackage_datastore': False,
+    'raster_native_analysis': False,
+    # Run some algorithms in a pool of processes.
+    'parallel_processing': False,
 
     'ISO19115_ORGANIZATION': 'InaSAFE.org',
     'ISO19115_URL': 'http://inasafe.org',
@@ -28,7 +32,13 @@ inasafe_default_settings = {
     'currency': idr['key'],
 
     'keywordCachePath': join(
-        QgsApplication.qgisSettingsDirPath(), 'inasafe', 'metadata.db')
+        QgsApplication.qgisSettingsDirPath(), 'inasafe', 'metadata.db'),
+
+    # Local catalog of the layers in these directories, separated by the
+    # path separator of the system.
+    'layer_catalog_path': join(
+        QgsApplication.qgisSettingsDirPath(), 'inasafe', 'layer_catalog.db'),
+    'layer_catalog_directories': '',
 
     # Make sure first to not have cyclic import
     # 'organisation_logo_path': resources_path(
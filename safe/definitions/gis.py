@@ -1,6 +1,7 @@
 # coding=utf-8
 
 from osgeo import ogr
+from PyQt4.QtCore import QVariant
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -18,3 +19,12 @@ QGIS_OGR_GEOMETRY_MAP = {
     6: ogr.wkbMultiPolygon,
     100: ogr.wkbNone
 }
+
+# From QVariant types used by QgsField to OGR field types.
+# Any other type is stored as a string.
+QGIS_OGR_FIELD_TYPE_MAP = {
+    QVariant.Int: ogr.OFTInteger,
+    QVariant.LongLong: ogr.OFTInteger64,
+    QVariant.Double: ogr.OFTReal,
+    QVariant.String: ogr.OFTString,
+}
@@ -113,6 +113,11 @@ align_steps = {
     'output_layer_name': '%s_aligned',
 }
 
+density_to_counts_steps = {
+    'step_name': tr('Density to counts'),
+    'output_layer_name': '%s_counts',
+}
+
 polygonize_steps = {
     'step_name': tr('Polygonize'),
     'output_layer_name': '%s_polygonized',
@@ -135,6 +140,11 @@ reclassify_raster_steps = {
     'output_layer_name': '%s_reclassified',
 }
 
+zonal_histogram_steps = {
+    'step_name': tr('Zonal histogram'),
+    'output_layer_name': 'zonal_histogram',
+}
+
 zonal_stats_steps = {
     'step_name': tr('Zonal statistics'),
     'output_layer_name': 'zonal_stats',
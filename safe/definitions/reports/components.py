@@ -100,6 +100,8 @@ analysis_question_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': analysis_question_extractor,
+    # The extractor only reads the result tables, it can run in a thread.
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'analysis-result-output.html',
     'template': 'standard-template/'
@@ -115,6 +117,7 @@ general_report_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': general_report_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'general-report-output.html',
     'template': 'standard-template/'
@@ -166,6 +169,7 @@ mmi_detail_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': mmi_detail_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'mmi-detail-output.html',
     'template': 'standard-template/'
@@ -205,6 +209,7 @@ analysis_detail_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': analysis_detail_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'analysis-detail-output.html',
     'template': 'standard-template/'
@@ -254,6 +259,7 @@ action_checklist_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': action_checklist_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'action-checklist-output.html',
     'template': 'standard-template/'
@@ -269,6 +275,7 @@ notes_assumptions_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': notes_assumptions_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'notes-assumptions-output.html',
     'template': 'standard-template/'
@@ -316,6 +323,7 @@ minimum_needs_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': minimum_needs_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'minimum-needs-output.html',
     'template': 'standard-template/'
@@ -339,6 +347,7 @@ aggregation_result_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': aggregation_result_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'aggregation-result-output.html',
     'template': 'standard-template/'
@@ -360,6 +369,7 @@ aggregation_postprocessors_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': aggregation_postprocessors_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'aggregation-postprocessors-output.html',
     'template': 'standard-template/'
@@ -402,6 +412,7 @@ analysis_provenance_details_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': analysis_provenance_details_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'analysis-provenance-details-output.html',
     'template': 'standard-template/'
@@ -431,6 +442,7 @@ analysis_provenance_details_simplified_component = {
     'type': jinja2_component_type,
     'processor': jinja2_renderer,
     'extractor': analysis_provenance_details_simplified_extractor,
+    'thread_safe': True,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'analysis-provenance-details-simplified-output.html',
     'template': 'standard-template/'
@@ -487,6 +499,7 @@ population_chart_png_component = {
     'output_format': Jinja2ComponentsMetadata.OutputFormat.File,
     'output_path': 'population-chart.png',
     'tags': [png_product_tag],
+    'dependencies': ['population-chart'],
     'extra_args': {
         'width': 256,
         'height': 256
@@ -501,6 +514,7 @@ population_chart_legend_component = {
     'extractor': population_chart_legend_extractor,
     'output_format': Jinja2ComponentsMetadata.OutputFormat.String,
     'output_path': 'population-chart-legend-output.html',
+    'dependencies': ['population-chart'],
     'template': 'standard-template/'
                 'jinja2/'
                 'population-chart-legend.html',
@@ -548,6 +562,7 @@ population_infographic_component = {
     'page_height': 210,
     'template': '../qgis-composer-templates/'
                 'infographic.qpt',
+    'dependencies': ['population-chart-png'],
     'tags': [
         final_product_tag,
         infographic_product_tag,
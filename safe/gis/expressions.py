@@ -1,8 +1,10 @@
 # coding=utf-8
 from qgis.core import (
     qgsfunction,
+    QgsFeatureRequest,
     QgsMapLayerRegistry,
     QgsExpressionContextUtils,
+    QgsProject,
 )
 
 import datetime
@@ -16,33 +18,139 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+# The row of the analysis layer, read once for all expression evaluations.
+# It is never modified, a new snapshot replaces it. None if it must be read
+# again.
+_analysis_snapshot = None
+# The layer the snapshot was read from, to disconnect its signals.
+_analysis_layer = None
+# The analysis layer id in the project variables when the snapshot was read.
+_analysis_layer_id = None
+_project_connected = False
 
-@qgsfunction(
-    args='auto', group='InaSAFE', usesGeometry=False, referencedColumns=[])
-def inasafe_impact_analysis_layer(field, feature, parent):
-    """Retrieve a value from a field in the impact analysis layer.
 
-    For instance:  inasafe_impact_analysis_layer('total_not_exposed') -> 3
+def _project_analysis_layer_id():
+    """The id of the analysis layer in the project variables.
+
+    :return: The layer id, None if there is no analysis.
+    :rtype: basestring
     """
-    _ = feature, parent  # NOQA
     project_context_scope = QgsExpressionContextUtils.projectScope()
-    registry = QgsMapLayerRegistry.instance()
-
     key = provenance_layer_analysis_impacted_id['provenance_key']
-    if not project_context_scope.hasVariable(key):
-        return None
+    if project_context_scope.hasVariable(key):
+        return project_context_scope.variable(key)
+    return None
 
-    layer = registry.mapLayer(project_context_scope.variable(key))
 
-    if not layer:
-        return None
+def analysis_snapshot():
+    """The values of the analysis layer of the project, by field name.
 
-    index = layer.fieldNameIndex(field)
-    if index < 0:
-        return None
+    The analysis layer is read on the first call. The snapshot is kept
+    until the analysis layer changes, another analysis layer is set in the
+    project variables or another project is read. It must not be modified.
+
+    :return: The values by field name, empty if there is no analysis.
+    :rtype: dict
+
+    .. versionadded:: 4.2
+    """
+    snapshot = _analysis_snapshot
+    if snapshot is None or (
+            _analysis_layer_id != _project_analysis_layer_id()):
+        snapshot = update_analysis_snapshot()
+    return snapshot
+
+
+def update_analysis_snapshot():
+    """Read the analysis layer set in the project variables again.
+
+    The dock calls it when it writes the provenance project variables. The
+    snapshot is also read again if the variables have been written by
+    someone else.
+
+    :return: The new snapshot, see analysis_snapshot.
+    :rtype: dict
+
+    .. versionadded:: 4.2
+    """
+    global _analysis_snapshot, _analysis_layer, _analysis_layer_id
+    global _project_connected
+    clear_analysis_snapshot()
+
+    if not _project_connected:
+        QgsProject.instance().readProject.connect(clear_analysis_snapshot)
+        QgsMapLayerRegistry.instance().layersWillBeRemoved.connect(
+            _layers_will_be_removed)
+        _project_connected = True
+
+    layer_id = _project_analysis_layer_id()
+    layer = None
+    if layer_id:
+        layer = QgsMapLayerRegistry.instance().mapLayer(layer_id)
 
-    feature = layer.getFeatures().next()
-    return feature[index]
+    snapshot = {}
+    if layer:
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        for feature in layer.getFeatures(request):
+            field_names = [field.name() for field in layer.fields()]
+            snapshot = dict(zip(field_names, feature.attributes()))
+            break
+
+        # Any change of the layer invalidates the snapshot.
+        layer.attributeValueChanged.connect(clear_analysis_snapshot)
+        layer.updatedFields.connect(clear_analysis_snapshot)
+        layer.editingStopped.connect(clear_analysis_snapshot)
+        _analysis_layer = layer
+
+    _analysis_snapshot = snapshot
+    _analysis_layer_id = layer_id
+    return snapshot
+
+
+def clear_analysis_snapshot(*args):
+    """Forget the snapshot, the analysis layer is read again when needed.
+
+    It can be connected to any signal, the arguments are ignored.
+
+    .. versionadded:: 4.2
+    """
+    global _analysis_snapshot, _analysis_layer, _analysis_layer_id
+    _ = args  # NOQA
+    layer = _analysis_layer
+    _analysis_layer = None
+    _analysis_layer_id = None
+    _analysis_snapshot = None
+    if layer is not None:
+        try:
+            layer.attributeValueChanged.disconnect(clear_analysis_snapshot)
+            layer.updatedFields.disconnect(clear_analysis_snapshot)
+            layer.editingStopped.disconnect(clear_analysis_snapshot)
+        except (TypeError, RuntimeError):
+            # Not connected or the layer is already deleted.
+            pass
+
+
+def _layers_will_be_removed(layer_ids):
+    """Forget the snapshot if the analysis layer is removed.
+
+    :param layer_ids: The IDs of the removed layers.
+    :type layer_ids: list
+    """
+    layer = _analysis_layer
+    if layer is not None and layer.id() in layer_ids:
+        clear_analysis_snapshot()
+
+
+@qgsfunction(
+    args='auto', group='InaSAFE', usesGeometry=False, referencedColumns=[])
+def inasafe_impact_analysis_layer(field, feature, parent):
+    """Retrieve a value from a field in the impact analysis layer.
+
+    For instance:  inasafe_impact_analysis_layer('total_not_exposed') -> 3
+    """
+    _ = feature, parent  # NOQA
+    return analysis_snapshot().get(field)
 
 
 @qgsfunction(
@@ -2,14 +2,13 @@
 
 """Clip a raster by bounding box."""
 
-import processing
 import logging
 
+from osgeo import gdal
 from qgis.core import QgsRasterLayer
 
-from safe.common.exceptions import ProcessingInstallationError
-from safe.common.utilities import unique_filename, temp_dir
 from safe.definitions.processing_steps import quick_clip_steps
+from safe.gis.raster.tools import memory_raster_path
 from safe.gis.sanity_check import check_layer
 from safe.utilities.gis import is_raster_y_inverted
 from safe.utilities.profiling import profile
@@ -25,10 +24,13 @@ LOGGER = logging.getLogger('InaSAFE')
 
 @profile
 def clip_by_extent(layer, extent, callback=None):
-    """Clip a raster using a bounding box using processing.
+    """Clip a raster using a bounding box.
 
     Issue https://github.com/inasafe/inasafe/issues/3183
 
+    The clip is a VRT window on the raster, kept in memory. No pixel is
+    copied, they are read from the source raster by the next step.
+
     :param layer: The layer to reproject.
     :type layer: QgsRasterLayer
 
@@ -52,55 +54,47 @@ def clip_by_extent(layer, extent, callback=None):
         processing_step = quick_clip_steps['step_name']
         output_layer_name = output_layer_name % layer.keywords['layer_purpose']
 
-        output_raster = unique_filename(dir=temp_dir())
+        output_raster = memory_raster_path(suffix='.vrt')
 
         # We make one pixel size buffer on the extent to cover every pixels.
         # See https://github.com/inasafe/inasafe/issues/3655
         pixel_size_x = layer.rasterUnitsPerPixelX()
         pixel_size_y = layer.rasterUnitsPerPixelY()
         buffer_size = max(pixel_size_x, pixel_size_y)
-        extent = extent.buffer(buffer_size)
+        extent = extent.buffer(buffer_size).intersect(layer.extent())
 
         if is_raster_y_inverted(layer):
             # The raster is Y inverted. We need to switch Y min and Y max.
-            bbox = [
-                str(extent.xMinimum()),
-                str(extent.xMaximum()),
-                str(extent.yMaximum()),
-                str(extent.yMinimum())
+            projection_window = [
+                extent.xMinimum(),
+                extent.yMinimum(),
+                extent.xMaximum(),
+                extent.yMaximum()
             ]
         else:
             # The raster is normal.
-            bbox = [
-                str(extent.xMinimum()),
-                str(extent.xMaximum()),
-                str(extent.yMinimum()),
-                str(extent.yMaximum())
+            projection_window = [
+                extent.xMinimum(),
+                extent.yMaximum(),
+                extent.xMaximum(),
+                extent.yMinimum()
             ]
 
-        # These values are all from the processing algorithm.
-        # https://github.com/qgis/QGIS/blob/master/python/plugins/processing/
-        # algs/gdal/ClipByExtent.py
-        # Please read the file to know these parameters.
         parameters['INPUT'] = layer.source()
-        parameters['NO_DATA'] = ''
-        parameters['PROJWIN'] = ','.join(bbox)
-        parameters['RTYPE'] = 5
-        parameters['COMPRESS'] = 4
-        parameters['JPEGCOMPRESSION'] = 75
-        parameters['ZLEVEL'] = 6
-        parameters['PREDICTOR'] = 1
-        parameters['TILED'] = False
-        parameters['BIGTIFF'] = 0
-        parameters['TFW'] = False
-        parameters['EXTRA'] = ''
+        parameters['PROJWIN'] = projection_window
         parameters['OUTPUT'] = output_raster
-        result = processing.runalg("gdalogr:cliprasterbyextent", parameters)
+        result = gdal.Translate(
+            output_raster,
+            layer.source(),
+            format='VRT',
+            projWin=projection_window)
 
         if result is None:
-            raise ProcessingInstallationError
+            raise Exception(gdal.GetLastErrorMsg())
+        # Close the dataset, the VRT is written when it is closed.
+        result = None
 
-        clipped = QgsRasterLayer(result['OUTPUT'], output_layer_name)
+        clipped = QgsRasterLayer(output_raster, output_layer_name)
 
         # We transfer keywords to the output.
         clipped.keywords = layer.keywords.copy()
@@ -115,9 +109,7 @@ def clip_by_extent(layer, extent, callback=None):
         # Check https://github.com/inasafe/inasafe/issues/4026 why we got some
         # exceptions with this step.
         LOGGER.exception(parameters)
-        LOGGER.exception(
-           'Error from QGIS clip raster by extent. Please check the QGIS '
-           'logs too !')
+        LOGGER.exception('Error from GDAL clip raster by extent.')
         LOGGER.info(
             'Even if we got an exception, we are continuing the analysis. The '
             'layer is not clip.')
@@ -0,0 +1,189 @@
+# coding=utf-8
+
+"""From density to counts."""
+
+import logging
+import os
+
+import numpy as np
+from osgeo import gdal, osr
+from qgis.core import QgsRasterLayer
+
+from safe.common.exceptions import FileNotFoundError
+from safe.common.utilities import unique_filename, temp_dir
+from safe.definitions.processing_steps import density_to_counts_steps
+from safe.definitions.units import count_exposure_unit
+from safe.gis.raster.tools import BLOCK_ROWS, MEMORY_TIFF_OPTIONS
+from safe.gis.sanity_check import check_layer
+from safe.utilities.profiling import profile
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# The density is a number per square kilometre.
+DENSITY_AREA = 1000000.0
+
+
+def _authalic_q(latitudes, eccentricity):
+    """Compute the q function of the authalic latitude.
+
+    The area of the ellipsoid between the equator and a latitude is
+    proportional to q.
+
+    :param latitudes: The latitudes in radians.
+    :type latitudes: numpy.ndarray
+
+    :param eccentricity: The eccentricity of the ellipsoid.
+    :type eccentricity: float
+
+    :rtype: numpy.ndarray
+    """
+    sin_latitudes = np.sin(latitudes)
+    if eccentricity == 0:
+        # On a sphere.
+        return 2 * sin_latitudes
+    e_sin = eccentricity * sin_latitudes
+    return (
+        sin_latitudes / (1 - e_sin ** 2) +
+        np.log((1 + e_sin) / (1 - e_sin)) / (2 * eccentricity))
+
+
+def cell_areas(spatial_reference, geo_transform, first_row, row_count):
+    """Compute the area of the cells of some rows of a raster.
+
+    In a geographic CRS, the area of a cell only depends on its latitude and
+    it is computed on the ellipsoid. In a projected CRS, all the cells have
+    the same area.
+
+    :param spatial_reference: The CRS of the raster.
+    :type spatial_reference: osr.SpatialReference
+
+    :param geo_transform: The geo transform of the raster, north up.
+    :type geo_transform: tuple
+
+    :param first_row: The index of the first row.
+    :type first_row: int
+
+    :param row_count: The number of rows.
+    :type row_count: int
+
+    :return: The area of a cell of each row, in square metres.
+    :rtype: numpy.ndarray
+
+    .. versionadded:: 4.2
+    """
+    x_size = geo_transform[1]
+    y_size = geo_transform[5]
+
+    if not spatial_reference.IsGeographic():
+        metres = spatial_reference.GetLinearUnits()
+        area = abs(x_size * y_size) * metres ** 2
+        return np.full(row_count, area, dtype=np.float64)
+
+    radians = spatial_reference.GetAngularUnits()
+    semi_major = spatial_reference.GetSemiMajor()
+    inverse_flattening = spatial_reference.GetInvFlattening()
+    if inverse_flattening:
+        flattening = 1 / inverse_flattening
+    else:
+        flattening = 0
+    squared_eccentricity = flattening * (2 - flattening)
+    squared_semi_minor = semi_major ** 2 * (1 - squared_eccentricity)
+
+    # The latitudes of the edges of the rows.
+    rows = np.arange(first_row, first_row + row_count + 1, dtype=np.float64)
+    latitudes = (geo_transform[3] + rows * y_size) * radians
+    latitudes = np.clip(latitudes, -np.pi / 2, np.pi / 2)
+    q = _authalic_q(latitudes, np.sqrt(squared_eccentricity))
+
+    longitude_size = abs(x_size) * radians
+    return np.abs(np.diff(q)) * longitude_size * squared_semi_minor / 2
+
+
+@profile
+def from_density_to_counts(layer, callback=None):
+    """Transform a density raster to a raster with the count of each cell.
+
+    Formula: count = density * cell area
+
+    The density is a number per square kilometre. The raster is processed
+    by blocks of rows and the counts are written in the temporary directory,
+    so a large raster does not need to fit in memory. The raster should be
+    clipped to the analysis extent first.
+
+    :param layer: The density raster layer.
+    :type layer: QgsRasterLayer
+
+    :param callback: A function to all to indicate progress. The function
+        should accept params 'current' (int), 'maximum' (int) and 'step' (str).
+        Defaults to None.
+    :type callback: function
+
+    :return: The raster layer with counts.
+    :rtype: QgsRasterLayer
+
+    .. versionadded:: 4.2
+    """
+    output_layer_name = density_to_counts_steps['output_layer_name']
+    processing_step = density_to_counts_steps['step_name']
+    output_layer_name = output_layer_name % layer.keywords['layer_purpose']
+
+    raster_file = gdal.Open(layer.source())
+    band = raster_file.GetRasterBand(1)
+    no_data = band.GetNoDataValue()
+    geo_transform = raster_file.GetGeoTransform()
+    spatial_reference = osr.SpatialReference()
+    spatial_reference.ImportFromWkt(raster_file.GetProjection())
+
+    output_raster = unique_filename(
+        suffix='.tif', dir=temp_dir(sub_dir='pre-process'))
+    driver = gdal.GetDriverByName('GTiff')
+    output_file = driver.Create(
+        output_raster,
+        raster_file.RasterXSize,
+        raster_file.RasterYSize,
+        1,
+        gdal.GDT_Float32,
+        MEMORY_TIFF_OPTIONS)
+    output_band = output_file.GetRasterBand(1)
+    if no_data is not None:
+        output_band.SetNoDataValue(no_data)
+
+    # CRS
+    output_file.SetProjection(raster_file.GetProjection())
+    output_file.SetGeoTransform(geo_transform)
+
+    for row in range(0, raster_file.RasterYSize, BLOCK_ROWS):
+        block_height = min(BLOCK_ROWS, raster_file.RasterYSize - row)
+        density = band.ReadAsArray(
+            0, row, raster_file.RasterXSize, block_height).astype(np.float64)
+        areas = cell_areas(
+            spatial_reference, geo_transform, row, block_height)
+        counts = density * (areas / DENSITY_AREA)[:, np.newaxis]
+
+        # Tag no data cells
+        if no_data is not None:
+            counts[density == no_data] = no_data
+
+        output_band.WriteArray(counts, 0, row)
+
+    output_file.FlushCache()
+    del output_file
+    del raster_file
+
+    if not os.path.exists(output_raster):
+        raise FileNotFoundError
+
+    counts_layer = QgsRasterLayer(output_raster, output_layer_name)
+
+    # We transfer keywords to the output.
+    counts_layer.keywords = layer.keywords.copy()
+    counts_layer.keywords['exposure_unit'] = count_exposure_unit['key']
+    counts_layer.keywords['title'] = output_layer_name
+
+    check_layer(counts_layer)
+    return counts_layer
@@ -4,15 +4,15 @@
 
 import numpy as np
 from osgeo import gdal
-from os.path import isfile
 from qgis.core import QgsRasterLayer
 
 from safe.common.exceptions import (
     FileNotFoundError, InvalidKeywordsForProcessingAlgorithm)
-from safe.common.utilities import unique_filename, temp_dir
 from safe.definitions.constants import no_data_value
 from safe.definitions.utilities import definition
 from safe.definitions.processing_steps import reclassify_raster_steps
+from safe.gis.raster.tools import (
+    BLOCK_ROWS, MEMORY_TIFF_OPTIONS, memory_raster_path)
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 from safe.utilities.metadata import (
@@ -98,49 +98,72 @@ def reclassify(layer, exposure_key=None, overwrite_input=False, callback=None):
         ranges[hazard_class['value']] = thresholds[hazard_class['key']]
         value_map[hazard_class['key']] = [hazard_class['value']]
 
+    # The raster is classified by blocks in a tiled raster kept in memory.
+    memory_raster = memory_raster_path()
     if overwrite_input:
         output_raster = layer.source()
     else:
-        output_raster = unique_filename(suffix='.tiff', dir=temp_dir())
+        output_raster = memory_raster
 
     driver = gdal.GetDriverByName('GTiff')
 
     raster_file = gdal.Open(layer.source())
     band = raster_file.GetRasterBand(1)
     no_data = band.GetNoDataValue()
-    source = band.ReadAsArray()
-    destination = source.copy()
-
-    for value, interval in ranges.iteritems():
-        v_min = interval[0]
-        v_max = interval[1]
-
-        if v_min is None:
-            destination[np.where(source <= v_max)] = value
-
-        if v_max is None:
-            destination[np.where(source > v_min)] = value
-
-        if v_min < v_max:
-            destination[np.where((v_min < source) & (source <= v_max))] = value
-
-    # Tag no data cells
-    destination[np.where(source == no_data)] = no_data_value
 
     # Create the new file.
     output_file = driver.Create(
-        output_raster, raster_file.RasterXSize, raster_file.RasterYSize, 1)
-    output_file.GetRasterBand(1).WriteArray(destination)
-    output_file.GetRasterBand(1).SetNoDataValue(no_data_value)
+        memory_raster,
+        raster_file.RasterXSize,
+        raster_file.RasterYSize,
+        1,
+        gdal.GDT_Byte,
+        MEMORY_TIFF_OPTIONS)
+    output_band = output_file.GetRasterBand(1)
+    output_band.SetNoDataValue(no_data_value)
 
     # CRS
     output_file.SetProjection(raster_file.GetProjection())
     output_file.SetGeoTransform(raster_file.GetGeoTransform())
+
+    for row in range(0, raster_file.RasterYSize, BLOCK_ROWS):
+        block_height = min(BLOCK_ROWS, raster_file.RasterYSize - row)
+        source = band.ReadAsArray(
+            0, row, raster_file.RasterXSize, block_height)
+        destination = source.copy()
+
+        for value, interval in ranges.iteritems():
+            v_min = interval[0]
+            v_max = interval[1]
+
+            if v_min is None:
+                destination[np.where(source <= v_max)] = value
+
+            if v_max is None:
+                destination[np.where(source > v_min)] = value
+
+            if v_min < v_max:
+                destination[
+                    np.where((v_min < source) & (source <= v_max))] = value
+
+        # Tag no data cells
+        destination[np.where(source == no_data)] = no_data_value
+
+        output_band.WriteArray(destination, 0, row)
+
     output_file.FlushCache()
 
-    del output_file
+    if overwrite_input:
+        # The source can be read while we write the classes, we replace it
+        # only at the end.
+        del raster_file
+        driver.CreateCopy(output_raster, output_file)
+        del output_file
+        gdal.Unlink(memory_raster)
+    else:
+        del output_file
 
-    if not isfile(output_raster):
+    if not gdal.VSIStatL(output_raster):
         raise FileNotFoundError
 
     reclassified = QgsRasterLayer(output_raster, output_layer_name)
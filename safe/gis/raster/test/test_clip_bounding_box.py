@@ -2,12 +2,15 @@
 
 import unittest
 
+from osgeo import gdal
 from qgis.core import QgsRectangle
 
 from safe.test.utilities import get_qgis_app, load_test_raster_layer
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
 from safe.gis.raster.clip_bounding_box import clip_by_extent
+from safe.gis.raster.tools import (
+    MEMORY_FOLDER, release_memory_rasters, track_memory_rasters)
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -30,3 +33,24 @@ class TestClipRaster(unittest.TestCase):
         self.assertAlmostEqual(expected.xMaximum(), extent.xMaximum(), 0)
         self.assertAlmostEqual(expected.yMinimum(), extent.yMinimum(), 0)
         self.assertAlmostEqual(expected.yMaximum(), extent.yMaximum(), 0)
+
+    def test_clip_raster_in_memory(self):
+        """Test the clip is a VRT in memory, released after the analysis."""
+        layer = load_test_raster_layer('gisv4', 'hazard', 'earthquake.asc')
+        expected = QgsRectangle(106.75, -6.2, 106.80, -6.1)
+        paths = []
+        with track_memory_rasters(paths):
+            new_layer = clip_by_extent(layer, expected)
+        other_layer = clip_by_extent(layer, expected)
+
+        self.assertTrue(new_layer.source().startswith(MEMORY_FOLDER))
+        self.assertTrue(new_layer.source().endswith('.vrt'))
+        self.assertTrue(new_layer.isValid())
+        self.assertEqual([new_layer.source()], paths)
+
+        release_memory_rasters(paths)
+        self.assertIsNone(gdal.VSIStatL(new_layer.source()))
+        self.assertEqual([], paths)
+        # The raster created outside of the block is kept.
+        self.assertIsNotNone(gdal.VSIStatL(other_layer.source()))
+        release_memory_rasters([other_layer.source()])
@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Test From Density To Counts."""
+
+import unittest
+
+from safe.test.utilities import get_qgis_app
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+import numpy as np
+from osgeo import gdal, osr
+from qgis.core import QgsRasterLayer, QgsRectangle
+
+from safe.common.utilities import unique_filename
+from safe.definitions.processing_steps import density_to_counts_steps
+from safe.gis.raster.clip_bounding_box import clip_by_extent
+from safe.gis.raster.from_density_to_counts import (
+    cell_areas, from_density_to_counts)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+# Area of the WGS84 ellipsoid, in square kilometres.
+WGS84_AREA = 510065621.724
+
+# Area of a cell of one degree on the equator, in square kilometres.
+EQUATOR_DEGREE_AREA = 12308.464
+
+
+def spatial_reference(epsg):
+    """Get a CRS from an EPSG code.
+
+    :param epsg: The EPSG code.
+    :type epsg: int
+
+    :rtype: osr.SpatialReference
+    """
+    crs = osr.SpatialReference()
+    crs.ImportFromEPSG(epsg)
+    return crs
+
+
+class TestFromDensityToCounts(unittest.TestCase):
+
+    """Test From Density To Counts."""
+
+    def test_cell_areas(self):
+        """Test the area of the cells in geographic and projected CRS.
+
+        .. versionadded:: 4.2
+        """
+        wgs84 = spatial_reference(4326)
+        # A grid of one degree on the whole world.
+        geo_transform = (-180, 1, 0, 90, 0, -1)
+        areas = cell_areas(wgs84, geo_transform, 0, 180) / 1000000
+        self.assertAlmostEqual(WGS84_AREA, areas.sum() * 360, places=2)
+        self.assertAlmostEqual(EQUATOR_DEGREE_AREA, areas[90], places=2)
+        # Symmetric around the equator.
+        self.assertAlmostEqual(areas[0], areas[179])
+        self.assertTrue(areas[0] < areas[45] < areas[89])
+
+        # The same rows by blocks.
+        blocks = np.concatenate([
+            cell_areas(wgs84, geo_transform, row, 60)
+            for row in range(0, 180, 60)]) / 1000000
+        self.assertTrue(np.allclose(areas, blocks))
+
+        # In UTM, the cells of 100 m have the same area.
+        utm = spatial_reference(32750)
+        geo_transform = (700000, 100, 0, 9300000, 0, -100)
+        areas = cell_areas(utm, geo_transform, 10, 5)
+        self.assertTrue(np.allclose(areas, 10000))
+
+    def test_from_density_to_counts(self):
+        """Test we get the number of people on the whole world.
+
+        .. versionadded:: 4.2
+        """
+        path = unique_filename(suffix='.tif')
+        raster = gdal.GetDriverByName('GTiff').Create(
+            path, 360, 180, 1, gdal.GDT_Float32)
+        raster.SetProjection(spatial_reference(4326).ExportToWkt())
+        raster.SetGeoTransform((-180, 1, 0, 90, 0, -1))
+        band = raster.GetRasterBand(1)
+        band.SetNoDataValue(-1)
+        # One person per square kilometre, except one cell on the equator.
+        density = np.ones((180, 360), dtype=np.float32)
+        density[90, 0] = -1
+        band.WriteArray(density)
+        del raster
+
+        layer = QgsRasterLayer(path, 'density')
+        layer.keywords = {
+            'layer_purpose': 'exposure',
+            'exposure': 'population',
+            'layer_mode': 'continuous',
+            'exposure_unit': 'density',
+        }
+
+        counts_layer = from_density_to_counts(layer)
+        self.assertEqual(
+            density_to_counts_steps['output_layer_name'] % 'exposure',
+            counts_layer.keywords['title'])
+        self.assertEqual('count', counts_layer.keywords['exposure_unit'])
+
+        # The counts are written on the disk, not in memory.
+        self.assertFalse(counts_layer.source().startswith('/vsimem/'))
+
+        raster = gdal.Open(counts_layer.source())
+        band = raster.GetRasterBand(1)
+        counts = band.ReadAsArray()
+        self.assertEqual(-1, band.GetNoDataValue())
+        self.assertEqual(-1, counts[90, 0])
+        total = counts[counts != -1].astype(np.float64).sum()
+        expected = WGS84_AREA - EQUATOR_DEGREE_AREA
+        # The counts are written in single precision.
+        self.assertAlmostEqual(1, total / expected, places=5)
+
+        # Only the cells of a clip are converted, with one cell of buffer.
+        clipped = clip_by_extent(layer, QgsRectangle(0, 0, 10, 10))
+        counts_layer = from_density_to_counts(clipped)
+        raster = gdal.Open(counts_layer.source())
+        self.assertEqual(12, raster.RasterXSize)
+        self.assertEqual(12, raster.RasterYSize)
+
+
+if __name__ == '__main__':
+    unittest.main()
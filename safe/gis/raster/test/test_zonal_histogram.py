@@ -0,0 +1,76 @@
+# coding=utf-8
+"""Test Zonal Histogram."""
+
+import unittest
+
+import numpy
+from osgeo import ogr
+
+from safe.test.utilities import get_qgis_app
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+from safe.gis.raster.zonal_histogram import (
+    classify_hazard, _multipolygon, _polygonize)
+from safe.definitions.hazard_classifications import generic_hazard_classes
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestZonalHistogram(unittest.TestCase):
+
+    """Test Zonal Histogram."""
+
+    def test_classify_hazard(self):
+        """Test we classify the cells like the vector path."""
+        classes = generic_hazard_classes['classes']
+        values = numpy.array([[-1, 0, 0.5], [1, 5, numpy.nan]])
+
+        thresholds = {
+            'low': [0, 1],
+            'medium': [1, 3],
+            'high': [3, None],
+        }
+        codes = classify_hazard(values, classes, thresholds=thresholds)
+        # High is the first class, so its code is 1.
+        self.assertEqual(codes.tolist(), [[0, 0, 3], [3, 1, 0]])
+
+        value_map = {
+            'high': [5],
+            'low': [0, 1],
+        }
+        codes = classify_hazard(values, classes, value_map=value_map)
+        self.assertEqual(codes.tolist(), [[0, 3, 0], [3, 1, 0]])
+
+    def test_class_polygons(self):
+        """Test the polygons of the classes of a block.
+
+        .. versionadded:: 4.2
+        """
+        source = ogr.GetDriverByName('Memory').CreateDataSource('')
+        layer = source.CreateLayer('hazard')
+        layer.CreateField(ogr.FieldDefn('code', ogr.OFTInteger))
+        codes = numpy.array([[1, 1, 2], [1, 1, 2]], dtype=numpy.uint8)
+        _polygonize(codes, (0, 1, 0, 2, 0, -1), layer)
+
+        areas = dict(
+            (feature.GetField('code'), feature.GetGeometryRef().Area())
+            for feature in layer)
+        self.assertEqual({1: 4, 2: 2}, areas)
+
+        # Only the polygons of an intersection are kept.
+        square = ogr.CreateGeometryFromWkt(
+            'POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+        touching = ogr.CreateGeometryFromWkt(
+            'POLYGON ((1 0, 1 1, 2 1, 2 0, 1 0))')
+        polygons = _multipolygon(square.Intersection(touching))
+        self.assertTrue(polygons.IsEmpty())
+        polygons = _multipolygon(square.Intersection(square))
+        self.assertEqual(1, polygons.GetGeometryCount())
+        self.assertEqual(1, polygons.Area())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# coding=utf-8
+
+"""Tools for raster layers.
+
+Intermediate rasters of the analysis are not written on the disk. A clip is a
+VRT window on the source raster and the other steps write in the GDAL memory
+file system, except the counts of a density raster which are written in the
+temporary directory. Only the layers added to a datastore are materialised.
+"""
+
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from uuid import uuid4
+
+from osgeo import gdal
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# All intermediate rasters are in this folder of the GDAL memory file system.
+MEMORY_FOLDER = '/vsimem/inasafe/'
+
+# Options of the intermediate GeoTIFF, tiles are faster to read by blocks.
+MEMORY_TIFF_OPTIONS = ['TILED=YES', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256']
+
+# Number of raster rows processed at once.
+BLOCK_ROWS = 256
+
+# The list recording the intermediate rasters created in the current thread.
+_STATE = threading.local()
+
+# Weak references to the owners of intermediate rasters. Their callback
+# releases the rasters when the owner is garbage collected.
+_OWNERS = set()
+
+
+def memory_raster_path(suffix='.tif'):
+    """Get a new path for an intermediate raster kept in memory.
+
+    :param suffix: The extension of the file.
+    :type suffix: str
+
+    :return: The path in the GDAL memory file system.
+    :rtype: str
+
+    .. versionadded:: 4.2
+    """
+    path = '%s%s%s' % (MEMORY_FOLDER, uuid4().hex, suffix)
+    paths = getattr(_STATE, 'paths', None)
+    if paths is not None:
+        paths.append(path)
+    return path
+
+
+def is_virtual_raster(path):
+    """Check if a raster is not a plain file on the disk.
+
+    It is in the GDAL memory file system or a VRT which reads the pixels of
+    another raster.
+
+    :param path: The path of the raster.
+    :type path: basestring
+
+    :rtype: bool
+
+    .. versionadded:: 4.2
+    """
+    return path.startswith('/vsimem/') or path.lower().endswith('.vrt')
+
+
+@contextmanager
+def track_memory_rasters(paths):
+    """Record the intermediate rasters created in the block.
+
+    Only the rasters created in the current thread are recorded.
+
+    :param paths: The list where the paths of the rasters are appended.
+    :type paths: list
+
+    .. versionadded:: 4.2
+    """
+    previous = getattr(_STATE, 'paths', None)
+    _STATE.paths = paths
+    try:
+        yield paths
+    finally:
+        _STATE.paths = previous
+
+
+def release_memory_rasters(paths):
+    """Delete some intermediate rasters kept in memory.
+
+    The rasters of another analysis are not touched.
+
+    :param paths: The paths of the rasters, the list is emptied.
+    :type paths: list
+
+    .. versionadded:: 4.2
+    """
+    for path in paths:
+        gdal.Unlink(path)
+        # GDAL may have written the statistics next to the raster.
+        if gdal.VSIStatL(path + '.aux.xml') is not None:
+            gdal.Unlink(path + '.aux.xml')
+    del paths[:]
+
+
+def release_memory_rasters_with(owner, paths):
+    """Delete some intermediate rasters when their owner is discarded.
+
+    :param owner: The object using the rasters, an impact function.
+    :type owner: object
+
+    :param paths: The paths of the rasters. The list can still be extended
+        after this call.
+    :type paths: list
+
+    .. versionadded:: 4.2
+    """
+    def release(reference):
+        """Release the rasters of the owner which has been collected."""
+        _OWNERS.discard(reference)
+        release_memory_rasters(paths)
+
+    _OWNERS.add(weakref.ref(owner, release))
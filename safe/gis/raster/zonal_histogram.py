@@ -0,0 +1,454 @@
+# coding=utf-8
+
+"""Sum a continuous raster exposure by aggregation area and hazard class."""
+
+import logging
+
+import numpy
+from osgeo import gdal, ogr
+from qgis.core import QGis, QgsFeature, QgsGeometry
+from PyQt4.QtCore import QPyNullVariant
+
+from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
+from safe.definitions.fields import (
+    aggregation_id_field,
+    exposure_count_field,
+    hazard_class_field,
+    total_field)
+from safe.definitions.hazard_classifications import not_exposed_class
+from safe.definitions.layer_modes import layer_mode_continuous
+from safe.definitions.layer_purposes import (
+    layer_purpose_aggregate_hazard_impacted)
+from safe.definitions.processing_steps import zonal_histogram_steps
+from safe.definitions.utilities import definition
+from safe.gis.raster.tools import BLOCK_ROWS
+from safe.gis.sanity_check import check_layer
+from safe.gis.vector.tools import (
+    create_field_from_definition, create_memory_layer)
+from safe.utilities.metadata import (
+    active_classification, active_thresholds_value_maps)
+from safe.utilities.profiling import profile
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+
+def classify_hazard(values, hazard_classes, thresholds=None, value_map=None):
+    """Get the hazard class of raster cells.
+
+    The rules are the same as `reclassify` for a continuous hazard and
+    `update_value_map` for a classified hazard. NaN cells have no class.
+
+    :param values: The hazard values.
+    :type values: numpy.ndarray
+
+    :param hazard_classes: The classes of the classification.
+    :type hazard_classes: list
+
+    :param thresholds: Class key -> [min, max] for a continuous hazard.
+    :type thresholds: dict
+
+    :param value_map: Class key -> list of values for a classified hazard.
+    :type value_map: dict
+
+    :return: The position of the class of each cell in hazard_classes plus
+        one, 0 if the cell has no class.
+    :rtype: numpy.ndarray
+
+    .. versionadded:: 4.2
+    """
+    codes = numpy.zeros(values.shape, dtype=numpy.uint8)
+    for code, hazard_class in enumerate(hazard_classes, 1):
+        if thresholds is not None:
+            if hazard_class['key'] not in thresholds:
+                continue
+            minimum, maximum = thresholds[hazard_class['key']]
+            mask = numpy.ones(values.shape, dtype=bool)
+            if minimum is not None:
+                mask &= values > minimum
+            if maximum is not None:
+                mask &= values <= maximum
+        else:
+            mask = numpy.in1d(
+                values, value_map.get(hazard_class['key'], []))
+            mask = mask.reshape(values.shape)
+        codes[mask & (codes == 0)] = code
+    return codes
+
+
+def _add_ogr_layer(source, name, geometries):
+    """Copy geometries in a new layer of an OGR data source.
+
+    The features are numbered from 1 in the integer field 'code'.
+
+    :param source: The OGR data source.
+    :type source: ogr.DataSource
+
+    :param name: The name of the new layer.
+    :type name: str
+
+    :param geometries: The geometries.
+    :type geometries: list
+    """
+    layer = source.CreateLayer(name)
+    layer.CreateField(ogr.FieldDefn('code', ogr.OFTInteger))
+    for code, geometry in enumerate(geometries, 1):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField('code', code)
+        feature.SetGeometry(ogr.CreateGeometryFromWkb(geometry.asWkb()))
+        layer.CreateFeature(feature)
+
+
+def _rasterize(source, layer, geo_transform, width, height):
+    """Burn the code of OGR features on a grid.
+
+    :param source: The OGR data source, with features with an integer
+        field 'code'.
+    :type source: ogr.DataSource
+
+    :param layer: The layer name in the data source.
+    :type layer: str
+
+    :param geo_transform: The geotransform of the grid.
+    :type geo_transform: tuple
+
+    :param width: The number of columns of the grid.
+    :type width: int
+
+    :param height: The number of rows of the grid.
+    :type height: int
+
+    :return: The code of the feature at the centre of each cell, 0 outside.
+    :rtype: numpy.ndarray
+    """
+    raster = gdal.GetDriverByName('MEM').Create(
+        '', width, height, 1, gdal.GDT_UInt32)
+    raster.SetGeoTransform(geo_transform)
+    ogr_layer = source.GetLayerByName(layer)
+    x_origin, x_size, _, y_origin, _, y_size = geo_transform
+    ogr_layer.SetSpatialFilterRect(
+        x_origin,
+        y_origin + height * y_size,
+        x_origin + width * x_size,
+        y_origin)
+    gdal.RasterizeLayer(raster, [1], ogr_layer, options=['ATTRIBUTE=code'])
+    return raster.GetRasterBand(1).ReadAsArray()
+
+
+def _polygonize(codes, geo_transform, layer):
+    """Polygonize the codes of a block in an OGR layer.
+
+    :param codes: The codes of the cells of the block.
+    :type codes: numpy.ndarray
+
+    :param geo_transform: The geotransform of the block.
+    :type geo_transform: tuple
+
+    :param layer: The OGR layer, with an integer field 'code' first.
+    :type layer: ogr.Layer
+    """
+    height, width = codes.shape
+    raster = gdal.GetDriverByName('MEM').Create(
+        '', width, height, 1, gdal.GDT_Byte)
+    raster.SetGeoTransform(geo_transform)
+    band = raster.GetRasterBand(1)
+    band.WriteArray(codes)
+    gdal.Polygonize(band, None, layer, 0, [])
+
+
+def _multipolygon(geometry):
+    """Keep the polygons of an OGR geometry in a multipolygon.
+
+    :param geometry: The OGR geometry, the result of an intersection.
+    :type geometry: ogr.Geometry
+
+    :return: The multipolygon, empty if there is no polygon.
+    :rtype: ogr.Geometry
+    """
+    multipolygon = ogr.Geometry(ogr.wkbMultiPolygon)
+    if geometry is None:
+        return multipolygon
+    geometry_type = ogr.GT_Flatten(geometry.GetGeometryType())
+    if geometry_type == ogr.wkbPolygon:
+        multipolygon.AddGeometry(geometry)
+    elif geometry_type in (ogr.wkbMultiPolygon, ogr.wkbGeometryCollection):
+        for i in range(geometry.GetGeometryCount()):
+            part = _multipolygon(geometry.GetGeometryRef(i))
+            for j in range(part.GetGeometryCount()):
+                multipolygon.AddGeometry(part.GetGeometryRef(j))
+    return multipolygon
+
+
+def _window(dataset, extent):
+    """Get the cells of a raster covering an extent.
+
+    :param dataset: The GDAL raster.
+    :type dataset: gdal.Dataset
+
+    :param extent: The extent, in the CRS of the raster.
+    :type extent: QgsRectangle
+
+    :return: The column and the row of the first cell, the width and the
+        height of the window.
+    :rtype: (int, int, int, int)
+    """
+    x_origin, x_size, _, y_origin, _, y_size = dataset.GetGeoTransform()
+    columns = sorted((
+        (extent.xMinimum() - x_origin) / x_size,
+        (extent.xMaximum() - x_origin) / x_size))
+    rows = sorted((
+        (extent.yMinimum() - y_origin) / y_size,
+        (extent.yMaximum() - y_origin) / y_size))
+    column = max(0, int(numpy.floor(columns[0])))
+    row = max(0, int(numpy.floor(rows[0])))
+    width = min(dataset.RasterXSize, int(numpy.ceil(columns[1]))) - column
+    height = min(dataset.RasterYSize, int(numpy.ceil(rows[1]))) - row
+    return column, row, max(0, width), max(0, height)
+
+
+@profile
+def zonal_histogram(exposure, hazard, aggregation, analysis, callback=None):
+    """Sum a continuous raster exposure by aggregation area and hazard class.
+
+    This is the raster path of `union` followed by `zonal_stats`, without
+    polygonizing the hazard. The hazard is warped on the grid of the
+    exposure, a cell belongs to the hazard class at its centre like with the
+    zonal statistics. The aggregation areas are rasterized on the same grid,
+    block by block, and the exposure is summed with a bincount over the
+    (aggregation area, hazard class) pairs. Like the hazard polygons, the
+    hazard is masked with the analysis layer.
+
+    The output has a feature for each hazard class found in each aggregation
+    area, with the attributes of the aggregate hazard layer produced by
+    `zonal_stats`. The classified hazard is polygonized block by block, the
+    polygons of each class are merged and clipped by each aggregation area.
+    The cells along the limits of the classes are not split: the exposure of
+    a cell is in the feature where its centre is.
+
+    The exposure must be north up.
+
+    :param exposure: The continuous raster exposure.
+    :type exposure: QgsRasterLayer
+
+    :param hazard: The raster hazard, continuous or classified.
+    :type hazard: QgsRasterLayer
+
+    :param aggregation: The aggregation layer, in the CRS of the exposure.
+    :type aggregation: QgsVectorLayer
+
+    :param analysis: The analysis layer, in the CRS of the exposure.
+    :type analysis: QgsVectorLayer
+
+    :param callback: A function to all to indicate progress. The function
+        should accept params 'current' (int), 'maximum' (int) and 'step' (str).
+        Defaults to None.
+    :type callback: function
+
+    :return: The aggregate hazard layer with the exposure counts.
+    :rtype: QgsVectorLayer
+
+    .. versionadded:: 4.2
+    """
+    output_layer_name = zonal_histogram_steps['output_layer_name']
+    processing_step = zonal_histogram_steps['step_name']
+
+    exposure_key = exposure.keywords['exposure']
+    classification_key = active_classification(hazard.keywords, exposure_key)
+    classes = active_thresholds_value_maps(hazard.keywords, exposure_key)
+    if not classification_key or not classes:
+        raise InvalidKeywordsForProcessingAlgorithm(
+            'classification is missing from the layer %s'
+            % hazard.keywords['layer_purpose'])
+
+    thresholds = None
+    value_map = None
+    hazard.keywords['classification'] = classification_key
+    if hazard.keywords['layer_mode'] == layer_mode_continuous['key']:
+        thresholds = classes
+        hazard.keywords['thresholds'] = classes
+    else:
+        value_map = classes
+        hazard.keywords['value_map'] = classes
+    hazard_classes = definition(classification_key)['classes']
+
+    # The aggregation areas are numbered from 1, 0 is outside.
+    ogr_source = ogr.GetDriverByName('Memory').CreateDataSource('')
+    aggregation_field = aggregation.keywords['inasafe_fields'][
+        aggregation_id_field['key']]
+    aggregation_index = aggregation.fieldNameIndex(aggregation_field)
+    areas = [None]
+    geometries = []
+    for feature in aggregation.getFeatures():
+        aggregation_id = feature[aggregation_index]
+        if not aggregation_id or isinstance(aggregation_id, QPyNullVariant):
+            # Like the union, we don't want areas without an id.
+            continue
+        if feature.geometry() and not feature.geometry().isEmpty():
+            geometries.append(feature.geometry())
+            areas.append(feature)
+    _add_ogr_layer(ogr_source, 'aggregation', geometries)
+    _add_ogr_layer(ogr_source, 'analysis', [
+        feature.geometry() for feature in analysis.getFeatures()
+        if feature.geometry() and not feature.geometry().isEmpty()])
+    # The polygons of the hazard classes, with the code of the class.
+    hazard_layer = ogr_source.CreateLayer('hazard')
+    hazard_layer.CreateField(ogr.FieldDefn('code', ogr.OFTInteger))
+
+    exposure_dataset = gdal.Open(exposure.source(), gdal.GA_ReadOnly)
+    exposure_band = exposure_dataset.GetRasterBand(
+        exposure.keywords.get('active_band', 1))
+    exposure_no_data = exposure_band.GetNoDataValue()
+    x_origin, x_size, _, y_origin, _, y_size = (
+        exposure_dataset.GetGeoTransform())
+    column, row, width, height = _window(
+        exposure_dataset, aggregation.extent())
+    x_origin += column * x_size
+    y_origin += row * y_size
+
+    sums = numpy.zeros((len(areas), len(hazard_classes) + 1))
+    cells = numpy.zeros(sums.shape, dtype=numpy.int64)
+    if width and height:
+        # The warped hazard is a VRT: it is computed when a block is read.
+        hazard_dataset = gdal.Open(hazard.source(), gdal.GA_ReadOnly)
+        aligned = gdal.Warp(
+            '',
+            hazard_dataset,
+            format='VRT',
+            outputBounds=(
+                x_origin,
+                y_origin + height * y_size,
+                x_origin + width * x_size,
+                y_origin),
+            width=width,
+            height=height,
+            dstSRS=exposure_dataset.GetProjection(),
+            resampleAlg=gdal.GRA_NearestNeighbour,
+            srcNodata=hazard_dataset.GetRasterBand(1).GetNoDataValue(),
+            dstNodata=float('nan'),
+            outputType=gdal.GDT_Float64)
+        aligned_band = aligned.GetRasterBand(1)
+
+        for block_row in range(0, height, BLOCK_ROWS):
+            block_height = min(BLOCK_ROWS, height - block_row)
+            block_y = y_origin + block_row * y_size
+
+            block_transform = (x_origin, x_size, 0, block_y, 0, y_size)
+            area_codes = _rasterize(
+                ogr_source,
+                'aggregation',
+                block_transform,
+                width,
+                block_height)
+            analysis_mask = _rasterize(
+                ogr_source, 'analysis', block_transform, width, block_height)
+
+            values = exposure_band.ReadAsArray(
+                column, row + block_row, width, block_height)
+            values = values.astype(float)
+            if exposure_no_data is not None:
+                values[values == exposure_no_data] = 0
+            values[~numpy.isfinite(values)] = 0
+
+            hazard_codes = classify_hazard(
+                aligned_band.ReadAsArray(0, block_row, width, block_height),
+                hazard_classes,
+                thresholds,
+                value_map)
+            hazard_codes[analysis_mask == 0] = 0
+            _polygonize(hazard_codes, block_transform, hazard_layer)
+
+            inside = area_codes > 0
+            pairs = (
+                area_codes[inside].astype(numpy.int64) * sums.shape[1] +
+                hazard_codes[inside])
+            sums += numpy.bincount(
+                pairs, weights=values[inside], minlength=sums.size).reshape(
+                sums.shape)
+            cells += numpy.bincount(pairs, minlength=cells.size).reshape(
+                cells.shape)
+
+            if callback:
+                callback(
+                    current=block_row + block_height,
+                    maximum=height,
+                    step=processing_step)
+
+    output_field = exposure_count_field['field_name'] % exposure_key
+    fields = [create_field_from_definition(hazard_class_field)]
+    fields.extend(aggregation.fields().toList())
+    fields.append(create_field_from_definition(
+        exposure_count_field, exposure_key))
+    layer = create_memory_layer(
+        output_layer_name, QGis.Polygon, aggregation.crs(), fields)
+
+    # The polygons of the blocks are merged by hazard class.
+    class_geometries = {}
+    hazard_layer.ResetReading()
+    for feature in hazard_layer:
+        class_geometries.setdefault(
+            feature.GetField('code'),
+            ogr.Geometry(ogr.wkbMultiPolygon)).AddGeometry(
+                feature.GetGeometryRef())
+    for code, geometry in class_geometries.items():
+        class_geometries[code] = geometry.UnionCascaded()
+
+    class_keys = [not_exposed_class['key']]
+    class_keys.extend(hazard_class['key'] for hazard_class in hazard_classes)
+    out_features = []
+    for area_code, area in enumerate(areas[1:], 1):
+        area_geometry = ogr.CreateGeometryFromWkb(area.geometry().asWkb())
+        parts = []
+        for code in range(len(class_keys)):
+            part = None
+            if code in class_geometries:
+                part = _multipolygon(
+                    area_geometry.Intersection(class_geometries[code]))
+                if part.IsEmpty():
+                    part = None
+            if part is not None or cells[area_code, code]:
+                parts.append((code, part))
+        if not parts:
+            # The area is outside of the grid, like the remainder of the
+            # union, it is not exposed.
+            parts = [(0, None)]
+
+        for code, part in parts:
+            if part is None:
+                # Without a polygon of the class, we keep the cells counted
+                # in the area.
+                geometry = QgsGeometry(area.geometry())
+            else:
+                geometry = QgsGeometry()
+                geometry.fromWkb(bytes(part.ExportToWkb()))
+            out_feature = QgsFeature()
+            out_feature.setGeometry(geometry)
+            out_feature.setAttributes(
+                [class_keys[code]] + area.attributes() +
+                [float(sums[area_code, code])])
+            out_features.append(out_feature)
+    layer.dataProvider().addFeatures(out_features)
+
+    inasafe_fields = aggregation.keywords['inasafe_fields'].copy()
+    inasafe_fields[hazard_class_field['key']] = (
+        hazard_class_field['field_name'])
+    # Special case here, one field is the exposure count and the total.
+    inasafe_fields[exposure_count_field['key'] % exposure_key] = output_field
+    inasafe_fields[total_field['key']] = output_field
+
+    layer.keywords = exposure.keywords.copy()
+    layer.keywords['inasafe_fields'] = inasafe_fields
+    layer.keywords['inasafe_default_values'] = (
+        exposure.keywords['inasafe_default_values'].copy())
+    layer.keywords['exposure_keywords'] = exposure.keywords.copy()
+    layer.keywords['hazard_keywords'] = hazard.keywords.copy()
+    layer.keywords['aggregation_keywords'] = aggregation.keywords.copy()
+    layer.keywords['layer_purpose'] = (
+        layer_purpose_aggregate_hazard_impacted['key'])
+    layer.keywords['title'] = output_layer_name
+
+    check_layer(layer)
+    return layer
@@ -54,7 +54,8 @@ def zonal_stats(raster, vector, callback=None):
         output_layer_name,
         vector.geometryType(),
         vector.crs(),
-        vector.fields()
+        vector.fields(),
+        spatial_index=False
     )
 
     copy_layer(vector, layer)
@@ -0,0 +1,101 @@
+# coding=utf-8
+
+"""Test file for the InaSAFE expressions."""
+
+import unittest
+
+from safe.test.utilities import get_qgis_app, load_test_vector_layer
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+from PyQt4.QtXml import QDomDocument
+from qgis.core import (
+    QgsExpression,
+    QgsExpressionContextUtils,
+    QgsMapLayerRegistry,
+    QgsProject)
+
+from safe.definitions.provenance import provenance_layer_analysis_impacted_id
+from safe.gis.expressions import (
+    analysis_snapshot,
+    clear_analysis_snapshot,
+    update_analysis_snapshot)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestExpressions(unittest.TestCase):
+
+    """Test the InaSAFE expressions."""
+
+    def setUp(self):
+        clear_analysis_snapshot()
+
+    def tearDown(self):
+        QgsMapLayerRegistry.instance().removeAllMapLayers()
+        QgsExpressionContextUtils.setProjectVariable(
+            provenance_layer_analysis_impacted_id['provenance_key'], '')
+        clear_analysis_snapshot()
+
+    def test_analysis_snapshot(self):
+        """Test the analysis layer is read once and read again if changed."""
+        layer = load_test_vector_layer(
+            'gisv4', 'analysis', 'analysis.geojson', clone_to_memory=True)
+        QgsMapLayerRegistry.instance().addMapLayer(layer)
+        QgsExpressionContextUtils.setProjectVariable(
+            provenance_layer_analysis_impacted_id['provenance_key'],
+            layer.id())
+        snapshot = update_analysis_snapshot()
+
+        expression = QgsExpression(
+            "inasafe_impact_analysis_layer('analysis_name')")
+        self.assertEqual(
+            expression.evaluate(), 'Generic Polygon On Structure Point')
+        expression = QgsExpression(
+            "inasafe_impact_analysis_layer('not_a_field')")
+        self.assertIsNone(expression.evaluate())
+        self.assertIs(analysis_snapshot(), snapshot)
+
+        # Editing the layer invalidates the snapshot.
+        index = layer.fieldNameIndex('analysis_name')
+        feature = layer.getFeatures().next()
+        layer.startEditing()
+        layer.changeAttributeValue(feature.id(), index, 'New name')
+        layer.commitChanges()
+        self.assertEqual(analysis_snapshot()['analysis_name'], 'New name')
+
+        # Reading a project or removing the layer too.
+        snapshot = analysis_snapshot()
+        QgsProject.instance().readProject.emit(QDomDocument())
+        self.assertIsNot(analysis_snapshot(), snapshot)
+        QgsMapLayerRegistry.instance().removeMapLayer(layer.id())
+        self.assertEqual(analysis_snapshot(), {})
+
+    def test_analysis_snapshot_other_layer(self):
+        """Test the snapshot is read again if another analysis is set."""
+        key = provenance_layer_analysis_impacted_id['provenance_key']
+        layer = load_test_vector_layer(
+            'gisv4', 'analysis', 'analysis.geojson', clone_to_memory=True)
+        QgsMapLayerRegistry.instance().addMapLayer(layer)
+        QgsExpressionContextUtils.setProjectVariable(key, layer.id())
+        snapshot = update_analysis_snapshot()
+
+        other_layer = load_test_vector_layer(
+            'gisv4', 'analysis', 'analysis.geojson', clone_to_memory=True)
+        index = other_layer.fieldNameIndex('analysis_name')
+        feature = other_layer.getFeatures().next()
+        other_layer.startEditing()
+        other_layer.changeAttributeValue(feature.id(), index, 'Other')
+        other_layer.commitChanges()
+        QgsMapLayerRegistry.instance().addMapLayer(other_layer)
+
+        # The project variable is written without the dock.
+        QgsExpressionContextUtils.setProjectVariable(key, other_layer.id())
+        self.assertIsNot(analysis_snapshot(), snapshot)
+        self.assertEqual(analysis_snapshot()['analysis_name'], 'Other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,9 @@
 """Assign the highest value to an exposure according to a hazard layer."""
 
 import logging
-from qgis.core import (
-    QGis,
-    QgsFeatureRequest,
-    QgsGeometry,
-    QgsWKBTypes,
-)
+
+import numpy
+from qgis.core import QgsFeatureRequest
 
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.layer_purposes import layer_purpose_exposure_summary
@@ -16,7 +13,9 @@ from safe.definitions.fields import hazard_class_field
 from safe.definitions.hazard_classifications import (
     hazard_classification, not_exposed_class)
 from safe.definitions.processing_steps import assign_highest_value_steps
-from safe.gis.vector.tools import create_spatial_index
+from safe.gis.vector.clean_geometry import geometry_checker
+from safe.gis.vector.layer_index import layer_index
+from safe.gis.vector.tools import write_columns
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 
@@ -43,6 +42,11 @@ def assign_highest_value(exposure, hazard, callback=None):
     touches the hazard is affected, and the greatest hazard is the effective
     hazard.
 
+    The bounding boxes of the buildings are packed in a static R-tree. For
+    each hazard area, from the highest to the lowest class, the candidates not
+    assigned yet are read in one request and tested against the prepared
+    geometry of the area. The attributes are written once at the end.
+
     :param exposure: The building vector layer.
     :type exposure: QgsVectorLayer
 
@@ -69,25 +73,28 @@ def assign_highest_value(exposure, hazard, callback=None):
     if not hazard_inasafe_fields.get(hazard_class_field['key']):
         raise InvalidKeywordsForProcessingAlgorithm
 
-    indices = []
-    exposure.startEditing()
-    for field in hazard.fields():
-        exposure.addAttribute(field)
-        indices.append(exposure.fieldNameIndex(field.name()))
-    exposure.commitChanges()
     provider = exposure.dataProvider()
+    provider.addAttributes(hazard.fields().toList())
+    exposure.updateFields()
+    indices = [
+        exposure.fieldNameIndex(field.name()) for field in hazard.fields()]
 
-    spatial_index = create_spatial_index(exposure)
+    # The bounding boxes of the buildings are packed in a R-tree made of a few
+    # arrays. The buildings themselves are only read when they are candidates
+    # for a hazard area, so nationwide layers fit in memory.
+    tree, building_ids = layer_index(exposure).packed_rtree()
+    hazard_index = layer_index(hazard)
 
-    # cache features from exposure layer for faster retrieval
-    exposure_features = {}
-    for f in exposure.getFeatures():
-        exposure_features[f.id()] = f
+    # Buildings which already got a hazard class and the row of the hazard
+    # area they got.
+    assigned = numpy.zeros(len(building_ids), dtype=bool)
+    hazard_rows = numpy.empty(len(building_ids), dtype=numpy.int32)
 
     # Todo callback
     # total = 100.0 / len(selectionA)
 
     hazard_field = hazard_inasafe_fields[hazard_class_field['key']]
+    hazard_field_index = hazard.fieldNameIndex(hazard_field)
 
     layer_classification = None
     for classification in hazard_classification['types']:
@@ -99,35 +106,49 @@ def assign_highest_value(exposure, hazard, callback=None):
     levels = [key['key'] for key in layer_classification['classes']]
     levels.append(not_exposed_class['key'])
 
-    # Let's loop over the hazard layer, from high to low hazard zone.
-    for hazard_value in levels:
-        expression = '"%s" = \'%s\'' % (hazard_field, hazard_value)
-        hazard_request = QgsFeatureRequest().setFilterExpression(expression)
-        update_map = {}
-        for area in hazard.getFeatures(hazard_request):
-            geometry = area.geometry()
-            intersects = spatial_index.intersects(geometry.boundingBox())
-
-            # use prepared geometry: makes multiple intersection tests faster
-            geometry_prepared = QgsGeometry.createGeometryEngine(
-                geometry.geometry())
-            geometry_prepared.prepareGeometry()
-
-            # We need to loop over each intersections exposure / hazard.
-            for i in intersects:
-                building = exposure_features[i]
-                building_geometry = building.geometry()
-
-                if geometry_prepared.intersects(building_geometry.geometry()):
-                    update_map[building.id()] = {}
-                    for index, value in zip(indices, area.attributes()):
-                        update_map[building.id()][index] = value
-
-                    # We don't want this building again, let's remove it from
-                    # the index.
-                    spatial_index.deleteFeature(building)
-
-        provider.changeAttributeValues(update_map)
+    # Hazard areas sorted from high to low hazard zone, in a single read.
+    areas = [
+        area for area in hazard_index.features().itervalues()
+        if area.geometry() and area[hazard_field_index] in levels]
+    areas.sort(key=lambda area: (
+        levels.index(area[hazard_field_index]), area.id()))
+    hazard_attributes = numpy.empty((len(areas), len(indices)), dtype=object)
+    for row, area in enumerate(areas):
+        hazard_attributes[row, :] = area.attributes()
+
+    request = QgsFeatureRequest().setSubsetOfAttributes([])
+    for row, area in enumerate(areas):
+        box = hazard_index.bounding_box(area.id())
+        candidates = tree.query(
+            box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum())
+        # We don't want these buildings again.
+        candidates = candidates[~assigned[candidates]]
+        if not len(candidates):
+            continue
+
+        # use prepared geometry: makes multiple intersection tests faster
+        geometry_prepared = hazard_index.engine(area.id())
+
+        # All candidates of the area are read with a single request.
+        positions = dict(zip(building_ids[candidates].tolist(), candidates))
+        request.setFilterFids(positions.keys())
+        hits = []
+        for building in exposure.getFeatures(request):
+            building_geometry = geometry_checker(building.geometry())
+            if not building_geometry:
+                continue
+            if geometry_prepared.intersects(building_geometry.geometry()):
+                hits.append(positions[building.id()])
+        assigned[hits] = True
+        hazard_rows[hits] = row
+
+    # All hazard attributes are written with a single provider call.
+    rows = hazard_rows[assigned]
+    write_columns(
+        exposure,
+        building_ids[assigned].tolist(),
+        dict((index, hazard_attributes[rows, column])
+             for column, index in enumerate(indices)))
 
     exposure.updateExtents()
     exposure.updateFields()
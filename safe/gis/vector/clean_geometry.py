@@ -2,8 +2,15 @@
 
 """Try to make a layer valid."""
 
+import logging
+
+from osgeo import ogr
+from qgis.core import QgsGeometry
+
 from safe.definitions.processing_steps import clean_geometry_steps
 from safe.gis.sanity_check import check_layer
+from safe.utilities.parallel import (
+    parallel_map, process_count, split_in_chunks)
 from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -11,6 +18,14 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+LOGGER = logging.getLogger('InaSAFE')
+
+# Below this number of geometries, they are checked in this process.
+PARALLEL_GEOMETRY_COUNT = 5000
+
+# Number of chunks per process, so a slow chunk does not delay the others.
+CHUNKS_PER_PROCESS = 4
+
 
 @profile
 def clean_layer(layer, callback=None):
@@ -70,3 +85,71 @@ def geometry_checker(geometry):
     else:
         new_geom = geometry.buffer(0, 5)
         return new_geom
+
+
+def _clean_wkb_chunk(wkbs):
+    """Check and clean a chunk of geometries, in a worker.
+
+    :param wkbs: The WKB of the geometries, None for a missing geometry.
+    :type wkbs: list
+
+    :return: For each geometry, a tuple with the WKB of the cleaned geometry,
+        None if it was valid or if it is missing, and a boolean if the
+        geometry is valid in the end.
+    :rtype: list
+    """
+    results = []
+    for wkb in wkbs:
+        geometry = ogr.CreateGeometryFromWkb(wkb) if wkb else None
+        if geometry is None:
+            results.append((None, False))
+        elif geometry.IsValid():
+            results.append((None, True))
+        else:
+            geometry = geometry.Buffer(0, 5)
+            if geometry is None:
+                results.append((None, False))
+            else:
+                results.append((geometry.ExportToWkb(), geometry.IsValid()))
+    return results
+
+
+def clean_geometries(geometries):
+    """Perform a cleaning of the geometries which are not valid.
+
+    It is the same as `geometry_checker` on each geometry. A lot of
+    geometries are checked in worker processes.
+
+    :param geometries: The geometries to check and clean, can be None.
+    :type geometries: list
+
+    :return: A tuple with the cleaned geometries and the number of
+        geometries still invalid or missing.
+    :rtype: (list, int)
+
+    .. versionadded:: 4.2
+    """
+    processes = process_count()
+    if processes <= 1 or len(geometries) < PARALLEL_GEOMETRY_COUNT:
+        cleaned = [geometry_checker(geometry) for geometry in geometries]
+        invalid_count = sum(
+            1 for geometry in cleaned
+            if not geometry or not geometry.isGeosValid())
+        return cleaned, invalid_count
+
+    wkbs = [
+        geometry.asWkb() if geometry else None
+        for geometry in geometries]
+    chunks = split_in_chunks(wkbs, processes * CHUNKS_PER_PROCESS)
+    results = sum(parallel_map(_clean_wkb_chunk, chunks), [])
+
+    cleaned = []
+    invalid_count = 0
+    for geometry, (wkb, is_valid) in zip(geometries, results):
+        if wkb is not None:
+            geometry = QgsGeometry()
+            geometry.fromWkb(bytes(wkb))
+        cleaned.append(geometry)
+        if not is_valid:
+            invalid_count += 1
+    return cleaned, invalid_count
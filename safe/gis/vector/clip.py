@@ -14,6 +14,7 @@ from qgis.core import (
 from safe.utilities.i18n import tr
 from safe.definitions.processing_steps import clip_steps
 from safe.gis.vector.tools import create_memory_layer
+from safe.gis.vector.layer_index import layer_index
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 
@@ -71,30 +72,25 @@ def clip(layer_to_clip, mask_layer, callback=None):
     # be able to track any diffs from QGIS easily.
 
     # first build up a list of clip geometries
-    clip_geometries = []
-    request = QgsFeatureRequest().setSubsetOfAttributes([])
-    for mask_feature in mask_layer.getFeatures(request):
-        clip_geometries.append(QgsGeometry(mask_feature.geometry()))
+    # The mask is usually the analysis layer, used by many clips. The union
+    # and its prepared geometry are computed only once.
+    mask_index = layer_index(mask_layer)
+    clip_geometries = [
+        fid for fid, f in mask_index.features().iteritems() if f.geometry()]
 
     # are we clipping against a single feature? if so,
     # we can show finer progress reports
-    if len(clip_geometries) > 1:
-        # noinspection PyTypeChecker,PyCallByClass,PyArgumentList
-        combined_clip_geom = QgsGeometry.unaryUnion(clip_geometries)
-        single_clip_feature = False
-    else:
-        combined_clip_geom = clip_geometries[0]
-        single_clip_feature = True
+    single_clip_feature = len(clip_geometries) <= 1
+    combined_clip_geom = mask_index.union()
 
     # use prepared geometries for faster intersection tests
-    # noinspection PyArgumentList
-    engine = QgsGeometry.createGeometryEngine(combined_clip_geom.geometry())
-    engine.prepareGeometry()
+    engine = mask_index.union_engine()
 
     tested_feature_ids = set()
 
     for i, clip_geom in enumerate(clip_geometries):
-        request = QgsFeatureRequest().setFilterRect(clip_geom.boundingBox())
+        request = QgsFeatureRequest().setFilterRect(
+            mask_index.bounding_box(clip_geom))
         input_features = [f for f in layer_to_clip.getFeatures(request)]
 
         if not input_features:
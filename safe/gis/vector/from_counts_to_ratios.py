@@ -3,6 +3,9 @@
 """From counts to ratio."""
 
 import logging
+
+from qgis.core import QgsFeatureRequest
+
 from safe.definitions.utilities import definition, get_non_compulsory_fields
 from safe.definitions.fields import population_count_field
 from safe.definitions import count_ratio_mapping
@@ -10,7 +13,8 @@ from safe.definitions.processing_steps import (
     recompute_counts_steps)
 from safe.definitions.layer_purposes import layer_purpose_exposure
 from safe.utilities.profiling import profile
-from safe.gis.vector.tools import create_field_from_definition
+from safe.gis.vector.tools import (
+    create_field_from_definition, numeric_column, write_columns)
 from safe.gis.sanity_check import check_layer
 
 LOGGER = logging.getLogger('InaSAFE')
@@ -58,9 +62,9 @@ def from_counts_to_ratios(layer, callback=None):
                 population_count_field=population_count_field['key']))
         return layer
 
-    layer.startEditing()
-
+    # Count field name -> ratio field name
     mapping = {}
+    new_fields = []
     non_compulsory_fields = get_non_compulsory_fields(
         layer_purpose_exposure['key'], exposure['key'])
     for count_field in non_compulsory_fields:
@@ -68,11 +72,10 @@ def from_counts_to_ratios(layer, callback=None):
         if count_field['key'] in count_ratio_mapping.keys() and exists:
             ratio_field = definition(count_ratio_mapping[count_field['key']])
 
-            field = create_field_from_definition(ratio_field)
-            layer.addAttribute(field)
+            new_fields.append(create_field_from_definition(ratio_field))
             name = ratio_field['field_name']
             layer.keywords['inasafe_fields'][ratio_field['key']] = name
-            mapping[count_field['field_name']] = layer.fieldNameIndex(name)
+            mapping[count_field['field_name']] = name
             LOGGER.info(
                 'Count field {count_field} detected in the exposure, we are '
                 'going to create a equivalent field {ratio_field} in the '
@@ -87,20 +90,29 @@ def from_counts_to_ratios(layer, callback=None):
 
     if len(mapping) == 0:
         # There is not a subset count field. Let's skip this layer.
-        layer.commitChanges()
         return layer
 
-    for feature in layer.getFeatures():
-        total_count = feature[inasafe_fields[population_count_field['key']]]
+    layer.dataProvider().addAttributes(new_fields)
+    layer.updateFields()
+
+    # Read the whole columns in one pass over the layer.
+    total_count_name = inasafe_fields[population_count_field['key']]
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    feature_ids = []
+    values = dict((name, []) for name in [total_count_name] + mapping.keys())
+    for feature in layer.getFeatures(request):
+        feature_ids.append(feature.id())
+        for name, column in values.iteritems():
+            column.append(feature[name])
+
+    # A NULL count or a null total count gives a NULL ratio.
+    total_counts = numeric_column(values[total_count_name])
+    columns = {}
+    for count_field, ratio_field_name in mapping.iteritems():
+        index = layer.fieldNameIndex(ratio_field_name)
+        columns[index] = numeric_column(values[count_field]) / total_counts
 
-        for count_field, index in mapping.iteritems():
-            count = feature[count_field]
-            try:
-                new_value = count / total_count
-            except TypeError:
-                new_value = ''
-            layer.changeAttributeValue(feature.id(), index, new_value)
+    write_columns(layer, feature_ids, columns)
 
-    layer.commitChanges()
     check_layer(layer)
     return layer
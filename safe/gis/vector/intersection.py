@@ -14,8 +14,8 @@ from qgis.core import (
 from safe.utilities.i18n import tr
 from safe.definitions.layer_purposes import layer_purpose_exposure_summary
 from safe.definitions.processing_steps import intersection_steps
-from safe.gis.vector.tools import (
-    create_memory_layer, wkb_type_groups, create_spatial_index)
+from safe.gis.vector.tools import create_memory_layer, wkb_type_groups
+from safe.gis.vector.layer_index import layer_index
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 
@@ -77,7 +77,9 @@ def intersection(source, mask, callback=None):
     # be able to track any diffs from QGIS easily.
 
     out_feature = QgsFeature()
-    index = create_spatial_index(mask)
+    # The mask features, their prepared geometries and the index are shared
+    # with the other algorithms using the same layer.
+    index = layer_index(mask)
 
     # Todo callback
     # total = 100.0 / len(selectionA)
@@ -88,10 +90,9 @@ def intersection(source, mask, callback=None):
         attributes = in_feature.attributes()
         intersects = index.intersects(geom.boundingBox())
         for i in intersects:
-            request = QgsFeatureRequest().setFilterFid(i)
-            feature_mask = next(mask.getFeatures(request))
+            feature_mask = index.feature(i)
             tmp_geom = feature_mask.geometry()
-            if geom.intersects(tmp_geom):
+            if index.engine(i).intersects(geom.geometry()):
                 mask_attributes = feature_mask.attributes()
                 int_geom = QgsGeometry(geom.intersection(tmp_geom))
                 if int_geom.wkbType() == QgsWKBTypes.Unknown\
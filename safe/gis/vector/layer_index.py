@@ -0,0 +1,358 @@
+# coding=utf-8
+
+"""Spatial structures of a vector layer, shared by the vector algorithms.
+
+Many algorithms need the same structures for the same layer: a spatial index,
+the geometries made valid, their bounding boxes and prepared geometries. The
+aggregate hazard layer or the analysis layer are used by several steps of the
+analysis, so we build these structures only once, when they are first asked,
+and we attach them to the layer like the keywords.
+
+Any edit on the layer through the edit buffer clears the structures. Edits
+made directly with the data provider must call `invalidate`.
+"""
+
+import logging
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy
+from qgis.core import QgsGeometry, QgsSpatialIndex, QgsFeatureRequest
+
+from safe.gis.vector.clean_geometry import geometry_checker
+from safe.gis.vector.packed_rtree import PackedRTree
+from safe.utilities.profiling import profile
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Name of the structure -> built count, reused count and build time.
+STATISTICS = OrderedDict()
+
+
+def _record(structure, built, elapsed_time=0):
+    """Record that a structure has been built or reused.
+
+    :param structure: The name of the structure.
+    :type structure: basestring
+
+    :param built: True if the structure has been built, False if reused.
+    :type built: bool
+
+    :param elapsed_time: Time spent to build the structure.
+    :type elapsed_time: float
+    """
+    statistic = STATISTICS.setdefault(
+        structure, {'built': 0, 'reused': 0, 'time': 0})
+    if built:
+        statistic['built'] += 1
+        statistic['time'] += elapsed_time
+    else:
+        statistic['reused'] += 1
+
+
+def layer_index_statistics():
+    """Get the number of structures built and reused since the last clear.
+
+    :return: Name of the structure -> dict with keys built, reused and time.
+    :rtype: OrderedDict
+    """
+    return STATISTICS
+
+
+def clear_layer_index_statistics():
+    """Reset the statistics."""
+    STATISTICS.clear()
+
+
+def layer_index(layer):
+    """Get the index attached to a vector layer, create it if needed.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :return: The index of the layer.
+    :rtype: LayerIndex
+    """
+    try:
+        return layer.layer_index
+    except AttributeError:
+        layer.layer_index = LayerIndex(layer)
+        return layer.layer_index
+
+
+def invalidate_layer_index(layer):
+    """Clear the index attached to a vector layer, if any.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+    """
+    try:
+        layer.layer_index.invalidate()
+    except AttributeError:
+        pass
+
+
+class LayerIndex(object):
+
+    """Lazy spatial structures of a vector layer.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, layer):
+        """Constructor.
+
+        :param layer: The vector layer to index.
+        :type layer: QgsVectorLayer
+        """
+        self._layer = layer
+        self._spatial_index = None
+        self._features = None
+        self._bounding_boxes = None
+        self._engines = {}
+        self._union = None
+        self._union_engine = None
+        self._packed_rtree = None
+
+        layer.featureAdded.connect(self.invalidate)
+        layer.featureDeleted.connect(self.invalidate)
+        layer.geometryChanged.connect(self.invalidate)
+        layer.attributeValueChanged.connect(self.invalidate)
+        layer.updatedFields.connect(self.invalidate)
+
+    def invalidate(self, *args):
+        """Clear all the structures. They will be built again if needed.
+
+        Extra arguments are ignored, so it can be connected to any signal.
+        """
+        self._spatial_index = None
+        self._features = None
+        self._bounding_boxes = None
+        self._engines = {}
+        self._union = None
+        self._union_engine = None
+        self._packed_rtree = None
+
+    @property
+    def spatial_index(self):
+        """The R-tree of the layer.
+
+        :rtype: QgsSpatialIndex
+        """
+        if self._spatial_index is None:
+            start_time = time.time()
+            self._spatial_index = self._build_spatial_index()
+            _record('spatial index', True, time.time() - start_time)
+        else:
+            _record('spatial index', False)
+        return self._spatial_index
+
+    @profile
+    def _build_spatial_index(self):
+        """Build the R-tree from the cached features.
+
+        :rtype: QgsSpatialIndex
+        """
+        spatial_index = QgsSpatialIndex()
+        for feature in self.features().itervalues():
+            if feature.geometry():
+                spatial_index.insertFeature(feature)
+        return spatial_index
+
+    def features(self):
+        """All features of the layer, with a valid geometry if possible.
+
+        Geometries are cleaned with `geometry_checker`. A feature without
+        geometry is kept with a None geometry.
+
+        :return: Feature id -> feature.
+        :rtype: dict
+        """
+        if self._features is None:
+            start_time = time.time()
+            self._build_features()
+            _record('valid geometries', True, time.time() - start_time)
+        else:
+            _record('valid geometries', False)
+        return self._features
+
+    @profile
+    def _build_features(self):
+        """Read the features, clean their geometries and bounding boxes."""
+        self._features = {}
+        self._bounding_boxes = {}
+        for feature in self._layer.getFeatures():
+            geometry = geometry_checker(feature.geometry())
+            if geometry:
+                geometry = QgsGeometry(geometry)
+                feature.setGeometry(geometry)
+                self._bounding_boxes[feature.id()] = geometry.boundingBox()
+            self._features[feature.id()] = feature
+
+    def feature(self, feature_id):
+        """Get one feature with its cleaned geometry.
+
+        :param feature_id: The feature id.
+        :type feature_id: int
+
+        :rtype: QgsFeature
+        """
+        if self._features is None:
+            self.features()
+        return self._features[feature_id]
+
+    def bounding_box(self, feature_id):
+        """Get the bounding box of the cleaned geometry of one feature.
+
+        :param feature_id: The feature id.
+        :type feature_id: int
+
+        :return: The bounding box or None if the feature has no geometry.
+        :rtype: QgsRectangle
+        """
+        if self._features is None:
+            self.features()
+        return self._bounding_boxes.get(feature_id)
+
+    def intersects(self, rectangle):
+        """Get ids of features whose bounding box intersects a rectangle.
+
+        :param rectangle: The rectangle.
+        :type rectangle: QgsRectangle
+
+        :return: List of feature ids.
+        :rtype: list
+        """
+        return self.spatial_index.intersects(rectangle)
+
+    def engine(self, feature_id):
+        """Get the prepared geometry engine of one feature.
+
+        :param feature_id: The feature id.
+        :type feature_id: int
+
+        :return: The prepared engine or None if the feature has no geometry.
+        :rtype: QgsGeometryEngine
+        """
+        engine = self._engines.get(feature_id)
+        if engine is not None:
+            _record('prepared geometries', False)
+            return engine
+
+        geometry = self.feature(feature_id).geometry()
+        if not geometry:
+            return None
+
+        start_time = time.time()
+        engine = QgsGeometry.createGeometryEngine(geometry.geometry())
+        engine.prepareGeometry()
+        self._engines[feature_id] = engine
+        _record('prepared geometries', True, time.time() - start_time)
+        return engine
+
+    def union(self):
+        """The union of all geometries of the layer.
+
+        :rtype: QgsGeometry
+        """
+        if self._union is None:
+            start_time = time.time()
+            self._union = self._build_union()
+            _record('union', True, time.time() - start_time)
+        else:
+            _record('union', False)
+        return self._union
+
+    @profile
+    def _build_union(self):
+        """Merge all cleaned geometries of the layer.
+
+        :rtype: QgsGeometry
+        """
+        geometries = [
+            QgsGeometry(f.geometry())
+            for f in self.features().itervalues() if f.geometry()]
+        if len(geometries) == 1:
+            return geometries[0]
+        # noinspection PyTypeChecker,PyCallByClass,PyArgumentList
+        return QgsGeometry.unaryUnion(geometries)
+
+    def union_engine(self):
+        """The prepared engine of the union of all geometries.
+
+        :rtype: QgsGeometryEngine
+        """
+        if self._union_engine is None:
+            union = self.union()
+            start_time = time.time()
+            # noinspection PyArgumentList
+            self._union_engine = QgsGeometry.createGeometryEngine(
+                union.geometry())
+            self._union_engine.prepareGeometry()
+            _record('prepared geometries', True, time.time() - start_time)
+        else:
+            _record('prepared geometries', False)
+        return self._union_engine
+
+    def packed_rtree(self):
+        """The packed R-tree of the bounding boxes of the features.
+
+        Unlike the other structures, the features are not kept in memory, so
+        it can be used on very large layers. Features without geometry are
+        not in the tree.
+
+        :return: The tree and the feature id of each box of the tree.
+        :rtype: (PackedRTree, numpy.ndarray)
+        """
+        if self._packed_rtree is None:
+            start_time = time.time()
+            self._packed_rtree = self._build_packed_rtree()
+            _record('packed R-tree', True, time.time() - start_time)
+        else:
+            _record('packed R-tree', False)
+        return self._packed_rtree
+
+    @profile
+    def _build_packed_rtree(self):
+        """Read the bounding boxes without the attributes and pack them.
+
+        :rtype: (PackedRTree, numpy.ndarray)
+        """
+        request = QgsFeatureRequest().setSubsetOfAttributes([])
+        feature_ids = array('l')
+        boxes = array('d')
+        for feature in self._layer.getFeatures(request):
+            geometry = feature.geometry()
+            if not geometry or geometry.isEmpty():
+                continue
+            box = geometry.boundingBox()
+            feature_ids.append(feature.id())
+            boxes.extend((
+                box.xMinimum(),
+                box.yMinimum(),
+                box.xMaximum(),
+                box.yMaximum()))
+        feature_ids = numpy.frombuffer(feature_ids, dtype='l')
+        tree = PackedRTree(numpy.frombuffer(boxes, dtype=float))
+        return tree, feature_ids
+
+    def features_by_expression(self, expression):
+        """Get ids of features matching an expression.
+
+        The expression is evaluated by QGIS, the features are not cached.
+
+        :param expression: The QGIS expression.
+        :type expression: basestring
+
+        :return: List of feature ids.
+        :rtype: list
+        """
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        return [f.id() for f in self._layer.getFeatures(request)]
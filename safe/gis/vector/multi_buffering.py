@@ -2,16 +2,13 @@
 
 """Buffer a vector layer using many buffers (for volcanoes or rivers)."""
 
+from osgeo import ogr, osr
 from qgis.core import (
-    QgsVectorLayer,
-    QgsCoordinateReferenceSystem,
-    QgsCoordinateTransform,
     QgsGeometry,
     QgsFeature,
     QGis
 )
 
-from safe.common.utilities import get_utm_epsg
 from safe.gis.vector.tools import (
     create_memory_layer,
     create_field_from_definition)
@@ -19,6 +16,9 @@ from safe.gis.sanity_check import check_layer
 from safe.definitions.fields import hazard_class_field, buffer_distance_field
 from safe.definitions.layer_purposes import layer_purpose_hazard
 from safe.definitions.processing_steps import buffer_steps
+from safe.utilities.gis import ogr_spatial_reference
+from safe.utilities.parallel import (
+    parallel_map, process_count, split_in_chunks)
 from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -26,6 +26,63 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+# Local projection centred on a feature, distances from the centre are true.
+AZIMUTHAL_EQUIDISTANT = (
+    '+proj=aeqd +lat_0=%f +lon_0=%f +x_0=0 +y_0=0 +ellps=WGS84 +units=m '
+    '+no_defs')
+
+# Number of segments used to approximate a quarter circle.
+BUFFER_SEGMENTS = 30
+
+# Number of chunks per process, so a slow chunk does not delay the others.
+CHUNKS_PER_PROCESS = 4
+
+
+def _buffer_chunk(chunk):
+    """Buffer a chunk of geometries with all radii, in a worker process.
+
+    :param chunk: The CRS WKT of the geometries, True if it is geographic,
+        the sorted radii and the list of (index, WKB) of the geometries.
+    :type chunk: tuple
+
+    :return: List of (index, list of the WKB of each ring).
+    :rtype: list
+    """
+    crs_wkt, geographic, radii, items = chunk
+    source = ogr_spatial_reference(crs_wkt)
+
+    results = []
+    for index, wkb in items:
+        geometry = ogr.CreateGeometryFromWkb(wkb)
+        reverse_transform = None
+        if geographic:
+            # Each feature is buffered in its own azimuthal equidistant
+            # projection, so the buffers are not distorted far from the
+            # centre of the layer.
+            centroid = geometry.Centroid()
+            local = ogr_spatial_reference(
+                AZIMUTHAL_EQUIDISTANT % (centroid.GetY(), centroid.GetX()),
+                proj4=True)
+            geometry.Transform(osr.CoordinateTransformation(source, local))
+            reverse_transform = osr.CoordinateTransformation(local, source)
+
+        rings = []
+        previous = None
+        for radius in radii:
+            circle = geometry.Buffer(radius, BUFFER_SEGMENTS)
+            # The ring is the difference with the previous buffer.
+            if previous is None:
+                ring = circle
+            else:
+                ring = circle.Difference(previous)
+            previous = circle
+
+            if reverse_transform:
+                ring.Transform(reverse_transform)
+            rings.append(ring.ExportToWkb())
+        results.append((index, rings))
+    return results
+
 
 @profile
 def multi_buffering(layer, radii, callback=None):
@@ -75,51 +132,44 @@ def multi_buffering(layer, radii, callback=None):
         output_layer_name, QGis.Polygon, input_crs, fields)
     data_provider = buffered.dataProvider()
 
-    # Reproject features if needed into UTM if the layer is in 4326.
-    if layer.crs().authid() == 'EPSG:4326':
-        center = layer.extent().center()
-        utm = QgsCoordinateReferenceSystem(
-            get_utm_epsg(center.x(), center.y(), input_crs))
-        transform = QgsCoordinateTransform(layer.crs(), utm)
-        reverse_transform = QgsCoordinateTransform(utm, layer.crs())
-    else:
-        transform = None
-        reverse_transform = None
-
-    for i, feature in enumerate(layer.getFeatures()):
-        geom = QgsGeometry(feature.geometry())
-
-        if transform:
-            geom.transform(transform)
-
-        inner_ring = None
-
-        for radius in radii:
-            attributes = feature.attributes()
-
-            # We add the hazard value name to the attribute table.
-            attributes.append(radii[radius])
-            # We add the value of buffer distance to the attribute table.
-            attributes.append(radius)
-
-            circle = geom.buffer(radius, 30)
-
-            if inner_ring:
-                circle.addRing(inner_ring)
-
-            inner_ring = circle.asPolygon()[0]
-
-            new_feature = QgsFeature()
-            if reverse_transform:
-                circle.transform(reverse_transform)
-
-            new_feature.setGeometry(circle)
-            new_feature.setAttributes(attributes)
-
-            data_provider.addFeatures([new_feature])
-
-        if callback:
-            callback(current=i, maximum=feature_count, step=processing_step)
+    # Only the WKB is sent to the worker processes.
+    attributes = []
+    items = []
+    for feature in layer.getFeatures():
+        geometry = feature.geometry()
+        if not geometry or geometry.isEmpty():
+            continue
+        items.append((len(attributes), geometry.asWkb()))
+        attributes.append(feature.attributes())
+
+    sorted_radii = sorted(radii)
+    chunks = [
+        (input_crs.toWkt(), input_crs.geographicFlag(), sorted_radii, chunk)
+        for chunk in split_in_chunks(
+            items, process_count() * CHUNKS_PER_PROCESS)]
+
+    new_features = []
+    for results in parallel_map(_buffer_chunk, chunks):
+        for index, rings in results:
+            for radius, wkb in zip(sorted_radii, rings):
+                geometry = QgsGeometry()
+                geometry.fromWkb(bytes(wkb))
+
+                # We add the hazard value name and the buffer distance to
+                # the attribute table.
+                new_feature = QgsFeature()
+                new_feature.setGeometry(geometry)
+                new_feature.setAttributes(
+                    attributes[index] + [radii[radius], radius])
+                new_features.append(new_feature)
+
+            if callback:
+                callback(
+                    current=index,
+                    maximum=feature_count,
+                    step=processing_step)
+
+    data_provider.addFeatures(new_features)
 
     # We transfer keywords to the output.
     buffered.keywords = layer.keywords
@@ -0,0 +1,139 @@
+# coding=utf-8
+
+"""Packed R-tree of bounding boxes, built with the Sort-Tile-Recursive method.
+
+The tree is read-only and stored in a few NumPy arrays, so it can hold tens of
+millions of bounding boxes: 20 bytes per box for the leaves, the upper levels
+are 16 times smaller each. Queries are evaluated level by level on all the
+nodes at once instead of walking the tree node by node.
+"""
+
+import numpy
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+# Number of children of a node.
+NODE_CAPACITY = 16
+
+
+def _round_outward(boxes):
+    """Convert bounding boxes to float32, never making them smaller.
+
+    :param boxes: Array of boxes, one row xmin, ymin, xmax, ymax per box.
+    :type boxes: numpy.ndarray
+
+    :return: The boxes as float32, containing the original boxes.
+    :rtype: numpy.ndarray
+    """
+    boxes = numpy.asarray(boxes, dtype=float)
+    rounded = boxes.astype(numpy.float32)
+    minimum = rounded[:, :2]
+    maximum = rounded[:, 2:]
+    minimum[:] = numpy.where(
+        minimum > boxes[:, :2],
+        numpy.nextafter(minimum, numpy.float32(-numpy.inf)),
+        minimum)
+    maximum[:] = numpy.where(
+        maximum < boxes[:, 2:],
+        numpy.nextafter(maximum, numpy.float32(numpy.inf)),
+        maximum)
+    return rounded
+
+
+class PackedRTree(object):
+
+    """Static R-tree of bounding boxes.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, boxes, node_capacity=NODE_CAPACITY):
+        """Constructor.
+
+        :param boxes: Array of boxes, one row xmin, ymin, xmax, ymax per box.
+        :type boxes: numpy.ndarray
+
+        :param node_capacity: Number of children of a node.
+        :type node_capacity: int
+        """
+        self.node_capacity = node_capacity
+        boxes = _round_outward(numpy.reshape(boxes, (-1, 4)))
+        count = len(boxes)
+
+        # Sort-Tile-Recursive: sort the boxes by x, cut them in vertical
+        # slices and sort each slice by y. Consecutive boxes are then close
+        # to each other and are packed in the same leaf.
+        center_x = boxes[:, 0] + boxes[:, 2]
+        center_y = boxes[:, 1] + boxes[:, 3]
+        leaf_count = -(-count // node_capacity)
+        slice_count = max(1, int(numpy.ceil(numpy.sqrt(leaf_count))))
+        slice_size = slice_count * node_capacity
+        order = numpy.argsort(center_x, kind='mergesort')
+        slices = numpy.arange(count) // slice_size
+        order = order[numpy.lexsort((center_y[order], slices))]
+
+        index_type = numpy.int32 if count < 2 ** 31 else numpy.int64
+        self._order = order.astype(index_type)
+        self._levels = [boxes[order]]
+        while len(self._levels[-1]) > node_capacity:
+            self._levels.append(self._parent_level(self._levels[-1]))
+
+    def __len__(self):
+        """The number of boxes in the tree.
+
+        :rtype: int
+        """
+        return len(self._order)
+
+    def _parent_level(self, level):
+        """Compute the boxes of the parents of a level.
+
+        :param level: The boxes of the level.
+        :type level: numpy.ndarray
+
+        :return: The boxes of the parent level.
+        :rtype: numpy.ndarray
+        """
+        starts = numpy.arange(0, len(level), self.node_capacity)
+        parent = numpy.empty((len(starts), 4), dtype=level.dtype)
+        parent[:, :2] = numpy.minimum.reduceat(level[:, :2], starts)
+        parent[:, 2:] = numpy.maximum.reduceat(level[:, 2:], starts)
+        return parent
+
+    def query(self, xmin, ymin, xmax, ymax):
+        """Get the boxes intersecting a rectangle.
+
+        :param xmin: The minimum x of the rectangle.
+        :type xmin: float
+
+        :param ymin: The minimum y of the rectangle.
+        :type ymin: float
+
+        :param xmax: The maximum x of the rectangle.
+        :type xmax: float
+
+        :param ymax: The maximum y of the rectangle.
+        :type ymax: float
+
+        :return: The positions of the boxes in the array given to the
+            constructor, sorted.
+        :rtype: numpy.ndarray
+        """
+        if not len(self):
+            return numpy.empty(0, dtype=self._order.dtype)
+
+        children = numpy.arange(self.node_capacity)
+        nodes = numpy.arange(len(self._levels[-1]))
+        for depth in range(len(self._levels) - 1, -1, -1):
+            boxes = self._levels[depth][nodes]
+            nodes = nodes[
+                (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) &
+                (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)]
+            if depth:
+                nodes = (nodes[:, None] * self.node_capacity + children)
+                nodes = nodes.ravel()
+                nodes = nodes[nodes < len(self._levels[depth - 1])]
+        return numpy.sort(self._order[nodes])
@@ -90,8 +90,13 @@ def prepare_vector_layer(layer, callback=None):
 
     feature_count = layer.featureCount()
 
+    # The spatial index is built once all features are copied.
     cleaned = create_memory_layer(
-        output_layer_name, layer.geometryType(), layer.crs(), layer.fields())
+        output_layer_name,
+        layer.geometryType(),
+        layer.crs(),
+        layer.fields(),
+        spatial_index=False)
 
     # We transfer keywords to the output.
     cleaned.keywords = layer.keywords
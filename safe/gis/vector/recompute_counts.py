@@ -4,16 +4,18 @@
 
 import logging
 
+from qgis.core import QgsGeometry
+
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import (
     size_field,
     count_fields,
 )
-from safe.definitions.post_processors import size
 from safe.definitions.processing_steps import (
     recompute_counts_steps)
 from safe.utilities.profiling import profile
-from safe.gis.vector.tools import SizeCalculator
+from safe.gis.vector.tools import (
+    SizeCalculator, numeric_column, write_columns)
 from safe.gis.sanity_check import check_layer
 
 LOGGER = logging.getLogger('InaSAFE')
@@ -73,29 +75,33 @@ def recompute_counts(layer, callback=None):
     size_field_name = fields[size_field['key']]
     size_field_index = layer.fieldNameIndex(size_field_name)
 
-    layer.startEditing()
-
     exposure_key = layer.keywords['exposure_keywords']['exposure']
     size_calculator = SizeCalculator(
         layer.crs(), layer.geometryType(), exposure_key)
 
+    # Read the whole columns in one pass over the layer.
+    feature_ids = []
+    geometries = []
+    values = dict((index, []) for index in [size_field_index] + indexes)
     for feature in layer.getFeatures():
-        old_size = feature[size_field_name]
-        new_size = size(
-            size_calculator=size_calculator, geometry=feature.geometry())
-
-        layer.changeAttributeValue(feature.id(), size_field_index, new_size)
-
-        # Cross multiplication for each field
-        for index in indexes:
-            old_count = feature[index]
-            try:
-                new_value = new_size * old_count / old_size
-            except TypeError:
-                new_value = ''
-            layer.changeAttributeValue(feature.id(), index, new_value)
-
-    layer.commitChanges()
+        feature_ids.append(feature.id())
+        geometry = feature.geometry()
+        geometries.append(QgsGeometry(geometry) if geometry else None)
+        attributes = feature.attributes()
+        for index, column in values.iteritems():
+            column.append(attributes[index])
+
+    new_sizes = size_calculator.measure_many(geometries)
+    old_sizes = numeric_column(values[size_field_index])
+
+    # Cross multiplication for each field. A NULL count or size, or a null
+    # old size, gives a NULL count.
+    columns = {size_field_index: new_sizes}
+    for index in indexes:
+        old_counts = numeric_column(values[index])
+        columns[index] = new_sizes * old_counts / old_sizes
+
+    write_columns(layer, feature_ids, columns)
 
     layer.keywords['title'] = output_layer_name
 
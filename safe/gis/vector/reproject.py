@@ -2,16 +2,22 @@
 
 """Reproject a vector layer to a specific CRS."""
 
+import numpy
+from osgeo import osr
 from qgis.core import (
     QgsVectorLayer,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
     QgsFeature,
+    QgsGeometry,
 )
 
-from safe.gis.vector.tools import create_memory_layer
+from safe.gis.vector.tools import create_memory_layer, wkb_coordinate_blocks
 from safe.gis.sanity_check import check_layer
 from safe.definitions.processing_steps import reproject_steps
+from safe.utilities.gis import ogr_spatial_reference
+from safe.utilities.parallel import (
+    parallel_map, process_count, split_in_chunks)
 from safe.utilities.profiling import profile
 
 
@@ -20,13 +26,96 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+# Layers with more features are reprojected in worker processes.
+PARALLEL_FEATURE_COUNT = 50000
+
+
+def transform_wkb(wkbs, source_wkt, destination_wkt):
+    """Transform many WKB geometries at once.
+
+    The coordinates of all geometries are gathered in one array, transformed
+    in a single call and written back in a copy of the WKB.
+
+    :param wkbs: List of WKB. An item can be None.
+    :type wkbs: list
+
+    :param source_wkt: The WKT of the CRS of the geometries.
+    :type source_wkt: str
+
+    :param destination_wkt: The WKT of the destination CRS.
+    :type destination_wkt: str
+
+    :return: The list of transformed WKB. An item is None if the WKB was None
+        or if the geometry type is not supported, like a curve.
+    :rtype: list
+
+    .. versionadded:: 4.2
+    """
+    transform = osr.CoordinateTransformation(
+        ogr_spatial_reference(source_wkt),
+        ogr_spatial_reference(destination_wkt))
+
+    # All geometries are copied in a single buffer which can be modified.
+    supported = []
+    positions = [0]
+    blocks = []
+    for i, wkb in enumerate(wkbs):
+        if wkb is None:
+            continue
+        try:
+            geometry_blocks = wkb_coordinate_blocks(wkb)
+        except ValueError:
+            continue
+        supported.append(i)
+        for offset, count, dimensions, byte_order, _ in geometry_blocks:
+            blocks.append(
+                (positions[-1] + offset, count, dimensions, byte_order))
+        positions.append(positions[-1] + len(wkb))
+    data = bytearray(b''.join(wkbs[i] for i in supported))
+
+    coordinates = [
+        numpy.frombuffer(
+            data, dtype=byte_order + 'f8', count=count * dimensions,
+            offset=offset).reshape(count, dimensions)
+        for offset, count, dimensions, byte_order in blocks if count]
+    if coordinates:
+        points = numpy.concatenate(
+            [block[:, :2] for block in coordinates]).tolist()
+        transformed = numpy.array(transform.TransformPoints(points))
+        start = 0
+        for block in coordinates:
+            block[:, :2] = transformed[start:start + len(block), :2]
+            start += len(block)
+
+    results = [None] * len(wkbs)
+    for position, i in enumerate(supported):
+        results[i] = bytes(data[positions[position]:positions[position + 1]])
+    return results
+
+
+def _transform_wkb_chunk(chunk):
+    """Worker for `transform_wkb`.
+
+    :param chunk: The list of WKB, the source and destination CRS WKT.
+    :type chunk: tuple
+
+    :return: The list of transformed WKB.
+    :rtype: list
+    """
+    return transform_wkb(*chunk)
+
 
 @profile
-def reproject(layer, output_crs, callback=None):
+def reproject(layer, output_crs, callback=None, geometry_only=False):
     """Reproject a vector layer to a specific CRS.
 
     Issue https://github.com/inasafe/inasafe/issues/3183
 
+    The coordinates are transformed in batches with OGR. Layers with more
+    than PARALLEL_FEATURE_COUNT features are transformed in chunks in worker
+    processes. Geometries which can not be transformed this way, like
+    curves, are transformed by QGIS.
+
     :param layer: The layer to reproject.
     :type layer: QgsVectorLayer
 
@@ -38,6 +127,10 @@ def reproject(layer, output_crs, callback=None):
         Defaults to None.
     :type callback: function
 
+    :param geometry_only: True to not copy the attributes. The output layer
+        has no fields and no inasafe_fields in its keywords.
+    :type geometry_only: bool
+
     :return: Reprojected memory layer.
     :rtype: QgsVectorLayer
 
@@ -48,32 +141,63 @@ def reproject(layer, output_crs, callback=None):
     processing_step = reproject_steps['step_name']
 
     input_crs = layer.crs()
-    input_fields = layer.fields()
+    if geometry_only:
+        input_fields = None
+    else:
+        input_fields = layer.fields()
     feature_count = layer.featureCount()
 
     reprojected = create_memory_layer(
         output_layer_name, layer.geometryType(), output_crs, input_fields)
-    reprojected.startEditing()
-
-    crs_transform = QgsCoordinateTransform(input_crs, output_crs)
 
-    out_feature = QgsFeature()
+    attributes = []
+    wkbs = []
+    for feature in layer.getFeatures():
+        geometry = feature.geometry()
+        if geometry and not geometry.isEmpty():
+            wkbs.append(geometry.asWkb())
+        else:
+            wkbs.append(None)
+        if not geometry_only:
+            attributes.append(feature.attributes())
+
+    if feature_count > PARALLEL_FEATURE_COUNT:
+        chunk_count = process_count()
+    else:
+        chunk_count = 1
+    chunks = [
+        (chunk, input_crs.toWkt(), output_crs.toWkt())
+        for chunk in split_in_chunks(wkbs, chunk_count)]
+    transformed = sum(parallel_map(_transform_wkb_chunk, chunks), [])
 
-    for i, feature in enumerate(layer.getFeatures()):
-        geom = feature.geometry()
-        geom.transform(crs_transform)
-        out_feature.setGeometry(geom)
-        out_feature.setAttributes(feature.attributes())
-        reprojected.addFeature(out_feature)
+    crs_transform = QgsCoordinateTransform(input_crs, output_crs)
+    out_features = []
+    for i, (wkb, new_wkb) in enumerate(zip(wkbs, transformed)):
+        out_feature = QgsFeature()
+        if new_wkb is not None:
+            geometry = QgsGeometry()
+            geometry.fromWkb(new_wkb)
+            out_feature.setGeometry(geometry)
+        elif wkb is not None:
+            geometry = QgsGeometry()
+            geometry.fromWkb(wkb)
+            geometry.transform(crs_transform)
+            out_feature.setGeometry(geometry)
+        if not geometry_only:
+            out_feature.setAttributes(attributes[i])
+        out_features.append(out_feature)
 
         if callback:
             callback(current=i, maximum=feature_count, step=processing_step)
 
-    reprojected.commitChanges()
+    reprojected.dataProvider().addFeatures(out_features)
 
     # We transfer keywords to the output.
     # We don't need to update keywords as the CRS is dynamic.
     reprojected.keywords = layer.keywords
     reprojected.keywords['title'] = output_layer_name
+    if geometry_only:
+        reprojected.keywords = dict(reprojected.keywords)
+        reprojected.keywords['inasafe_fields'] = {}
     check_layer(reprojected)
     return reprojected
@@ -13,6 +13,7 @@ from qgis.core import (
 
 from safe.definitions.processing_steps import smart_clip_steps
 from safe.gis.vector.tools import create_memory_layer
+from safe.gis.vector.layer_index import layer_index
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 
@@ -59,19 +60,25 @@ def smart_clip(layer_to_clip, mask_layer, callback=None):
     writer.startEditing()
 
     # first build up a list of clip geometries
-    request = QgsFeatureRequest().setSubsetOfAttributes([])
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([])
     iterator = mask_layer.getFeatures(request)
     feature = next(iterator)
-    geometries = QgsGeometry(feature.geometry())
 
     # use prepared geometries for faster intersection tests
-    # noinspection PyArgumentList
-    engine = QgsGeometry.createGeometryEngine(geometries.geometry())
-    engine.prepareGeometry()
+    # The prepared geometry is shared with other steps using the same mask.
+    engine = layer_index(mask_layer).engine(feature.id())
 
     extent = mask_layer.extent()
 
-    for feature in layer_to_clip.getFeatures(QgsFeatureRequest(extent)):
+    # Without a mask geometry, nothing intersects and the layer is empty.
+    if engine is None:
+        LOGGER.warning('The mask layer of the smart clip has no geometry.')
+        features = []
+    else:
+        features = layer_to_clip.getFeatures(QgsFeatureRequest(extent))
+
+    for feature in features:
 
         if engine.intersects(feature.geometry().geometry()):
             out_feat = QgsFeature()
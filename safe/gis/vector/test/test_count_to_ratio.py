@@ -4,6 +4,8 @@
 
 import unittest
 
+from PyQt4.QtCore import QPyNullVariant
+
 from safe.test.utilities import qgis_iface, load_test_vector_layer
 from safe.definitions.fields import (
     female_count_field, female_ratio_field, size_field, population_count_field)
@@ -48,3 +50,26 @@ class TestRecomputeCounts(unittest.TestCase):
                 manual_ratio - feature[female_ratio_field['field_name']])
 
             self.assertTrue(diff < 10 ** -2, diff)
+
+    def test_null_counts(self):
+        """Test a NULL or a null total count gives a NULL ratio."""
+        layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'population.geojson',
+            clone=True)
+        layer = prepare_vector_layer(layer)
+
+        feature_ids = [f.id() for f in layer.getFeatures()]
+        index = layer.fieldNameIndex(population_count_field['field_name'])
+        layer.dataProvider().changeAttributeValues({
+            feature_ids[0]: {index: None},
+            feature_ids[1]: {index: 0},
+        })
+
+        layer = from_counts_to_ratios(layer)
+
+        ratios = dict(
+            (f.id(), f[female_ratio_field['field_name']])
+            for f in layer.getFeatures())
+        self.assertIsInstance(ratios[feature_ids[0]], QPyNullVariant)
+        self.assertIsInstance(ratios[feature_ids[1]], QPyNullVariant)
+        self.assertNotIsInstance(ratios[feature_ids[2]], QPyNullVariant)
@@ -0,0 +1,99 @@
+# coding=utf-8
+
+import unittest
+
+from safe.test.utilities import (
+    get_qgis_app,
+    load_test_vector_layer)
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+from safe.gis.vector.clip import clip
+from safe.gis.vector.smart_clip import smart_clip
+from safe.gis.vector.layer_index import (
+    layer_index,
+    layer_index_statistics,
+    clear_layer_index_statistics)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestLayerIndex(unittest.TestCase):
+
+    def setUp(self):
+        clear_layer_index_statistics()
+
+    def tearDown(self):
+        pass
+
+    def test_layer_index(self):
+        """Test the structures are built once and cleared after an edit."""
+        layer = load_test_vector_layer(
+            'gisv4', 'aggregation', 'small_grid.geojson', clone=True)
+
+        index = layer_index(layer)
+        self.assertIs(index, layer_index(layer))
+        self.assertEqual(len(index.features()), layer.featureCount())
+
+        feature = next(layer.getFeatures())
+        rectangle = feature.geometry().boundingBox()
+        self.assertIn(feature.id(), index.intersects(rectangle))
+        self.assertIn(feature.id(), index.intersects(rectangle))
+        engine = index.engine(feature.id())
+        self.assertIs(engine, index.engine(feature.id()))
+
+        statistics = layer_index_statistics()
+        self.assertEqual(statistics['spatial index']['built'], 1)
+        self.assertEqual(statistics['spatial index']['reused'], 1)
+        self.assertEqual(statistics['prepared geometries']['built'], 1)
+        self.assertEqual(statistics['prepared geometries']['reused'], 1)
+
+        # An edit clears the index.
+        layer.startEditing()
+        layer.deleteFeature(feature.id())
+        layer.commitChanges()
+        self.assertEqual(len(index.features()), layer.featureCount())
+        self.assertNotIn(feature.id(), index.intersects(rectangle))
+        self.assertEqual(statistics['spatial index']['built'], 2)
+
+    def test_shared_mask(self):
+        """Test many clips with the same mask prepare it only once."""
+        analysis = load_test_vector_layer(
+            'gisv4', 'analysis', 'analysis.geojson')
+        exposure = load_test_vector_layer(
+            'gisv4', 'exposure', 'buildings.geojson')
+
+        self.assertEqual(smart_clip(exposure, analysis).featureCount(), 9)
+        clip(exposure, analysis)
+        clip(exposure, analysis)
+
+        statistics = layer_index_statistics()
+        self.assertEqual(statistics['valid geometries']['built'], 1)
+        self.assertEqual(statistics['union']['built'], 1)
+        self.assertEqual(statistics['union']['reused'], 1)
+
+    def test_packed_rtree(self):
+        """Test the packed R-tree finds the same features as the R-tree."""
+        layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'buildings.geojson')
+        index = layer_index(layer)
+        tree, feature_ids = index.packed_rtree()
+        self.assertEqual(len(tree), layer.featureCount())
+
+        for feature in layer.getFeatures():
+            box = feature.geometry().boundingBox()
+            positions = tree.query(
+                box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum())
+            self.assertItemsEqual(
+                feature_ids[positions].tolist(), index.intersects(box))
+
+        self.assertIs(tree, index.packed_rtree()[0])
+        statistics = layer_index_statistics()
+        self.assertEqual(statistics['packed R-tree']['built'], 1)
+        self.assertEqual(statistics['packed R-tree']['reused'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
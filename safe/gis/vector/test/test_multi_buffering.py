@@ -8,8 +8,16 @@ from safe.test.utilities import (
     load_test_vector_layer)
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
-from qgis.core import QGis
+from math import pi
+
+from qgis.core import (
+    QGis,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry,
+    QgsPoint)
 from safe.gis.vector.multi_buffering import multi_buffering
+from safe.gis.vector.tools import create_memory_layer, SizeCalculator
 from safe.definitions.fields import hazard_class_field, buffer_distance_field
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -67,3 +75,34 @@ class TestMultiBuffering(unittest.TestCase):
         new_field_names = actual_field_names[-2:]
 
         self.assertEqual(expected_fields_name, new_field_names)
+
+    def test_multi_buffer_far_points(self):
+        """Test the buffers are not distorted far from the layer centre."""
+        radii = OrderedDict()
+        radii[1000] = 'high'
+        radii[2000] = 'low'
+
+        wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+        layer = create_memory_layer('points', QGis.Point, wgs84)
+        features = []
+        for x, y in [(95, 5), (141, -8), (118, 60)]:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPoint(QgsPoint(x, y)))
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+
+        result = multi_buffering(layer=layer, radii=radii)
+        self.assertEqual(result.featureCount(), len(features) * len(radii))
+
+        calculator = SizeCalculator(result.crs(), QGis.Polygon, None)
+        expected_areas = {
+            1000: pi * 1000 ** 2,
+            2000: pi * (2000 ** 2 - 1000 ** 2)
+        }
+        for feature in result.getFeatures():
+            radius = feature[buffer_distance_field['field_name']]
+            area = calculator.measure(feature.geometry())
+            self.assertAlmostEqual(
+                area, expected_areas[radius],
+                delta=expected_areas[radius] * 0.01)
+
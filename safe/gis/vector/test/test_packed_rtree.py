@@ -0,0 +1,51 @@
+# coding=utf-8
+
+import unittest
+
+import numpy
+
+from safe.gis.vector.packed_rtree import PackedRTree
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestPackedRTree(unittest.TestCase):
+
+    def test_query(self):
+        """Test the tree finds the same boxes as a brute force search."""
+        random = numpy.random.RandomState(0)
+        # Multiples of 1/8 are stored exactly in the tree.
+        corners = random.randint(0, 800, (5000, 2)) / 8.0
+        sizes = random.randint(0, 16, (5000, 2)) / 8.0
+        boxes = numpy.hstack((corners, corners + sizes))
+        tree = PackedRTree(boxes)
+        self.assertEqual(len(tree), len(boxes))
+
+        for xmin, ymin in random.uniform(0, 100, (50, 2)):
+            xmax, ymax = xmin + 5, ymin + 5
+            expected = numpy.flatnonzero(
+                (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) &
+                (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin))
+            numpy.testing.assert_array_equal(
+                tree.query(xmin, ymin, xmax, ymax), expected)
+
+    def test_precision(self):
+        """Test boxes are not made smaller when they are stored."""
+        boxes = [[106.80000001, -6.2, 106.80000002, -6.1]]
+        tree = PackedRTree(boxes)
+        self.assertEqual(
+            tree.query(106.80000002, -6.1, 106.9, -6.0).tolist(), [0])
+        self.assertEqual(tree.query(0, 0, 1, 1).tolist(), [])
+
+    def test_empty(self):
+        """Test an empty tree."""
+        tree = PackedRTree(numpy.empty((0, 4)))
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(tree.query(0, 0, 1, 1).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
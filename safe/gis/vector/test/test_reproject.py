@@ -7,9 +7,13 @@ from safe.test.utilities import (
     load_test_vector_layer)
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
-from qgis.core import QgsCoordinateReferenceSystem
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsGeometry,
+    QgsPoint)
 
-from safe.gis.vector.reproject import reproject
+from safe.gis.vector.reproject import reproject, transform_wkb
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -38,3 +42,48 @@ class TestReprojectVector(unittest.TestCase):
         self.assertEqual(
             reprojected.featureCount(), layer.featureCount())
         self.assertDictEqual(layer.keywords, reprojected.keywords)
+
+    def test_reproject_geometries(self):
+        """Test the batch transformation agrees with QGIS."""
+        layer = load_test_vector_layer('exposure', 'buildings.shp')
+        output_crs = QgsCoordinateReferenceSystem(3857)
+        crs_transform = QgsCoordinateTransform(layer.crs(), output_crs)
+
+        reprojected = reproject(
+            layer=layer, output_crs=output_crs, geometry_only=True)
+
+        self.assertEqual(reprojected.fields().count(), 0)
+        self.assertEqual(reprojected.keywords['inasafe_fields'], {})
+        self.assertNotEqual(layer.keywords.get('inasafe_fields'), {})
+
+        for feature, new_feature in zip(
+                layer.getFeatures(), reprojected.getFeatures()):
+            expected = QgsGeometry(feature.geometry())
+            expected.transform(crs_transform)
+            geometry = new_feature.geometry()
+            # A millimetre in pseudo mercator.
+            self.assertAlmostEqual(
+                geometry.area(), expected.area(), delta=expected.area() * 1e-6)
+            self.assertAlmostEqual(
+                geometry.boundingBox().xMinimum(),
+                expected.boundingBox().xMinimum(),
+                delta=0.001)
+            self.assertAlmostEqual(
+                geometry.boundingBox().yMaximum(),
+                expected.boundingBox().yMaximum(),
+                delta=0.001)
+
+    def test_transform_wkb(self):
+        """Test we can transform a list of WKB with empty geometries."""
+        wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+        mercator = QgsCoordinateReferenceSystem('EPSG:3857')
+        point = QgsGeometry.fromPoint(QgsPoint(180, 0)).asWkb()
+
+        results = transform_wkb(
+            [None, point], wgs84.toWkt(), mercator.toWkt())
+
+        self.assertIsNone(results[0])
+        geometry = QgsGeometry()
+        geometry.fromWkb(results[1])
+        self.assertAlmostEqual(geometry.asPoint().x(), 20037508.34, places=2)
+        self.assertAlmostEqual(geometry.asPoint().y(), 0)
@@ -7,7 +7,10 @@ from safe.test.utilities import (
     load_test_vector_layer)
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
+from qgis.core import QGis, QgsFeature
+
 from safe.gis.vector.smart_clip import smart_clip
+from safe.gis.vector.tools import create_memory_layer
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -37,3 +40,20 @@ class TestClipVector(unittest.TestCase):
 
         # Add test about keywords
         # todo
+
+    def test_clip_vector_without_mask_geometry(self):
+        """Test the clip is empty if the mask has no geometry.
+
+        .. versionadded:: 4.2
+        """
+        exposure = load_test_vector_layer(
+            'gisv4', 'exposure', 'buildings.geojson')
+
+        mask = create_memory_layer(
+            'mask', QGis.Polygon, exposure.crs())
+        mask.startEditing()
+        mask.addFeature(QgsFeature())
+        mask.commitChanges()
+
+        layer = smart_clip(exposure, mask)
+        self.assertEqual(layer.featureCount(), 0)
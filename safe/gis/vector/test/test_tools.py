@@ -0,0 +1,114 @@
+# coding=utf-8
+
+import unittest
+
+from safe.test.utilities import (
+    get_qgis_app,
+    load_test_vector_layer)
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+from qgis.core import QgsCoordinateReferenceSystem, QgsGeometry
+
+from safe.gis.vector.clean_geometry import (
+    _clean_wkb_chunk, clean_geometries)
+from safe.gis.vector.reproject import reproject
+from safe.gis.vector.tools import (
+    SizeCalculator, copy_layer, create_memory_layer)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestTools(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def check_measure_many(self, layer, exposure):
+        """Helper to compare measure_many with measure on a layer."""
+        calculator = SizeCalculator(
+            layer.crs(), layer.geometryType(), exposure)
+        geometries = [
+            QgsGeometry(f.geometry()) for f in layer.getFeatures()]
+
+        sizes = calculator.measure_many(geometries)
+
+        self.assertEqual(len(sizes), len(geometries))
+        for geometry, size in zip(geometries, sizes):
+            expected = calculator.measure(geometry)
+            # 0.01 % of the size, plus one unit for the rounding.
+            self.assertAlmostEqual(
+                size, expected, delta=expected * 10 ** -4 + 1)
+
+    def test_measure_many(self):
+        """Test the batch size calculation agrees with the QGIS one."""
+        buildings = load_test_vector_layer(
+            'gisv4', 'exposure', 'buildings.geojson')
+        self.check_measure_many(buildings, None)
+
+        roads = load_test_vector_layer('gisv4', 'exposure', 'roads.geojson')
+        self.check_measure_many(roads, None)
+
+        # In a projected CRS.
+        utm = QgsCoordinateReferenceSystem('EPSG:32748')
+        self.check_measure_many(reproject(roads, utm), None)
+
+        calculator = SizeCalculator(
+            roads.crs(), roads.geometryType(), None)
+        self.assertEqual(calculator.measure_many([None]).tolist(), [0])
+
+    def test_copy_layer(self):
+        """Test we copy a layer in bulk and build the index at the end.
+
+        .. versionadded:: 4.2
+        """
+        layer = load_test_vector_layer(
+            'gisv4', 'aggregation', 'small_grid.geojson')
+        target = create_memory_layer(
+            'copy',
+            layer.geometryType(),
+            layer.crs(),
+            layer.fields(),
+            spatial_index=False)
+        self.assertNotIn('index=yes', target.dataProvider().dataSourceUri())
+
+        copy_layer(layer, target)
+        self.assertEqual(layer.featureCount(), target.featureCount())
+        self.assertIn('index=yes', target.dataProvider().dataSourceUri())
+        for source, copy in zip(layer.getFeatures(), target.getFeatures()):
+            self.assertEqual(source.attributes(), copy.attributes())
+            self.assertTrue(source.geometry().equals(copy.geometry()))
+
+    def test_clean_geometries(self):
+        """Test we clean the geometries in a batch.
+
+        .. versionadded:: 4.2
+        """
+        valid = QgsGeometry.fromWkt('POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))')
+        # A bow tie.
+        invalid = QgsGeometry.fromWkt('POLYGON((0 0, 1 1, 1 0, 0 1, 0 0))')
+
+        cleaned, invalid_count = clean_geometries([valid, invalid, None])
+        self.assertEqual(1, invalid_count)
+        self.assertIs(valid, cleaned[0])
+        self.assertTrue(cleaned[1].isGeosValid())
+        self.assertIsNone(cleaned[2])
+
+        # The same in a worker.
+        results = _clean_wkb_chunk(
+            [valid.asWkb(), invalid.asWkb(), None])
+        self.assertEqual((None, True), results[0])
+        self.assertTrue(results[1][1])
+        geometry = QgsGeometry()
+        geometry.fromWkb(bytes(results[1][0]))
+        self.assertTrue(geometry.isGeosValid())
+        self.assertEqual((None, False), results[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,9 @@ from safe.test.utilities import (
 from safe.gis.vector.clean_geometry import clean_layer
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
-from safe.gis.vector.union import union
-from safe.definitions.fields import hazard_class_field, hazard_value_field
+from safe.gis.vector.union import union, processing_union
+from safe.definitions.fields import (
+    hazard_class_field, hazard_value_field, aggregation_id_field)
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -44,6 +45,35 @@ class TestUnionVector(unittest.TestCase):
             layer.fields().count()
         )
 
+    def test_union_reference(self):
+        """Test the union covers the same areas as the Processing union."""
+
+        def summary(function):
+            """Sum the areas by hazard class and aggregation id."""
+            union_a = load_test_vector_layer(
+                'gisv4', 'hazard', 'classified_vector.geojson')
+            union_a.keywords['inasafe_fields'][hazard_class_field['key']] = (
+                union_a.keywords['inasafe_fields'][hazard_value_field['key']])
+            union_b = load_test_vector_layer(
+                'gisv4', 'aggregation', 'small_grid.geojson')
+
+            layer = function(union_a, union_b)
+            inasafe_fields = layer.keywords['inasafe_fields']
+            hazard_field = inasafe_fields[hazard_class_field['key']]
+            aggregation_field = inasafe_fields[aggregation_id_field['key']]
+            areas = {}
+            for feature in layer.getFeatures():
+                key = (feature[hazard_field], feature[aggregation_field])
+                areas[key] = (
+                    areas.get(key, 0) + feature.geometry().area())
+            return areas
+
+        expected = summary(processing_union)
+        areas = summary(union)
+        self.assertItemsEqual(areas.keys(), expected.keys())
+        for key, area in expected.iteritems():
+            self.assertAlmostEqual(areas[key], area, delta=area * 1e-6)
+
     @unittest.expectedFailure
     def test_union_error(self):
         """Test we can union two layers like hazard and aggregation (2)."""
@@ -3,8 +3,12 @@
 """Tools for vector layers."""
 
 import logging
+import struct
+from itertools import islice
 from uuid import uuid4
 from math import isnan
+
+import numpy
 from PyQt4.QtCore import QPyNullVariant
 from qgis.core import (
     QgsGeometry,
@@ -12,18 +16,21 @@ from qgis.core import (
     QgsSpatialIndex,
     QgsFeatureRequest,
     QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
     QGis,
     QgsFeature,
     QgsField,
     QgsDistanceArea,
     QgsUnitTypes,
+    QgsVectorDataProvider,
     QgsWKBTypes
 )
 
 from safe.common.exceptions import MemoryLayerCreationError
 from safe.definitions.utilities import definition
 from safe.definitions.units import unit_metres, unit_square_metres
-from safe.gis.vector.clean_geometry import geometry_checker
+from safe.gis.vector.clean_geometry import clean_geometries
+from safe.gis.vector.layer_index import invalidate_layer_index
 from safe.utilities.profiling import profile
 from safe.utilities.rounding import convert_unit
 
@@ -34,6 +41,9 @@ __revision__ = '$Format:%H$'
 
 LOGGER = logging.getLogger('InaSAFE')
 
+# Number of features added at once to the data provider by copy_layer.
+COPY_CHUNK_SIZE = 10000
+
 wkb_type_groups = {
     'Point': (
         QgsWKBTypes.Point,
@@ -84,7 +94,11 @@ area_unit = {
 
 @profile
 def create_memory_layer(
-        layer_name, geometry, coordinate_reference_system=None, fields=None):
+        layer_name,
+        geometry,
+        coordinate_reference_system=None,
+        fields=None,
+        spatial_index=True):
     """Create a vector memory layer.
 
     :param layer_name: The name of the layer.
@@ -99,6 +113,11 @@ def create_memory_layer(
     :param fields: Fields of the vector layer. Default to None.
     :type fields: QgsFields
 
+    :param spatial_index: False to not update the spatial index of the
+        provider at each new feature. It can be built at the end with
+        createSpatialIndex, like copy_layer does. Default to True.
+    :type spatial_index: bool
+
     :return: The memory layer.
     :rtype: QgsVectorLayer
     """
@@ -115,7 +134,9 @@ def create_memory_layer(
         raise MemoryLayerCreationError(
             'Layer is whether Point nor Line nor Polygon, I got %s' % geometry)
 
-    uri = '%s?index=yes&uuid=%s' % (type_string, str(uuid4()))
+    uri = '%s?uuid=%s' % (type_string, str(uuid4()))
+    if spatial_index:
+        uri += '&index=yes'
     if coordinate_reference_system:
         crs = coordinate_reference_system.authid().lower()
         uri += '&crs=%s' % crs
@@ -136,15 +157,16 @@ def create_memory_layer(
 def copy_layer(source, target):
     """Copy a vector layer to another one.
 
+    The features are added by chunks directly to the data provider of the
+    target. If the target is a memory layer without spatial index, the
+    index is built once at the end.
+
     :param source: The vector layer to copy.
     :type source: QgsVectorLayer
 
     :param target: The destination.
     :type source: QgsVectorLayer
     """
-    out_feature = QgsFeature()
-    target.startEditing()
-
     request = QgsFeatureRequest()
 
     aggregation_layer = False
@@ -161,22 +183,47 @@ def copy_layer(source, target):
 
         aggregation_layer = True
 
-    for i, feature in enumerate(source.getFeatures(request)):
-        geom = feature.geometry()
+    data_provider = target.dataProvider()
+    invalid_count = 0
+    features = source.getFeatures(request)
+    while True:
+        chunk = list(islice(features, COPY_CHUNK_SIZE))
+        if not chunk:
+            break
+
+        geometries = [feature.geometry() for feature in chunk]
         if aggregation_layer:
             # See issue https://github.com/inasafe/inasafe/issues/3713
             # and issue https://github.com/inasafe/inasafe/issues/3927
             # Also handle if feature has no geometry.
-            geom = geometry_checker(geom)
-            if not geom or not geom.isGeosValid():
-                LOGGER.info(
-                    'One geometry in the aggregation layer is still invalid '
-                    'after cleaning.')
-        out_feature.setGeometry(QgsGeometry(geom))
-        out_feature.setAttributes(feature.attributes())
-        target.addFeature(out_feature)
-
-    target.commitChanges()
+            geometries, invalid = clean_geometries(geometries)
+            invalid_count += invalid
+
+        out_features = []
+        for feature, geometry in zip(chunk, geometries):
+            out_feature = QgsFeature()
+            if geometry:
+                out_feature.setGeometry(QgsGeometry(geometry))
+            out_feature.setAttributes(feature.attributes())
+            out_features.append(out_feature)
+        data_provider.addFeatures(out_features)
+
+    if invalid_count:
+        LOGGER.info(
+            '%s geometries in the aggregation layer are still invalid after '
+            'cleaning.' % invalid_count)
+
+    memory_without_index = (
+        target.providerType() == 'memory' and
+        'index=yes' not in data_provider.dataSourceUri())
+    if memory_without_index and (
+            data_provider.capabilities() &
+            QgsVectorDataProvider.CreateSpatialIndex):
+        data_provider.createSpatialIndex()
+
+    target.updateExtents()
+    # The layer index is not notified of changes made with the provider.
+    invalidate_layer_index(target)
 
 
 @profile
@@ -236,6 +283,56 @@ def remove_fields(layer, fields_to_remove):
     layer.updateFields()
 
 
+def numeric_column(values):
+    """Convert attribute values to a NumPy array with a mask for NULL.
+
+    NULL, empty strings and any value which is not a number are masked.
+
+    :param values: List of attribute values.
+    :type values: list
+
+    :return: The column as floats.
+    :rtype: numpy.ma.MaskedArray
+
+    .. versionadded:: 4.2
+    """
+    column = numpy.empty(len(values), dtype=float)
+    for i, value in enumerate(values):
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError):
+            column[i] = numpy.nan
+    return numpy.ma.masked_invalid(column)
+
+
+@profile
+def write_columns(layer, feature_ids, columns):
+    """Write whole columns in a vector layer with a single provider call.
+
+    Masked values are written as NULL. The layer must not be in edit mode.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param feature_ids: The feature ids, in the same order as the columns.
+    :type feature_ids: list
+
+    :param columns: Field index -> values. Values can be a masked array.
+    :type columns: dict
+    """
+    columns = [
+        (index, numpy.ma.asarray(values).tolist(fill_value=None))
+        for index, values in columns.iteritems()]
+    changes = {}
+    for i, feature_id in enumerate(feature_ids):
+        changes[feature_id] = dict(
+            (index, values[i]) for index, values in columns)
+    layer.dataProvider().changeAttributeValues(changes)
+
+    # The layer index is not notified of changes made with the provider.
+    invalidate_layer_index(layer)
+
+
 @profile
 def create_spatial_index(layer):
     """Helper function to create the spatial index on a vector layer.
@@ -307,6 +404,166 @@ def read_dynamic_inasafe_field(inasafe_fields, dynamic_field):
     return unique_exposure
 
 
+# WGS84 ellipsoid, used by the size calculator.
+WGS84_SEMI_MAJOR_AXIS = 6378137.0
+WGS84_ECCENTRICITY_SQUARED = 0.00669437999014
+
+# Number of coordinates for the ISO WKB dimension code (type // 1000).
+WKB_ISO_DIMENSIONS = {0: 2, 1: 3, 2: 3, 3: 4}
+
+
+def wkb_coordinate_blocks(wkb):
+    """Find the sequences of coordinates of a WKB geometry.
+
+    Only linear geometries are supported. The coordinates can be read, or
+    changed in a copy of the WKB, without parsing the WKB again.
+
+    :param wkb: The WKB.
+    :type wkb: str
+
+    :return: List of tuples with the position of the first coordinate in
+        the WKB, the number of points, the number of coordinates per point,
+        the byte order ('<' or '>') and the ring number: -1 for a point, 0
+        for a line or an exterior ring, more than 0 for a hole.
+    :rtype: list
+
+    :raises: ValueError if the geometry type is not supported.
+
+    .. versionadded:: 4.2
+    """
+    blocks, _ = _read_wkb(wkb, 0)
+    return blocks
+
+
+def _wkb_parts(wkb):
+    """Read the lines and the rings of a WKB geometry.
+
+    Only linear geometries are supported. Z and M values are dropped.
+
+    :param wkb: The WKB.
+    :type wkb: str
+
+    :return: List of tuples with the X and Y coordinates of a line or a ring
+        as an array of shape (n, 2), and True if the ring is a hole.
+    :rtype: list
+
+    :raises: ValueError if the geometry type is not supported.
+    """
+    parts = []
+    for offset, count, dimensions, byte_order, ring in (
+            wkb_coordinate_blocks(wkb)):
+        if ring < 0:
+            continue
+        points = numpy.frombuffer(
+            wkb, dtype=byte_order + 'f8', count=count * dimensions,
+            offset=offset).reshape(count, dimensions)[:, :2]
+        parts.append((points, ring > 0))
+    return parts
+
+
+def _read_wkb(wkb, offset):
+    """Recursive helper for `wkb_coordinate_blocks`.
+
+    :return: The coordinate blocks and the position after the geometry.
+    :rtype: (list, int)
+    """
+    byte_order = '<' if ord(wkb[offset]) == 1 else '>'
+    wkb_type = struct.unpack_from(byte_order + 'I', wkb, offset + 1)[0]
+    offset += 5
+
+    # QGIS 2.5D and EWKB flags, then ISO codes.
+    dimensions = 2
+    if wkb_type & 0x80000000:
+        dimensions += 1
+    if wkb_type & 0x40000000:
+        dimensions += 1
+    if wkb_type & 0x20000000:
+        # EWKB SRID
+        offset += 4
+    wkb_type &= 0x0fffffff
+    dimensions += WKB_ISO_DIMENSIONS.get(wkb_type // 1000, 2) - 2
+    wkb_type %= 1000
+
+    def read_count(position):
+        return struct.unpack_from(byte_order + 'I', wkb, position)[0]
+
+    blocks = []
+    if wkb_type == 1:
+        blocks.append((offset, 1, dimensions, byte_order, -1))
+        offset += 8 * dimensions
+    elif wkb_type == 2:
+        count = read_count(offset)
+        blocks.append((offset + 4, count, dimensions, byte_order, 0))
+        offset += 4 + 8 * count * dimensions
+    elif wkb_type == 3:
+        rings = read_count(offset)
+        offset += 4
+        for ring in range(rings):
+            count = read_count(offset)
+            blocks.append((offset + 4, count, dimensions, byte_order, ring))
+            offset += 4 + 8 * count * dimensions
+    elif wkb_type in (4, 5, 6, 7):
+        count = read_count(offset)
+        offset += 4
+        for _ in range(count):
+            sub_blocks, offset = _read_wkb(wkb, offset)
+            blocks.extend(sub_blocks)
+    else:
+        raise ValueError('WKB type %s is not supported.' % wkb_type)
+    return blocks, offset
+
+
+def _measure_parts(coordinates, is_line):
+    """Measure lines or rings given in WGS84 on the ellipsoid.
+
+    :param coordinates: List of arrays of longitudes and latitudes.
+    :type coordinates: list
+
+    :param is_line: True to measure lengths, False for areas.
+    :type is_line: bool
+
+    :return: The length in metres or the unsigned area in square metres of
+        each part.
+    :rtype: numpy.ndarray
+    """
+    a = WGS84_SEMI_MAJOR_AXIS
+    e2 = WGS84_ECCENTRICITY_SQUARED
+
+    counts = [len(part) for part in coordinates]
+    points = numpy.radians(numpy.concatenate(coordinates))
+    longitude = points[:, 0]
+    latitude = points[:, 1]
+    part_ids = numpy.repeat(numpy.arange(len(coordinates)), counts)
+
+    # Segments between two consecutive vertices of the same part.
+    same_part = part_ids[1:] == part_ids[:-1]
+    segment_parts = part_ids[:-1][same_part]
+    delta_longitude = (longitude[1:] - longitude[:-1])[same_part]
+
+    if is_line:
+        middle = ((latitude[1:] + latitude[:-1]) / 2)[same_part]
+        delta_latitude = (latitude[1:] - latitude[:-1])[same_part]
+        w = 1 - e2 * numpy.sin(middle) ** 2
+        meridian_radius = a * (1 - e2) / w ** 1.5
+        normal_radius = a / numpy.sqrt(w)
+        segments = numpy.hypot(
+            meridian_radius * delta_latitude,
+            normal_radius * numpy.cos(middle) * delta_longitude)
+        return numpy.bincount(
+            segment_parts, weights=segments, minlength=len(coordinates))
+
+    # Area = a^2 / 2 * integral of q(latitude) d(longitude)
+    e = numpy.sqrt(e2)
+    sin_latitude = numpy.sin(latitude)
+    q = (1 - e2) * (
+        sin_latitude / (1 - e2 * sin_latitude ** 2) -
+        numpy.log((1 - e * sin_latitude) / (1 + e * sin_latitude)) / (2 * e))
+    segments = delta_longitude * ((q[1:] + q[:-1]) / 2)[same_part]
+    return numpy.abs(numpy.bincount(
+        segment_parts, weights=segments,
+        minlength=len(coordinates))) * a * a / 2
+
+
 class SizeCalculator(object):
 
     """Special object to handle size calculation with an output unit."""
@@ -322,6 +579,7 @@ class SizeCalculator(object):
         :param exposure_key: The geometry type of the layer.
         :type exposure_key: qgis.core.QgsWkbTypes.GeometryType
         """
+        self.crs = coordinate_reference_system
         self.calculator = QgsDistanceArea()
         self.calculator.setSourceCrs(coordinate_reference_system)
         self.calculator.setEllipsoid('WGS84')
@@ -350,6 +608,24 @@ class SizeCalculator(object):
         :return: The geometric size in the expected exposure unit.
         :rtype: float
         """
+        feature_size = round(self._measure(geometry))
+
+        if self.output_unit:
+            if self.output_unit != self.default_unit:
+                feature_size = convert_unit(
+                    feature_size, self.default_unit, self.output_unit)
+
+        return feature_size
+
+    def _measure(self, geometry):
+        """Measure a geometry with the QGIS calculator, in the default unit.
+
+        :param geometry: The geometry.
+        :type geometry: QgsGeometry
+
+        :return: The geometric size, not rounded.
+        :rtype: float
+        """
         message = 'Size with NaN value : geometry valid={valid}, WKT={wkt}'
         feature_size = 0
         if geometry.isMultipart():
@@ -378,12 +654,80 @@ class SizeCalculator(object):
                 LOGGER.debug(message.format(
                     valid=geometry.isGeosValid(),
                     wkt=geometry.exportToWkt()))
+        return feature_size
+
+    @profile
+    def measure_many(self, geometries):
+        """Measure the length or the area of many geometries at once.
 
-        feature_size = round(feature_size)
+        The geometries are reprojected to WGS84 and all their vertices are
+        packed in NumPy arrays, so the sizes are computed in a few vector
+        operations instead of one QGIS call per part:
+
+        * an area is the integral of the authalic latitude function along the
+          rings, like QgsDistanceArea does in ellipsoidal mode.
+        * a length is the sum of segments measured with the radii of
+          curvature of the ellipsoid at the middle of each segment.
+
+        Tolerance: before rounding, the sizes agree with `measure` within
+        0.01 % for segments shorter than 10 km. After rounding, a size can
+        then differ by one unit from `measure`. A geometry which cannot be
+        read as linear WKB, like a curve, is measured with `measure`.
+
+        :param geometries: List of geometries. A geometry can be None.
+        :type geometries: list
+
+        :return: The geometric sizes in the expected exposure unit.
+        :rtype: numpy.ndarray
+
+        .. versionadded:: 4.2
+        """
+        is_line = self.geometry_type == QgsWKBTypes.LineGeometry
+        wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+        transform = None
+        if self.crs != wgs84:
+            transform = QgsCoordinateTransform(self.crs, wgs84)
+
+        sizes = numpy.zeros(len(geometries))
+        coordinates = []
+        owners = []
+        holes = []
+        for i, geometry in enumerate(geometries):
+            if geometry is None or geometry.isEmpty():
+                continue
+            wgs84_geometry = geometry
+            if transform:
+                wgs84_geometry = QgsGeometry(geometry)
+                wgs84_geometry.transform(transform)
+            try:
+                parts = _wkb_parts(wgs84_geometry.asWkb())
+            except ValueError:
+                sizes[i] = self._measure(geometry)
+                continue
+            for part, is_hole in parts:
+                if len(part) > 1:
+                    coordinates.append(part)
+                    owners.append(i)
+                    holes.append(is_hole)
+
+        if coordinates:
+            part_sizes = numpy.abs(_measure_parts(coordinates, is_line))
+            if not is_line:
+                part_sizes[numpy.array(holes)] *= -1
+            invalid = numpy.isnan(part_sizes)
+            if invalid.any():
+                LOGGER.debug(
+                    'Size with NaN value for {count} parts'.format(
+                        count=invalid.sum()))
+                part_sizes[invalid] = 0
+            sizes += numpy.bincount(
+                owners, weights=part_sizes, minlength=len(geometries))
+
+        sizes = numpy.round(sizes)
 
         if self.output_unit:
             if self.output_unit != self.default_unit:
-                feature_size = convert_unit(
-                    feature_size, self.default_unit, self.output_unit)
+                sizes = convert_unit(
+                    sizes, self.default_unit, self.output_unit)
 
-        return feature_size
+        return sizes
@@ -1,8 +1,10 @@
 # coding=utf-8
 
-"""Clip and mask a hazard layer."""
+"""Union of a hazard layer and an aggregation layer."""
 
 import logging
+
+from osgeo import ogr
 from PyQt4.QtCore import QPyNullVariant
 from qgis.core import (
     QGis,
@@ -16,10 +18,12 @@ from safe.utilities.i18n import tr
 from safe.definitions.processing_steps import union_steps
 from safe.definitions.fields import hazard_class_field, aggregation_id_field
 from safe.definitions.hazard_classifications import not_exposed_class
-from safe.gis.vector.tools import (
-    create_memory_layer, wkb_type_groups, create_spatial_index)
+from safe.gis.vector.tools import create_memory_layer, wkb_type_groups
+from safe.gis.vector.layer_index import layer_index
 from safe.gis.vector.clean_geometry import geometry_checker
 from safe.gis.sanity_check import check_layer
+from safe.utilities.parallel import (
+    parallel_map, process_count, split_in_chunks)
 from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -30,6 +34,83 @@ __revision__ = '$Format:%H$'
 
 LOGGER = logging.getLogger('InaSAFE')
 
+# Number of chunks per process, so a slow chunk does not delay the others.
+CHUNKS_PER_PROCESS = 4
+
+
+def _polygon_parts(geometry):
+    """Get the polygonal parts of an OGR geometry, made valid.
+
+    :param geometry: The OGR geometry.
+    :type geometry: ogr.Geometry
+
+    :return: The polygons or multipolygons in the geometry. The members of
+        a geometry collection are returned separately.
+    :rtype: list
+    """
+    if geometry is None or geometry.IsEmpty():
+        return []
+
+    geometry_type = ogr.GT_Flatten(geometry.GetGeometryType())
+    if geometry_type == ogr.wkbGeometryCollection:
+        parts = []
+        for i in range(geometry.GetGeometryCount()):
+            parts.extend(_polygon_parts(geometry.GetGeometryRef(i).Clone()))
+        return parts
+    if geometry_type not in (ogr.wkbPolygon, ogr.wkbMultiPolygon):
+        return []
+    if not geometry.IsValid():
+        geometry = geometry.Buffer(0)
+        if geometry is None or geometry.IsEmpty():
+            return []
+    return [geometry]
+
+
+def _union_chunk(chunk):
+    """Overlay a chunk of aggregation areas with the hazard, in a worker.
+
+    Each aggregation area is cut by the hazard areas intersecting it. The
+    part of the aggregation area not covered by the hazard is kept too.
+
+    :param chunk: The WKB of the hazard areas by row and the list of
+        aggregation areas as (row, WKB, rows of the candidate hazard areas).
+    :type chunk: tuple
+
+    :return: List of (hazard row or None, aggregation row, WKB).
+    :rtype: list
+    """
+    hazard_wkbs, areas = chunk
+    hazards = {}
+
+    results = []
+    for aggregation_row, wkb, candidates in areas:
+        aggregation = ogr.CreateGeometryFromWkb(wkb)
+        covered = ogr.Geometry(ogr.wkbMultiPolygon)
+        for hazard_row in candidates:
+            hazard = hazards.get(hazard_row)
+            if hazard is None:
+                hazard = ogr.CreateGeometryFromWkb(hazard_wkbs[hazard_row])
+                hazards[hazard_row] = hazard
+            if not aggregation.Intersects(hazard):
+                continue
+
+            for part in _polygon_parts(aggregation.Intersection(hazard)):
+                results.append(
+                    (hazard_row, aggregation_row, part.ExportToWkb()))
+                if ogr.GT_Flatten(part.GetGeometryType()) == ogr.wkbPolygon:
+                    covered.AddGeometry(part)
+                else:
+                    for i in range(part.GetGeometryCount()):
+                        covered.AddGeometry(part.GetGeometryRef(i))
+
+        # The remaining bit of the aggregation area.
+        remainder = aggregation
+        if covered.GetGeometryCount():
+            remainder = aggregation.Difference(covered.UnionCascaded())
+        for part in _polygon_parts(remainder):
+            results.append((None, aggregation_row, part.ExportToWkb()))
+    return results
+
 
 @profile
 def union(union_a, union_b, callback=None):
@@ -37,14 +118,19 @@ def union(union_a, union_b, callback=None):
 
     Issue https://github.com/inasafe/inasafe/issues/3186
 
-    Note : This algorithm is copied from :
-    https://github.com/qgis/QGIS/blob/master/python/plugins/processing/algs/
-    qgis/Union.py
+    The output has a feature for each intersection of a hazard area with an
+    aggregation area and a feature for the part of each aggregation area not
+    covered by the hazard. The parts of the hazard outside of the aggregation
+    are not written, they have no aggregation id.
 
-    :param union_a: The vector layer for the union.
+    The overlay is computed per aggregation area with OGR, so only one area
+    and the hazard areas around it are needed at once. The aggregation areas
+    are processed in chunks in worker processes.
+
+    :param union_a: The vector layer for the union, the hazard.
     :type union_a: QgsVectorLayer
 
-    :param union_b: The vector layer for the union.
+    :param union_b: The vector layer for the union, the aggregation.
     :type union_b: QgsVectorLayer
 
     :param callback: A function to all to indicate progress. The function
@@ -57,8 +143,97 @@ def union(union_a, union_b, callback=None):
 
     .. versionadded:: 4.0
     """
-    output_layer_name = union_steps['output_layer_name']
     processing_step = union_steps['step_name']
+    writer, not_null_field_index = _create_union_layer(union_a, union_b)
+
+    # Indexes hold valid geometries, shared with the other algorithms using
+    # the same layers.
+    hazard_index = layer_index(union_a)
+    aggregation_index = layer_index(union_b)
+
+    hazard_rows = {}
+    hazard_attributes = []
+    hazard_wkbs = []
+    for feature_id, feature in sorted(hazard_index.features().iteritems()):
+        if feature.geometry():
+            hazard_rows[feature_id] = len(hazard_wkbs)
+            hazard_wkbs.append(feature.geometry().asWkb())
+            hazard_attributes.append(feature.attributes())
+
+    length = len(union_a.fields())
+    aggregation_attributes = []
+    items = []
+    for feature_id, feature in sorted(
+            aggregation_index.features().iteritems()):
+        attributes = [None] * length + feature.attributes()
+        compulsary_field = attributes[not_null_field_index]
+        if not compulsary_field or isinstance(
+                compulsary_field, QPyNullVariant):
+            # We don't want feature without a compulsary field.
+            continue
+        geometry = feature.geometry()
+        if not geometry:
+            continue
+        candidates = [
+            hazard_rows[i]
+            for i in hazard_index.intersects(geometry.boundingBox())]
+        items.append((
+            len(aggregation_attributes),
+            geometry.asWkb(),
+            sorted(candidates)))
+        aggregation_attributes.append(feature.attributes())
+
+    # Only the WKB of the hazard areas used by a chunk are sent with it.
+    chunks = []
+    for chunk in split_in_chunks(items, process_count() * CHUNKS_PER_PROCESS):
+        rows = set(row for item in chunk for row in item[2])
+        chunks.append(
+            (dict((row, hazard_wkbs[row]) for row in rows), chunk))
+
+    out_features = []
+    processed = 0
+    for (_, chunk), results in zip(
+            chunks, parallel_map(_union_chunk, chunks)):
+        for hazard_row, aggregation_row, wkb in results:
+            if hazard_row is None:
+                attributes = [None] * length
+            else:
+                attributes = list(hazard_attributes[hazard_row])
+            attributes.extend(aggregation_attributes[aggregation_row])
+
+            geometry = QgsGeometry()
+            geometry.fromWkb(bytes(wkb))
+            out_feature = QgsFeature()
+            out_feature.setGeometry(geometry)
+            out_feature.setAttributes(attributes)
+            out_features.append(out_feature)
+
+        processed += len(chunk)
+        if callback:
+            callback(
+                current=processed, maximum=len(items), step=processing_step)
+
+    writer.dataProvider().addFeatures(out_features)
+
+    fill_hazard_class(writer)
+
+    check_layer(writer)
+    return writer
+
+
+def _create_union_layer(union_a, union_b):
+    """Create the output layer of the union, with its keywords.
+
+    :param union_a: The vector layer for the union, the hazard.
+    :type union_a: QgsVectorLayer
+
+    :param union_b: The vector layer for the union, the aggregation.
+    :type union_b: QgsVectorLayer
+
+    :return: The memory layer and the index of the aggregation id field.
+    :rtype: (QgsVectorLayer, int)
+    """
+    output_layer_name = union_steps['output_layer_name']
     output_layer_name = output_layer_name % (
         union_a.keywords['layer_purpose'],
         union_b.keywords['layer_purpose']
@@ -90,6 +265,39 @@ def union(union_a, union_b, callback=None):
     skip_field = inasafe_fields_union_2[aggregation_id_field['key']]
     not_null_field_index = writer.fieldNameIndex(skip_field)
 
+    return writer, not_null_field_index
+
+
+@profile
+def processing_union(union_a, union_b, callback=None):
+    """Union of two vector layers, copied from the Processing plugin.
+
+    This was the implementation of `union` before InaSAFE 4.2. It unions and
+    diffs the whole geometries feature by feature. It is kept as a reference
+    to check the results of `union`.
+
+    Note : This algorithm is copied from :
+    https://github.com/qgis/QGIS/blob/master/python/plugins/processing/algs/
+    qgis/Union.py
+
+    :param union_a: The vector layer for the union.
+    :type union_a: QgsVectorLayer
+
+    :param union_b: The vector layer for the union.
+    :type union_b: QgsVectorLayer
+
+    :param callback: A function to all to indicate progress. The function
+        should accept params 'current' (int), 'maximum' (int) and 'step' (str).
+        Defaults to None.
+    :type callback: function
+
+    :return: The clip vector layer.
+    :rtype: QgsVectorLayer
+
+    .. versionadded:: 4.2
+    """
+    writer, not_null_field_index = _create_union_layer(union_a, union_b)
+
     writer.startEditing()
 
     # Begin copy/paste from Processing plugin.
@@ -97,8 +305,10 @@ def union(union_a, union_b, callback=None):
     # The code below is not following our coding standards because we want to
     # be able to track any diffs from QGIS easily.
 
-    index_a = create_spatial_index(union_b)
-    index_b = create_spatial_index(union_a)
+    # Indexes also hold valid geometries and prepared geometries, shared
+    # by both passes and by the other algorithms using the same layers.
+    index_a = layer_index(union_b)
+    index_b = layer_index(union_a)
 
     count = 0
     n_element = 0
@@ -108,7 +318,7 @@ def union(union_a, union_b, callback=None):
         # progress.setPercentage(nElement / float(nFeat) * 50)
         n_element += 1
         list_intersecting_b = []
-        geom = geometry_checker(in_feat_a.geometry())
+        geom = index_b.feature(in_feat_a.id()).geometry()
         at_map_a = in_feat_a.attributes()
         intersects = index_a.intersects(geom.boundingBox())
         if len(intersects) < 1:
@@ -121,16 +331,14 @@ def union(union_a, union_b, callback=None):
                     tr('Feature geometry error: One or more output features '
                        'ignored due to invalid geometry.'))
         else:
-            request = QgsFeatureRequest().setFilterFids(intersects)
-
-            engine = QgsGeometry.createGeometryEngine(geom.geometry())
-            engine.prepareGeometry()
+            engine = index_b.engine(in_feat_a.id())
 
-            for in_feat_b in union_b.getFeatures(request):
+            for fid in intersects:
+                in_feat_b = index_a.feature(fid)
                 count += 1
 
                 at_map_b = in_feat_b.attributes()
-                tmp_geom = geometry_checker(in_feat_b.geometry())
+                tmp_geom = in_feat_b.geometry()
 
                 if engine.intersects(tmp_geom.geometry()):
                     int_geom = geometry_checker(geom.intersection(tmp_geom))
@@ -226,19 +434,19 @@ def union(union_a, union_b, callback=None):
     for in_feat_a in union_b.getFeatures():
         # progress.setPercentage(nElement / float(nFeat) * 100)
         add = False
-        geom = geometry_checker(in_feat_a.geometry())
+        geom = index_a.feature(in_feat_a.id()).geometry()
         atMap = [None] * length
         atMap.extend(in_feat_a.attributes())
         intersects = index_b.intersects(geom.boundingBox())
         lstIntersectingA = []
 
         for id in intersects:
-            request = QgsFeatureRequest().setFilterFid(id)
-            inFeatB = union_a.getFeatures(request).next()
+            inFeatB = index_b.feature(id)
             atMapB = inFeatB.attributes()
-            tmpGeom = QgsGeometry(geometry_checker(inFeatB.geometry()))
+            tmpGeom = QgsGeometry(inFeatB.geometry())
 
-            if geom.intersects(tmpGeom):
+            # Reuse the prepared geometries of the first pass.
+            if index_b.engine(id).intersects(geom.geometry()):
                 lstIntersectingA.append(tmpGeom)
 
         if len(lstIntersectingA) == 0:
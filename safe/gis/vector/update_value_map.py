@@ -2,7 +2,8 @@
 
 """Reclassify a continuous vector layer."""
 
-from qgis.core import QgsField
+import numpy
+from qgis.core import QgsField, QgsFeatureRequest
 
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import (
@@ -14,7 +15,7 @@ from safe.definitions.fields import (
 from safe.definitions.layer_purposes import (
     layer_purpose_hazard, layer_purpose_exposure)
 from safe.definitions.processing_steps import assign_inasafe_values_steps
-from safe.gis.vector.tools import remove_fields
+from safe.gis.vector.tools import remove_fields, write_columns
 from safe.gis.sanity_check import check_layer
 from safe.utilities.metadata import (
     active_thresholds_value_maps, active_classification)
@@ -94,23 +95,28 @@ def update_value_map(layer, exposure_key=None, callback=None):
     classified_field.setLength(new_field['length'])
     classified_field.setPrecision(new_field['precision'])
 
-    layer.startEditing()
-    layer.addAttribute(classified_field)
-
+    # Factorise the source column: each distinct value is classified once.
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([unclassified_index])
+    feature_ids = []
+    codes = []
+    unique_values = {}
+    for feature in layer.getFeatures(request):
+        feature_ids.append(feature.id())
+        source_value = feature.attributes()[unclassified_index]
+        codes.append(
+            unique_values.setdefault(source_value, len(unique_values)))
+
+    classes = numpy.empty(len(unique_values), dtype=object)
+    for source_value, code in unique_values.iteritems():
+        classes[code] = reversed_value_map.get(source_value) or ''
+
+    layer.dataProvider().addAttributes([classified_field])
+    layer.updateFields()
     classified_field_index = layer.fieldNameIndex(classified_field.name())
 
-    for feature in layer.getFeatures():
-        attributes = feature.attributes()
-        source_value = attributes[unclassified_index]
-        classified_value = reversed_value_map.get(source_value)
-
-        if not classified_value:
-            classified_value = ''
-
-        layer.changeAttributeValue(
-            feature.id(), classified_field_index, classified_value)
-
-    layer.commitChanges()
+    write_columns(layer, feature_ids, {
+        classified_field_index: classes[numpy.array(codes, dtype=int)]})
 
     remove_fields(layer, [unclassified_column])
 
@@ -4,7 +4,7 @@
 
 import os
 from collections import OrderedDict
-from PyQt4.QtCore import QDir, Qt
+from PyQt4.QtCore import Qt
 from qgis.core import QgsMapLayerRegistry, QgsProject, QgsMapLayer, QGis
 
 from safe.definitions.utilities import definition, update_template_component
@@ -50,14 +50,9 @@ def generate_impact_report(impact_function, iface):
         extra_layers=extra_layers)
 
     # generate report folder
-
-    # no other option for now
-    # TODO: retrieve the information from data store
-    if isinstance(impact_function.datastore.uri, QDir):
-        layer_dir = impact_function.datastore.uri.absolutePath()
-    else:
-        # No other way for now
-        return
+    # For a folder, it's the folder itself. For a GeoPackage, it's the folder
+    # containing the file.
+    layer_dir = impact_function.datastore.uri_path
 
     # We will generate it on the fly without storing it after datastore
     # supports
@@ -103,14 +98,9 @@ def generate_impact_map_report(impact_function, iface):
         impact_function.impact.extent()
 
     # generate report folder
-
-    # no other option for now
-    # TODO: retrieve the information from data store
-    if isinstance(impact_function.datastore.uri, QDir):
-        layer_dir = impact_function.datastore.uri.absolutePath()
-    else:
-        # No other way for now
-        return
+    # For a folder, it's the folder itself. For a GeoPackage, it's the folder
+    # containing the file.
+    layer_dir = impact_function.datastore.uri_path
 
     # We will generate it on the fly without storing it after datastore
     # supports
@@ -146,14 +136,9 @@ def generate_infographic_report(impact_function, iface):
         impact_function.impact.extent()
 
     # generate report folder
-
-    # no other option for now
-    # TODO: retrieve the information from data store
-    if isinstance(impact_function.datastore.uri, QDir):
-        layer_dir = impact_function.datastore.uri.absolutePath()
-    else:
-        # No other way for now
-        return
+    # For a folder, it's the folder itself. For a GeoPackage, it's the folder
+    # containing the file.
+    layer_dir = impact_function.datastore.uri_path
 
     # We will generate it on the fly without storing it after datastore
     # supports
@@ -345,6 +345,12 @@ def content():
             'file:///%s/img/icons/'
             'add-test-layers.svg' % resources_path(),
             **SMALL_ICON_STYLE)))
+    bullets.add(m.Text(
+        m.ImportantText(tr('Directories of layers indexed in the catalog')),
+        tr(' - The layer files in these directories are described in a local '
+           'catalog when QGIS starts, with their keywords. The wizard reads '
+           'the catalog instead of opening each layer. Use the path '
+           'separator of your system between two directories.')))
     message.add(bullets)
 
     return message
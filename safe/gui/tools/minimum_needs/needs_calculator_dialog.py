@@ -156,7 +156,8 @@ class NeedsCalculatorDialog(QtGui.QDialog, FORM_CLASS):
             output_layer_name,
             input_layer.geometryType(),
             input_layer.crs(),
-            input_layer.fields())
+            input_layer.fields(),
+            spatial_index=False)
 
         # monkey patching input layer to make it work with
         # prepare vector layer function
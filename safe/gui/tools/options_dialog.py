@@ -2,6 +2,7 @@
 """InaSAFE Options Dialog"""
 
 import logging
+import os
 # This import is to enable SIP API V2
 # noinspection PyUnresolvedReferences
 import qgis  # pylint: disable=unused-import
@@ -106,6 +107,7 @@ class OptionsDialog(QDialog, FORM_CLASS):
             'ISO19115_URL': self.iso19115_url_le,
             'ISO19115_EMAIL': self.iso19115_email_le,
             'ISO19115_LICENSE': self.iso19115_license_le,
+            'layer_catalog_directories': self.leLayerCatalogDirectories,
         }
 
         # Set up things for context help
@@ -379,6 +381,30 @@ class OptionsDialog(QDialog, FORM_CLASS):
             self.tr('Sqlite DB File (*.db)'))
         self.leKeywordCachePath.setText(file_name)
 
+    # noinspection PyPep8Naming
+    @pyqtSignature('')  # prevents actions being handled twice
+    def on_toolLayerCatalogDirectories_clicked(self):
+        """Auto-connect slot activated when layer catalog directories tool
+        button is clicked.
+
+        .. versionadded:: 4.2
+        """
+        # noinspection PyCallByClass,PyTypeChecker
+        dir_name = QFileDialog.getExistingDirectory(
+            self,
+            self.tr('Directory of layers'),
+            '',
+            QFileDialog.ShowDirsOnly)
+        if not dir_name:
+            return
+        directories = [
+            directory for directory in
+            self.leLayerCatalogDirectories.text().split(os.pathsep)
+            if directory]
+        if dir_name not in directories:
+            directories.append(dir_name)
+        self.leLayerCatalogDirectories.setText(os.pathsep.join(directories))
+
     # noinspection PyPep8Naming
     @pyqtSignature('')  # prevents actions being handled twice
     def on_toolUserDirectoryPath_clicked(self):
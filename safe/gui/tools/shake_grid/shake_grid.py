@@ -23,30 +23,31 @@ import os
 import sys
 import shutil
 import logging
+import threading
 import codecs
+import hashlib
+import json
+import numpy
 import pytz
 from xml.dom import minidom
 from datetime import datetime
 from pytz import timezone
 from subprocess import call, CalledProcessError
-from osgeo import gdal, ogr
+from osgeo import gdal, ogr, osr
 from osgeo.gdalconst import GA_ReadOnly
 # This import is required to enable PyQt API v2
 # noinspection PyUnresolvedReferences
 # pylint: disable=unused-import
 import qgis
 # pylint: enable=unused-import
-from qgis.core import (
-    QgsVectorLayer,
-    QgsFeatureRequest,
-    QgsRectangle,
-    QgsRasterLayer)
+from qgis.core import QgsRectangle, QgsRasterLayer
 from safe.common.utilities import which, romanise
 from safe.common.exceptions import (
     GridXmlFileNotFoundError,
     GridXmlParseError,
     ContourCreationError,
     InvalidLayerError)
+from safe.gis.vector.tools import wkb_coordinate_blocks
 from safe.utilities.styling import mmi_colour
 from safe.utilities.keyword_io import KeywordIO
 from safe.utilities.i18n import tr
@@ -62,6 +63,85 @@ from safe.definitions.versions import inasafe_keyword_version
 
 LOGGER = logging.getLogger('InaSAFE')
 
+# The products of an event and the products they are built from. A product
+# using an algorithm is built from the products using the same algorithm.
+PRODUCT_DEPENDENCIES = {
+    'csv': [],
+    'vrt': ['csv'],
+    'raster': ['vrt'],
+    'shapefile': ['vrt'],
+    'contours': ['raster'],
+}
+ALGORITHM_PRODUCTS = ['raster', 'contours']
+
+
+def contour_properties(coordinates, line_sizes):
+    """Compute the label position and the length of contour lines.
+
+    The coordinates of all lines are packed in a single array, the lines
+    are read using their number of points.
+
+    :param coordinates: X and Y of all points, as an array of shape (n, 2).
+    :type coordinates: numpy.ndarray
+
+    :param line_sizes: Number of points of each line. Each line has at least
+        one point.
+    :type line_sizes: numpy.ndarray
+
+    :returns: For each line, the X in the middle of the line extent, the
+        minimum Y and the length.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+
+    .. versionadded:: 4.2
+    """
+    if len(line_sizes) == 0:
+        empty = numpy.zeros(0)
+        return empty, empty, empty
+
+    starts = numpy.zeros(len(line_sizes), dtype=int)
+    starts[1:] = numpy.cumsum(line_sizes)[:-1]
+    x_min = numpy.minimum.reduceat(coordinates[:, 0], starts)
+    x_max = numpy.maximum.reduceat(coordinates[:, 0], starts)
+    y_min = numpy.minimum.reduceat(coordinates[:, 1], starts)
+    x = x_min + ((x_max - x_min) / 2)
+
+    # Segments between the last point of a line and the first point of the
+    # next line are not counted.
+    segments = numpy.hypot(
+        numpy.diff(coordinates[:, 0]), numpy.diff(coordinates[:, 1]))
+    line_index = numpy.repeat(numpy.arange(len(line_sizes)), line_sizes)
+    same_line = line_index[1:] == line_index[:-1]
+    lengths = numpy.bincount(
+        line_index[1:][same_line],
+        weights=segments[same_line],
+        minlength=len(line_sizes))
+
+    return x, y_min, lengths
+
+
+def product_key(name, algorithm=None):
+    """The key of a product of an event.
+
+    :param name: The product name, one of PRODUCT_DEPENDENCIES.
+    :type name: str
+
+    :param algorithm: The algorithm, 'nearest' if None. It is ignored for
+        the products which do not use one.
+    :type algorithm: str
+
+    :returns: The product name and the algorithm.
+    :rtype: tuple
+
+    .. versionadded:: 4.2
+    """
+    if name not in PRODUCT_DEPENDENCIES:
+        raise KeyError('Unknown ShakeMap product %s' % name)
+    if name not in ALGORITHM_PRODUCTS:
+        return name, None
+    if algorithm is None:
+        algorithm = 'nearest'
+    return name, algorithm
+
 
 def data_dir():
     """Return the path to the standard data dir for e.g. geonames data
@@ -148,6 +228,9 @@ class ShakeGrid(object):
             self.output_basename = output_basename
         self.algorithm_name = algorithm_filename_flag
         self.grid_xml_path = grid_xml_path
+        self.event_id = None
+        self._grid_digest = None
+        self._products_lock = threading.Lock()
         self.parse_grid_xml()
 
     def extract_date_time(self, the_time_stamp):
@@ -255,6 +338,11 @@ class ShakeGrid(object):
         grid_path = self.grid_file_path()
         try:
             document = minidom.parse(grid_path)
+            grid_element = document.getElementsByTagName('shakemap_grid')[0]
+            if grid_element.hasAttribute('event_id'):
+                self.event_id = grid_element.attributes['event_id'].nodeValue
+            else:
+                self.event_id = os.path.basename(grid_path)
             event_element = document.getElementsByTagName('event')
             event_element = event_element[0]
             self.magnitude = float(
@@ -371,24 +459,7 @@ class ShakeGrid(object):
               ogr2ogr -select mmi -a_srs EPSG:4326 mmi.shp mmi.vrt mmi
         """
         LOGGER.debug('mmi_to_delimited_text requested.')
-
-        csv_path = os.path.join(
-            self.output_dir, 'mmi.csv')
-        # short circuit if the csv is already created.
-        if os.path.exists(csv_path) and force_flag is not True:
-            return csv_path
-        csv_file = file(csv_path, 'w')
-        csv_file.write(self.mmi_to_delimited_text())
-        csv_file.close()
-
-        # Also write the .csvt which contains metadata about field types
-        csvt_path = os.path.join(
-            self.output_dir, self.output_basename + '.csvt')
-        csvt_file = file(csvt_path, 'w')
-        csvt_file.write('"Real","Real","Real"')
-        csvt_file.close()
-
-        return csv_path
+        return self.build_products([('csv', None)], force_flag)[0]
 
     def mmi_to_vrt(self, force_flag=True):
         """Save the mmi_data to an ogr vrt text file.
@@ -402,33 +473,8 @@ class ShakeGrid(object):
 
         :raises: None
         """
-        # Ensure the delimited mmi file exists
         LOGGER.debug('mmi_to_vrt requested.')
-
-        vrt_path = os.path.join(
-            self.output_dir,
-            self.output_basename + '.vrt')
-
-        # short circuit if the vrt is already created.
-        if os.path.exists(vrt_path) and force_flag is not True:
-            return vrt_path
-
-        csv_path = self.mmi_to_delimited_file(True)
-
-        vrt_string = (
-            '<OGRVRTDataSource>'
-            '  <OGRVRTLayer name="mmi">'
-            '    <SrcDataSource>%s</SrcDataSource>'
-            '    <GeometryType>wkbPoint</GeometryType>'
-            '    <GeometryField encoding="PointFromColumns"'
-            '                      x="lon" y="lat" z="mmi"/>'
-            '  </OGRVRTLayer>'
-            '</OGRVRTDataSource>' % csv_path)
-
-        with codecs.open(vrt_path, 'w', encoding='utf-8') as f:
-            f.write(vrt_string)
-
-        return vrt_path
+        return self.build_products([('vrt', None)], force_flag)[0]
 
     def _run_command(self, command):
         """Run a command and raise any error as needed.
@@ -501,24 +547,318 @@ class ShakeGrid(object):
           -ot Float16 -l mmi mmi.vrt mmi-trippy.tif
         """
         LOGGER.debug('mmi_to_raster requested.')
+        return self.build_products([('raster', algorithm)], force_flag)[0]
+
+    def mmi_to_shapefile(self, force_flag=False):
+        """Convert grid.xml's mmi column to a vector shp file using ogr2ogr.
+
+        An ESRI shape file will be created.
 
-        if algorithm is None:
-            algorithm = 'nearest'
+        :param force_flag: bool (Optional). Whether to force the regeneration
+            of the output file. Defaults to False.
 
+        :return: Path to the resulting tif file.
+        :rtype: str
+
+        Example of the ogr2ogr call we generate::
+
+           ogr2ogr -select mmi -a_srs EPSG:4326 mmi.shp mmi.vrt mmi
+
+        .. note:: It is assumed that ogr2ogr is in your path.
+        """
+        LOGGER.debug('mmi_to_shapefile requested.')
+        return self.build_products([('shapefile', None)], force_flag)[0]
+
+    def mmi_to_contours(self, force_flag=True, algorithm='nearest'):
+        """Extract contours from the event's tif file.
+
+        Contours are extracted at a 0.5 MMI interval. The resulting file will
+        be saved in the extract directory. In the easiest use case you can
+
+        :param force_flag:  (Optional). Whether to force the
+         regeneration of contour product. Defaults to False.
+        :type force_flag: bool
+
+        :param algorithm: (Optional) Which interpolation algorithm to
+                  use to create the underlying raster. Defaults to 'nearest'.
+        :type algorithm: str
+         **Only enforced if theForceFlag is true!**
+
+        :returns: An absolute filesystem path pointing to the generated
+            contour geopackage.
+        :exception: ContourCreationError
+
+         simply do::
+
+           shake_grid = ShakeGrid()
+           contour_path = shake_grid.mmi_to_contours()
+
+        which will return the contour dataset for the latest event on the
+        ftp server.
+        """
+        LOGGER.debug('mmi_to_contours requested.')
+        return self.build_products([('contours', algorithm)], force_flag)[0]
+
+    def build_products(self, products, force_flag=False):
+        """Build several products of the event, each one at most once.
+
+        The products and the products they are built from form a graph, see
+        PRODUCT_DEPENDENCIES. A product is built only if its inputs changed
+        since it was last built: the digest of its inputs, starting from the
+        content of the grid.xml, is recorded in the products file of the
+        output directory. Independent products, for instance the rasters of
+        two algorithms, are built concurrently.
+
+        For example, to get the contours of two algorithms::
+
+           nearest, invdist = shake_grid.build_products(
+               [('contours', 'nearest'), ('contours', 'invdist')])
+
+        :param products: List of products to build as tuples of the product
+            name and the algorithm. The algorithm is ignored for the products
+            which do not use one.
+        :type products: list
+
+        :param force_flag: Whether to force the regeneration of the products
+            and of their inputs, even if their inputs did not change.
+        :type force_flag: bool
+
+        :returns: The paths of the products, in the same order.
+        :rtype: list
+
+        .. versionadded:: 4.2
+        """
+        keys = [product_key(name, algorithm) for name, algorithm in products]
+        build = {
+            'force_flag': force_flag,
+            'lock': threading.Lock(),
+            'locks': {},
+            'products': {},
+        }
+        errors = []
+
+        def build_product(key):
+            try:
+                self._build_product(build, key)
+            except Exception:  # pylint: disable=broad-except
+                errors.append(sys.exc_info())
+
+        unique_keys = sorted(set(keys))
         if self.algorithm_name:
-            tif_path = os.path.join(
-                self.output_dir, '%s-%s.tif' % (
-                    self.output_basename, algorithm))
+            parallel_keys = unique_keys[1:]
         else:
-            tif_path = os.path.join(
-                self.output_dir, '%s.tif' % self.output_basename)
-        # short circuit if the tif is already created.
-        if os.path.exists(tif_path) and force_flag is not True:
-            return tif_path
+            # The rasters of all algorithms are written in the same file, so
+            # the products of each algorithm are built one after the other.
+            parallel_keys = []
+        threads = [
+            threading.Thread(target=build_product, args=(key, ))
+            for key in parallel_keys]
+        for thread in threads:
+            thread.start()
+        # The other products are built in this thread.
+        for key in unique_keys:
+            if key not in parallel_keys:
+                build_product(key)
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            error_type, error, traceback = errors[0]
+            raise error_type, error, traceback
+
+        return [build['products'][key][0] for key in keys]
+
+    def _build_product(self, build, key):
+        """Build a product of the event and its inputs if needed.
+
+        :param build: The state of the current build, shared between threads.
+        :type build: dict
+
+        :param key: The product name and the algorithm.
+        :type key: tuple
+
+        :returns: The path of the product and the digest of its inputs.
+        :rtype: (str, str)
+        """
+        with build['lock']:
+            lock = build['locks'].setdefault(key, threading.Lock())
+
+        # The graph has no cycle, so two threads can not wait for each other.
+        with lock:
+            if key in build['products']:
+                return build['products'][key]
+
+            name, algorithm = key
+            input_paths = []
+            digest = hashlib.sha1(repr(key))
+            if not PRODUCT_DEPENDENCIES[name]:
+                digest.update(self.grid_digest())
+            for dependency in PRODUCT_DEPENDENCIES[name]:
+                input_path, input_digest = self._build_product(
+                    build, product_key(dependency, algorithm))
+                input_paths.append(input_path)
+                digest.update(input_digest)
+            digest = digest.hexdigest()
+
+            path = self.product_path(name, algorithm)
+            # The digest is recorded for the file, because several products
+            # can share the same file. The digest contains the product key.
+            file_name = os.path.basename(path)
+            up_to_date = (
+                not build['force_flag'] and
+                os.path.exists(path) and
+                self._product_digests().get(file_name) == digest)
+            if up_to_date:
+                LOGGER.debug('%s is up to date.' % path)
+            else:
+                builder = getattr(self, '_write_%s' % name)
+                builder(path, algorithm, *input_paths)
+                self._save_product_digest(file_name, digest)
+
+            build['products'][key] = path, digest
+            return path, digest
+
+    def grid_digest(self):
+        """The digest of the content of the grid.xml.
+
+        :returns: The SHA1 hexadecimal digest.
+        :rtype: str
+
+        .. versionadded:: 4.2
+        """
+        if self._grid_digest is None:
+            digest = hashlib.sha1()
+            with open(self.grid_file_path(), 'rb') as grid_file:
+                for block in iter(lambda: grid_file.read(2 ** 20), b''):
+                    digest.update(block)
+            self._grid_digest = digest.hexdigest()
+        return self._grid_digest
+
+    def product_path(self, name, algorithm=None):
+        """The path of a product of the event.
+
+        :param name: The product name, one of PRODUCT_DEPENDENCIES.
+        :type name: str
+
+        :param algorithm: The algorithm, for the products using one.
+        :type algorithm: str
+
+        :returns: The absolute file system path to the product.
+        :rtype: str
+
+        .. versionadded:: 4.2
+        """
+        _, algorithm = product_key(name, algorithm)
+        if name == 'raster' and self.algorithm_name:
+            file_name = '%s-%s.tif' % (self.output_basename, algorithm)
+        elif name == 'raster':
+            file_name = '%s.tif' % self.output_basename
+        elif name == 'contours':
+            file_name = '%s-contours-%s.gpkg' % (
+                self.output_basename, algorithm)
+        elif name == 'shapefile':
+            file_name = '%s-points.shp' % self.output_basename
+        else:
+            file_name = '%s.%s' % (self.output_basename, name)
+        return os.path.join(self.output_dir, file_name)
+
+    def _products_file_path(self):
+        """The path of the file with the digests of the products."""
+        return os.path.join(
+            self.output_dir, '%s-products.json' % self.output_basename)
+
+    def _product_digests(self):
+        """The digests of the inputs of the products built for the event.
+
+        :returns: The digest for each product file name.
+        :rtype: dict
+        """
+        with self._products_lock:
+            try:
+                with open(self._products_file_path()) as products_file:
+                    events = json.load(products_file)
+            except (IOError, ValueError):
+                return {}
+        return events.get(self.event_id, {})
+
+    def _save_product_digest(self, file_name, digest):
+        """Record the digest of the inputs of a product which is built.
+
+        :param file_name: The file name of the product.
+        :type file_name: str
+
+        :param digest: The digest of the inputs.
+        :type digest: str
+        """
+        with self._products_lock:
+            try:
+                with open(self._products_file_path()) as products_file:
+                    events = json.load(products_file)
+            except (IOError, ValueError):
+                events = {}
+            events.setdefault(self.event_id, {})[file_name] = digest
+            with open(self._products_file_path(), 'w') as products_file:
+                json.dump(events, products_file, indent=2)
+
+    def _write_csv(self, csv_path, algorithm):
+        """Write the delimited text file, see mmi_to_delimited_file.
+
+        :param csv_path: The path of the file.
+        :type csv_path: str
+
+        :param algorithm: Not used.
+        :type algorithm: None
+        """
+        csv_file = file(csv_path, 'w')
+        csv_file.write(self.mmi_to_delimited_text())
+        csv_file.close()
+
+        # Also write the .csvt which contains metadata about field types
+        csvt_path = os.path.splitext(csv_path)[0] + '.csvt'
+        csvt_file = file(csvt_path, 'w')
+        csvt_file.write('"Real","Real","Real"')
+        csvt_file.close()
+
+    def _write_vrt(self, vrt_path, algorithm, csv_path):
+        """Write the ogr vrt file, see mmi_to_vrt.
+
+        :param vrt_path: The path of the file.
+        :type vrt_path: str
 
-        # Ensure the vrt mmi file exists (it will generate csv too if needed)
-        vrt_path = self.mmi_to_vrt(force_flag)
+        :param algorithm: Not used.
+        :type algorithm: None
 
+        :param csv_path: The path of the delimited text file.
+        :type csv_path: str
+        """
+        # OGR names the layer of a CSV file after the file name.
+        csv_layer = os.path.splitext(os.path.basename(csv_path))[0]
+        vrt_string = (
+            '<OGRVRTDataSource>'
+            '  <OGRVRTLayer name="mmi">'
+            '    <SrcDataSource>%s</SrcDataSource>'
+            '    <SrcLayer>%s</SrcLayer>'
+            '    <GeometryType>wkbPoint</GeometryType>'
+            '    <GeometryField encoding="PointFromColumns"'
+            '                      x="lon" y="lat" z="mmi"/>'
+            '  </OGRVRTLayer>'
+            '</OGRVRTDataSource>' % (csv_path, csv_layer))
+
+        with codecs.open(vrt_path, 'w', encoding='utf-8') as f:
+            f.write(vrt_string)
+
+    def _write_raster(self, tif_path, algorithm, vrt_path):
+        """Write the raster, see mmi_to_raster.
+
+        :param tif_path: The path of the raster.
+        :type tif_path: str
+
+        :param algorithm: Which re-sampling algorithm to use.
+        :type algorithm: str
+
+        :param vrt_path: The path of the ogr vrt file.
+        :type vrt_path: str
+        """
         # now generate the tif using default nearest neighbour interpolation
         # options. This gives us the same output as the mi.grd generated by
         # the earthquake server.
@@ -559,47 +899,22 @@ class ShakeGrid(object):
         self.create_keyword_file(algorithm)
 
         # Lastly copy over the standard qml (QGIS Style file) for the mmi.tif
-        if self.algorithm_name:
-            qml_path = os.path.join(
-                self.output_dir, '%s-%s.qml' % (
-                    self.output_basename, algorithm))
-        else:
-            qml_path = os.path.join(
-                self.output_dir, '%s.qml' % self.output_basename)
+        qml_path = os.path.splitext(tif_path)[0] + '.qml'
         qml_source_path = os.path.join(data_dir(), 'mmi.qml')
         shutil.copyfile(qml_source_path, qml_path)
-        return tif_path
 
-    def mmi_to_shapefile(self, force_flag=False):
-        """Convert grid.xml's mmi column to a vector shp file using ogr2ogr.
+    def _write_shapefile(self, shp_path, algorithm, vrt_path):
+        """Write the point shapefile, see mmi_to_shapefile.
 
-        An ESRI shape file will be created.
+        :param shp_path: The path of the shapefile.
+        :type shp_path: str
 
-        :param force_flag: bool (Optional). Whether to force the regeneration
-            of the output file. Defaults to False.
+        :param algorithm: Not used.
+        :type algorithm: None
 
-        :return: Path to the resulting tif file.
-        :rtype: str
-
-        Example of the ogr2ogr call we generate::
-
-           ogr2ogr -select mmi -a_srs EPSG:4326 mmi.shp mmi.vrt mmi
-
-        .. note:: It is assumed that ogr2ogr is in your path.
+        :param vrt_path: The path of the ogr vrt file.
+        :type vrt_path: str
         """
-        LOGGER.debug('mmi_to_shapefile requested.')
-
-        shp_path = os.path.join(
-            self.output_dir, '%s-points.shp' % self.output_basename)
-        # Short circuit if the tif is already created.
-        if os.path.exists(shp_path) and force_flag is not True:
-            return shp_path
-
-        # Ensure the vrt mmi file exists (it will generate csv too if needed)
-        vrt_path = self.mmi_to_vrt(force_flag)
-
-        # now generate the tif using default interpolation options
-
         binary_list = which('ogr2ogr')
         LOGGER.debug('Path for ogr2ogr: %s' % binary_list)
         if len(binary_list) < 1:
@@ -620,97 +935,44 @@ class ShakeGrid(object):
         self._run_command(command)
 
         # Lastly copy over the standard qml (QGIS Style file) for the mmi.tif
-        qml_path = os.path.join(
-            self.output_dir, '%s-points.qml' % self.output_basename)
+        qml_path = os.path.splitext(shp_path)[0] + '.qml'
         source_qml = os.path.join(data_dir(), 'mmi-shape.qml')
         shutil.copyfile(source_qml, qml_path)
-        return shp_path
 
-    def mmi_to_contours(self, force_flag=True, algorithm='nearest'):
-        """Extract contours from the event's tif file.
+    def _write_contours(self, output_file, algorithm, tif_path):
+        """Write the contours, see mmi_to_contours.
 
-        Contours are extracted at a 0.5 MMI interval. The resulting file will
-        be saved in the extract directory. In the easiest use case you can
+        :param output_file: The path of the geopackage.
+        :type output_file: str
 
-        :param force_flag:  (Optional). Whether to force the
-         regeneration of contour product. Defaults to False.
-        :type force_flag: bool
-
-        :param algorithm: (Optional) Which interpolation algorithm to
-                  use to create the underlying raster. Defaults to 'nearest'.
+        :param algorithm: Which re-sampling algorithm was used for the raster.
         :type algorithm: str
-         **Only enforced if theForceFlag is true!**
-
-        :returns: An absolute filesystem path pointing to the generated
-            contour dataset.
-        :exception: ContourCreationError
-
-         simply do::
 
-           shake_grid = ShakeGrid()
-           contour_path = shake_grid.mmi_to_contours()
+        :param tif_path: The path of the raster.
+        :type tif_path: str
 
-        which will return the contour dataset for the latest event on the
-        ftp server.
+        :raise: ContourCreationError
         """
-        LOGGER.debug('mmi_to_contours requested.')
-        # TODO: Use sqlite rather?
-        output_file_base = os.path.join(
-            self.output_dir,
-            '%s-contours-%s.' % (self.output_basename, algorithm))
-        output_file = output_file_base + 'shp'
-        if os.path.exists(output_file) and force_flag is not True:
-            return output_file
-        elif os.path.exists(output_file):
+        if os.path.exists(output_file):
             try:
-                os.remove(output_file_base + 'shp')
-                os.remove(output_file_base + 'shx')
-                os.remove(output_file_base + 'dbf')
-                os.remove(output_file_base + 'prj')
+                os.remove(output_file)
             except OSError:
                 LOGGER.exception(
                     'Old contour files not deleted'
                     ' - this may indicate a file permissions issue.')
 
-        tif_path = self.mmi_to_raster(force_flag, algorithm)
         # Based largely on
         # http://svn.osgeo.org/gdal/trunk/autotest/alg/contour.py
-        driver = ogr.GetDriverByName('ESRI Shapefile')
-        ogr_dataset = driver.CreateDataSource(output_file)
-        if ogr_dataset is None:
-            # Probably the file existed and could not be overriden
-            raise ContourCreationError(
-                'Could not create datasource for:\n%s. Check that the file '
-                'does not already exist and that you do not have file system '
-                'permissions issues' % output_file)
-        layer = ogr_dataset.CreateLayer('contour')
+        # The contours are generated in memory. The final layer is written
+        # once, with all its attributes, by set_contour_properties.
+        memory_driver = ogr.GetDriverByName('Memory')
+        memory_dataset = memory_driver.CreateDataSource('contours')
+        layer = memory_dataset.CreateLayer(
+            'contour', geom_type=ogr.wkbLineString)
         field_definition = ogr.FieldDefn('ID', ogr.OFTInteger)
         layer.CreateField(field_definition)
         field_definition = ogr.FieldDefn('MMI', ogr.OFTReal)
         layer.CreateField(field_definition)
-        # So we can fix the x pos to the same x coord as centroid of the
-        # feature so labels line up nicely vertically
-        field_definition = ogr.FieldDefn('X', ogr.OFTReal)
-        layer.CreateField(field_definition)
-        # So we can fix the y pos to the min y coord of the whole contour so
-        # labels line up nicely vertically
-        field_definition = ogr.FieldDefn('Y', ogr.OFTReal)
-        layer.CreateField(field_definition)
-        # So that we can set the html hex colour based on its MMI class
-        field_definition = ogr.FieldDefn('RGB', ogr.OFTString)
-        layer.CreateField(field_definition)
-        # So that we can set the label in it roman numeral form
-        field_definition = ogr.FieldDefn('ROMAN', ogr.OFTString)
-        layer.CreateField(field_definition)
-        # So that we can set the label horizontal alignment
-        field_definition = ogr.FieldDefn('ALIGN', ogr.OFTString)
-        layer.CreateField(field_definition)
-        # So that we can set the label vertical alignment
-        field_definition = ogr.FieldDefn('VALIGN', ogr.OFTString)
-        layer.CreateField(field_definition)
-        # So that we can set feature length to filter out small features
-        field_definition = ogr.FieldDefn('LEN', ogr.OFTReal)
-        layer.CreateField(field_definition)
 
         tif_dataset = gdal.Open(tif_path, GA_ReadOnly)
         # see http://gdal.org/java/org/gdal/gdal/gdal.html for these options
@@ -738,100 +1000,142 @@ class ShakeGrid(object):
             raise ContourCreationError(str(e))
         finally:
             del tif_dataset
-            ogr_dataset.Release()
 
-        # Copy over the standard .prj file since ContourGenerate does not
-        # create a projection definition
-        qml_path = os.path.join(
-            self.output_dir,
-            '%s-contours-%s.prj' % (self.output_basename, algorithm))
-        source_qml = os.path.join(data_dir(), 'mmi-contours.prj')
-        shutil.copyfile(source_qml, qml_path)
+        # Now write the contours with the additional columns - X, Y, ROMAN
+        # and RGB
+        try:
+            self.set_contour_properties(layer, output_file)
+        finally:
+            memory_dataset.Release()
 
         # Lastly copy over the standard qml (QGIS Style file)
-        qml_path = os.path.join(
-            self.output_dir,
-            '%s-contours-%s.qml' % (self.output_basename, algorithm))
+        qml_path = os.path.splitext(output_file)[0] + '.qml'
         source_qml = os.path.join(data_dir(), 'mmi-contours.qml')
         shutil.copyfile(source_qml, qml_path)
 
-        # Now update the additional columns - X,Y, ROMAN and RGB
-        try:
-            self.set_contour_properties(output_file)
-        except InvalidLayerError:
-            raise
+    def set_contour_properties(self, contour_layer, output_file):
+        """Write the contours with their X, Y, RGB, ROMAN attributes.
 
-        return output_file
+        The attributes of all contours are computed at once from their
+        packed coordinates.
 
-    def set_contour_properties(self, input_file):
-        """Set the X, Y, RGB, ROMAN attributes of the contour layer.
+        :param contour_layer: The OGR layer with the ID and MMI of the
+            contours.
+        :type contour_layer: ogr.Layer
 
-        :param input_file: (Required) Name of the contour layer.
-        :type input_file: str
+        :param output_file: Path of the geopackage to create.
+        :type output_file: str
 
-        :raise: InvalidLayerError if anything is amiss with the layer.
+        :raise: ContourCreationError if the geopackage can not be created.
         """
-        LOGGER.debug('set_contour_properties requested for %s.' % input_file)
-        layer = QgsVectorLayer(input_file, 'mmi-contours', "ogr")
-        if not layer.isValid():
-            raise InvalidLayerError(input_file)
-
-        layer.startEditing()
-        # Now loop through the db adding selected features to mem layer
-        request = QgsFeatureRequest()
-        fields = layer.dataProvider().fields()
-
-        for feature in layer.getFeatures(request):
-            if not feature.isValid():
+        LOGGER.debug('set_contour_properties requested for %s.' % output_file)
+
+        features = []
+        coordinates = []
+        line_sizes = []
+        for feature in contour_layer:
+            geometry = feature.GetGeometryRef()
+            # The coordinates are read from the WKB, without a Python tuple
+            # per point.
+            wkb = geometry.ExportToWkb() if geometry else None
+            points = [
+                numpy.frombuffer(
+                    wkb, dtype=byte_order + 'f8', count=count * dimensions,
+                    offset=offset).reshape(count, dimensions)[:, :2]
+                for offset, count, dimensions, byte_order, _ in (
+                    wkb_coordinate_blocks(wkb) if wkb else [])]
+            line_size = sum(len(part) for part in points)
+            if not line_size:
                 LOGGER.debug('Skipping feature')
                 continue
-            # Work out x and y
-            line = feature.geometry().asPolyline()
-            y = line[0].y()
-
-            x_max = line[0].x()
-            x_min = x_max
-            for point in line:
-                if point.y() < y:
-                    y = point.y()
-                x = point.x()
-                if x < x_min:
-                    x_min = x
-                if x > x_max:
-                    x_max = x
-            x = x_min + ((x_max - x_min) / 2)
-
-            # Get length
-            length = feature.geometry().length()
-
-            mmi_value = float(feature['MMI'])
-            # We only want labels on the whole number contours
+            features.append(feature)
+            coordinates.extend(points)
+            line_sizes.append(line_size)
+
+        mmi = numpy.array(
+            [feature.GetField('MMI') for feature in features], dtype=float)
+        if coordinates:
+            coordinates = numpy.concatenate(coordinates)
+        x, y, lengths = contour_properties(
+            numpy.array(coordinates, dtype=float).reshape(-1, 2),
+            numpy.array(line_sizes, dtype=int))
+
+        # Only a few MMI levels, so we compute the labels once per level.
+        # We only want labels on the whole number contours.
+        romans = {}
+        colours = {}
+        for mmi_value in set(mmi.tolist()):
             if mmi_value != round(mmi_value):
-                roman = ''
+                romans[mmi_value] = ''
             else:
-                roman = romanise(mmi_value)
-
+                romans[mmi_value] = romanise(mmi_value)
             # RGB from http://en.wikipedia.org/wiki/Mercalli_intensity_scale
-            rgb = mmi_colour(mmi_value)
-
-            # Now update the feature
-            feature_id = feature.id()
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('X'), x)
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('Y'), y)
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('RGB'), rgb)
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('ROMAN'), roman)
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('ALIGN'), 'Center')
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('VALIGN'), 'HALF')
-            layer.changeAttributeValue(
-                feature_id, fields.indexFromName('LEN'), length)
-
-        layer.commitChanges()
+            colours[mmi_value] = mmi_colour(mmi_value)
+
+        driver = ogr.GetDriverByName('GPKG')
+        ogr_dataset = driver.CreateDataSource(output_file)
+        if ogr_dataset is None:
+            # Probably the file existed and could not be overriden
+            raise ContourCreationError(
+                'Could not create datasource for:\n%s. Check that the file '
+                'does not already exist and that you do not have file system '
+                'permissions issues' % output_file)
+        # ContourGenerate does not set the projection, the grid is in WGS84.
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+        layer = ogr_dataset.CreateLayer('contour', srs, ogr.wkbLineString)
+        field_definition = ogr.FieldDefn('ID', ogr.OFTInteger)
+        layer.CreateField(field_definition)
+        field_definition = ogr.FieldDefn('MMI', ogr.OFTReal)
+        layer.CreateField(field_definition)
+        # So we can fix the x pos to the same x coord as centroid of the
+        # feature so labels line up nicely vertically
+        field_definition = ogr.FieldDefn('X', ogr.OFTReal)
+        layer.CreateField(field_definition)
+        # So we can fix the y pos to the min y coord of the whole contour so
+        # labels line up nicely vertically
+        field_definition = ogr.FieldDefn('Y', ogr.OFTReal)
+        layer.CreateField(field_definition)
+        # So that we can set the html hex colour based on its MMI class
+        field_definition = ogr.FieldDefn('RGB', ogr.OFTString)
+        layer.CreateField(field_definition)
+        # So that we can set the label in it roman numeral form
+        field_definition = ogr.FieldDefn('ROMAN', ogr.OFTString)
+        layer.CreateField(field_definition)
+        # So that we can set the label horizontal alignment
+        field_definition = ogr.FieldDefn('ALIGN', ogr.OFTString)
+        layer.CreateField(field_definition)
+        # So that we can set the label vertical alignment
+        field_definition = ogr.FieldDefn('VALIGN', ogr.OFTString)
+        layer.CreateField(field_definition)
+        # So that we can set feature length to filter out small features
+        field_definition = ogr.FieldDefn('LEN', ogr.OFTReal)
+        layer.CreateField(field_definition)
+
+        layer_definition = layer.GetLayerDefn()
+        ogr_dataset.StartTransaction()
+        try:
+            for i, feature in enumerate(features):
+                mmi_value = mmi[i]
+                new_feature = ogr.Feature(layer_definition)
+                new_feature.SetGeometry(feature.GetGeometryRef())
+                new_feature.SetField('ID', feature.GetField('ID'))
+                new_feature.SetField('MMI', mmi_value)
+                new_feature.SetField('X', x[i])
+                new_feature.SetField('Y', y[i])
+                new_feature.SetField('RGB', colours[mmi_value])
+                new_feature.SetField('ROMAN', romans[mmi_value])
+                new_feature.SetField('ALIGN', 'Center')
+                new_feature.SetField('VALIGN', 'HALF')
+                new_feature.SetField('LEN', lengths[i])
+                layer.CreateFeature(new_feature)
+        except RuntimeError as e:
+            ogr_dataset.RollbackTransaction()
+            ogr_dataset.Release()
+            LOGGER.exception('Contour creation failed')
+            raise ContourCreationError(str(e))
+        ogr_dataset.CommitTransaction()
+        ogr_dataset.Release()
 
     def create_keyword_file(self, algorithm):
         """Create keyword file for the raster file created.
@@ -896,7 +1200,8 @@ def convert_mmi_data(
         source,
         output_path=None,
         algorithm=None,
-        algorithm_filename_flag=True):
+        algorithm_filename_flag=True,
+        products=None):
     """Convenience function to convert a single file.
 
     :param grid_xml_path: Path to the xml shake grid file.
@@ -919,8 +1224,14 @@ def convert_mmi_data(
         output file's name.
     :type algorithm_filename_flag: bool
 
-    :returns: A path to the resulting raster file.
-    :rtype: str
+    :param products: Other products of the event to build in the same call,
+        as tuples of the product name and the algorithm, for instance
+        [('contours', 'invdist')]. See ShakeGrid.build_products.
+    :type products: list
+
+    :returns: A path to the resulting raster file. If products are given,
+        the list of the raster path followed by the paths of the products.
+    :rtype: str, list
     """
     LOGGER.debug(grid_xml_path)
     LOGGER.debug(output_path)
@@ -939,4 +1250,7 @@ def convert_mmi_data(
         output_dir=output_dir,
         output_basename=output_basename,
         algorithm_filename_flag=algorithm_filename_flag)
-    return converter.mmi_to_raster(force_flag=True, algorithm=algorithm)
+    if products is None:
+        return converter.mmi_to_raster(force_flag=True, algorithm=algorithm)
+    return converter.build_products(
+        [('raster', algorithm)] + list(products), force_flag=True)
@@ -21,12 +21,17 @@ import os
 import unittest
 import shutil
 
+import numpy
+
 from qgis.core import QgsVectorLayer
-from safe.common.utilities import unique_filename, temp_dir
+from safe.common.utilities import unique_filename, temp_dir, romanise
 from safe.test.utilities import standard_data_path, get_qgis_app
 from safe.gui.tools.shake_grid.shake_grid import (
     ShakeGrid,
-    convert_mmi_data)
+    contour_properties,
+    convert_mmi_data,
+    product_key)
+from safe.utilities.styling import mmi_colour
 
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 # Parse the grid once and use it for all tests to fasten the tests
@@ -193,10 +198,25 @@ class ShakeGridTest(unittest.TestCase):
             force_flag=True, algorithm='invdist')
         self.assertTrue(self.check_feature_count(file_path, 16))
         self.assertTrue(os.path.exists(file_path))
-        expected_qml = file_path.replace('shp', 'qml')
+        expected_qml = file_path.replace('gpkg', 'qml')
         message = '%s not found' % expected_qml
         self.assertTrue(os.path.exists(expected_qml), message)
 
+        layer = QgsVectorLayer(file_path, 'Contours', 'ogr')
+        for feature in layer.getFeatures():
+            mmi = feature['MMI']
+            self.assertEqual(feature['RGB'], mmi_colour(mmi))
+            if mmi == round(mmi):
+                self.assertEqual(feature['ROMAN'], romanise(mmi))
+            else:
+                self.assertEqual(feature['ROMAN'], '')
+            geometry = feature.geometry()
+            self.assertAlmostEqual(feature['LEN'], geometry.length())
+            self.assertAlmostEqual(
+                feature['Y'], geometry.boundingBox().yMinimum())
+            self.assertAlmostEqual(
+                feature['X'], geometry.boundingBox().center().x())
+
         file_path = SHAKE_GRID.mmi_to_contours(
             force_flag=True, algorithm='nearest')
         self.assertTrue(self.check_feature_count(file_path, 132))
@@ -204,6 +224,97 @@ class ShakeGridTest(unittest.TestCase):
             force_flag=True, algorithm='average')
         self.assertTrue(self.check_feature_count(file_path, 132))
 
+    def test_build_products(self):
+        """Test the products are built once and only if needed."""
+        output_dir = temp_dir('test_build_products')
+        shake_grid = ShakeGrid(
+            'Test Title', 'Test Source', GRID_PATH, output_dir=output_dir)
+        self.assertEqual(shake_grid.event_id, '20131105060809')
+
+        products = [
+            ('contours', 'nearest'),
+            ('contours', 'invdist'),
+            ('raster', None),
+            ('shapefile', 'nearest')]
+        paths = shake_grid.build_products(products)
+        self.assertEqual(paths, [
+            shake_grid.product_path('contours', 'nearest'),
+            shake_grid.product_path('contours', 'invdist'),
+            shake_grid.product_path('raster', 'nearest'),
+            shake_grid.product_path('shapefile')])
+        for path in paths:
+            self.assertTrue(os.path.exists(path), '%s not found' % path)
+
+        # The inputs did not change, nothing is built again, even with a new
+        # converter for the same event.
+        modified_times = [os.path.getmtime(path) for path in paths]
+        os.utime(paths[0], (0, 0))
+        shake_grid = ShakeGrid(
+            'Test Title', 'Test Source', GRID_PATH, output_dir=output_dir)
+        self.assertEqual(shake_grid.build_products(products), paths)
+        self.assertEqual(os.path.getmtime(paths[0]), 0)
+        self.assertEqual(
+            [os.path.getmtime(path) for path in paths[1:]],
+            modified_times[1:])
+
+        # Only the contours are built again if they were removed.
+        os.remove(paths[1])
+        shake_grid.mmi_to_contours(force_flag=False, algorithm='invdist')
+        self.assertTrue(os.path.exists(paths[1]))
+        self.assertEqual(os.path.getmtime(paths[2]), modified_times[2])
+
+        self.assertEqual(product_key('vrt', 'invdist'), ('vrt', None))
+        self.assertEqual(product_key('raster'), ('raster', 'nearest'))
+        self.assertRaises(KeyError, product_key, 'pdf')
+
+    def test_output_basename(self):
+        """Test the products with another basename than mmi."""
+        output_raster = unique_filename(
+            prefix='quake', suffix='.tif', dir=temp_dir('test'))
+        raster_path, shapefile_path = convert_mmi_data(
+            GRID_PATH,
+            'Earthquake',
+            'USGS',
+            output_raster,
+            algorithm_filename_flag=False,
+            products=[('shapefile', None)])
+        self.assertEqual(output_raster, raster_path)
+        self.assertTrue(os.path.exists(raster_path))
+        # The points are read from the CSV named after the basename.
+        layer = QgsVectorLayer(shapefile_path, 'Points', 'ogr')
+        self.assertTrue(layer.isValid())
+        self.assertGreater(layer.featureCount(), 0)
+
+        # Without the algorithm in the file name, both algorithms write the
+        # same raster, so the raster of the other algorithm is built again.
+        output_dir, basename = os.path.split(output_raster)
+        shake_grid = ShakeGrid(
+            'Earthquake',
+            'USGS',
+            GRID_PATH,
+            output_dir=output_dir,
+            output_basename=os.path.splitext(basename)[0],
+            algorithm_filename_flag=False)
+        os.utime(raster_path, (0, 0))
+        self.assertEqual(
+            [raster_path],
+            shake_grid.build_products([('raster', 'nearest')]))
+        self.assertEqual(os.path.getmtime(raster_path), 0)
+        shake_grid.build_products([('raster', 'invdist')])
+        self.assertNotEqual(os.path.getmtime(raster_path), 0)
+
+    def test_contour_properties(self):
+        """Test the label position and the length of packed contours."""
+        coordinates = numpy.array([
+            # First line
+            [0, 1], [3, 5], [4, 5],
+            # Second line
+            [10, 10], [10, 8]], dtype=float)
+        x, y, lengths = contour_properties(coordinates, numpy.array([3, 2]))
+        self.assertEqual(x.tolist(), [2, 10])
+        self.assertEqual(y.tolist(), [1, 8])
+        self.assertEqual(lengths.tolist(), [6, 2])
+
     @unittest.skipIf(
         os.environ.get('ON_TRAVIS', False), 'Slow test, skipped on travis')
     def test_convert_grid_to_raster(self):
@@ -13,20 +13,34 @@ Contact : ole.moller.nielsen@gmail.com
 
 """
 
+import logging
+
 from PyQt4.QtGui import QSortFilterProxyModel
 
+LOGGER = logging.getLogger('InaSAFE')
+
 
 class LayerBrowserProxyModel(QSortFilterProxyModel):
 
     """Proxy model for hiding unsupported branches in the layer browser."""
 
-    def __init__(self, parent):
+    def __init__(self, parent, layer_purpose=None, layer_catalog=None):
         """Constructor for the model.
 
         :param parent: Parent widget of this model.
         :type parent: QWidget
+
+        :param layer_purpose: The layer purpose of the layers to show. The
+            layer files with another layer purpose in the layer catalog are
+            hidden.
+        :type layer_purpose: basestring
+
+        :param layer_catalog: The layer catalog.
+        :type layer_catalog: safe.utilities.layer_catalog.LayerCatalog
         """
         QSortFilterProxyModel.__init__(self, parent)
+        self.layer_purpose = layer_purpose
+        self.layer_catalog = layer_catalog
 
     def filterAcceptsRow(self, source_row, source_parent):
         """The filter method
@@ -41,7 +55,8 @@ class LayerBrowserProxyModel(QSortFilterProxyModel):
            QgsOWSRootItem, QgsWCSRootItem, QgsWFSRootItem, QgsWMSRootItem.
 
            Disabled leaf items: QgsLayerItem and QgsOgrLayerItem with path
-           ending with '.xml'
+           ending with '.xml'. Layer files with another layer purpose in the
+           layer catalog, if a layer purpose is set.
 
         :param source_row: Parent widget of the model
         :type source_row: int
@@ -70,4 +85,20 @@ class LayerBrowserProxyModel(QSortFilterProxyModel):
         if item.path().endswith('.xml'):
             return False
 
+        if self.layer_purpose and self.layer_catalog and (
+                item.metaObject().className() in [
+                    'QgsLayerItem', 'QgsGdalLayerItem', 'QgsOgrLayerItem']):
+            # Only the layers already in the catalog, it is too slow to
+            # describe the other ones while browsing.
+            # noinspection PyBroadException
+            try:
+                record = self.layer_catalog.record(
+                    item.path(), describe=False)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Could not read the layer catalog.')
+                record = None
+            if record and record['layer_purpose'] and (
+                    record['layer_purpose'] != self.layer_purpose):
+                return False
+
         return True
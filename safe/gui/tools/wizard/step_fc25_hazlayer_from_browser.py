@@ -30,6 +30,7 @@ class StepFcHazLayerFromBrowser(WizardStepBrowser, FORM_CLASS):
 
         """
         WizardStepBrowser.__init__(self, parent)
+        self.proxy_model.layer_purpose = 'hazard'
         self.tvBrowserHazard.setModel(self.proxy_model)
         self.tvBrowserHazard.selectionModel().selectionChanged.connect(
             self.tvBrowserHazard_selection_changed)
@@ -32,6 +32,7 @@ class StepFcExpLayerFromBrowser(WizardStepBrowser, FORM_CLASS):
         :type parent: QWidget
         """
         WizardStepBrowser.__init__(self, parent)
+        self.proxy_model.layer_purpose = 'exposure'
         self.tvBrowserExposure.setModel(self.proxy_model)
         self.tvBrowserExposure.selectionModel().selectionChanged.connect(
             self.tvBrowserExposure_selection_changed)
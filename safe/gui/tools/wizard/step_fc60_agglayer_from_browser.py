@@ -31,6 +31,7 @@ class StepFcAggLayerFromBrowser(WizardStepBrowser, FORM_CLASS):
 
         """
         WizardStepBrowser.__init__(self, parent)
+        self.proxy_model.layer_purpose = 'aggregation'
         self.tvBrowserAggregation.setModel(self.proxy_model)
         self.tvBrowserAggregation.selectionModel().selectionChanged.connect(
             self.tvBrowserAggregation_selection_changed)
@@ -7,6 +7,8 @@ import logging
 from PyQt4 import QtCore
 from PyQt4.QtGui import QListWidgetItem, QAbstractItemView
 
+from safe.utilities.column_statistics import (
+    column_statistics, prefetch_column_statistics)
 from safe.utilities.i18n import tr
 from safe import messaging as m
 
@@ -133,11 +135,14 @@ class StepKwField(WizardStep, FORM_CLASS):
 
             # Generate description for the field.
             field_type = layer_fields.field(field_name).typeName()
-            field_index = layer_fields.indexFromName(field_name)
-            unique_values = self.parent.layer.uniqueValues(field_index)[0:48]
+            # Only a preview, the classification step needs all the values.
+            statistics = column_statistics(
+                self.parent.layer, field_name, limit=48)
+            prefetch_column_statistics(self.parent.layer, field_name)
             unique_values_str = [
-                i is not None and unicode(i) or 'NULL'
-                for i in unique_values]
+                unicode(i) for i in statistics.distinct_values]
+            if statistics.null_count:
+                unique_values_str.append('NULL')
             unique_values_str = ', '.join(unique_values_str)
             field_descriptions += tr('<b>Field name</b>: {field_name}').format(
                 field_name=field_name)
@@ -27,6 +27,7 @@ from safe.definitions.font import big_font
 from safe.definitions.layer_purposes import layer_purpose_aggregation
 from safe.gui.tools.wizard.wizard_step import (
     WizardStep, get_wizard_step_ui_class)
+from safe.utilities.column_statistics import column_statistics
 from safe.utilities.gis import is_raster_layer
 from safe.definitions.utilities import (
     definition,
@@ -805,7 +806,8 @@ class StepKwMultiClassifications(WizardStep, FORM_CLASS):
                 layer_purpose['name'],
                 classification['name'],
                 field.upper())
-            unique_values = self.parent.layer.uniqueValues(field_index)
+            unique_values = column_statistics(
+                self.parent.layer, field).distinct_values
 
         # Set description
         description_label = QLabel(description_text)
@@ -9,6 +9,7 @@ from PyQt4.QtCore import QPyNullVariant
 from osgeo import gdal
 from osgeo.gdalconst import GA_ReadOnly
 
+from safe.utilities.column_statistics import column_statistics
 from safe.utilities.i18n import tr
 from safe import messaging as m
 
@@ -171,7 +172,8 @@ class StepKwClassify(WizardStep, FORM_CLASS):
             self.lblClassify.setText(classify_vector_question % (
                     subcategory['name'], purpose['name'],
                     classification_name, field.upper()))
-            unique_values = self.parent.layer.uniqueValues(field_index)
+            unique_values = column_statistics(
+                self.parent.layer, field).distinct_values
 
         clean_unique_values = []
         for unique_value in unique_values:
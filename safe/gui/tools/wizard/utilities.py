@@ -12,6 +12,11 @@ from qgis.core import QgsCoordinateTransform
 import safe.gui.tools.wizard.wizard_strings
 from safe.common.version import get_version
 from safe.definitions.constants import RECENT, GLOBAL
+from safe.definitions.layer_geometry import (
+    layer_geometry_line,
+    layer_geometry_point,
+    layer_geometry_polygon,
+    layer_geometry_raster)
 from safe.definitions.layer_modes import layer_mode_classified
 from safe.definitions.layer_purposes import (
     layer_purpose_exposure, layer_purpose_hazard)
@@ -74,16 +79,25 @@ def layers_intersect(layer_a, layer_b):
     return extent_a.intersects(extent_b)
 
 
-def layer_description_html(layer, keywords=None):
+def layer_description_html(
+        layer, keywords=None, layer_geometry_key=None, source=None):
     """Form a html description of a given layer based on the layer
        parameters and keywords if provided
 
-    :param layer: The layer to get the description
+    :param layer: The layer to get the description, None if it is described
+        by its geometry and its source.
     :type layer: QgsMapLayer
 
     :param keywords: The layer keywords
     :type keywords: None, dict
 
+    :param layer_geometry_key: The layer geometry if there is no layer, for
+        instance from the layer catalog.
+    :type layer_geometry_key: str
+
+    :param source: The source of the layer if there is no layer.
+    :type source: basestring
+
     :returns: The html description in tabular format,
         ready to use in a label or tool tip.
     :rtype: str
@@ -141,15 +155,23 @@ def layer_description_html(layer, keywords=None):
             layer_version=layer_version, inasafe_version=get_version())
     else:
         # The layer is keywordless
-        if is_point_layer(layer):
-            geom_type = 'point'
-        elif is_polygon_layer(layer):
-            geom_type = 'polygon'
-        else:
-            geom_type = 'line'
+        if layer is not None:
+            if is_raster_layer(layer):
+                layer_geometry_key = layer_geometry_raster['key']
+            elif is_point_layer(layer):
+                layer_geometry_key = layer_geometry_point['key']
+            elif is_polygon_layer(layer):
+                layer_geometry_key = layer_geometry_polygon['key']
+            else:
+                layer_geometry_key = layer_geometry_line['key']
+
+            # hide password in the layer source
+            source = layer.publicSource()
 
-        # hide password in the layer source
-        source = layer.publicSource()
+        if layer_geometry_key == layer_geometry_raster['key']:
+            layer_type = 'raster'
+        else:
+            layer_type = 'vector (%s)' % layer_geometry_key
         desc = """
             %s<br/><br/>
             <b>%s</b>: %s<br/>
@@ -157,8 +179,7 @@ def layer_description_html(layer, keywords=None):
             %s
         """ % (tr('This layer has no valid keywords assigned'),
                tr('SOURCE'), source,
-               tr('TYPE'), is_raster_layer(layer) and 'raster' or
-               'vector (%s)' % geom_type,
+               tr('TYPE'), layer_type,
                tr('In the next step you will be able' +
                   ' to assign keywords to this layer.'))
     return desc
@@ -365,11 +365,17 @@ class WizardDialog(QDialog, FORM_CLASS):
             layer_purpose_exposure['key'])
         return hazard, exposure, hazard_geometry, exposure_geometry
 
-    def is_layer_compatible(self, layer, layer_purpose=None, keywords=None):
+    def is_layer_compatible(
+            self,
+            layer,
+            layer_purpose=None,
+            keywords=None,
+            layer_geometry_key=None):
         """Validate if a given layer is compatible for selected IF
            as a given layer_purpose
 
-        :param layer: The layer to be validated
+        :param layer: The layer to be validated, None if it is validated
+            with its keywords and its geometry only.
         :type layer: QgsVectorLayer | QgsRasterLayer
 
         :param layer_purpose: The layer_purpose the layer is validated for
@@ -378,6 +384,10 @@ class WizardDialog(QDialog, FORM_CLASS):
         :param keywords: The layer keywords
         :type keywords: None, dict
 
+        :param layer_geometry_key: The layer geometry, read from the layer if
+            not provided.
+        :type layer_geometry_key: None, string
+
         :returns: True if layer is appropriate for the selected role
         :rtype: boolean
         """
@@ -388,7 +398,7 @@ class WizardDialog(QDialog, FORM_CLASS):
             layer_purpose = self.get_parent_mode_constraints()[0]['key']
 
         # If not explicitly stated, read the layer's keywords
-        if not keywords:
+        if not keywords and layer is not None:
             try:
                 keywords = self.keyword_io.read_keywords(layer)
                 if ('layer_purpose' not in keywords and
@@ -402,6 +412,9 @@ class WizardDialog(QDialog, FORM_CLASS):
                     UnsupportedProviderError):
                 keywords = None
 
+        if layer_geometry_key is None:
+            layer_geometry_key = self.get_layer_geometry_key(layer)
+
         # Get allowed subcategory and layer_geometry from IF constraints
         h, e, hc, ec = self.selected_impact_function_constraints()
         if layer_purpose == 'hazard':
@@ -415,13 +428,14 @@ class WizardDialog(QDialog, FORM_CLASS):
             if (keywords and 'layer_purpose' in keywords and
                     keywords['layer_purpose'] == layer_purpose):
                 return True
-            if not keywords and is_polygon_layer(layer):
+            if not keywords and (
+                    layer_geometry_key == layer_geometry_polygon['key']):
                 return True
             return False
 
         # Compare layer properties with explicitly set constraints
         # Reject if layer geometry doesn't match
-        if layer_geometry != self.get_layer_geometry_key(layer):
+        if layer_geometry != layer_geometry_key:
             return False
 
         # If no keywords, there's nothing more we can check.
@@ -642,6 +656,17 @@ class WizardDialog(QDialog, FORM_CLASS):
                     self, tr('Invalid Field Mapping'), get_string(e.message))
                 return
 
+        browser_steps = [
+            self.step_fc_hazlayer_from_browser,
+            self.step_fc_explayer_from_browser,
+            self.step_fc_agglayer_from_browser]
+        # The layer selected in the browser is created only now.
+        if current_step in browser_steps:
+            if not current_step.load_selected_layer():
+                display_warning_message_box(
+                    self, tr('Invalid Layer'), tr('Not a valid layer.'))
+                return
+
         if current_step.step_type == STEP_FC:
             self.impact_function_steps.append(current_step)
         elif current_step.step_type == STEP_KW:
@@ -655,9 +680,7 @@ class WizardDialog(QDialog, FORM_CLASS):
             self.save_current_keywords()
 
         # After any step involving Browser, add selected layer to map canvas
-        if current_step in [self.step_fc_hazlayer_from_browser,
-                            self.step_fc_explayer_from_browser,
-                            self.step_fc_agglayer_from_browser]:
+        if current_step in browser_steps:
             if not QgsMapLayerRegistry.instance().mapLayersByName(
                     self.layer.name()):
                 QgsMapLayerRegistry.instance().addMapLayers([self.layer])
@@ -1,6 +1,7 @@
 # coding=utf-8
 """Wizard Step Browser."""
 
+import logging
 import os
 from sqlite3 import OperationalError
 
@@ -39,6 +40,7 @@ from safe.gui.tools.wizard.wizard_strings import (
     create_postGIS_connection_first)
 from safe.gui.tools.wizard.utilities import layer_description_html
 from safe.utilities.gis import qgis_version
+from safe.utilities.layer_catalog import LayerCatalog, READ_TIMEOUT
 from safe.utilities.utilities import is_keyword_version_supported
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -46,6 +48,8 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+LOGGER = logging.getLogger('InaSAFE')
+
 
 class WizardStepBrowser(WizardStep):
 
@@ -60,8 +64,13 @@ class WizardStepBrowser(WizardStep):
         WizardStep.__init__(self, parent)
         # Set model for browser
         browser_model = QgsBrowserModel()
-        self.proxy_model = LayerBrowserProxyModel(self)
+        self.layer_catalog = LayerCatalog(timeout=READ_TIMEOUT)
+        self.proxy_model = LayerBrowserProxyModel(
+            self, layer_catalog=self.layer_catalog)
         self.proxy_model.setSourceModel(browser_model)
+        # The layer selected in the browser, it is created only when the
+        # step is accepted.
+        self._selected_layer = None
 
     def get_next_step(self):
         """Find the proper step when user clicks the Next button.
@@ -144,7 +153,8 @@ class WizardStepBrowser(WizardStep):
         return uri
 
     def unsuitable_layer_description_html(
-            self, layer, layer_purpose, keywords=None):
+            self, layer, layer_purpose, keywords=None,
+            layer_geometry_key=None):
         """Form a html description of a given non-matching layer based on
            the currently selected impact function requirements vs layer\'s
            parameters and keywords if provided, as
@@ -158,6 +168,10 @@ class WizardStepBrowser(WizardStep):
         :param keywords: The layer keywords
         :type keywords: None, dict
 
+        :param layer_geometry_key: The layer geometry, read from the layer if
+            not provided.
+        :type layer_geometry_key: None, string
+
         :returns: The html description in tabular format,
             ready to use in a label or tool tip.
         :rtype: str
@@ -200,7 +214,8 @@ class WizardStepBrowser(WizardStep):
             req_geometry = layer_geometry_polygon['key']
         req_layer_mode = lay_req['layer_mode']['key']
 
-        layer_geometry_key = self.parent.get_layer_geometry_key(layer)
+        if layer_geometry_key is None:
+            layer_geometry_key = self.parent.get_layer_geometry_key(layer)
         lay_purpose = '&nbsp;&nbsp;-'
         lay_subcategory = '&nbsp;&nbsp;-'
         lay_layer_mode = '&nbsp;&nbsp;-'
@@ -309,6 +324,88 @@ class WizardStepBrowser(WizardStep):
                units_row)
         return html
 
+    def catalog_record(self, path):
+        """Get the record of a layer file from the layer catalog.
+
+        :param path: The path of the layer from QgsBrowserModel.
+        :type path: basestring
+
+        :returns: The record, None if it is not up to date in the catalog.
+        :rtype: dict
+
+        .. versionadded:: 4.2
+        """
+        # noinspection PyBroadException
+        try:
+            return self.layer_catalog.record(path, describe=False)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Could not read the layer catalog.')
+            return None
+
+    def create_layer(self, item_class_name, path):
+        """Create a layer from a browser item.
+
+        :param item_class_name: The class name of the browser item.
+        :type item_class_name: str
+
+        :param path: The path of the browser item.
+        :type path: basestring
+
+        :returns: The layer, None if it can not be created.
+        :rtype: QgsVectorLayer, QgsRasterLayer
+
+        .. versionadded:: 4.2
+        """
+        if item_class_name == 'QgsOgrLayerItem':
+            layer = QgsVectorLayer(path, '', 'ogr')
+        elif item_class_name == 'QgsPGLayerItem':
+            uri = self.postgis_path_to_uri(path)
+            if uri:
+                layer = QgsVectorLayer(uri.uri(), uri.table(), 'postgres')
+            else:
+                layer = None
+        else:
+            layer = QgsRasterLayer(path, '', 'gdal')
+        return layer
+
+    def load_selected_layer(self):
+        """Create the layer selected in the browser and use it.
+
+        The layer is created only when the step is accepted, the description
+        of the layer may come from the layer catalog.
+
+        :returns: True if the layer is valid.
+        :rtype: bool
+
+        .. versionadded:: 4.2
+        """
+        if self._selected_layer is None:
+            return False
+        category, item_class_name, path, keywords, layer = (
+            self._selected_layer)
+        if layer is None:
+            layer = self.create_layer(item_class_name, path)
+        if not layer or not layer.isValid():
+            return False
+
+        # set the layer name for further use in the step_fc_summary
+        if keywords:
+            if qgis_version() >= 21800:
+                layer.setName(keywords.get('title'))
+            else:
+                layer.setLayerName(keywords.get('title'))
+
+        # set the current layer (e.g. for the keyword creation sub-thread
+        #                          or for adding the layer to mapCanvas)
+        self.parent.layer = layer
+        if category == 'hazard':
+            self.parent.hazard_layer = layer
+        elif category == 'exposure':
+            self.parent.exposure_layer = layer
+        else:
+            self.parent.aggregation_layer = layer
+        return True
+
     def get_layer_description_from_browser(self, category):
         """Obtain the description of the browser layer selected by user.
 
@@ -331,6 +428,7 @@ class WizardStepBrowser(WizardStep):
         else:
             raise InaSAFEError
 
+        self._selected_layer = None
         index = browser.selectionModel().currentIndex()
         if not index:
             return False, ''
@@ -360,59 +458,47 @@ class WizardStepBrowser(WizardStep):
                                'QgsLayerItem'] and not os.path.exists(path):
             return False, ''
 
-        # try to create the layer
-        if item_class_name == 'QgsOgrLayerItem':
-            layer = QgsVectorLayer(path, '', 'ogr')
-        elif item_class_name == 'QgsPGLayerItem':
-            uri = self.postgis_path_to_uri(path)
-            if uri:
-                layer = QgsVectorLayer(uri.uri(), uri.table(), 'postgres')
-            else:
-                layer = None
+        # The layer files up to date in the catalog are not opened.
+        layer = None
+        record = None
+        if item_class_name != 'QgsPGLayerItem':
+            record = self.catalog_record(path)
+        if record and record['layer_geometry'] and (
+                record['keywords'] is not None):
+            layer_geometry_key = record['layer_geometry']
+            keywords = record['keywords']
         else:
-            layer = QgsRasterLayer(path, '', 'gdal')
-
-        if not layer or not layer.isValid():
-            return False, self.tr('Not a valid layer.')
-
-        try:
-            keywords = self.keyword_io.read_keywords(layer)
-            if ('layer_purpose' not in keywords and
-                    'impact_summary' not in keywords):
+            layer = self.create_layer(item_class_name, path)
+            if not layer or not layer.isValid():
+                return False, self.tr('Not a valid layer.')
+            layer_geometry_key = self.parent.get_layer_geometry_key(layer)
+            try:
+                keywords = self.keyword_io.read_keywords(layer)
+            except (HashNotFoundError,
+                    OperationalError,
+                    NoKeywordsFoundError,
+                    KeywordNotFoundError,
+                    InvalidParameterError,
+                    UnsupportedProviderError,
+                    MissingMetadata):
                 keywords = None
-        except (HashNotFoundError,
-                OperationalError,
-                NoKeywordsFoundError,
-                KeywordNotFoundError,
-                InvalidParameterError,
-                UnsupportedProviderError,
-                MissingMetadata):
+        if keywords and (
+                'layer_purpose' not in keywords and
+                'impact_summary' not in keywords):
             keywords = None
 
-        # set the layer name for further use in the step_fc_summary
-        if keywords:
-            if qgis_version() >= 21800:
-                layer.setName(keywords.get('title'))
-            else:
-                layer.setLayerName(keywords.get('title'))
-
-        if not self.parent.is_layer_compatible(layer, category, keywords):
+        if not self.parent.is_layer_compatible(
+                layer, category, keywords, layer_geometry_key):
             label_text = '%s<br/>%s' % (
                 self.tr(
                     'This layer\'s keywords or type are not suitable:'),
                 self.unsuitable_layer_description_html(
-                    layer, category, keywords))
+                    layer, category, keywords, layer_geometry_key))
             return False, label_text
 
-        # set the current layer (e.g. for the keyword creation sub-thread
-        #                          or for adding the layer to mapCanvas)
-        self.parent.layer = layer
-        if category == 'hazard':
-            self.parent.hazard_layer = layer
-        elif category == 'exposure':
-            self.parent.exposure_layer = layer
-        else:
-            self.parent.aggregation_layer = layer
+        # The layer is created when the step is accepted.
+        self._selected_layer = (
+            category, item_class_name, path, keywords, layer)
 
         # Check if the layer is keywordless
         if keywords and 'keyword_version' in keywords:
@@ -422,5 +508,6 @@ class WizardStepBrowser(WizardStep):
         else:
             self.parent.is_selected_layer_keywordless = True
 
-        desc = layer_description_html(layer, keywords)
+        desc = layer_description_html(
+            layer, keywords, layer_geometry_key, path)
         return True, desc
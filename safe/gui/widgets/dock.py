@@ -45,6 +45,8 @@ from safe.definitions.provenance import provenance_list
 from safe.definitions.reports.infographic import map_overview
 from safe.definitions.utilities import update_template_component, get_name
 from safe.defaults import supporters_logo_path
+from safe.gis.expressions import (
+    clear_analysis_snapshot, update_analysis_snapshot)
 from safe.definitions.reports import (
     final_product_tag,
     pdf_product_tag,
@@ -60,6 +62,7 @@ from safe.test.utilities import load_layer
 from safe.utilities.gis import wkt_to_rectangle, qgis_version
 from safe.utilities.i18n import tr
 from safe.utilities.keyword_io import KeywordIO
+from safe.utilities.layer_catalog import LayerCatalog, READ_TIMEOUT
 from safe.utilities.utilities import (
     get_error_message,
     add_ordered_combo_item,
@@ -155,6 +158,7 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
 
         self.impact_function = None
         self.keyword_io = KeywordIO()
+        self.layer_catalog = LayerCatalog(timeout=READ_TIMEOUT)
         self.state = None
         self.extent = Extent(self.iface)
         self.composer = None
@@ -584,6 +588,40 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
         self.exposure_layer_combo.blockSignals(True)
         self.hazard_layer_combo.blockSignals(True)
 
+    def layer_keywords(self, layer):
+        """Get the keywords of a layer, from the layer catalog if possible.
+
+        The catalog is only read, the layer catalog indexer writes it. If
+        the layer is not up to date in the catalog, the keywords are read
+        from the metadata.
+
+        :param layer: The layer.
+        :type layer: QgsMapLayer
+
+        :return: The keywords, None if they can not be read.
+        :rtype: dict
+
+        .. versionadded:: 4.2
+        """
+        # noinspection PyBroadException
+        try:
+            record = self.layer_catalog.record(
+                layer.source(), describe=False)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Could not read the layer catalog.')
+            record = None
+        if record is not None and record['keywords'] is not None:
+            return record['keywords']
+
+        # noinspection PyBroadException
+        try:
+            return self.keyword_io.read_keywords(layer)
+        except (NoKeywordsFoundError,
+                KeywordNotFoundError, MetadataReadError):
+            return None
+        except:  # pylint: disable=W0702
+            return None
+
     # noinspection PyUnusedLocal
     @pyqtSlot('QgsMapLayer')
     def get_layers(self, *args):
@@ -639,19 +677,12 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
             source = layer.id()
             # See if there is a title for this layer, if not,
             # fallback to the layer's filename
-
-            # noinspection PyBroadException
-            try:
-                title = self.keyword_io.read_keywords(layer, 'title')
-            except (NoKeywordsFoundError,
-                    KeywordNotFoundError, MetadataReadError):
+            keywords = self.layer_keywords(layer)
+            if not keywords or 'title' not in keywords:
                 # Skip if there are no keywords at all, or missing keyword
                 continue
-            except:  # pylint: disable=W0702
-                pass
-            else:
-                # Lookup internationalised title if available
-                title = self.tr(title)
+            # Lookup internationalised title if available
+            title = self.tr(keywords['title'])
             # Register title with layer
             if title and self.set_layer_from_title_flag:
                 if qgis_version() >= 21800:
@@ -663,16 +694,12 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
             # Find out if the layer is a hazard or an exposure
             # layer by querying its keywords. If the query fails,
             # the layer will be ignored.
-            # noinspection PyBroadException
-            try:
-                layer_purpose = self.keyword_io.read_keywords(
-                    layer, 'layer_purpose')
-                keyword_version = str(self.keyword_io.read_keywords(
-                    layer, inasafe_keyword_version_key))
-                if not is_keyword_version_supported(keyword_version):
-                    continue
-            except:  # pylint: disable=W0702
-                # continue ignoring this layer
+            if ('layer_purpose' not in keywords or
+                    inasafe_keyword_version_key not in keywords):
+                continue
+            layer_purpose = keywords['layer_purpose']
+            keyword_version = str(keywords[inasafe_keyword_version_key])
+            if not is_keyword_version_supported(keyword_version):
                 continue
 
             if layer_purpose == 'hazard':
@@ -1503,6 +1530,9 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
                 continue
             write_project_variable(key, value)
 
+        # Read the new analysis layer once for the report expressions.
+        update_analysis_snapshot()
+
     def remove_provenance_project_variables(self):
         """Removing variables from provenance data."""
         project_context_scope = QgsExpressionContextUtils.projectScope()
@@ -1541,3 +1571,4 @@ class Dock(QtGui.QDockWidget, FORM_CLASS):
         # other variable
         QgsExpressionContextUtils.setProjectVariables(
             non_null_existing_variables)
+        clear_analysis_snapshot()
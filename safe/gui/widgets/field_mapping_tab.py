@@ -38,6 +38,7 @@ from safe.common.exceptions import KeywordNotFoundError
 from parameters.parameter_exceptions import (
     InvalidValidationException as OriginalValidationException)
 
+from safe.utilities.column_statistics import column_statistics
 from safe.utilities.i18n import tr
 from safe.common.parameters.group_select_parameter import (
     GroupSelectParameter)
@@ -347,9 +348,9 @@ class FieldMappingTab(QWidget, object):
         field_name = field_item.data(Qt.UserRole)
         field = self.layer.fields().field(field_name)
 
-        index = self.layer.fieldNameIndex(field_name)
-        unique_values = self.layer.uniqueValues(index)
-        pretty_unique_values = ', '.join([str(v) for v in unique_values[:10]])
+        unique_values = column_statistics(
+            self.layer, field_name, limit=10).distinct_values
+        pretty_unique_values = ', '.join([str(v) for v in unique_values])
 
         footer_text = tr('Field type: {0}\n').format(field.typeName())
         footer_text += tr('Unique values: {0}').format(pretty_unique_values)
@@ -198,8 +198,13 @@ def create_valid_aggregation(layer):
     :return: The new aggregation layer in memory.
     :rtype: QgsVectorLayer
     """
+    # The spatial index is built once all features are copied.
     cleaned = create_memory_layer(
-        'aggregation', layer.geometryType(), layer.crs(), layer.fields())
+        'aggregation',
+        layer.geometryType(),
+        layer.crs(),
+        layer.fields(),
+        spatial_index=False)
 
     # We transfer keywords to the output.
     cleaned.keywords = layer.keywords
@@ -27,6 +27,7 @@ import logging
 from safe.common.utilities import temp_dir
 from safe.common.version import get_version
 from safe.datastore.folder import Folder
+from safe.datastore.geopackage import GeoPackage
 from safe.datastore.datastore import DataStore
 from safe.gis.sanity_check import check_inasafe_fields, check_layer
 from safe.gis.vector.tools import remove_fields
@@ -41,6 +42,8 @@ from safe.gis.vector.union import union
 from safe.gis.vector.clip import clip
 from safe.gis.vector.smart_clip import smart_clip
 from safe.gis.vector.intersection import intersection
+from safe.gis.vector.layer_index import (
+    layer_index_statistics, clear_layer_index_statistics)
 from safe.gis.vector.summary_1_aggregate_hazard import (
     aggregate_hazard_summary)
 from safe.gis.vector.summary_2_aggregation import aggregation_summary
@@ -50,8 +53,14 @@ from safe.gis.vector.summary_4_exposure_summary_table import (
 from safe.gis.vector.recompute_counts import recompute_counts
 from safe.gis.vector.update_value_map import update_value_map
 from safe.gis.raster.clip_bounding_box import clip_by_extent
+from safe.gis.raster.from_density_to_counts import from_density_to_counts
 from safe.gis.raster.reclassify import reclassify as reclassify_raster
+from safe.gis.raster.tools import (
+    release_memory_rasters,
+    release_memory_rasters_with,
+    track_memory_rasters)
 from safe.gis.raster.polygonize import polygonize
+from safe.gis.raster.zonal_histogram import zonal_histogram
 from safe.gis.raster.zonal_statistics import zonal_stats
 from safe.definitions.analysis_steps import analysis_steps
 from safe.definitions.utilities import (
@@ -144,6 +153,7 @@ from safe.definitions.hazard_exposure_specifications import (
     specific_actions, specific_notes)
 from safe.definitions.versions import inasafe_keyword_version
 from safe.common.exceptions import (
+    ErrorDataStore,
     InaSAFEError,
     InvalidExtentError,
     InvalidLayerError,
@@ -167,7 +177,8 @@ from safe.impact_function.style import (
     hazard_class_style,
     simple_polygon_without_brush,
 )
-from safe.utilities.gis import is_vector_layer, is_raster_layer
+from safe.utilities.gis import (
+    is_vector_layer, is_raster_layer, is_raster_y_inverted)
 from safe.utilities.i18n import tr
 from safe.utilities.default_values import get_inasafe_default_value_qsetting
 from safe.utilities.unicode import get_unicode
@@ -180,7 +191,7 @@ from safe.utilities.utilities import (
     is_keyword_version_supported,
     readable_os_version)
 from safe.utilities.profiling import (
-    profile, clear_prof_data, profiling_log)
+    profile, profiling_log, start_trace, stop_trace, write_chrome_trace)
 from safe.utilities.gis import qgis_version
 from safe.utilities.settings import setting
 from safe import messaging as m
@@ -235,6 +246,16 @@ class ImpactFunction(object):
         # The CRS is the exposure CRS.
         self._analysis_extent = None
 
+        # True if the hazard and the exposure are combined on the raster
+        # cells, without polygonizing the hazard.
+        self._raster_analysis = False
+
+        # Paths of the intermediate rasters of this analysis kept in memory.
+        # They are released by the next run or when the impact function is
+        # discarded.
+        self._memory_rasters = []
+        release_memory_rasters_with(self, self._memory_rasters)
+
         # set this to a gui call back / web callback etc as needed.
         self._callback = self.console_progress_callback
 
@@ -296,6 +317,7 @@ class ImpactFunction(object):
         row.add(m.Cell(tr('Time'), header=True))
         if setting(key='memory_profile', expected_type=bool):
             row.add(m.Cell(tr('Memory'), header=True))
+        row.add(m.Cell(tr('Features'), header=True))
         table.add(row)
 
         if self.performance_log is None:
@@ -329,6 +351,12 @@ class ImpactFunction(object):
                 if memory_used is None:
                     memory_used = busy
                 new_row.add(m.Cell(memory_used))
+            features = ''
+            if tree.features_in is not None or tree.features_out is not None:
+                features = '{features_in} -> {features_out}'.format(
+                    features_in=tree.features_in,
+                    features_out=tree.features_out)
+            new_row.add(m.Cell(features))
             table.add(new_row)
             if tree.children:
                 for child in tree.children:
@@ -337,6 +365,19 @@ class ImpactFunction(object):
 
         # noinspection PyTypeChecker
         display_tree(self.performance_log, indent)
+
+        # Structures built or reused by the vector algorithms.
+        for structure, statistic in layer_index_statistics().iteritems():
+            new_row = m.Row()
+            new_row.add(m.Cell(tr(
+                'Layer index {structure}: {built} built / {reused} '
+                'reused').format(structure=structure, **statistic)))
+            new_row.add(m.Cell(round(statistic['time'], 3)))
+            if setting(key='memory_profile', expected_type=bool):
+                new_row.add(m.Cell(''))
+            new_row.add(m.Cell(''))
+            table.add(new_row)
+
         message.add(table)
 
         return message
@@ -1210,9 +1251,14 @@ class ImpactFunction(object):
                 raise Exception(
                     'Something went wrong with the datastore : {error_message}'
                     .format(error_message=name))
-            if self.debug_mode:
+            background = (
+                isinstance(self.datastore, GeoPackage) and
+                self.datastore.background_writing)
+            if self.debug_mode and not background:
                 # This one checks the GeoJSON file. We noticed some difference
                 # between checking a memory layer and a file based layer.
+                # We skip it if the layer is still written in the background,
+                # reading it would commit the transaction.
                 check_layer(self.datastore.layer(name))
 
             return name
@@ -1236,8 +1282,14 @@ class ImpactFunction(object):
 
         try:
             self.reset_state()
-            clear_prof_data()
-            self._run()
+            start_trace()
+            clear_layer_index_statistics()
+            # The intermediate rasters of the previous run are not used
+            # anymore. We keep the ones of this run, the hazard and the
+            # exposure can still be read by the report.
+            release_memory_rasters(self._memory_rasters)
+            with track_memory_rasters(self._memory_rasters):
+                self._run()
 
             # Get the profiling log
             self._performance_log = profiling_log()
@@ -1252,6 +1304,12 @@ class ImpactFunction(object):
                     'Something went wrong with the datastore : {error_message}'
                     .format(error_message=name))
             self._profiling_table = self.datastore.layer(name)
+            write_chrome_trace(
+                join(self.datastore.uri_path, 'profiling.json'))
+
+            if isinstance(self.datastore, GeoPackage):
+                # Commit the last layers and build the spatial indexes.
+                self.datastore.close()
 
             # Later, we should move this call.
             self.style()
@@ -1339,6 +1397,16 @@ class ImpactFunction(object):
         else:
             return ANALYSIS_SUCCESS, None
 
+        finally:
+            stop_trace()
+            if isinstance(self._datastore, GeoPackage):
+                # Even if the analysis failed, the background writer must be
+                # stopped so the file is not locked by its transaction.
+                try:
+                    self._datastore.background_writing = False
+                except ErrorDataStore:
+                    LOGGER.exception('Could not write the last layers.')
+
     @profile
     def _run(self):
         """Internal function to run the impact function with profiling."""
@@ -1368,11 +1436,17 @@ class ImpactFunction(object):
                 path = join(default_user_directory, self._unique_name)
                 if not exists(path):
                     makedirs(path)
-                self._datastore = Folder(path)
             else:
-                self._datastore = Folder(temp_dir(sub_dir=self._unique_name))
+                path = temp_dir(sub_dir=self._unique_name)
 
-            self._datastore.default_vector_format = 'geojson'
+            if setting('geopackage_datastore', expected_type=bool):
+                # All layers in a single file, written in the background.
+                self._datastore = GeoPackage(
+                    join(path, self._unique_name + '.gpkg'))
+                self._datastore.background_writing = True
+            else:
+                self._datastore = Folder(path)
+                self._datastore.default_vector_format = 'geojson'
         LOGGER.info('Datastore : %s' % self.datastore.uri_path)
 
         if self.debug_mode:
@@ -1840,6 +1914,19 @@ class ImpactFunction(object):
         self.set_state_info(
             'hazard', 'use_same_projection', use_same_projection)
 
+        self._raster_analysis = (
+            setting('raster_native_analysis', expected_type=bool)
+            and is_raster_layer(self.hazard)
+            and is_raster_layer(self.exposure)
+            and self.exposure.keywords.get('layer_mode') == 'continuous'
+            and not is_raster_y_inverted(self.exposure))
+        if self._raster_analysis:
+            # The hazard will be warped on the exposure grid when the
+            # exposure is combined with the aggregation.
+            self.set_state_process(
+                'hazard', 'Keep the raster hazard for the raster analysis')
+            return
+
         if is_raster_layer(self.hazard):
 
             extent = self.analysis_impacted.extent()
@@ -1915,6 +2002,10 @@ class ImpactFunction(object):
         aggregation areas and assign hazard class.
         """
         LOGGER.info('ANALYSIS : Aggregate hazard preparation')
+        if self._raster_analysis:
+            # The aggregate hazard is computed with the exposure counts.
+            return
+
         self.set_state_process('hazard', 'Make hazard layer valid')
         self.hazard = clean_layer(self.hazard)
         self.debug_layer(self.hazard)
@@ -1933,9 +2024,19 @@ class ImpactFunction(object):
         if is_raster_layer(self.exposure):
             if self.exposure.keywords.get('layer_mode') == 'continuous':
                 if self.exposure.keywords.get('exposure_unit') == 'density':
+                    # Only the cells in the analysis are converted.
+                    self.set_state_process(
+                        'exposure', 'Clip raster by analysis bounding box')
+                    # noinspection PyTypeChecker
+                    self.exposure = clip_by_extent(
+                        self.exposure, self.analysis_impacted.extent())
+                    self.debug_layer(self.exposure)
+
                     self.set_state_process(
                         'exposure', 'Calculate counts per cell')
-                    # Todo, Need to write this algorithm.
+                    # noinspection PyTypeChecker
+                    self.exposure = from_density_to_counts(self.exposure)
+                    self.debug_layer(self.exposure)
 
                 # We don't do any other process to a continuous raster.
                 return
@@ -1998,12 +2099,23 @@ class ImpactFunction(object):
         """
         LOGGER.info('ANALYSIS : Intersect Exposure and Aggregate Hazard')
         if is_raster_layer(self.exposure):
-            self.set_state_process(
-                'impact function',
-                'Zonal stats between exposure and aggregate hazard')
-            # noinspection PyTypeChecker
-            self._aggregate_hazard_impacted = zonal_stats(
-                self.exposure, self._aggregate_hazard_impacted)
+            if self._raster_analysis:
+                self.set_state_process(
+                    'impact function',
+                    'Zonal histogram between exposure, hazard and aggregation')
+                # noinspection PyTypeChecker
+                self._aggregate_hazard_impacted = zonal_histogram(
+                    self.exposure,
+                    self.hazard,
+                    self.aggregation,
+                    self._analysis_impacted)
+            else:
+                self.set_state_process(
+                    'impact function',
+                    'Zonal stats between exposure and aggregate hazard')
+                # noinspection PyTypeChecker
+                self._aggregate_hazard_impacted = zonal_stats(
+                    self.exposure, self._aggregate_hazard_impacted)
             self.debug_layer(self._aggregate_hazard_impacted)
 
             self.set_state_process('impact function', 'Add default values')
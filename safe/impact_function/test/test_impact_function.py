@@ -66,6 +66,7 @@ from safe.definitions.layer_purposes import (
     layer_purpose_profiling,
     layer_purpose_analysis_impacted,
     layer_purpose_aggregate_hazard_impacted,
+    layer_purpose_aggregation_summary,
 )
 from safe.definitions.minimum_needs import minimum_needs_fields
 from safe.definitions.utilities import definition
@@ -112,6 +113,7 @@ from safe.gis.sanity_check import check_inasafe_fields
 from safe.utilities.unicode import byteify
 from safe.utilities.gis import wkt_to_rectangle
 from safe.utilities.utilities import readable_os_version
+from safe.utilities.settings import setting, set_setting
 from safe.impact_function.impact_function import ImpactFunction
 
 LOGGER = logging.getLogger('InaSAFE')
@@ -582,6 +584,53 @@ class TestImpactFunction(unittest.TestCase):
         self.assertEqual(1, len(values))
         self.assertEqual(0.75, values[0])
 
+    def test_raster_analysis(self):
+        """Test the raster analysis gives the same summaries."""
+        scenario = {
+            'hazard': 'tsunami_wgs84.tif',
+            'exposure': 'pop_binary_raster_20_20.asc',
+            'aggregation': 'grid_jakarta.geojson',
+        }
+        purposes = [
+            layer_purpose_analysis_impacted['key'],
+            layer_purpose_aggregation_summary['key'],
+        ]
+
+        summaries = []
+        raster_analysis = setting(
+            'raster_native_analysis', expected_type=bool)
+        try:
+            for enabled in [False, True]:
+                set_setting('raster_native_analysis', enabled)
+                status, steps, outputs = run_scenario(scenario)
+                self.assertEqual(ANALYSIS_SUCCESS, status, steps)
+                summary = {}
+                for layer in outputs:
+                    purpose = layer.keywords['layer_purpose']
+                    if purpose in purposes:
+                        names = [field.name() for field in layer.fields()]
+                        summary[purpose] = [
+                            dict(zip(names, feature.attributes()))
+                            for feature in layer.getFeatures()]
+                summaries.append(summary)
+        finally:
+            set_setting('raster_native_analysis', raster_analysis)
+
+        expected, result = summaries
+        for purpose in purposes:
+            self.assertEqual(len(result[purpose]), len(expected[purpose]))
+            for row, expected_row in zip(
+                    result[purpose], expected[purpose]):
+                self.assertItemsEqual(row.keys(), expected_row.keys())
+                for name, value in expected_row.iteritems():
+                    if isinstance(value, float):
+                        # The zonal statistics split the cells on the
+                        # border of tiny polygons.
+                        self.assertAlmostEqual(
+                            row[name], value, delta=max(1, value * 0.01))
+                    else:
+                        self.assertEqual(row[name], value)
+
     def test_profiling(self):
         """Test running impact function on test data."""
         hazard_layer = load_test_vector_layer(
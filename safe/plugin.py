@@ -23,7 +23,9 @@ from PyQt4.QtCore import (
     QTranslator,
     QCoreApplication,
     Qt,
-    QSettings)
+    QSettings,
+    QThread,
+    QTimer)
 # noinspection PyPackageRequirements
 from PyQt4.QtGui import (
     QAction,
@@ -34,20 +36,11 @@ from PyQt4.QtGui import (
     QLineEdit,
     QInputDialog)
 
-from safe.report.expressions import infographic
-from safe.gis import expressions
+# Only light modules are imported here, to keep the QGIS startup fast. The
+# dock, the wizard, the reports and the definitions are imported on first
+# use.
 from safe.common.version import release_status
-from safe.common.exceptions import (
-    KeywordNotFoundError,
-    NoKeywordsFoundError,
-    MetadataReadError)
 from safe.utilities.resources import resources_path
-from safe.utilities.gis import is_raster_layer
-from safe.definitions.layer_purposes import (
-    layer_purpose_exposure, layer_purpose_hazard
-)
-from safe.definitions.utilities import get_field_groups
-from safe.utilities.keyword_io import KeywordIO
 LOGGER = logging.getLogger('InaSAFE')
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -79,7 +72,7 @@ class Plugin(object):
         """
         # Save reference to the QGIS interface
         self.iface = iface
-        self.dock_widget = None
+        self._dock_widget = None
 
         # Actions
         self.action_add_layers = None
@@ -105,6 +98,7 @@ class Plugin(object):
         self.translator = None
         self.toolbar = None
         self.wizard = None
+        self.layer_catalog_indexer = None
         self.actions = []  # list of all QActions we create for InaSAFE
 
         self.message_bar_item = None
@@ -114,6 +108,16 @@ class Plugin(object):
         # For enable/disable the keyword editor icon
         self.iface.currentLayerChanged.connect(self.layer_changed)
 
+    @property
+    def dock_widget(self):
+        """The InaSAFE dock, created on first use.
+
+        :rtype: safe.gui.widgets.dock.Dock
+        """
+        if self._dock_widget is None:
+            self._create_dock()
+        return self._dock_widget
+
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
         """Get the translation for a string using Qt translation API.
@@ -416,7 +420,7 @@ class Plugin(object):
         self.action_toggle_rubberbands.setChecked(flag)
         # noinspection PyUnresolvedReferences
         self.action_toggle_rubberbands.triggered.connect(
-            self.dock_widget.toggle_rubber_bands)
+            self.toggle_rubber_bands)
         self.add_action(self.action_toggle_rubberbands)
 
     def _create_analysis_extent_action(self):
@@ -504,16 +508,32 @@ class Plugin(object):
 
     def _create_dock(self):
         """Create dockwidget and tabify it with the legend."""
+        if self._dock_widget is not None:
+            return
         # Import dock here as it needs to be imported AFTER i18n is set up
         from safe.gui.widgets.dock import Dock
-        self.dock_widget = Dock(self.iface)
-        self.dock_widget.setObjectName('InaSAFE-Dock')
-        self.iface.addDockWidget(Qt.RightDockWidgetArea, self.dock_widget)
+        # The expressions used by the reports are registered in QGIS when
+        # their modules are imported.
+        # noinspection PyUnresolvedReferences
+        from safe.gis import expressions  # NOQA pylint: disable=unused-import
+        # noinspection PyUnresolvedReferences
+        from safe.report.expressions import (  # NOQA pylint: disable=W0611
+            infographic)
+        self._dock_widget = Dock(self.iface)
+        self._dock_widget.setObjectName('InaSAFE-Dock')
+        self.iface.addDockWidget(Qt.RightDockWidgetArea, self._dock_widget)
         legend_tab = self.iface.mainWindow().findChild(QApplication, 'Legend')
         if legend_tab:
             self.iface.mainWindow().tabifyDockWidget(
-                legend_tab, self.dock_widget)
-            self.dock_widget.raise_()
+                legend_tab, self._dock_widget)
+            self._dock_widget.raise_()
+
+        # Hook up a slot for when the dock is hidden using its close button
+        # or  view-panels
+        #
+        self._dock_widget.visibilityChanged.connect(
+            self.toggle_inasafe_action)
+        self.action_dock.setChecked(self._dock_widget.isVisible())
 
     # noinspection PyPep8Naming
     def initGui(self):
@@ -528,10 +548,7 @@ class Plugin(object):
         """
         self.toolbar = self.iface.addToolBar('InaSAFE')
         self.toolbar.setObjectName('InaSAFEToolBar')
-        self.dock_widget = None
-        # Now create the actual dock
-        self._create_dock()
-        # And all the menu actions
+        # All the menu actions
         # Configuration Group
         self._create_dock_toggle_action()
         self._create_options_dialog_action()
@@ -557,13 +574,28 @@ class Plugin(object):
         self._add_spacer_to_menu()
         self._create_show_definitions_action()
 
-        # Hook up a slot for when the dock is hidden using its close button
-        # or  view-panels
-        #
-        self.dock_widget.visibilityChanged.connect(self.toggle_inasafe_action)
-        # Also deal with the fact that on start of QGIS dock may already be
-        # hidden.
-        self.action_dock.setChecked(self.dock_widget.isVisible())
+        # The dock is created on first use. If it was visible at the end of
+        # the last session, we create it once QGIS has finished to start.
+        show_dock = QSettings().value('inasafe/showDock', True, type=bool)
+        self.action_dock.setChecked(show_dock)
+        if show_dock:
+            QTimer.singleShot(0, self._create_dock)
+
+        # The layer catalog is updated in the background, once QGIS has
+        # finished to start.
+        QTimer.singleShot(0, self._update_layer_catalog)
+
+    def _update_layer_catalog(self):
+        """Scan the directories of the layer catalog in a thread.
+
+        .. versionadded:: 4.2
+        """
+        from safe.utilities.layer_catalog import LayerCatalogIndexer
+        indexer = LayerCatalogIndexer()
+        if not indexer.directories:
+            return
+        self.layer_catalog_indexer = indexer
+        indexer.start(QThread.LowPriority)
 
     def _add_spacer_to_menu(self):
         """Create a spacer to the menu to separate action groups."""
@@ -623,17 +655,33 @@ class Plugin(object):
             self.iface.removePluginMenu(self.tr('InaSAFE'), myAction)
             self.iface.removeToolBarIcon(myAction)
             self.iface.legendInterface().removeLegendLayerAction(myAction)
-        self.iface.mainWindow().removeDockWidget(self.dock_widget)
         self.iface.mainWindow().removeToolBar(self.toolbar)
-        self.dock_widget.setVisible(False)
-        self.dock_widget.destroy()
+        if self._dock_widget is not None:
+            # Remember if the dock should be created at the next startup.
+            # A dock behind another tab is not hidden.
+            QSettings().setValue(
+                'inasafe/showDock', not self._dock_widget.isHidden())
+            self.iface.mainWindow().removeDockWidget(self._dock_widget)
+            self._dock_widget.setVisible(False)
+            self._dock_widget.destroy()
         self.iface.currentLayerChanged.disconnect(self.layer_changed)
-
-        # Unload QGIS expressions loaded by the plugin.
-        qgis_expressions = [
-            fct[0] for fct in getmembers(expressions) if isfunction(fct[1])]
-        qgis_expressions += [
-            fct[0] for fct in getmembers(infographic) if isfunction(fct[1])]
+        if self.layer_catalog_indexer is not None:
+            self.layer_catalog_indexer.stop()
+            self.layer_catalog_indexer.wait()
+            self.layer_catalog_indexer = None
+        # Stop the scans of the fields started by the wizard, if it was used.
+        column_statistics = sys.modules.get('safe.utilities.column_statistics')
+        if column_statistics:
+            column_statistics.stop_column_statistics_tasks()
+
+        # Unload QGIS expressions loaded by the plugin, if they were loaded.
+        qgis_expressions = []
+        for module_name in (
+                'safe.gis.expressions', 'safe.report.expressions.infographic'):
+            module = sys.modules.get(module_name)
+            if module:
+                qgis_expressions += [
+                    fct[0] for fct in getmembers(module) if isfunction(fct[1])]
         for qgis_expression in qgis_expressions:
             if qgis_expression != 'qgsfunction':
                 QgsExpression.unregisterFunction(qgis_expression)
@@ -649,10 +697,22 @@ class Plugin(object):
         """
         self.action_dock.setChecked(checked)
 
+    def toggle_rubber_bands(self, flag):
+        """Disabled/enable the rendering of rubber bands in the dock.
+
+        :param flag: Flag to indicate if drawing of bands is active.
+        :type flag: bool
+        """
+        self.dock_widget.toggle_rubber_bands(flag)
+
     # Run method that performs all the real work
     def toggle_dock_visibility(self):
         """Show or hide the dock widget."""
-        if self.dock_widget.isVisible():
+        if self._dock_widget is None:
+            # First use, the new dock is visible.
+            self._create_dock()
+            self.dock_widget.raise_()
+        elif self.dock_widget.isVisible():
             self.dock_widget.setVisible(False)
         else:
             self.dock_widget.setVisible(True)
@@ -757,7 +817,9 @@ class Plugin(object):
             iface=self.iface,
             parent=self.iface.mainWindow())
         if dialog.exec_():  # modal
-            self.dock_widget.read_settings()
+            # A dock created later reads the settings itself.
+            if self._dock_widget is not None:
+                self._dock_widget.read_settings()
 
     def show_keywords_wizard(self):
         """Show the keywords creation wizard."""
@@ -867,7 +929,8 @@ class Plugin(object):
             iface=self.iface,)
         if dialog.exec_():  # modal
             LOGGER.debug('Show field mapping accepted')
-            self.dock_widget.layer_changed(self.iface.activeLayer())
+            if self._dock_widget is not None:
+                self._dock_widget.layer_changed(self.iface.activeLayer())
         else:
             LOGGER.debug('Show field mapping not accepted')
 
@@ -915,6 +978,17 @@ class Plugin(object):
         else:
             enable_keyword_wizard = True
 
+        # import here only so that it is AFTER i18n set up
+        from safe.common.exceptions import (
+            KeywordNotFoundError,
+            NoKeywordsFoundError,
+            MetadataReadError)
+        from safe.definitions.layer_purposes import (
+            layer_purpose_exposure, layer_purpose_hazard)
+        from safe.definitions.utilities import get_field_groups
+        from safe.utilities.gis import is_raster_layer
+        from safe.utilities.keyword_io import KeywordIO
+
         try:
             if layer:
                 if is_raster_layer(layer):
@@ -28,6 +28,23 @@ __revision__ = '$Format:%H$'
 
 group = tr('InaSAFE - Infographic Elements')
 
+# The definitions do not change, so each field is looked up only once.
+_field_definitions = {}
+
+
+def _field_definition(field):
+    """The definition of a field, looked up by key or by field name.
+
+    :param field: The field key or field name.
+    :type field: basestring
+
+    :return: The field definition, None if not found.
+    :rtype: dict
+    """
+    if field not in _field_definitions:
+        _field_definitions[field] = definition(field, 'field_name')
+    return _field_definitions[field]
+
 
 @qgsfunction(
     args='auto', group=group, usesGeometry=False, referencedColumns=[])
@@ -52,7 +69,7 @@ def inasafe_field_header(field, feature, parent):
         'under': '<'
     }
 
-    field_definition = definition(field, 'field_name')
+    field_definition = _field_definition(field)
     if field_definition:
         if field_definition in age_fields:
             header_format = tr('{symbol} {age} y.o')
@@ -82,7 +99,7 @@ def minimum_needs_unit(field, feature, parent):
 
     """
     _ = feature, parent  # NOQA
-    field_definition = definition(field, 'field_name')
+    field_definition = _field_definition(field)
     if field_definition:
         unit_abbreviation = None
         frequency = None
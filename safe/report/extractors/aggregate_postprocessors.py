@@ -58,9 +58,10 @@ def aggregation_postprocessors_extractor(impact_report, component_metadata):
     extra_args = component_metadata.extra_args
     # Find out aggregation report type
     exposure_layer = impact_report.exposure
-    aggregation_summary = impact_report.aggregation_summary
-    analysis_layer = impact_report.analysis
-    analysis_layer_fields = impact_report.analysis.keywords['inasafe_fields']
+    extraction_context = impact_report.extraction_context
+    aggregation_summary = extraction_context.aggregation_summary
+    analysis_layer = extraction_context.analysis
+    analysis_layer_fields = analysis_layer.keywords['inasafe_fields']
     debug_mode = impact_report.impact_function.debug_mode
     use_aggregation = bool(impact_report.impact_function.provenance[
         'aggregation_layer'])
@@ -319,10 +320,11 @@ def create_section(
     """Create demographic section context.
 
     :param aggregation_summary: Aggregation summary
-    :type aggregation_summary: qgis.core.QgsVectorlayer
+    :type aggregation_summary:
+        safe.report.extractors.extraction_context.LayerTable
 
     :param analysis_layer: Analysis layer
-    :type analysis_layer: qgis.core.QgsVectorLayer
+    :type analysis_layer: safe.report.extractors.extraction_context.LayerTable
 
     :param postprocessor_fields: Postprocessor fields to extract
     :type postprocessor_fields: list[dict]
@@ -373,10 +375,11 @@ def create_section_with_aggregation(
     """Create demographic section context with aggregation breakdown.
 
     :param aggregation_summary: Aggregation summary
-    :type aggregation_summary: qgis.core.QgsVectorlayer
+    :type aggregation_summary:
+        safe.report.extractors.extraction_context.LayerTable
 
     :param analysis_layer: Analysis layer
-    :type analysis_layer: qgis.core.QgsVectorLayer
+    :type analysis_layer: safe.report.extractors.extraction_context.LayerTable
 
     :param postprocessor_fields: Postprocessor fields to extract
     :type postprocessor_fields: list[dict]
@@ -490,13 +493,13 @@ def create_section_with_aggregation(
 
     """Generating values for rows"""
 
-    for feature in aggregation_summary.getFeatures():
+    for feature in aggregation_summary.rows:
 
-        aggregation_name_index = aggregation_summary.fieldNameIndex(
+        aggregation_name_index = aggregation_summary.field_index(
             aggregation_name_field['field_name'])
         displaced_field_name = aggregation_summary_fields[
             displaced_field['key']]
-        displaced_field_index = aggregation_summary.fieldNameIndex(
+        displaced_field_index = aggregation_summary.field_index(
             displaced_field_name)
 
         aggregation_name = feature[aggregation_name_index]
@@ -521,7 +524,7 @@ def create_section_with_aggregation(
 
         for output_field in postprocessors_fields_found:
             field_name = aggregation_summary_fields[output_field['key']]
-            field_index = aggregation_summary.fieldNameIndex(field_name)
+            field_index = aggregation_summary.field_index(field_name)
             value = feature[field_index]
 
             value = format_number(
@@ -588,10 +591,11 @@ def create_section_without_aggregation(
     """Create demographic section context without aggregation.
 
     :param aggregation_summary: Aggregation summary
-    :type aggregation_summary: qgis.core.QgsVectorlayer
+    :type aggregation_summary:
+        safe.report.extractors.extraction_context.LayerTable
 
     :param analysis_layer: Analysis layer
-    :type analysis_layer: qgis.core.QgsVectorLayer
+    :type analysis_layer: safe.report.extractors.extraction_context.LayerTable
 
     :param postprocessor_fields: Postprocessor fields to extract
     :type postprocessor_fields: list[dict]
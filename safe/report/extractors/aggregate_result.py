@@ -47,13 +47,14 @@ def aggregation_result_extractor(impact_report, component_metadata):
     extra_args = component_metadata.extra_args
     # Find out aggregation report type
     exposure_layer = impact_report.exposure
-    analysis_layer = impact_report.analysis
+    extraction_context = impact_report.extraction_context
+    analysis_layer = extraction_context.analysis
     provenance = impact_report.impact_function.provenance
-    exposure_summary_table = impact_report.exposure_summary_table
+    exposure_summary_table = extraction_context.exposure_summary_table
     if exposure_summary_table:
         exposure_summary_table_fields = exposure_summary_table.keywords[
             'inasafe_fields']
-    aggregation_summary = impact_report.aggregation_summary
+    aggregation_summary = extraction_context.aggregation_summary
     aggregation_summary_fields = aggregation_summary.keywords[
         'inasafe_fields']
     debug_mode = impact_report.impact_function.debug_mode
@@ -115,18 +116,18 @@ def aggregation_result_extractor(impact_report, component_metadata):
 
     # generate rows of values for values of each column
     rows = []
-    aggregation_name_index = aggregation_summary.fieldNameIndex(
+    aggregation_name_index = aggregation_summary.field_index(
         aggregation_name_field['field_name'])
-    total_field_index = aggregation_summary.fieldNameIndex(
+    total_field_index = aggregation_summary.field_index(
         total_affected_field['field_name'])
 
     type_field_index = []
     for type_name in type_fields:
         field_name = affected_exposure_count_field['field_name'] % type_name
-        type_index = aggregation_summary.fieldNameIndex(field_name)
+        type_index = aggregation_summary.field_index(field_name)
         type_field_index.append(type_index)
 
-    for feat in aggregation_summary.getFeatures():
+    for feat in aggregation_summary.rows:
         total_affected_value = format_number(
             feat[total_field_index],
             enable_rounding=is_rounded,
@@ -155,7 +156,7 @@ def aggregation_result_extractor(impact_report, component_metadata):
     # calculate total values for each type. Taken from exposure summary table
     type_total_values = []
     # Get affected field index
-    affected_field_index = exposure_summary_table.fieldNameIndex(
+    affected_field_index = exposure_summary_table.field_index(
         total_affected_field['field_name'])
 
     # Get breakdown field
@@ -172,12 +173,12 @@ def aggregation_result_extractor(impact_report, component_metadata):
             breakdown_field = field
             break
     breakdown_field_name = breakdown_field['field_name']
-    breakdown_field_index = exposure_summary_table.fieldNameIndex(
+    breakdown_field_index = exposure_summary_table.field_index(
         breakdown_field_name)
 
     # Fetch total affected for each breakdown name
     value_dict = {}
-    for feat in exposure_summary_table.getFeatures():
+    for feat in exposure_summary_table.rows:
         # exposure summary table is in csv format, so the field returned is
         # always in text format
         affected_value = int(float(feat[affected_field_index]))
@@ -210,8 +211,8 @@ def aggregation_result_extractor(impact_report, component_metadata):
     """Get the super total affected"""
 
     # total for affected (super total)
-    analysis_feature = analysis_layer.getFeatures().next()
-    field_index = analysis_layer.fieldNameIndex(
+    analysis_feature = analysis_layer.rows[0]
+    field_index = analysis_layer.field_index(
         total_affected_field['field_name'])
     total_all = format_number(
         analysis_feature[field_index],
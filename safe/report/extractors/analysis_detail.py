@@ -52,10 +52,11 @@ def analysis_detail_extractor(impact_report, component_metadata):
 
     hazard_layer = impact_report.hazard
     exposure_layer = impact_report.exposure
-    analysis_layer = impact_report.analysis
+    extraction_context = impact_report.extraction_context
+    analysis_layer = extraction_context.analysis
     analysis_layer_fields = analysis_layer.keywords['inasafe_fields']
-    analysis_feature = analysis_layer.getFeatures().next()
-    exposure_summary_table = impact_report.exposure_summary_table
+    analysis_feature = analysis_layer.rows[0]
+    exposure_summary_table = extraction_context.exposure_summary_table
     if exposure_summary_table:
         exposure_summary_table_fields = exposure_summary_table.keywords[
             'inasafe_fields']
@@ -187,12 +188,12 @@ def analysis_detail_extractor(impact_report, component_metadata):
 
     """Create detail rows"""
     details = []
-    for feat in exposure_summary_table.getFeatures():
+    for feat in exposure_summary_table.rows:
         row = []
 
         # Get breakdown name
         exposure_summary_table_field_name = breakdown_field['field_name']
-        field_index = exposure_summary_table.fieldNameIndex(
+        field_index = exposure_summary_table.field_index(
             exposure_summary_table_field_name)
         class_key = feat[field_index]
 
@@ -216,7 +217,7 @@ def analysis_detail_extractor(impact_report, component_metadata):
                 # will cause key error if no hazard count for that particular
                 # class
                 field_name = exposure_summary_table_fields[field_key_name]
-                field_index = exposure_summary_table.fieldNameIndex(field_name)
+                field_index = exposure_summary_table.field_index(field_name)
                 # exposure summary table is in csv format, so the field
                 # returned is always in text format
                 count_value = int(float(feat[field_index]))
@@ -245,7 +246,7 @@ def analysis_detail_extractor(impact_report, component_metadata):
                     group_key = key
                     break
 
-            field_index = exposure_summary_table.fieldNameIndex(
+            field_index = exposure_summary_table.field_index(
                 field['field_name'])
             total_count = int(float(feat[field_index]))
             total_count = format_number(
@@ -348,7 +349,7 @@ def analysis_detail_extractor(impact_report, component_metadata):
             # will cause key error if no hazard count for that particular
             # class
             field_name = analysis_layer_fields[field_key_name]
-            field_index = analysis_layer.fieldNameIndex(field_name)
+            field_index = analysis_layer.field_index(field_name)
             count_value = format_number(
                 analysis_feature[field_index],
                 enable_rounding=is_rounding,
@@ -518,7 +519,7 @@ def analysis_detail_extractor(impact_report, component_metadata):
         current_unit = None
         currency_unit = setting('currency', expected_type=str)
         for field in extra_fields[exposure_type['key']]:
-            field_index = exposure_summary_table.fieldNameIndex(
+            field_index = exposure_summary_table.field_index(
                 field['field_name'])
             if field_index < 0:
                 LOGGER.debug(
@@ -541,19 +542,19 @@ def analysis_detail_extractor(impact_report, component_metadata):
 
         # rows
         details = []
-        for feat in exposure_summary_table.getFeatures():
+        for feat in exposure_summary_table.rows:
             row = []
 
             # Get breakdown name
             exposure_summary_table_field_name = breakdown_field['field_name']
-            field_index = exposure_summary_table.fieldNameIndex(
+            field_index = exposure_summary_table.field_index(
                 exposure_summary_table_field_name)
             class_key = feat[field_index]
 
             row.append(class_key)
 
             for field in extra_fields[exposure_type['key']]:
-                field_index = exposure_summary_table.fieldNameIndex(
+                field_index = exposure_summary_table.field_index(
                     field['field_name'])
                 # noinspection PyBroadException
                 try:
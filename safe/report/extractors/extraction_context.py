@@ -0,0 +1,203 @@
+# coding=utf-8
+
+"""Result tables of an analysis, read once for all the report extractors.
+
+The analysis layer, the exposure summary table and the aggregation summary
+are small. They are loaded in memory once per report, so the extractors do
+not read the layers again and can be tested without QGIS layers.
+"""
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class LayerRow(object):
+
+    """A row of a layer table.
+
+    Like a QgsFeature, a value is read with the field index or the field name
+    and a KeyError is raised if the field does not exist.
+
+    .. versionadded:: 4.2
+    """
+
+    __slots__ = ('_table', '_attributes')
+
+    def __init__(self, table, attributes):
+        """Constructor.
+
+        :param table: The table of the row.
+        :type table: LayerTable
+
+        :param attributes: The values of the row, in the order of the fields.
+        :type attributes: list
+        """
+        self._table = table
+        self._attributes = attributes
+
+    def __getitem__(self, key):
+        """Get a value.
+
+        :param key: The field index or the field name.
+        :type key: int, basestring
+
+        :return: The value.
+        """
+        if isinstance(key, basestring):
+            index = self._table.field_index(key)
+        else:
+            index = key
+        if index < 0 or index >= len(self._attributes):
+            raise KeyError(key)
+        return self._attributes[index]
+
+    def attributes(self):
+        """The values of the row, in the order of the fields.
+
+        :rtype: list
+        """
+        return self._attributes
+
+
+class LayerTable(object):
+
+    """The attribute table of a layer, in memory.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, field_names, rows, keywords=None, title=''):
+        """Constructor.
+
+        :param field_names: The names of the fields.
+        :type field_names: list
+
+        :param rows: The values of each row, in the order of the fields.
+        :type rows: list
+
+        :param keywords: The keywords of the layer.
+        :type keywords: dict
+
+        :param title: The title of the layer.
+        :type title: basestring
+        """
+        self._field_names = list(field_names)
+        self._field_indexes = dict(
+            (name, index) for index, name in enumerate(self._field_names))
+        self._rows = [LayerRow(self, list(row)) for row in rows]
+        self.keywords = keywords or {}
+        self._title = title
+
+    @classmethod
+    def from_layer(cls, layer):
+        """Read the attribute table of a layer.
+
+        :param layer: The layer.
+        :type layer: QgsVectorLayer
+
+        :return: The table, None if the layer is None.
+        :rtype: LayerTable
+        """
+        if layer is None:
+            return None
+        field_names = [field.name() for field in layer.fields()]
+        rows = [feature.attributes() for feature in layer.getFeatures()]
+        return cls(
+            field_names,
+            rows,
+            getattr(layer, 'keywords', None),
+            layer.title())
+
+    def title(self):
+        """The title of the layer.
+
+        :rtype: basestring
+        """
+        return self._title
+
+    @property
+    def field_names(self):
+        """The names of the fields.
+
+        :rtype: list
+        """
+        return self._field_names
+
+    @property
+    def rows(self):
+        """The rows of the table.
+
+        :rtype: list
+        """
+        return self._rows
+
+    def field_index(self, field_name):
+        """Get the index of a field.
+
+        :param field_name: The name of the field.
+        :type field_name: basestring
+
+        :return: The index, -1 if the field does not exist.
+        :rtype: int
+        """
+        return self._field_indexes.get(field_name, -1)
+
+    def value(self, field_name, row=0):
+        """Get the value of a field in a row.
+
+        :param field_name: The name of the field.
+        :type field_name: basestring
+
+        :param row: The index of the row. Defaults to the first row, the
+            analysis layer has only one row.
+        :type row: int
+
+        :return: The value.
+        :raises: KeyError if the field does not exist.
+        """
+        return self._rows[row][field_name]
+
+
+class ExtractionContext(object):
+
+    """The result tables of an analysis used by the report extractors.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(
+            self,
+            analysis=None,
+            exposure_summary_table=None,
+            aggregation_summary=None):
+        """Constructor.
+
+        :param analysis: The analysis table.
+        :type analysis: LayerTable
+
+        :param exposure_summary_table: The exposure summary table.
+        :type exposure_summary_table: LayerTable
+
+        :param aggregation_summary: The aggregation summary table.
+        :type aggregation_summary: LayerTable
+        """
+        self.analysis = analysis
+        self.exposure_summary_table = exposure_summary_table
+        self.aggregation_summary = aggregation_summary
+
+    @classmethod
+    def from_impact_report(cls, impact_report):
+        """Read the result tables of the layers of a report.
+
+        :param impact_report: The impact report.
+        :type impact_report: safe.report.impact_report.ImpactReport
+
+        :return: The extraction context.
+        :rtype: ExtractionContext
+        """
+        return cls(
+            LayerTable.from_layer(impact_report.analysis),
+            LayerTable.from_layer(impact_report.exposure_summary_table),
+            LayerTable.from_layer(impact_report.aggregation_summary))
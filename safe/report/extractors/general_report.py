@@ -41,7 +41,7 @@ def general_report_extractor(impact_report, component_metadata):
     # figure out analysis report type
     hazard_layer = impact_report.hazard
     exposure_layer = impact_report.exposure
-    analysis_layer = impact_report.analysis
+    analysis_layer = impact_report.extraction_context.analysis
     provenance = impact_report.impact_function.provenance
     debug_mode = impact_report.impact_function.debug_mode
 
@@ -54,7 +54,7 @@ def general_report_extractor(impact_report, component_metadata):
     # find hazard class
     summary = []
 
-    analysis_feature = analysis_layer.getFeatures().next()
+    analysis_feature = analysis_layer.rows[0]
     analysis_inasafe_fields = analysis_layer.keywords['inasafe_fields']
 
     exposure_unit = exposure_type['units'][0]
@@ -82,7 +82,7 @@ def general_report_extractor(impact_report, component_metadata):
                 # will cause key error if no hazard count for that particular
                 # class
                 field_name = analysis_inasafe_fields[field_key_name]
-                field_index = analysis_layer.fieldNameIndex(field_name)
+                field_index = analysis_layer.field_index(field_name)
                 # Hazard label taken from translated hazard count field
                 # label, string-formatted with translated hazard class label
                 hazard_label = hazard_class['name']
@@ -138,7 +138,7 @@ def general_report_extractor(impact_report, component_metadata):
         header = item['header']
         field = item['field']
         if field['key'] in analysis_inasafe_fields:
-            field_index = analysis_layer.fieldNameIndex(
+            field_index = analysis_layer.field_index(
                 field['field_name'])
             if field == fatalities_field:
                 # For fatalities field, we show a range of number
@@ -36,7 +36,7 @@ def minimum_needs_extractor(impact_report, component_metadata):
     """
     context = {}
     extra_args = component_metadata.extra_args
-    analysis_layer = impact_report.analysis
+    analysis_layer = impact_report.extraction_context.analysis
     analysis_keywords = analysis_layer.keywords['inasafe_fields']
     debug_mode = impact_report.impact_function.debug_mode
     is_rounding = not debug_mode
@@ -88,7 +88,7 @@ def minimum_needs_extractor(impact_report, component_metadata):
                 frequencies[frequency].append(field)
 
     needs = []
-    analysis_feature = analysis_layer.getFeatures().next()
+    analysis_feature = analysis_layer.rows[0]
     header_frequency_format = resolve_from_dictionary(
         extra_args, 'header_frequency_format')
     total_header = resolve_from_dictionary(extra_args, 'total_header')
@@ -103,7 +103,7 @@ def minimum_needs_extractor(impact_report, component_metadata):
         }
         for field in frequency:
             # check value exists in the field
-            field_idx = analysis_layer.fieldNameIndex(field['field_name'])
+            field_idx = analysis_layer.field_index(field['field_name'])
             if field_idx == -1:
                 # skip if field doesn't exists
                 continue
@@ -39,7 +39,7 @@ def mmi_detail_extractor(impact_report, component_metadata):
     context = {}
     exposure_layer = impact_report.exposure
     hazard_layer = impact_report.hazard
-    analysis_layer = impact_report.analysis
+    analysis_layer = impact_report.extraction_context.analysis
     analysis_layer_keywords = analysis_layer.keywords
     hazard_keywords = hazard_layer.keywords
     extra_args = component_metadata.extra_args
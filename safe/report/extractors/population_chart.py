@@ -37,7 +37,7 @@ def population_chart_extractor(impact_report, component_metadata):
     extra_args = component_metadata.extra_args
 
     hazard_layer = impact_report.hazard
-    analysis_layer = impact_report.analysis
+    analysis_layer = impact_report.extraction_context.analysis
     analysis_layer_fields = analysis_layer.keywords['inasafe_fields']
 
     """Generate Donut chart for affected population"""
@@ -114,15 +114,16 @@ def value_from_field_name(field_name, analysis_layer):
     :param field_name: Field name of analysis layer that we want to get.
     :type field_name: str
 
-    :param analysis_layer: Analysis layer.
-    :type analysis_layer: qgis.core.QgsVectorLayer
+    :param analysis_layer: Analysis table, from the extraction context of the
+        report.
+    :type analysis_layer:
+        safe.report.extractors.extraction_context.LayerTable
 
     :return: return the valeu of a given field name of the analysis.
 
     .. versionadded:: 4.0
     """
-    field_index = analysis_layer.fieldNameIndex(field_name)
-    return analysis_layer.getFeatures().next()[field_index]
+    return analysis_layer.value(field_name)
 
 
 def resolve_from_dictionary(dictionary, key_list, default_value=None):
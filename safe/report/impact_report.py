@@ -10,6 +10,10 @@ import imp
 import logging
 import os
 import shutil
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 from qgis.core import (
     QgsComposition,
@@ -26,8 +30,10 @@ from safe.defaults import (
     default_north_arrow_path)
 from safe import messaging as m
 from safe.messaging import styles
+from safe.report.extractors.extraction_context import ExtractionContext
 from safe.utilities.i18n import tr
 from safe.utilities.keyword_io import KeywordIO
+from safe.utilities.parallel import cpu_count
 from safe.utilities.utilities import get_error_message
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -40,6 +46,10 @@ WARNING_STYLE = styles.RED_LEVEL_4_STYLE
 
 LOGGER = logging.getLogger('InaSAFE')
 
+# Modules of the template folders, loaded once, by path.
+_template_modules = {}
+_template_modules_lock = threading.Lock()
+
 
 class InaSAFEReportContext(object):
 
@@ -333,6 +343,9 @@ class ImpactReport(object):
             map_settings,
             ImpactReport.DEFAULT_PAGE_DPI)
         self._keyword_io = KeywordIO()
+        self._extraction_context = None
+        self._extraction_context_lock = threading.Lock()
+        self._component_timings = OrderedDict()
 
     @property
     def inasafe_context(self):
@@ -532,6 +545,7 @@ class ImpactReport(object):
         :type layer: qgis.core.QgsVectorLayer
         """
         self._analysis = layer
+        self._extraction_context = None
 
     @property
     def exposure_summary_table(self):
@@ -551,6 +565,7 @@ class ImpactReport(object):
         :return:
         """
         self._exposure_summary_table = value
+        self._extraction_context = None
 
     @property
     def aggregation_summary(self):
@@ -569,6 +584,7 @@ class ImpactReport(object):
         :type value: qgis.core.QgsVectorLayer
         """
         self._aggregation_summary = value
+        self._extraction_context = None
 
     @property
     def extra_layers(self):
@@ -649,9 +665,106 @@ class ImpactReport(object):
                 pass
         return legend_attribute_dict
 
+    @property
+    def extraction_context(self):
+        """The result tables of the analysis, read once for all extractors.
+
+        :rtype: safe.report.extractors.extraction_context.ExtractionContext
+
+        .. versionadded:: 4.2
+        """
+        with self._extraction_context_lock:
+            if self._extraction_context is None:
+                self._extraction_context = (
+                    ExtractionContext.from_impact_report(self))
+            return self._extraction_context
+
+    @property
+    def component_timings(self):
+        """Time spent on each component by the last `process_components`.
+
+        :return: Ordered dictionary with the component key as key and a
+            dictionary with the seconds spent by the 'extractor' and the
+            'renderer' as value.
+        :rtype: OrderedDict
+
+        .. versionadded:: 4.2
+        """
+        return self._component_timings
+
+    def _load_template_method(self, component, path, package, method_name):
+        """Load a method from a module in the template folder.
+
+        Each module is loaded only once.
+
+        :param component: The component using this method.
+        :type component: ReportComponentsMetadata
+
+        :param path: The path of the module, relative to the template folder.
+        :type path: str
+
+        :param package: The package of the module, 'extractors' or
+            'renderer'.
+        :type package: str
+
+        :param method_name: The name of the method in the module.
+        :type method_name: str
+
+        :return: The method.
+        :rtype: function
+
+        .. versionadded:: 4.2
+        """
+        module_path = os.path.abspath(
+            os.path.join(self.metadata.template_folder, path))
+        with _template_modules_lock:
+            module = _template_modules.get(module_path)
+            if module is None:
+                package_name = '%(report-key)s.%(package)s.%(component-key)s'
+                package_name %= {
+                    'report-key': self.metadata.key,
+                    'package': package,
+                    'component-key': component.key
+                }
+                # replace dash with underscores
+                package_name = package_name.replace('-', '_')
+                module = imp.load_source(package_name, module_path)
+                _template_modules[module_path] = module
+        return getattr(module, method_name)
+
+    def _extract_component(self, job):
+        """Run the extractor of a component, maybe in a thread of the pool.
+
+        :param job: The component and its extractor. The extractor is None
+            if the component has a predefined context.
+        :type job: tuple
+
+        :return: The context or None, the seconds spent and the exception if
+            the extractor failed.
+        :rtype: tuple
+        """
+        component, extractor = job
+        start = time.time()
+        if extractor is None:
+            return None, 0.0, None
+        try:
+            # method signature:
+            #  - this ImpactReport
+            #  - this component
+            context = extractor(self, component)
+        except Exception as e:  # pylint: disable=broad-except
+            return None, time.time() - start, e
+        return context, time.time() - start, None
+
     def process_components(self):
         """Process context for each component and a given template.
 
+        The components are processed by waves: a wave has all the components
+        whose dependencies are done. Their thread safe extractors run
+        concurrently while the others run in this thread, then they are
+        rendered one by one, in the order of the report metadata, because the
+        renderers may use QGIS compositions.
+
         :returns: Tuple of error code and message
         :type: tuple
 
@@ -663,37 +776,30 @@ class ImpactReport(object):
         message.add(warning_heading)
         failed_extract_context = m.Heading(tr(
             'Failed to extract context'), **WARNING_STYLE)
-        failed_render_context = m.Heading(tr(
-            'Failed to render context'), **WARNING_STYLE)
         failed_find_extractor = m.Heading(tr(
             'Failed to load extractor method'), **WARNING_STYLE)
-        failed_find_renderer = m.Heading(tr(
-            'Failed to load renderer method'), **WARNING_STYLE)
 
         generation_error_code = self.REPORT_GENERATION_SUCCESS
+        self._component_timings = OrderedDict()
 
+        jobs = []
         for component in self.metadata.components:
+            self._component_timings[component.key] = {
+                'extractor': 0.0,
+                'renderer': 0.0
+            }
             # load extractors
             try:
+                _extractor_method = None
                 if not component.context:
                     if callable(component.extractor):
                         _extractor_method = component.extractor
                     else:
-                        _package_name = (
-                            '%(report-key)s.extractors.%(component-key)s')
-                        _package_name %= {
-                            'report-key': self.metadata.key,
-                            'component-key': component.key
-                        }
-                        # replace dash with underscores
-                        _package_name = _package_name.replace('-', '_')
-                        _extractor_path = os.path.join(
-                            self.metadata.template_folder,
-                            component.extractor
-                        )
-                        _module = imp.load_source(
-                            _package_name, _extractor_path)
-                        _extractor_method = getattr(_module, 'extractor')
+                        _extractor_method = self._load_template_method(
+                            component,
+                            component.extractor,
+                            'extractors',
+                            'extractor')
                 else:
                     LOGGER.info('Predefined context. Extractor not needed.')
             except Exception as e:  # pylint: disable=broad-except
@@ -706,86 +812,143 @@ class ImpactReport(object):
                     message.add(component.info)
                     message.add(get_error_message(e))
                     continue
+            jobs.append((component, _extractor_method))
 
-            # method signature:
-            #  - this ImpactReport
-            #  - this component
-            try:
-                if not component.context:
-                    context = _extractor_method(self, component)
-                    component.context = context
-                else:
-                    LOGGER.info('Using predefined context.')
-            except Exception as e:  # pylint: disable=broad-except
-                generation_error_code = self.REPORT_GENERATION_FAILED
-                LOGGER.info(e)
-                if self.impact_function.debug_mode:
-                    raise
-                else:
-                    message.add(failed_extract_context)
-                    message.add(get_error_message(e))
-                    continue
+        try:
+            # Read the result tables before the extractors need them.
+            self.extraction_context
+        except Exception as e:  # pylint: disable=broad-except
+            # Each extractor will report the error.
+            LOGGER.info(e)
+
+        keys = set(component.key for component, _ in jobs)
+        done = set()
+        # Threads, the processes are not used here.
+        pool = ThreadPool(cpu_count())
+        try:
+            while jobs:
+                wave = [
+                    job for job in jobs
+                    if not (job[0].dependencies & keys) - done]
+                if not wave:
+                    # Circular dependencies, we keep the metadata order.
+                    wave = jobs[:1]
+                jobs = [job for job in jobs if job not in wave]
+
+                # Only the thread safe extractors run in the pool, the
+                # others may use QGIS or Qt objects of this thread.
+                pooled = [job for job in wave if job[0].thread_safe]
+                pooled_results = pool.map_async(
+                    self._extract_component, pooled)
+                results = dict(
+                    (job[0].key, self._extract_component(job))
+                    for job in wave if not job[0].thread_safe)
+                results.update(
+                    (job[0].key, result) for job, result in zip(
+                        pooled, pooled_results.get()))
+                results = [results[job[0].key] for job in wave]
+                for (component, _), result in zip(wave, results):
+                    done.add(component.key)
+                    context, seconds, error = result
+                    self._component_timings[component.key]['extractor'] = (
+                        seconds)
+                    if error is not None:
+                        generation_error_code = self.REPORT_GENERATION_FAILED
+                        LOGGER.info(error)
+                        if self.impact_function.debug_mode:
+                            raise error
+                        else:
+                            message.add(failed_extract_context)
+                            message.add(get_error_message(error))
+                            continue
+                    if context is not None:
+                        component.context = context
+                    else:
+                        LOGGER.info('Using predefined context.')
+
+                    start = time.time()
+                    error_code = self._render_component(component, message)
+                    self._component_timings[component.key]['renderer'] = (
+                        time.time() - start)
+                    if error_code != self.REPORT_GENERATION_SUCCESS:
+                        generation_error_code = error_code
+        finally:
+            pool.close()
+            pool.join()
+
+        for key, timing in self._component_timings.iteritems():
+            LOGGER.info(
+                'Report component {key}: extractor {extractor:.2f} s, '
+                'renderer {renderer:.2f} s'.format(key=key, **timing))
+
+        return generation_error_code, message
+
+    def _render_component(self, component, message):
+        """Render a component whose context has been extracted.
+
+        :param component: The component to render.
+        :type component: ReportComponentsMetadata
+
+        :param message: The message where the errors are added.
+        :type message: safe.messaging.Message
 
+        :returns: The error code.
+        :rtype: int
+
+        .. versionadded:: 4.2
+        """
+        failed_render_context = m.Heading(tr(
+            'Failed to render context'), **WARNING_STYLE)
+        failed_find_renderer = m.Heading(tr(
+            'Failed to load renderer method'), **WARNING_STYLE)
+
+        try:
+            # load processor
+            if callable(component.processor):
+                _renderer = component.processor
+            else:
+                _renderer = self._load_template_method(
+                    component, component.processor, 'renderer', 'renderer')
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.info(e)
+            if self.impact_function.debug_mode:
+                raise
+            else:
+                message.add(failed_find_renderer)
+                message.add(component.info)
+                message.add(get_error_message(e))
+                return self.REPORT_GENERATION_FAILED
+
+        # method signature:
+        #  - this ImpactReport
+        #  - this component
+        if component.context:
             try:
-                # load processor
-                if callable(component.processor):
-                    _renderer = component.processor
+                output = _renderer(self, component)
+                output_path = self.component_absolute_output_path(
+                    component.key)
+                if isinstance(output_path, dict):
+                    try:
+                        dirname = os.path.dirname(output_path.get('doc'))
+                    except:
+                        dirname = os.path.dirname(output_path.get('map'))
                 else:
-                    _package_name = '%(report-key)s.renderer.%(component-key)s'
-                    _package_name %= {
-                        'report-key': self.metadata.key,
-                        'component-key': component.key
-                    }
-                    # replace dash with underscores
-                    _package_name = _package_name.replace('-', '_')
-                    _renderer_path = os.path.join(
-                        self.metadata.template_folder,
-                        component.processor
-                    )
-                    _module = imp.load_source(_package_name, _renderer_path)
-                    _renderer = getattr(_module, 'renderer')
+                    dirname = os.path.dirname(output_path)
+                if component.resources:
+                    for resource in component.resources:
+                        target_resource = os.path.basename(resource)
+                        target_dir = os.path.join(
+                            dirname, 'resources', target_resource)
+                        # copy here
+                        shutil.copytree(resource, target_dir)
+                component.output = output
             except Exception as e:  # pylint: disable=broad-except
-                generation_error_code = self.REPORT_GENERATION_FAILED
                 LOGGER.info(e)
                 if self.impact_function.debug_mode:
                     raise
                 else:
-                    message.add(failed_find_renderer)
-                    message.add(component.info)
+                    message.add(failed_render_context)
                     message.add(get_error_message(e))
-                    continue
+                    return self.REPORT_GENERATION_FAILED
 
-            # method signature:
-            #  - this ImpactReport
-            #  - this component
-            if component.context:
-                try:
-                    output = _renderer(self, component)
-                    output_path = self.component_absolute_output_path(
-                        component.key)
-                    if isinstance(output_path, dict):
-                        try:
-                            dirname = os.path.dirname(output_path.get('doc'))
-                        except:
-                            dirname = os.path.dirname(output_path.get('map'))
-                    else:
-                        dirname = os.path.dirname(output_path)
-                    if component.resources:
-                        for resource in component.resources:
-                            target_resource = os.path.basename(resource)
-                            target_dir = os.path.join(
-                                dirname, 'resources', target_resource)
-                            # copy here
-                            shutil.copytree(resource, target_dir)
-                    component.output = output
-                except Exception as e:  # pylint: disable=broad-except
-                    generation_error_code = self.REPORT_GENERATION_FAILED
-                    LOGGER.info(e)
-                    if self.impact_function.debug_mode:
-                        raise
-                    else:
-                        message.add(failed_render_context)
-                        message.add(get_error_message(e))
-                        continue
-
-        return generation_error_code, message
+        return self.REPORT_GENERATION_SUCCESS
@@ -0,0 +1,193 @@
+# coding=utf-8
+
+"""Print some pages of an atlas in a process of its own.
+
+The process is started by the atlas renderer with the path of a JSON job:
+
+    python -m safe.report.processors.atlas_worker job.json
+
+The worker starts QGIS, loads the layers of the report from their files with
+their style, loads the composition from the template saved by the renderer
+and prints each atlas feature of the job in its own PDF. The pages printed
+are written in the result file of the job.
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+from PyQt4 import QtXml
+from qgis.core import (
+    QgsApplication,
+    QgsComposerMap,
+    QgsComposition,
+    QgsCoordinateReferenceSystem,
+    QgsMapLayerRegistry,
+    QgsMapSettings,
+    QgsRasterLayer,
+    QgsVectorLayer,
+)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+
+def replace_layer_ids(template, layer_ids):
+    """Replace the layer ids in a composition template.
+
+    The layers loaded by the worker do not have the ids of the layers of the
+    report, which are used by the maps, the legends and the atlas.
+
+    :param template: The content of the template.
+    :type template: basestring
+
+    :param layer_ids: The new id of each layer id.
+    :type layer_ids: dict
+
+    :return: The template with the new ids.
+    :rtype: basestring
+
+    .. versionadded:: 4.2
+    """
+    # The longest ids first, an id may start with another one.
+    for layer_id in sorted(layer_ids, key=len, reverse=True):
+        template = template.replace(layer_id, layer_ids[layer_id])
+    return template
+
+
+def _load_layers(layers):
+    """Load the layers of the job and add them to the registry.
+
+    :param layers: The description of each layer: id, source, provider,
+        name, type ('raster' or 'vector') and the path of its QML style.
+    :type layers: list
+
+    :return: The new id of each layer id.
+    :rtype: dict
+
+    :raises: IOError if a layer is not valid.
+    """
+    layer_ids = {}
+    for description in layers:
+        if description['type'] == 'raster':
+            layer = QgsRasterLayer(
+                description['source'],
+                description['name'],
+                description['provider'])
+        else:
+            layer = QgsVectorLayer(
+                description['source'],
+                description['name'],
+                description['provider'])
+        if not layer.isValid():
+            raise IOError(
+                'Could not load the layer %s.' % description['source'])
+        layer.loadNamedStyle(description['style'])
+        QgsMapLayerRegistry.instance().addMapLayer(layer, False)
+        layer_ids[description['id']] = layer.id()
+    return layer_ids
+
+
+def print_atlas_pages(job):
+    """Print some atlas features, each one in its own PDF.
+
+    QGIS must be started.
+
+    :param job: The job written by the atlas renderer.
+    :type job: dict
+
+    :return: List of (feature index, PDF path, seconds) for each feature. The
+        path is None if the page could not be printed.
+    :rtype: list
+    """
+    # Imported here, the renderer module imports the report machinery.
+    from safe.report.processors.default import (
+        composition_item, _print_atlas_page)
+
+    layer_ids = _load_layers(job['layers'])
+    with io.open(job['template'], encoding='utf-8') as template_file:
+        template = replace_layer_ids(template_file.read(), layer_ids)
+
+    map_settings = QgsMapSettings()
+    crs = QgsCoordinateReferenceSystem()
+    crs.createFromWkt(job['crs'])
+    map_settings.setDestinationCrs(crs)
+    map_settings.setCrsTransformEnabled(True)
+    map_settings.setLayers(layer_ids.values())
+
+    composition = QgsComposition(map_settings)
+    document = QtXml.QDomDocument()
+    document.setContent(template)
+    if not composition.loadFromTemplate(document):
+        raise IOError('Could not load the template %s.' % job['template'])
+
+    composer_map = composition_item(composition, 'impact-map', QgsComposerMap)
+    atlas_composition = composition.atlasComposition()
+    atlas_composition.setCoverageLayer(
+        QgsMapLayerRegistry.instance().mapLayer(
+            layer_ids[job['coverage_layer']]))
+    atlas_composition.setComposerMap(composer_map)
+    atlas_composition.prepareMap(composer_map)
+    atlas_composition.setPredefinedScales(job['scales'])
+    composition.setAtlasMode(QgsComposition.ExportAtlas)
+
+    pages = []
+    if not atlas_composition.beginRender():
+        return [(index, None, 0.0) for index in job['features']]
+    for feature_index in job['features']:
+        start = time.time()
+        page_path = None
+        if atlas_composition.prepareForFeature(feature_index):
+            if job['pages_directory']:
+                page_path = os.path.join(
+                    job['pages_directory'], 'page_%06d.pdf' % feature_index)
+            else:
+                page_path = os.path.join(
+                    job['output_directory'],
+                    atlas_composition.currentFilename() + '.pdf')
+            if not _print_atlas_page(composition, page_path):
+                page_path = None
+        pages.append((feature_index, page_path, time.time() - start))
+    atlas_composition.endRender()
+    return pages
+
+
+def main(job_path):
+    """Run an atlas job.
+
+    :param job_path: The path of the JSON job.
+    :type job_path: str
+
+    :return: The exit code, 0 if the result has been written.
+    :rtype: int
+    """
+    with io.open(job_path, encoding='utf-8') as job_file:
+        job = json.load(job_file)
+
+    # The composer HTML frames need a GUI application.
+    application = QgsApplication([], True)
+    QgsApplication.setPrefixPath(job['prefix_path'], True)
+    application.initQgis()
+    # noinspection PyBroadException
+    try:
+        pages = print_atlas_pages(job)
+        with open(job['result'], 'w') as result_file:
+            json.dump(pages, result_file)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception('Could not print the atlas pages.')
+        return 1
+    finally:
+        QgsMapLayerRegistry.instance().removeAllMapLayers()
+        application.exitQgis()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1]))
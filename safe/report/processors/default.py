@@ -8,14 +8,21 @@ Module for basic renderer we support. Currently we have:
 """
 
 import io
+import json
 import logging
 import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
 from PyQt4 import QtXml
 from tempfile import mkdtemp
 
 from PyQt4.QtCore import QUrl
 from PyQt4.QtGui import QImage, QPainter, QPrinter
 from PyQt4.QtSvg import QSvgRenderer
+from jinja2.bccache import FileSystemBytecodeCache
 from jinja2.environment import Environment
 from jinja2.loaders import FileSystemLoader
 from qgis.core import (
@@ -31,14 +38,18 @@ from qgis.core import (
     QgsComposerLegend,
     QgsCoordinateTransform,
     QgsProject,
+    QgsApplication,
+    QgsMapLayerRegistry,
     PROJECT_SCALES
     )
 
 from safe.common.exceptions import TemplateLoadingError
-from safe.common.utilities import temp_dir
+from safe.common.utilities import temp_dir, which
 from safe.definitions.reports.infographic import map_overview
 from safe.report.report_metadata import QgisComposerComponentsMetadata
 from safe.utilities.i18n import tr
+from safe.utilities.parallel import (
+    PARALLEL_TIMEOUT, process_count, python_executable, split_in_chunks)
 from safe.utilities.settings import general_setting, setting
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -49,6 +60,14 @@ __revision__ = '$Format:%H$'
 
 LOGGER = logging.getLogger('InaSAFE')
 
+# Atlas with more features are printed in worker processes, if the
+# parallel_processing setting is enabled.
+ATLAS_PARALLEL_FEATURE_COUNT = 20
+
+# Jinja2 environments by template folder.
+_jinja2_environments = {}
+_jinja2_environments_lock = threading.Lock()
+
 
 def composition_item(composer, item_id, item_class):
     """Fetch a specific item according to its type in a composer.
@@ -92,6 +111,39 @@ def composition_item(composer, item_id, item_class):
     return None
 
 
+def jinja2_environment(template_folder):
+    """Get the Jinja2 environment of a template folder.
+
+    The environment is created once per folder, so the templates are parsed
+    only once. The compiled templates are also cached on the disk.
+
+    :param template_folder: The folder of the templates.
+    :type template_folder: str
+
+    :return: The Jinja2 environment.
+    :rtype: jinja2.environment.Environment
+
+    .. versionadded:: 4.2
+    """
+    template_folder = os.path.abspath(template_folder)
+    with _jinja2_environments_lock:
+        environment = _jinja2_environments.get(template_folder)
+        if environment is None:
+            extensions = [
+                'jinja2.ext.i18n',
+                'jinja2.ext.with_',
+                'jinja2.ext.loopcontrols',
+                'jinja2.ext.do',
+            ]
+            environment = Environment(
+                loader=FileSystemLoader(template_folder),
+                extensions=extensions,
+                bytecode_cache=FileSystemBytecodeCache(
+                    temp_dir('jinja2_cache')))
+            _jinja2_environments[template_folder] = environment
+    return environment
+
+
 def jinja2_renderer(impact_report, component):
     """Versatile text renderer using Jinja2 Template.
 
@@ -112,19 +164,7 @@ def jinja2_renderer(impact_report, component):
     """
     context = component.context
 
-    main_template_folder = impact_report.metadata.template_folder
-    loader = FileSystemLoader(
-        os.path.abspath(main_template_folder))
-    extensions = [
-        'jinja2.ext.i18n',
-        'jinja2.ext.with_',
-        'jinja2.ext.loopcontrols',
-        'jinja2.ext.do',
-    ]
-    env = Environment(
-        loader=loader,
-        extensions=extensions)
-
+    env = jinja2_environment(impact_report.metadata.template_folder)
     template = env.get_template(component.template)
     rendered = template.render(context)
     if component.output_format == 'string':
@@ -661,9 +701,264 @@ def qt_svg_to_png_renderer(impact_report, component):
     return component.output
 
 
+def _print_atlas_page(composition, output_path, painter=None):
+    """Print the current atlas feature of a composition in its own PDF.
+
+    :param composition: The composition, prepared for an atlas feature.
+    :type composition: qgis.core.QgsComposition
+
+    :param output_path: The path of the PDF.
+    :type output_path: str
+
+    :param painter: The painter to use. A new one is used if None.
+    :type painter: QPainter
+
+    :return: True if the page has been written.
+    :rtype: bool
+
+    .. versionadded:: 4.2
+    """
+    if painter is None:
+        painter = QPainter()
+    printer = QPrinter(QPrinter.HighResolution)
+    composition.beginPrintAsPDF(printer, output_path)
+    composition.beginPrint(printer)
+    if not painter.begin(printer):
+        msg = ('Atlas processing error: Cannot write to '
+               '{output}.').format(output=output_path)
+        LOGGER.error(msg)
+        return False
+    composition.doPrint(printer, painter)
+    painter.end()
+    composition.georeferenceOutput(output_path)
+    return True
+
+
+def _pdf_merge_command(pages, output_path):
+    """Get the command merging some PDF with pdfunite or Ghostscript.
+
+    :param pages: The paths of the PDF, in order.
+    :type pages: list
+
+    :param output_path: The path of the merged PDF.
+    :type output_path: str
+
+    :return: The command, None if none of these programs is installed.
+    :rtype: list
+
+    .. versionadded:: 4.2
+    """
+    pdfunite = which('pdfunite')
+    if pdfunite:
+        return [pdfunite[0]] + pages + [output_path]
+
+    ghostscript = which('gs') + which('gswin64c') + which('gswin32c')
+    if ghostscript:
+        return [
+            ghostscript[0],
+            '-dBATCH',
+            '-dNOPAUSE',
+            '-q',
+            '-sDEVICE=pdfwrite',
+            '-sOutputFile=%s' % output_path] + pages
+
+    return None
+
+
+def _atlas_layers(template_path, job_directory, coverage_layer):
+    """Describe the layers used by a composition template, for the workers.
+
+    The style of each layer is saved in the job directory.
+
+    :param template_path: The path of the template.
+    :type template_path: str
+
+    :param job_directory: The directory of the job.
+    :type job_directory: str
+
+    :param coverage_layer: Coverage Layer used for atlas map, which may not
+        be in the layer registry.
+    :type coverage_layer: QgsMapLayer
+
+    :return: The description of each layer, None if a layer can not be
+        loaded from a file by the workers, like a memory layer.
+    :rtype: list
+    """
+    with io.open(template_path, encoding='utf-8') as template_file:
+        template = template_file.read()
+
+    map_layers = QgsMapLayerRegistry.instance().mapLayers()
+    map_layers[coverage_layer.id()] = coverage_layer
+    layers = []
+    for layer_id, layer in map_layers.iteritems():
+        if layer_id not in template:
+            continue
+        source = layer.source()
+        if layer.providerType() == 'memory' or source.startswith('/vsimem/'):
+            LOGGER.info(
+                'The atlas uses the layer %s which is not a file.' % source)
+            return None
+        style_path = os.path.join(job_directory, '%d.qml' % len(layers))
+        layer.saveNamedStyle(style_path)
+        layers.append({
+            'id': layer_id,
+            'source': source,
+            'provider': layer.providerType(),
+            'name': layer.name(),
+            'type': (
+                'raster' if layer.type() == QgsMapLayer.RasterLayer
+                else 'vector'),
+            'style': style_path,
+        })
+    return layers
+
+
+def _wait_for_workers(workers, timeout):
+    """Wait for the atlas workers, kill them after the timeout.
+
+    :param workers: The worker processes.
+    :type workers: list
+
+    :param timeout: Seconds to wait for all the workers.
+    :type timeout: float
+
+    :return: True if all the workers succeeded.
+    :rtype: bool
+    """
+    deadline = time.time() + timeout
+    while any(worker.poll() is None for worker in workers):
+        if time.time() > deadline:
+            LOGGER.error(
+                'The atlas workers did not finish in %s s.' % timeout)
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.kill()
+                    worker.wait()
+            return False
+        time.sleep(0.5)
+    return all(worker.returncode == 0 for worker in workers)
+
+
+def _parallel_atlas(
+        composition, coverage_layer, output_path, single_file, scales):
+    """Print the atlas features in worker processes.
+
+    The composition is saved as a template. Each worker is a new Python
+    process which starts QGIS, loads the layers from their files and the
+    composition from the template, and prints a share of the features, one
+    PDF per feature. With a single file output, the pages are merged in order
+    at the end.
+
+    :param composition: The composition, ready for the atlas export.
+    :type composition: qgis.core.QgsComposition
+
+    :param coverage_layer: Coverage Layer used for atlas map.
+    :type coverage_layer: QgsMapLayer
+
+    :param output_path: The output path of the product.
+    :type output_path: str
+
+    :param single_file: True to merge the pages in a single file.
+    :type single_file: bool
+
+    :param scales: The predefined scales of the atlas.
+    :type scales: list
+
+    :return: Generated output path(s), None if the atlas could not be
+        printed by the workers.
+    :rtype: str, list
+
+    .. versionadded:: 4.2
+    """
+    feature_count = composition.atlasComposition().numFeatures()
+    job_directory = mkdtemp(dir=temp_dir('atlas'))
+    try:
+        template_path = create_qgis_template_output(
+            os.path.join(job_directory, 'atlas.qpt'), composition)
+        layers = _atlas_layers(template_path, job_directory, coverage_layer)
+        if layers is None:
+            return None
+        pages_directory = None
+        if single_file:
+            pages_directory = os.path.join(job_directory, 'pages')
+            os.makedirs(pages_directory)
+
+        # The workers find the plugin and QGIS like this process.
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.pathsep.join(
+            path for path in sys.path if path)
+
+        workers = []
+        results = []
+        for i, feature_indexes in enumerate(split_in_chunks(
+                range(feature_count), process_count())):
+            job_path = os.path.join(job_directory, 'job_%d.json' % i)
+            result_path = os.path.join(job_directory, 'result_%d.json' % i)
+            job = {
+                'prefix_path': QgsApplication.prefixPath(),
+                'template': template_path,
+                'layers': layers,
+                'coverage_layer': coverage_layer.id(),
+                'crs': composition.mapSettings().destinationCrs().toWkt(),
+                'scales': scales,
+                'features': feature_indexes,
+                'pages_directory': pages_directory,
+                'output_directory': os.path.dirname(output_path),
+                'result': result_path,
+            }
+            with open(job_path, 'w') as job_file:
+                json.dump(job, job_file)
+            workers.append(subprocess.Popen(
+                [python_executable(), '-m',
+                 'safe.report.processors.atlas_worker', job_path],
+                env=environment))
+            results.append(result_path)
+
+        if not _wait_for_workers(workers, PARALLEL_TIMEOUT):
+            return None
+
+        pages = []
+        for result_path in results:
+            with open(result_path) as result_file:
+                pages.extend(json.load(result_file))
+        pages.sort()
+        for feature_index, page_path, seconds in pages:
+            LOGGER.info(
+                'Atlas page {index}/{count} printed in {seconds:.2f} s'.format(
+                    index=feature_index + 1, count=feature_count,
+                    seconds=seconds))
+
+        page_paths = [page_path for _, page_path, _ in pages]
+        if None in page_paths or len(page_paths) != feature_count:
+            LOGGER.error(
+                'Atlas processing error: some pages were not printed.')
+            return None
+
+        if not single_file:
+            return page_paths
+
+        try:
+            merged = subprocess.call(
+                _pdf_merge_command(page_paths, output_path)) == 0
+        except OSError:
+            merged = False
+        if not merged:
+            LOGGER.error('Atlas processing error: could not merge the pages.')
+            return None
+        return output_path
+    finally:
+        shutil.rmtree(job_directory, ignore_errors=True)
+
+
 def atlas_renderer(composition, coverage_layer, output_path, file_format):
     """Extract composition using atlas generation.
 
+    If the parallel_processing setting is enabled and the atlas has more
+    than ATLAS_PARALLEL_FEATURE_COUNT features, the features are printed in
+    worker processes. For a single file output, pdfunite or Ghostscript must
+    be installed to merge the pages. The atlas is printed in this process if
+    the workers fail.
+
     :param composition: QGIS Composition object used for producing the report.
     :type composition: qgis.core.QgsComposition
 
@@ -723,6 +1018,35 @@ def atlas_renderer(composition, coverage_layer, output_path, file_format):
             LOGGER.error(msg)
             return
 
+        feature_count = atlas_composition.numFeatures()
+        parallel = (
+            feature_count > ATLAS_PARALLEL_FEATURE_COUNT and
+            process_count() > 1 and
+            (not atlas_on_single_file or
+             _pdf_merge_command([], output_path) is not None))
+        if parallel:
+            # The workers begin their own render.
+            atlas_composition.endRender()
+            LOGGER.info('Exporting Atlas in worker processes')
+            start = time.time()
+            # noinspection PyBroadException
+            try:
+                atlas_output = _parallel_atlas(
+                    composition,
+                    coverage_layer,
+                    output_path,
+                    atlas_on_single_file,
+                    project_scales)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Could not export the atlas in parallel.')
+                atlas_output = None
+            if atlas_output:
+                LOGGER.info('Atlas exported in {seconds:.2f} s'.format(
+                    seconds=time.time() - start))
+                return atlas_output
+            # Export the atlas in this process instead.
+            atlas_composition.beginRender()
+
         if atlas_on_single_file:
             atlas_composition.prepareForFeature(0)
             composition.beginPrintAsPDF(printer, output_path)
@@ -736,7 +1060,8 @@ def atlas_renderer(composition, coverage_layer, output_path, file_format):
         LOGGER.info('Exporting Atlas')
 
         atlas_output = []
-        for feature_index in range(atlas_composition.numFeatures()):
+        for feature_index in range(feature_count):
+            start = time.time()
             if not atlas_composition.prepareForFeature(feature_index):
                 msg = ('Atlas processing error: Exporting atlas error at '
                        'feature number {index}').format(index=feature_index)
@@ -744,23 +1069,18 @@ def atlas_renderer(composition, coverage_layer, output_path, file_format):
                 return
             if not atlas_on_single_file:
                 # we need another printer object fot multi file atlas
-                multi_file_printer = QPrinter(QPrinter.HighResolution)
                 current_filename = atlas_composition.currentFilename()
                 output_path = os.path.join(
                     output_directory, current_filename + '.pdf')
-                composition.beginPrintAsPDF(multi_file_printer, output_path)
-                composition.beginPrint(multi_file_printer)
-                if not painter.begin(multi_file_printer):
-                    msg = ('Atlas processing error: Cannot write to '
-                           '{output}.').format(output=output_path)
-                    LOGGER.error(msg)
+                if not _print_atlas_page(composition, output_path, painter):
                     return
-                composition.doPrint(multi_file_printer, painter)
-                painter.end()
-                composition.georeferenceOutput(output_path)
                 atlas_output.append(output_path)
             else:
                 composition.doPrint(printer, painter, feature_index > 0)
+            LOGGER.info(
+                'Atlas page {index}/{count} printed in {seconds:.2f} s'.format(
+                    index=feature_index + 1, count=feature_count,
+                    seconds=time.time() - start))
 
         atlas_composition.endRender()
 
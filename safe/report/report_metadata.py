@@ -25,7 +25,8 @@ class ReportComponentsMetadata(object):
     def __init__(
             self, key, processor, extractor,
             output_format, template, output_path, resources=None,
-            tags=None, context=None, extra_args=None, **kwargs):
+            tags=None, context=None, extra_args=None, dependencies=None,
+            thread_safe=False, **kwargs):
         """Base class for component metadata.
 
         ReportComponentMetadata is a metadata about the component element of
@@ -62,6 +63,16 @@ class ReportComponentsMetadata(object):
             Needed to pass it out to extractors.
         :type extra_args: str
 
+        :param dependencies: Keys of the components which must be extracted
+            and rendered before this one. The components in the extra args are
+            always dependencies.
+        :type dependencies: list
+
+        :param thread_safe: True if the extractor only reads the result
+            tables and can run in a thread. The extractors using QGIS or Qt
+            objects run in the thread of the report.
+        :type thread_safe: bool
+
         .. versionadded:: 4.0
         """
         self._key = key
@@ -83,6 +94,8 @@ class ReportComponentsMetadata(object):
         else:
             self._component_context = {}
         self._extra_args = extra_args
+        self._dependencies = dependencies or []
+        self._thread_safe = thread_safe
 
     @property
     def key(self):
@@ -212,6 +225,42 @@ class ReportComponentsMetadata(object):
         """
         self._extra_args = value
 
+    @property
+    def dependencies(self):
+        """Keys of the components needed by this component.
+
+        The extractor of this component reads the context or the output of
+        these components.
+
+        :rtype: set
+
+        .. versionadded:: 4.2
+        """
+        dependencies = set(self._dependencies)
+        values = [self.extra_args]
+        while values:
+            value = values.pop()
+            if isinstance(value, dict):
+                if 'key' in value and 'extractor' in value:
+                    # A component declaration.
+                    dependencies.add(value['key'])
+                else:
+                    values.extend(value.values())
+            elif isinstance(value, (list, tuple)):
+                values.extend(value)
+        dependencies.discard(self.key)
+        return dependencies
+
+    @property
+    def thread_safe(self):
+        """True if the extractor can run in a thread of a pool.
+
+        :rtype: bool
+
+        .. versionadded:: 4.2
+        """
+        return self._thread_safe
+
     @property
     def info(self):
         """Short info about the component.
@@ -0,0 +1,101 @@
+# coding=utf-8
+"""Unittest for the aggregate postprocessors extractor."""
+import unittest
+
+from safe.definitions.fields import (
+    aggregation_name_field,
+    displaced_field,
+    female_displaced_count_field)
+from safe.report.extractors.aggregate_postprocessors import (
+    create_section_with_aggregation, create_section_without_aggregation)
+from safe.report.extractors.extraction_context import LayerTable
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestAggregatePostprocessors(unittest.TestCase):
+
+    """Test the sections are extracted from layer tables."""
+
+    def setUp(self):
+        """Create the analysis and the aggregation summary tables."""
+        inasafe_fields = {
+            aggregation_name_field['key']: 'aggregation_name',
+            displaced_field['key']: 'displaced',
+            female_displaced_count_field['key']: 'female_displaced',
+        }
+        self.aggregation_summary = LayerTable(
+            ['aggregation_name', 'displaced', 'female_displaced'],
+            [['Area A', 100, 40], ['Area B', 0, 0], ['Area C', 20, 12]],
+            {'inasafe_fields': inasafe_fields},
+            'Aggregation')
+        self.analysis = LayerTable(
+            ['displaced', 'female_displaced'],
+            [[120, 52]],
+            {'inasafe_fields': inasafe_fields},
+            'Analysis')
+        self.postprocessor_fields = {
+            'fields': [female_displaced_count_field],
+            'group_header': 'Gender',
+            'group': {
+                'fields': [female_displaced_count_field],
+                'notes': ['Gender note'],
+            },
+        }
+        self.extra_args = {
+            'defaults': {
+                'aggregation_header': 'Aggregation area',
+                'total_population_header': 'Total displaced',
+                'total_header': 'Total',
+                'notes': 'Default note',
+            }
+        }
+
+    def test_create_section_with_aggregation(self):
+        """Test the section with the aggregation breakdown.
+
+        .. versionadded:: 4.2
+        """
+        section = create_section_with_aggregation(
+            self.aggregation_summary,
+            self.analysis,
+            self.postprocessor_fields,
+            'Gender section',
+            debug_mode=True,
+            extra_component_args=self.extra_args)
+
+        self.assertEqual('Gender section', section['header'])
+        self.assertEqual(
+            ['Aggregation', 'Total displaced'], section['columns'][:2])
+        # The area without displaced people is skipped.
+        self.assertEqual(
+            [['Area A', '100', '40'], ['Area C', '20', '12']],
+            section['rows'])
+        self.assertEqual(['Total', '120', '52'], section['totals'])
+        self.assertEqual(['Default note', 'Gender note'], section['notes'])
+        self.assertEqual(1, section['group_header_colspan'])
+
+    def test_create_section_without_aggregation(self):
+        """Test the section with the analysis totals only.
+
+        .. versionadded:: 4.2
+        """
+        section = create_section_without_aggregation(
+            self.aggregation_summary,
+            self.analysis,
+            self.postprocessor_fields,
+            'Gender section',
+            debug_mode=True,
+            extra_component_args=self.extra_args)
+
+        self.assertEqual(
+            ['Gender section', 'Total displaced'], section['columns'])
+        self.assertEqual(1, len(section['rows']))
+        self.assertEqual('52', section['rows'][0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# coding=utf-8
+"""Unittest for the atlas printed in worker processes."""
+import subprocess
+import sys
+import unittest
+
+from safe.report.processors.atlas_worker import replace_layer_ids
+from safe.report.processors.default import _wait_for_workers
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestAtlasWorker(unittest.TestCase):
+
+    def test_replace_layer_ids(self):
+        """Test the layer ids of a template are replaced.
+
+        .. versionadded:: 4.2
+        """
+        template = (
+            '<LayerSet><Layer>impact2017</Layer>'
+            '<Layer>impact2017_summary</Layer></LayerSet>'
+            '<Atlas coverageLayer="impact2017_summary"/>')
+        layer_ids = {
+            'impact2017': 'impact2018',
+            'impact2017_summary': 'summary2018',
+        }
+        self.assertEqual(
+            '<LayerSet><Layer>impact2018</Layer>'
+            '<Layer>summary2018</Layer></LayerSet>'
+            '<Atlas coverageLayer="summary2018"/>',
+            replace_layer_ids(template, layer_ids))
+
+    def test_wait_for_workers(self):
+        """Test the workers are killed after the timeout.
+
+        .. versionadded:: 4.2
+        """
+        workers = [
+            subprocess.Popen([sys.executable, '-c', 'pass'])
+            for _ in range(2)]
+        self.assertTrue(_wait_for_workers(workers, 60))
+
+        failing = subprocess.Popen(
+            [sys.executable, '-c', 'import sys; sys.exit(1)'])
+        self.assertFalse(_wait_for_workers([failing], 60))
+
+        hung = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.assertFalse(_wait_for_workers([hung], 1))
+        self.assertIsNotNone(hung.poll())
+
+
+if __name__ == '__main__':
+    unittest.main()
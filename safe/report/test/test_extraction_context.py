@@ -0,0 +1,51 @@
+# coding=utf-8
+"""Unittest for the extraction context of the reports."""
+import unittest
+
+from safe.report.extractors.extraction_context import (
+    ExtractionContext, LayerTable)
+from safe.report.extractors.util import value_from_field_name
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestExtractionContext(unittest.TestCase):
+
+    def test_layer_table(self):
+        """Test we can read a layer table like a layer.
+
+        .. versionadded:: 4.2
+        """
+        table = LayerTable(
+            ['exposure_class', 'total'],
+            [['residential', 10], ['school', 2]],
+            {'inasafe_fields': {'total_field': 'total'}},
+            'Exposure summary')
+
+        self.assertEqual('Exposure summary', table.title())
+        self.assertEqual(['exposure_class', 'total'], table.field_names)
+        self.assertEqual(1, table.field_index('total'))
+        self.assertEqual(-1, table.field_index('population'))
+
+        rows = table.rows
+        self.assertEqual(2, len(rows))
+        self.assertEqual('school', rows[1][0])
+        self.assertEqual(2, rows[1]['total'])
+        self.assertEqual(['school', 2], rows[1].attributes())
+
+        # Like a QgsFeature, a missing field raises a KeyError.
+        with self.assertRaises(KeyError):
+            rows[0][table.field_index('population')]
+        with self.assertRaises(KeyError):
+            rows[0]['population']
+
+        self.assertEqual(10, table.value('total'))
+        self.assertEqual(2, table.value('total', 1))
+
+        context = ExtractionContext(analysis=table)
+        self.assertEqual(
+            10, value_from_field_name('total', context.analysis))
+        self.assertIsNone(context.aggregation_summary)
@@ -2,6 +2,10 @@
 """Unittest for Report Metadata."""
 import unittest
 
+from safe.definitions.reports.components import (
+    analysis_detail_component,
+    report_a4_blue,
+    standard_impact_report_metadata_pdf)
 from safe.report.extractors.action_notes import action_checklist_extractor
 from safe.report.extractors.general_report import general_report_extractor
 from safe.report.processors.default import jinja2_renderer
@@ -60,3 +64,72 @@ class TestReportMetadata(unittest.TestCase):
         self.assertEqual(
             len(sample_report_metadata_dict['components']),
             len(report_metadata.components))
+
+    def test_component_dependencies(self):
+        """Test the dependencies of a component.
+
+        .. versionadded:: 4.2
+        """
+        general_report = {
+            'key': 'general-report',
+            'type': 'Jinja2',
+            'processor': jinja2_renderer,
+            'extractor': general_report_extractor,
+            'output_format': 'string',
+            'output_path': 'general-report-output.html',
+            'template': 'standard-template/'
+                        'jinja2/'
+                        'general-report.html',
+        }
+        sample_report_metadata_dict = {
+            'key': 'analysis-result-html',
+            'name': 'analysis-result-html',
+            'template_folder': '../resources/report-templates/',
+            'components': [
+                general_report,
+                {
+                    'key': 'action-checklist',
+                    'type': 'Jinja2',
+                    'processor': jinja2_renderer,
+                    'extractor': action_checklist_extractor,
+                    'output_format': 'file',
+                    'output_path': 'action-checklist-output.html',
+                    'template': 'standard-template/'
+                                'jinja2/'
+                                'bullet-list-section.html',
+                    'dependencies': ['population-chart'],
+                    'extra_args': {
+                        'components_list': {
+                            'general_report': general_report
+                        }
+                    }
+                }
+            ]
+        }
+
+        report_metadata = ReportMetadata(
+            metadata_dict=sample_report_metadata_dict)
+
+        self.assertEqual(
+            set(),
+            report_metadata.component_by_key('general-report').dependencies)
+        self.assertEqual(
+            {'population-chart', 'general-report'},
+            report_metadata.component_by_key('action-checklist').dependencies)
+
+    def test_component_thread_safe(self):
+        """Test only the declared extractors can run in a thread.
+
+        .. versionadded:: 4.2
+        """
+        report_metadata = ReportMetadata(
+            metadata_dict=standard_impact_report_metadata_pdf)
+        self.assertTrue(report_metadata.component_by_key(
+            analysis_detail_component['key']).thread_safe)
+        self.assertFalse(report_metadata.component_by_key(
+            'impact-report-pdf').thread_safe)
+
+        # The composer extractor builds QPixmaps for the legends.
+        report_metadata = ReportMetadata(metadata_dict=report_a4_blue)
+        self.assertFalse(report_metadata.component_by_key(
+            'a4-landscape-blue').thread_safe)
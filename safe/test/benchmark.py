@@ -0,0 +1,576 @@
+# coding=utf-8
+
+"""Benchmark the impact function on the gisv4 test data.
+
+The benchmark runs `ImpactFunction.prepare()` and `run()` over a matrix of
+the gisv4 hazards, exposures and aggregations. The layers can be scaled up
+synthetically: a vector layer is tiled with shrunk copies of itself and a
+raster layer is resampled to smaller cells, so the extent is the same but
+there are more features or more cells. Each case runs in its own process,
+so the peak memory is the one of the case.
+
+For each case we store the total time, the time of each profiled function,
+the peak memory and the number of features in a JSON file. Two JSON files
+can be compared to flag regressions. The cases run with both datastores
+can be compared to measure the throughput of the GeoPackage against the
+folder of GeoJSON files, see docs/datastore-benchmark.md.
+
+Usage::
+
+    python -m safe.test.benchmark run --scale 1 10 100 -o results.json
+    python -m safe.test.benchmark compare before.json after.json
+    python -m safe.test.benchmark datastores results.json
+
+Run it from the root of the repository, with QGIS in the PYTHONPATH.
+"""
+
+import argparse
+import json
+import logging
+import math
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from itertools import product
+from os.path import basename, exists, join, splitext
+from tempfile import mkdtemp
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+HAZARDS = [
+    'gisv4/hazard/classified_vector.geojson',
+    'gisv4/hazard/tsunami_vector.geojson',
+    'gisv4/hazard/earthquake.asc',
+]
+EXPOSURES = [
+    'gisv4/exposure/building-points.geojson',
+    'gisv4/exposure/buildings.geojson',
+    'gisv4/exposure/roads.geojson',
+    'gisv4/exposure/population.geojson',
+    'gisv4/exposure/raster/population.asc',
+]
+AGGREGATIONS = [
+    None,
+    'gisv4/aggregation/small_grid.geojson',
+]
+DATASTORES = ['folder', 'geopackage']
+
+RASTER_EXTENSIONS = ('.asc', '.tif', '.tiff')
+
+# Sidecar files copied with a scaled layer.
+SIDECAR_EXTENSIONS = ['.xml', '.qml', '.prj']
+
+# A metric is a regression if it is slower by this ratio and by at least
+# this absolute value.
+DEFAULT_THRESHOLD = 0.1
+MINIMUM_TIME = 0.05
+MINIMUM_MEMORY = 10
+
+
+def benchmark_cases(scales=None, datastores=None):
+    """List all cases of the benchmark.
+
+    :param scales: List of scale factors. Defaults to [1].
+    :type scales: list
+
+    :param datastores: List of datastores. Defaults to ['folder'].
+    :type datastores: list
+
+    :return: List of cases.
+    :rtype: list
+    """
+    cases = []
+    for hazard, exposure, aggregation, scale, datastore in product(
+            HAZARDS, EXPOSURES, AGGREGATIONS,
+            scales or [1], datastores or ['folder']):
+        names = []
+        for path in (hazard, exposure, aggregation):
+            if path:
+                name, extension = splitext(basename(path))
+                if extension in RASTER_EXTENSIONS:
+                    name += '_raster'
+                names.append(name)
+        names.append('x%s' % scale)
+        names.append(datastore)
+        cases.append({
+            'name': '-'.join(names),
+            'hazard': hazard,
+            'exposure': exposure,
+            'aggregation': aggregation,
+            'scale': scale,
+            'datastore': datastore,
+        })
+    return cases
+
+
+def _copy_sidecars(source_path, target_path):
+    """Copy the keywords and the style of a layer next to a new file."""
+    source_base = splitext(source_path)[0]
+    target_base = splitext(target_path)[0]
+    for extension in SIDECAR_EXTENSIONS:
+        if exists(source_base + extension):
+            shutil.copy2(source_base + extension, target_base + extension)
+
+
+def _affine(geometry, scale, origin_x, origin_y, offset_x, offset_y):
+    """Scale an OGR geometry from an origin and translate it, in place."""
+    for i in range(geometry.GetGeometryCount()):
+        _affine(
+            geometry.GetGeometryRef(i),
+            scale, origin_x, origin_y, offset_x, offset_y)
+    for i in range(geometry.GetPointCount()):
+        geometry.SetPoint_2D(
+            i,
+            origin_x + offset_x + (geometry.GetX(i) - origin_x) * scale,
+            origin_y + offset_y + (geometry.GetY(i) - origin_y) * scale)
+
+
+def scale_vector_layer(path, factor, directory):
+    """Create a vector layer with about `factor` times more features.
+
+    The layer is tiled with copies shrunk by sqrt(factor), so the new layer
+    covers the same extent with smaller and denser features. If the factor
+    is not a square, the last row of tiles is not complete.
+
+    :param path: Path to the vector layer.
+    :type path: basestring
+
+    :param factor: The scale factor.
+    :type factor: int
+
+    :param directory: Directory where to write the new layer.
+    :type directory: basestring
+
+    :return: Path to the new GeoJSON layer.
+    :rtype: basestring
+    """
+    from osgeo import ogr
+
+    target_path = join(directory, splitext(basename(path))[0] + '.geojson')
+    _copy_sidecars(path, target_path)
+
+    source = ogr.Open(path)
+    source_layer = source.GetLayer(0)
+    driver = ogr.GetDriverByName('GeoJSON')
+    target = driver.CreateDataSource(target_path)
+    target_layer = target.CreateLayer(
+        source_layer.GetName(),
+        source_layer.GetSpatialRef(),
+        source_layer.GetGeomType())
+    definition = source_layer.GetLayerDefn()
+    for i in range(definition.GetFieldCount()):
+        target_layer.CreateField(definition.GetFieldDefn(i))
+
+    tiles = int(math.ceil(math.sqrt(factor)))
+    scale = 1.0 / tiles
+    min_x, max_x, min_y, max_y = source_layer.GetExtent()
+    width = (max_x - min_x) * scale
+    height = (max_y - min_y) * scale
+
+    for tile in range(factor):
+        offset_x = (tile % tiles) * width
+        offset_y = (tile // tiles) * height
+        source_layer.ResetReading()
+        for feature in source_layer:
+            new_feature = feature.Clone()
+            geometry = new_feature.GetGeometryRef()
+            if geometry is not None:
+                _affine(geometry, scale, min_x, min_y, offset_x, offset_y)
+            target_layer.CreateFeature(new_feature)
+
+    target = None
+    source = None
+    return target_path
+
+
+def scale_raster_layer(path, factor, directory):
+    """Create a raster layer with about `factor` times more cells.
+
+    The cells are split in sqrt(factor) x sqrt(factor) smaller cells with
+    the same value. Counts like population are not divided, the results of
+    the analysis are bigger but the work is the same.
+
+    :param path: Path to the raster layer.
+    :type path: basestring
+
+    :param factor: The scale factor.
+    :type factor: int
+
+    :param directory: Directory where to write the new layer.
+    :type directory: basestring
+
+    :return: Path to the new GeoTIFF layer.
+    :rtype: basestring
+    """
+    from osgeo import gdal
+
+    target_path = join(directory, splitext(basename(path))[0] + '.tif')
+    _copy_sidecars(path, target_path)
+
+    tiles = int(math.ceil(math.sqrt(factor)))
+    source = gdal.Open(path)
+    gdal.Translate(
+        target_path,
+        source,
+        format='GTiff',
+        width=source.RasterXSize * tiles,
+        height=source.RasterYSize * tiles,
+        resampleAlg='near')
+    source = None
+    return target_path
+
+
+def scale_layer(path, factor, directory):
+    """Scale a vector or a raster layer, see `scale_vector_layer`.
+
+    :return: Path to the new layer, or the same path if the factor is 1.
+    :rtype: basestring
+    """
+    if factor == 1:
+        return path
+    if splitext(path)[1] in RASTER_EXTENSIONS:
+        return scale_raster_layer(path, factor, directory)
+    return scale_vector_layer(path, factor, directory)
+
+
+def _load_layer(path, name):
+    """Load a vector or a raster layer with its keywords."""
+    from qgis.core import QgsVectorLayer, QgsRasterLayer
+    from safe.utilities.utilities import monkey_patch_keywords
+
+    layer = QgsVectorLayer(path, name, 'ogr')
+    if not layer.isValid():
+        layer = QgsRasterLayer(path, name)
+    monkey_patch_keywords(layer)
+    return layer
+
+
+def _size(layer):
+    """Number of features or of cells of a layer."""
+    try:
+        return layer.featureCount()
+    except AttributeError:
+        return layer.width() * layer.height()
+
+
+def _step_times(tree):
+    """Sum the time of all spans of the profiling tree by function name."""
+    steps = {}
+    nodes = [tree] if tree else []
+    while nodes:
+        node = nodes.pop()
+        if node.elapsed_time is not None:
+            steps[node.key] = steps.get(node.key, 0) + node.elapsed_time
+        nodes.extend(node.children)
+    return steps
+
+
+def run_case(case, repeat=1):
+    """Run one case of the benchmark in the current process.
+
+    :param case: The case, see `benchmark_cases`.
+    :type case: dict
+
+    :param repeat: Number of runs. The fastest run is kept.
+    :type repeat: int
+
+    :return: The result of the case.
+    :rtype: dict
+    """
+    from safe.test.utilities import get_qgis_app, standard_data_path
+    get_qgis_app()
+    from safe.definitions.constants import ANALYSIS_SUCCESS
+    from safe.impact_function.impact_function import ImpactFunction
+    from safe.utilities.profiling import profiling_log
+    from safe.utilities.settings import setting, set_setting
+
+    result = dict(case)
+    directory = mkdtemp()
+    paths = {}
+    for key in ('hazard', 'exposure', 'aggregation'):
+        if case[key]:
+            paths[key] = scale_layer(
+                standard_data_path(*case[key].split('/')),
+                case['scale'],
+                directory)
+
+    geopackage = setting('geopackage_datastore', expected_type=bool)
+    set_setting('geopackage_datastore', case['datastore'] == 'geopackage')
+    try:
+        runs = []
+        for _ in range(repeat):
+            impact_function = ImpactFunction()
+            layers = {}
+            for key, path in paths.iteritems():
+                layers[key] = _load_layer(path, key)
+                setattr(impact_function, key, layers[key])
+
+            start_time = time.time()
+            status, message = impact_function.prepare()
+            prepare_time = time.time() - start_time
+            if status != ANALYSIS_SUCCESS:
+                result['status'] = 'not run'
+                result['message'] = message.to_text()
+                return result
+
+            start_time = time.time()
+            status, message = impact_function.run()
+            run_time = time.time() - start_time
+            if status != ANALYSIS_SUCCESS:
+                result['status'] = 'failed'
+                result['message'] = message.to_text()
+                return result
+
+            tree = profiling_log()
+            runs.append({
+                'prepare_time': round(prepare_time, 3),
+                'time': round(prepare_time + run_time, 3),
+                'steps': _step_times(tree),
+                'peak_memory': tree.peak_memory if tree else None,
+                'features': dict(
+                    (key, _size(layer)) for key, layer in layers.iteritems()),
+            })
+    finally:
+        set_setting('geopackage_datastore', geopackage)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result.update(min(runs, key=lambda run: run['time']))
+    result['status'] = 'success'
+    return result
+
+
+def run_benchmark(cases, repeat=1):
+    """Run each case of the benchmark in a new process.
+
+    :param cases: List of cases, see `benchmark_cases`.
+    :type cases: list
+
+    :param repeat: Number of runs for each case.
+    :type repeat: int
+
+    :return: The results, ready to be saved as JSON.
+    :rtype: dict
+    """
+    from safe.common.version import get_version
+
+    results = []
+    for case in cases:
+        LOGGER.info('Benchmark %s' % case['name'])
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'safe.test.benchmark', 'run-case',
+             json.dumps(case), '--repeat', str(repeat)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, error = process.communicate()
+        if process.returncode == 0:
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        else:
+            result = dict(case)
+            result['status'] = 'failed'
+            result['message'] = '\n'.join(error.strip().splitlines()[-1:])
+            results.append(result)
+        LOGGER.info('%s: %s' % (case['name'], results[-1]['status']))
+
+    return {
+        'date': datetime.now().isoformat(),
+        'version': get_version(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_results(
+        before, after, threshold=DEFAULT_THRESHOLD,
+        minimum_time=MINIMUM_TIME, minimum_memory=MINIMUM_MEMORY):
+    """Find the regressions between two benchmark results.
+
+    The total time, the time of each function and the peak memory of each
+    case are compared. A value is a regression if it increased by more than
+    the threshold ratio and by more than the minimum value, to ignore the
+    noise on small values.
+
+    :param before: The reference results.
+    :type before: dict
+
+    :param after: The new results.
+    :type after: dict
+
+    :param threshold: The ratio, 0.1 means 10 % slower.
+    :type threshold: float
+
+    :param minimum_time: Ignore time increases lower than this, in seconds.
+    :type minimum_time: float
+
+    :param minimum_memory: Ignore memory increases lower than this, in MB.
+    :type minimum_memory: float
+
+    :return: List of regressions (case name, metric, before, after).
+    :rtype: list
+    """
+    reference = dict(
+        (result['name'], result) for result in before['results']
+        if result['status'] == 'success')
+
+    regressions = []
+    for result in after['results']:
+        old = reference.get(result['name'])
+        if not old:
+            continue
+
+        if result['status'] != 'success':
+            regressions.append(
+                (result['name'], 'status', old['status'], result['status']))
+            continue
+
+        metrics = [('time', old['time'], result['time'], minimum_time)]
+        for step, value in sorted(result['steps'].iteritems()):
+            if step in old['steps']:
+                metrics.append(
+                    (step, old['steps'][step], value, minimum_time))
+        if old.get('peak_memory') and result.get('peak_memory'):
+            metrics.append((
+                'peak_memory', old['peak_memory'], result['peak_memory'],
+                minimum_memory))
+
+        for metric, old_value, new_value, minimum in metrics:
+            increase = new_value - old_value
+            if increase > minimum and increase > old_value * threshold:
+                regressions.append(
+                    (result['name'], metric, old_value, new_value))
+    return regressions
+
+
+def compare_datastores(results):
+    """Compare the cases run with the folder and the GeoPackage datastores.
+
+    The time spent in `DataStore.add_layer` is the time spent writing the
+    layers, the analysis is the same.
+
+    :param results: The results of the benchmark.
+    :type results: dict
+
+    :return: List of (case name without the datastore, folder total time,
+        GeoPackage total time, folder writing time, GeoPackage writing time,
+        writing speedup) for each case run successfully with both datastores.
+    :rtype: list
+    """
+    by_datastore = {}
+    for result in results['results']:
+        if result['status'] != 'success':
+            continue
+        name = result['name'].rsplit('-', 1)[0]
+        by_datastore.setdefault(name, {})[result['datastore']] = result
+
+    rows = []
+    for name, cases in sorted(by_datastore.iteritems()):
+        if 'folder' not in cases or 'geopackage' not in cases:
+            continue
+        folder = cases['folder']
+        geopackage = cases['geopackage']
+        folder_writing = folder['steps'].get('add_layer', 0)
+        geopackage_writing = geopackage['steps'].get('add_layer', 0)
+        speedup = None
+        if geopackage_writing:
+            speedup = round(float(folder_writing) / geopackage_writing, 2)
+        rows.append((
+            name,
+            folder['time'],
+            geopackage['time'],
+            round(folder_writing, 3),
+            round(geopackage_writing, 3),
+            speedup))
+    return rows
+
+
+def main(arguments=None):
+    """Command line entry point.
+
+    :return: The exit code, 1 if there are regressions.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser('run', help='Run the benchmark.')
+    run_parser.add_argument(
+        '-o', '--output', default='benchmark.json',
+        help='JSON file where to write the results.')
+    run_parser.add_argument(
+        '--scale', type=int, nargs='+', default=[1],
+        help='Scale factors of the layers, for instance 1 10 100.')
+    run_parser.add_argument(
+        '--datastore', nargs='+', default=['folder'], choices=DATASTORES)
+    run_parser.add_argument('--repeat', type=int, default=1)
+    run_parser.add_argument(
+        '--case', nargs='+',
+        help='Run only the cases whose name contains one of these words.')
+
+    case_parser = commands.add_parser('run-case')
+    case_parser.add_argument('case', help='The case as JSON.')
+    case_parser.add_argument('--repeat', type=int, default=1)
+
+    compare_parser = commands.add_parser(
+        'compare', help='Flag regressions between two results.')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    datastores_parser = commands.add_parser(
+        'datastores',
+        help='Compare the folder and the GeoPackage datastores.')
+    datastores_parser.add_argument('results')
+
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == 'run':
+        cases = benchmark_cases(arguments.scale, arguments.datastore)
+        if arguments.case:
+            cases = [
+                case for case in cases
+                if any(word in case['name'] for word in arguments.case)]
+        results = run_benchmark(cases, arguments.repeat)
+        with open(arguments.output, 'w') as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+        for result in results['results']:
+            print('%s: %s %s' % (
+                result['name'], result['status'], result.get('time', '')))
+        return 0
+
+    if arguments.command == 'run-case':
+        result = run_case(json.loads(arguments.case), arguments.repeat)
+        # The last line of the output is read by the main process.
+        print(json.dumps(result))
+        return 0
+
+    if arguments.command == 'datastores':
+        with open(arguments.results) as json_file:
+            results = json.load(json_file)
+        print('| Case | Folder (s) | GeoPackage (s) | Folder writing (s) '
+              '| GeoPackage writing (s) | Writing speedup |')
+        print('| --- | --- | --- | --- | --- | --- |')
+        for row in compare_datastores(results):
+            print('| %s | %s | %s | %s | %s | %s |' % row)
+        return 0
+
+    with open(arguments.before) as json_file:
+        before = json.load(json_file)
+    with open(arguments.after) as json_file:
+        after = json.load(json_file)
+    regressions = compare_results(before, after, arguments.threshold)
+    for name, metric, old_value, new_value in regressions:
+        print('REGRESSION %s %s: %s -> %s' % (
+            name, metric, old_value, new_value))
+    if not regressions:
+        print('No regression.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
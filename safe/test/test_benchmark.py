@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Unit tests for the benchmark module."""
+
+import unittest
+
+from safe.test.benchmark import (
+    benchmark_cases, compare_datastores, compare_results)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+def benchmark_result(name, time, steps, peak_memory=100, status='success'):
+    """Helper to create the result of one case."""
+    return {
+        'name': name,
+        'status': status,
+        'time': time,
+        'steps': steps,
+        'peak_memory': peak_memory,
+    }
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the benchmark."""
+
+    def test_benchmark_cases(self):
+        """Test the matrix of cases."""
+        cases = benchmark_cases([1, 10], ['folder', 'geopackage'])
+        names = [case['name'] for case in cases]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn(
+            'classified_vector-buildings-small_grid-x10-geopackage', names)
+        self.assertIn('earthquake_raster-population-x1-folder', names)
+        self.assertIn(
+            'earthquake_raster-population_raster-x1-folder', names)
+
+    def test_compare_results(self):
+        """Test we flag regressions but not the noise."""
+        before = {'results': [
+            benchmark_result('a', 10, {'union': 4, 'clip': 0.01}),
+            benchmark_result('b', 1, {}),
+            benchmark_result('c', 1, {}),
+        ]}
+        after = {'results': [
+            # The union is slower, the clip is noise.
+            benchmark_result('a', 10.5, {'union': 5, 'clip': 0.03}),
+            benchmark_result('b', 1, {}, peak_memory=200),
+            benchmark_result('c', 0, {}, status='failed'),
+            benchmark_result('d', 100, {}),
+        ]}
+
+        regressions = compare_results(before, after)
+
+        self.assertEqual(regressions, [
+            ('a', 'union', 4, 5),
+            ('b', 'peak_memory', 100, 200),
+            ('c', 'status', 'success', 'failed'),
+        ])
+        self.assertEqual(compare_results(before, before), [])
+
+    def test_compare_datastores(self):
+        """Test the datastores are compared on the same cases."""
+        results = {'results': [
+            dict(benchmark_result('a-x1-folder', 10, {'add_layer': 4}),
+                 datastore='folder'),
+            dict(benchmark_result('a-x1-geopackage', 7, {'add_layer': 1}),
+                 datastore='geopackage'),
+            # Not run with both datastores.
+            dict(benchmark_result('b-x1-folder', 10, {'add_layer': 4}),
+                 datastore='folder'),
+            dict(benchmark_result('c-x1-folder', 1, {}),
+                 datastore='folder'),
+            dict(benchmark_result('c-x1-geopackage', 1, {}, status='failed'),
+                 datastore='geopackage'),
+        ]}
+        self.assertEqual(
+            [('a-x1', 10, 7, 4, 1, 4.0)], compare_datastores(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# coding=utf-8
+
+import unittest
+import json
+import os
+import sys
+from subprocess import Popen, PIPE
+
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+# Imports the plugin in a new interpreter, so the modules already loaded by
+# the test runner are not counted.
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.time()
+import safe.plugin
+import_time = time.time() - start
+
+print(json.dumps({
+    'time': import_time,
+    'modules': [name for name in sys.modules if sys.modules[name]],
+}))
+'''
+
+# Modules which must only be loaded when the user needs them.
+LAZY_MODULES = [
+    'jinja2',
+    'safe.definitions.fields',
+    'safe.definitions.hazard',
+    'safe.gui.widgets.dock',
+    'safe.gui.tools.wizard.wizard_dialog',
+    'safe.impact_function.impact_function',
+    'safe.report',
+]
+
+# Generous bound, only a regression of the lazy loading should exceed it.
+MAXIMUM_IMPORT_TIME = 2
+
+
+class TestPluginImport(unittest.TestCase):
+
+    """Test importing the plugin stays light."""
+
+    def import_plugin(self):
+        """Import the plugin in a subprocess.
+
+        :return: The import time and the list of loaded modules.
+        :rtype: dict
+        """
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        process = Popen(
+            [sys.executable, '-c', IMPORT_SCRIPT],
+            stdout=PIPE,
+            stderr=PIPE,
+            cwd=root)
+        output, error = process.communicate()
+        message = 'Importing the plugin failed:\n%s' % error
+        self.assertEqual(process.returncode, 0, message)
+        return json.loads(output.splitlines()[-1])
+
+    def test_lazy_modules(self):
+        """Test the heavy modules are not loaded with the plugin."""
+        modules = self.import_plugin()['modules']
+        for lazy_module in LAZY_MODULES:
+            self.assertNotIn(
+                lazy_module,
+                modules,
+                '%s is loaded when importing the plugin.' % lazy_module)
+
+    def test_import_time(self):
+        """Test the time to import the plugin."""
+        # Keep the fastest import, the first one fills the OS file cache.
+        import_time = min(
+            self.import_plugin()['time'] for _ in range(3))
+        self.assertLess(import_time, MAXIMUM_IMPORT_TIME)
+
+
+if __name__ == '__main__':
+    unittest.main()
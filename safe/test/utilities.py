@@ -346,7 +346,11 @@ def load_path_vector_layer(path, **kwargs):
     if kwargs.get('clone_to_memory', False):
         keywords = layer.keywords.copy()
         memory_layer = create_memory_layer(
-            name, layer.geometryType(), layer.crs(), layer.fields())
+            name,
+            layer.geometryType(),
+            layer.crs(),
+            layer.fields(),
+            spatial_index=False)
         copy_layer(layer, memory_layer)
         if kwargs.get('with_keywords', True):
             memory_layer.keywords = keywords
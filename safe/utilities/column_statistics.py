@@ -0,0 +1,430 @@
+# coding=utf-8
+
+"""Statistics of a field of a vector layer, cached for the wizard.
+
+The distinct values, the value counts, the minimum, the maximum and the
+number of NULL values are computed in one scan of the layer, without the
+geometries. The statistics are cached with the modification times of the
+layer files, the sidecar files such as the dbf included, so selecting the same
+field again does not read the layer again. A layer with edits which are not
+saved is not cached. Only the statistics of the fields used recently are
+kept.
+A preview can stop the scan as soon as enough distinct values are found, or
+use a random sample of the values. The other scans stop when there are more
+than DISTINCT_VALUES_LIMIT distinct values, they are cached too.
+"""
+
+import glob
+import logging
+import os
+import random
+import re
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from PyQt4.QtCore import QPyNullVariant, QThread, pyqtSignal
+from qgis.core import QgsFeatureRequest, QgsVectorLayer
+
+from safe.utilities.layer_catalog import modification_times
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# The scans which are not a preview stop after this number of distinct
+# values, the wizard can not classify more values anyway.
+DISTINCT_VALUES_LIMIT = 10000
+
+# Number of fields in the cache.
+STATISTICS_CACHE_SIZE = 64
+
+# Complete statistics, or stopped by DISTINCT_VALUES_LIMIT,
+# (source, subset, field name): (times, statistics).
+# The statistics used recently are at the end.
+_statistics_cache = OrderedDict()
+_statistics_lock = Lock()
+
+# Background scans, (source, subset, field name): ColumnStatisticsTask.
+_running_tasks = {}
+
+
+class ColumnStatistics(object):
+
+    """Statistics of the values of a field.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, field_name):
+        """Constructor.
+
+        :param field_name: The name of the field.
+        :type field_name: basestring
+        """
+        self.field_name = field_name
+        self.value_counts = Counter()
+        self.null_count = 0
+        self.minimum = None
+        self.maximum = None
+        # Number of values read.
+        self.count = 0
+        # False if the scan stopped before the end of the layer.
+        self.complete = True
+        # True if the scan stopped because of the limit of distinct values.
+        self.limited = False
+        # True if the statistics are computed from a sample of the values.
+        self.sampled = False
+
+    def add(self, value):
+        """Add a value of the field.
+
+        :param value: The value.
+        """
+        self.count += 1
+        if value is None or isinstance(value, QPyNullVariant):
+            self.null_count += 1
+            return
+        self.value_counts[value] += 1
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def distinct_values(self):
+        """The sorted distinct values, without NULL.
+
+        :rtype: list
+        """
+        return sorted(self.value_counts)
+
+
+def _cache_key(layer, field_name):
+    """Get the key of the statistics of a field in the cache.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :rtype: tuple
+    """
+    return layer.source(), layer.subsetString(), field_name
+
+
+def _glob_escape(path):
+    """Escape the special characters of a path for glob.
+
+    :param path: The path.
+    :type path: basestring
+
+    :rtype: basestring
+    """
+    # glob.escape is not available in Python 2.
+    return re.sub(r'([*?[])', r'[\1]', path)
+
+
+def _layer_times(layer):
+    """Get the modification times of the files of a layer.
+
+    The attributes of a shapefile are in the dbf file, so all the files with
+    the same base name are included.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :return: The modification times, None if the layer is not a file or if
+        it has edits which are not saved.
+    :rtype: tuple
+    """
+    if layer.isModified():
+        return None
+    source = layer.source()
+    times = modification_times(source)
+    if times is None:
+        return None
+    base_name = os.path.splitext(source.partition('|')[0])[0]
+    sidecar_times = tuple(
+        os.path.getmtime(path)
+        for path in sorted(glob.glob(_glob_escape(base_name) + '.*')))
+    return times + sidecar_times
+
+
+def _field_values(layer, field_name):
+    """Iterate over the values of a field, without the geometries.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :return: Generator of values.
+    """
+    index = layer.fieldNameIndex(field_name)
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([index])
+    for feature in layer.getFeatures(request):
+        yield feature[index]
+
+
+def compute_column_statistics(
+        layer, field_name, limit=None, sample_size=None, stopped=None):
+    """Compute the statistics of a field, without the cache.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :param limit: Stop the scan when there are more distinct values than
+        this limit. The statistics are then not complete.
+    :type limit: int
+
+    :param sample_size: Compute the statistics from a random sample of this
+        size of the values.
+    :type sample_size: int
+
+    :param stopped: Function returning True if the scan must stop. The
+        statistics are then not complete.
+    :type stopped: function
+
+    :return: The statistics.
+    :rtype: ColumnStatistics
+
+    .. versionadded:: 4.2
+    """
+    statistics = ColumnStatistics(field_name)
+    values = _field_values(layer, field_name)
+
+    if sample_size:
+        # Reservoir sampling, the layer is read only once.
+        sample = []
+        for i, value in enumerate(values):
+            if i < sample_size:
+                sample.append(value)
+            else:
+                j = random.randint(0, i)
+                if j < sample_size:
+                    sample[j] = value
+        statistics.sampled = len(sample) == sample_size
+        values = sample
+
+    for value in values:
+        if stopped and stopped():
+            statistics.complete = False
+            break
+        is_new_value = not (
+            value is None or
+            isinstance(value, QPyNullVariant) or
+            value in statistics.value_counts)
+        if limit and is_new_value and len(statistics.value_counts) >= limit:
+            statistics.complete = False
+            statistics.limited = True
+            break
+        statistics.add(value)
+    return statistics
+
+
+def cached_column_statistics(layer, field_name):
+    """Get the complete statistics of a field if they are in the cache.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :return: The statistics, None if they are not in the cache or if the
+        layer has been modified since.
+    :rtype: ColumnStatistics
+    """
+    times = _layer_times(layer)
+    if times is None:
+        return None
+    key = _cache_key(layer, field_name)
+    with _statistics_lock:
+        cached = _statistics_cache.pop(key, None)
+        if cached is None:
+            return None
+        if cached[0] != times:
+            # The layer has been modified, these statistics are useless.
+            return None
+        _statistics_cache[key] = cached
+    return cached[1]
+
+
+def _store(key, times, statistics):
+    """Store complete statistics in the cache.
+
+    The statistics stopped by DISTINCT_VALUES_LIMIT are stored too. The
+    fields not used for the longest time are removed from the cache.
+
+    :param key: The key of the statistics.
+    :type key: tuple
+
+    :param times: The modification times of the layer.
+    :type times: tuple
+
+    :param statistics: The statistics.
+    :type statistics: ColumnStatistics
+    """
+    if times is None or statistics.sampled:
+        return
+    capped = statistics.limited and (
+        len(statistics.value_counts) >= DISTINCT_VALUES_LIMIT)
+    if not (statistics.complete or capped):
+        return
+    with _statistics_lock:
+        _statistics_cache.pop(key, None)
+        _statistics_cache[key] = (times, statistics)
+        while len(_statistics_cache) > STATISTICS_CACHE_SIZE:
+            _statistics_cache.popitem(last=False)
+
+
+def column_statistics(layer, field_name, limit=None, sample_size=None):
+    """Get the statistics of a field, from the cache if possible.
+
+    Only the layer files are cached. If the statistics of the field are
+    being computed in the background, we wait for them. Without a limit,
+    the scan stops after DISTINCT_VALUES_LIMIT distinct values.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :param limit: Stop the scan when there are more distinct values than
+        this limit, for a preview.
+    :type limit: int
+
+    :param sample_size: Compute the statistics from a random sample of this
+        size of the values, for a preview.
+    :type sample_size: int
+
+    :return: The statistics.
+    :rtype: ColumnStatistics
+
+    .. versionadded:: 4.2
+    """
+    key = _cache_key(layer, field_name)
+    task = _running_tasks.get(key)
+    if task is not None and not (limit or sample_size):
+        task.wait()
+
+    statistics = cached_column_statistics(layer, field_name)
+    if statistics is not None:
+        return statistics
+
+    times = _layer_times(layer)
+    statistics = compute_column_statistics(
+        layer, field_name, limit or DISTINCT_VALUES_LIMIT, sample_size)
+    _store(key, times, statistics)
+    return statistics
+
+
+class ColumnStatisticsTask(QThread):
+
+    """Compute the complete statistics of a field in the background.
+
+    The layer is opened again in the thread. The scan stops after
+    DISTINCT_VALUES_LIMIT distinct values.
+
+    .. versionadded:: 4.2
+    """
+
+    # The name of the field.
+    computed = pyqtSignal(str)
+
+    def __init__(self, layer, field_name):
+        """Constructor.
+
+        :param layer: The vector layer.
+        :type layer: QgsVectorLayer
+
+        :param field_name: The name of the field.
+        :type field_name: basestring
+        """
+        super(ColumnStatisticsTask, self).__init__()
+        self.key = _cache_key(layer, field_name)
+        self.provider = layer.providerType()
+        self.field_name = field_name
+        self._stopped = False
+
+    def stop(self):
+        """Stop the scan as soon as possible."""
+        self._stopped = True
+
+    def run(self):
+        """Scan the layer, in the thread."""
+        source, subset, field_name = self.key
+        layer = QgsVectorLayer(source, 'statistics', self.provider)
+        if subset:
+            layer.setSubsetString(subset)
+        if not layer.isValid():
+            LOGGER.warning('Could not open %s for the statistics.' % source)
+            return
+        times = _layer_times(layer)
+        statistics = compute_column_statistics(
+            layer,
+            field_name,
+            limit=DISTINCT_VALUES_LIMIT,
+            stopped=lambda: self._stopped)
+        if self._stopped:
+            return
+        _store(self.key, times, statistics)
+        self.computed.emit(field_name)
+
+
+def prefetch_column_statistics(layer, field_name):
+    """Compute the complete statistics of a field in the background.
+
+    Nothing is done if the layer is not a file or if the statistics are
+    already in the cache or being computed.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param field_name: The name of the field.
+    :type field_name: basestring
+
+    :return: The task, None if nothing has to be computed.
+    :rtype: ColumnStatisticsTask
+
+    .. versionadded:: 4.2
+    """
+    # Forget the scans which are finished.
+    for key, task in _running_tasks.items():
+        if task.isFinished():
+            del _running_tasks[key]
+
+    key = _cache_key(layer, field_name)
+    if key in _running_tasks:
+        return None
+    if _layer_times(layer) is None:
+        return None
+    if cached_column_statistics(layer, field_name) is not None:
+        return None
+
+    task = ColumnStatisticsTask(layer, field_name)
+    _running_tasks[key] = task
+    task.start(QThread.LowPriority)
+    return task
+
+
+def stop_column_statistics_tasks():
+    """Stop the background scans and wait for them, when the plugin unloads.
+
+    .. versionadded:: 4.2
+    """
+    for key, task in _running_tasks.items():
+        task.stop()
+        task.wait()
+        del _running_tasks[key]
@@ -1,7 +1,7 @@
 # coding=utf-8
 """Helpers for GIS related functionality."""
 
-from osgeo import gdal
+from osgeo import gdal, osr
 from qgis.core import (
     QgsMapLayer,
     QgsField,
@@ -307,3 +307,33 @@ def qgis_version():
     version = unicode(QGis.QGIS_VERSION_INT)
     version = int(version)
     return version
+
+
+def ogr_spatial_reference(definition, proj4=False):
+    """Create an OGR spatial reference with the longitude first.
+
+    OGR objects can be used in threads and in worker processes, unlike the
+    QGIS ones.
+
+    :param definition: The WKT, for instance from
+        QgsCoordinateReferenceSystem.toWkt(), or the PROJ.4 definition.
+    :type definition: str
+
+    :param proj4: True if the definition is a PROJ.4 string.
+    :type proj4: bool
+
+    :returns: The spatial reference.
+    :rtype: osr.SpatialReference
+
+    .. versionadded:: 4.2
+    """
+    spatial_reference = osr.SpatialReference()
+    if proj4:
+        spatial_reference.ImportFromProj4(definition)
+    else:
+        spatial_reference.ImportFromWkt(definition)
+    if hasattr(spatial_reference, 'SetAxisMappingStrategy'):
+        # GDAL 3 follows the axis order of the authority.
+        spatial_reference.SetAxisMappingStrategy(
+            osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return spatial_reference
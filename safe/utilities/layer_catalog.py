@@ -0,0 +1,447 @@
+# coding=utf-8
+
+"""Local catalog of the layers with InaSAFE keywords.
+
+The catalog is a SQLite database describing each layer file: its keywords,
+geometry, CRS, extent and feature count. A layer is described again only if
+the layer file or its xml metadata file has been modified since, so the
+wizard and the dock do not need to open the layer and to parse the metadata
+every time they need them.
+"""
+
+import json
+import logging
+import os
+import sqlite3 as sqlite
+from sqlite3 import OperationalError
+
+from osgeo import gdal, ogr
+from PyQt4.QtCore import QThread, pyqtSignal
+
+from safe.common.exceptions import (
+    HashNotFoundError,
+    InvalidParameterError,
+    KeywordNotFoundError,
+    MetadataReadError,
+    MissingMetadata,
+    NoKeywordsFoundError,
+    UnsupportedProviderError)
+from safe.datastore.folder import RASTER_EXTENSIONS, VECTOR_EXTENSIONS
+from safe.definitions.layer_geometry import (
+    layer_geometry_line,
+    layer_geometry_point,
+    layer_geometry_polygon,
+    layer_geometry_raster)
+from safe.utilities.metadata import read_iso19115_metadata, xml_metadata_path
+from safe.utilities.settings import setting
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Seconds the GUI waits for the database, it never writes in the catalog.
+READ_TIMEOUT = 0.5
+
+# Number of layers described by the indexer between two commits, so the
+# database is not locked during the whole scan.
+COMMIT_BATCH_SIZE = 20
+
+# The columns of the catalog, after the source.
+CATALOG_COLUMNS = [
+    'mtime',
+    'xml_mtime',
+    'title',
+    'layer_purpose',
+    'subcategory',
+    'layer_mode',
+    'layer_geometry',
+    'crs',
+    'xmin',
+    'ymin',
+    'xmax',
+    'ymax',
+    'feature_count',
+    'keyword_version',
+    'keywords'
+]
+
+OGR_GEOMETRIES = {
+    ogr.wkbPoint: layer_geometry_point['key'],
+    ogr.wkbMultiPoint: layer_geometry_point['key'],
+    ogr.wkbLineString: layer_geometry_line['key'],
+    ogr.wkbMultiLineString: layer_geometry_line['key'],
+    ogr.wkbPolygon: layer_geometry_polygon['key'],
+    ogr.wkbMultiPolygon: layer_geometry_polygon['key'],
+}
+
+
+def modification_times(source):
+    """Get the modification times of a layer file and of its metadata.
+
+    :param source: The source of the layer.
+    :type source: basestring
+
+    :return: The modification time of the layer file and of its xml file, 0
+        if the xml file does not exist. None if the layer is not a file.
+    :rtype: tuple, None
+
+    .. versionadded:: 4.2
+    """
+    path = source.partition('|')[0]
+    if not os.path.isfile(path):
+        return None
+    xml_path = xml_metadata_path(source)
+    if os.path.isfile(xml_path):
+        xml_mtime = os.path.getmtime(xml_path)
+    else:
+        xml_mtime = 0
+    return os.path.getmtime(path), xml_mtime
+
+
+def describe_layer(source):
+    """Describe a layer file with GDAL and its keywords.
+
+    :param source: The source of the layer.
+    :type source: basestring
+
+    :return: The record of the layer in the catalog, None if the layer can
+        not be opened.
+    :rtype: dict
+
+    .. versionadded:: 4.2
+    """
+    times = modification_times(source)
+    if times is None:
+        return None
+
+    record = dict.fromkeys(CATALOG_COLUMNS)
+    record['source'] = source
+    record['mtime'], record['xml_mtime'] = times
+
+    path, _, options = source.partition('|')
+    extension = os.path.splitext(path)[1][1:].lower()
+    if extension in RASTER_EXTENSIONS:
+        dataset = gdal.Open(path)
+        if dataset is None:
+            return None
+        record['layer_geometry'] = layer_geometry_raster['key']
+        spatial_reference = dataset.GetProjection()
+        x, width, _, y, _, height = dataset.GetGeoTransform()
+        x_end = x + width * dataset.RasterXSize
+        y_end = y + height * dataset.RasterYSize
+        record['xmin'], record['xmax'] = sorted([x, x_end])
+        record['ymin'], record['ymax'] = sorted([y, y_end])
+    else:
+        dataset = ogr.Open(path)
+        if dataset is None:
+            return None
+        layer = None
+        for option in options.split('|'):
+            if option.startswith('layername='):
+                layer = dataset.GetLayerByName(
+                    str(option[len('layername='):]))
+        if layer is None:
+            layer = dataset.GetLayer(0)
+        if layer is None:
+            return None
+        record['layer_geometry'] = OGR_GEOMETRIES.get(
+            ogr.GT_Flatten(layer.GetGeomType()))
+        reference = layer.GetSpatialRef()
+        spatial_reference = reference.ExportToWkt() if reference else ''
+        extent = layer.GetExtent()
+        record['xmin'], record['xmax'], record['ymin'], record['ymax'] = (
+            extent)
+        record['feature_count'] = layer.GetFeatureCount()
+    record['crs'] = spatial_reference
+
+    try:
+        keywords = read_iso19115_metadata(source)
+    except (HashNotFoundError,
+            OperationalError,
+            NoKeywordsFoundError,
+            KeywordNotFoundError,
+            InvalidParameterError,
+            UnsupportedProviderError,
+            MissingMetadata,
+            MetadataReadError):
+        keywords = {}
+
+    layer_purpose = keywords.get('layer_purpose')
+    record['title'] = keywords.get('title')
+    record['layer_purpose'] = layer_purpose
+    record['subcategory'] = keywords.get(layer_purpose)
+    record['layer_mode'] = keywords.get('layer_mode')
+    record['keyword_version'] = keywords.get('keyword_version')
+    record['keywords'] = keywords
+    return record
+
+
+class LayerCatalog(object):
+
+    """Local SQLite catalog of the layer files.
+
+    A catalog must be used in the thread where it has been created.
+
+    .. versionadded:: 4.2
+    """
+
+    def __init__(self, path=None, timeout=30):
+        """Constructor.
+
+        :param path: The path of the database. Defaults to the
+            layer_catalog_path setting.
+        :type path: basestring
+
+        :param timeout: Seconds to wait if the database is locked.
+        :type timeout: float
+        """
+        if path is None:
+            path = setting('layer_catalog_path', expected_type=unicode)
+        self.path = path
+        self.timeout = timeout
+        self._connection = None
+
+    def _cursor(self):
+        """Get a cursor, the database is created if needed.
+
+        :return: A cursor.
+        :rtype: sqlite3.Cursor
+        """
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._connection = sqlite.connect(
+                self.path, timeout=self.timeout)
+            self._connection.text_factory = unicode
+            # The readers are not blocked by the indexer.
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            columns = ', '.join(CATALOG_COLUMNS)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS layers ('
+                'source TEXT PRIMARY KEY, %s)' % columns)
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS layers_purpose '
+                'ON layers (layer_purpose)')
+            self._connection.commit()
+        return self._connection.cursor()
+
+    def close(self):
+        """Close the database."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def _record(row):
+        """Convert a row of the database to a record.
+
+        :param row: The row, the source and the catalog columns.
+        :type row: tuple
+
+        :return: The record.
+        :rtype: dict
+        """
+        record = dict(zip(['source'] + CATALOG_COLUMNS, row))
+        if record['keywords'] is not None:
+            record['keywords'] = json.loads(record['keywords'])
+        return record
+
+    def _store(self, record):
+        """Insert or replace a record.
+
+        :param record: The record.
+        :type record: dict
+        """
+        values = [record['source']]
+        for column in CATALOG_COLUMNS:
+            value = record[column]
+            if column == 'keywords':
+                try:
+                    value = json.dumps(value)
+                except (TypeError, ValueError):
+                    # The keywords will be read from the metadata.
+                    value = None
+            values.append(value)
+        self._cursor().execute(
+            'INSERT OR REPLACE INTO layers VALUES (%s)' % ', '.join(
+                '?' * len(values)), values)
+
+    def record(self, source, describe=True):
+        """Get the record of a layer, described again if it is outdated.
+
+        :param source: The source of the layer.
+        :type source: basestring
+
+        :param describe: False to not describe the layer if it is not in the
+            catalog or if it is outdated.
+        :type describe: bool
+
+        :return: The record, None if the layer is not a file which can be
+            opened, or if it is not up to date in the catalog and describe is
+            False.
+        :rtype: dict
+        """
+        times = modification_times(source)
+        if times is None:
+            return None
+        cursor = self._cursor()
+        cursor.execute('SELECT * FROM layers WHERE source = ?', (source, ))
+        row = cursor.fetchone()
+        if row:
+            record = self._record(row)
+            if (record['mtime'], record['xml_mtime']) == times:
+                return record
+        if not describe:
+            return None
+        return self.update(source)
+
+    def update(self, source):
+        """Describe a layer again.
+
+        :param source: The source of the layer.
+        :type source: basestring
+
+        :return: The record, None if the layer can not be opened.
+        :rtype: dict
+        """
+        record = describe_layer(source)
+        if record is None:
+            self._cursor().execute(
+                'DELETE FROM layers WHERE source = ?', (source, ))
+        else:
+            self._store(record)
+        self._connection.commit()
+        return record
+
+    def update_directory(self, directory, stopped=None):
+        """Describe the new and modified layer files in a directory.
+
+        The layers of the directory which do not exist anymore are removed.
+
+        :param directory: The directory, scanned recursively.
+        :type directory: basestring
+
+        :param stopped: Function returning True if the scan must stop. The
+            layers described before are kept.
+        :type stopped: function
+
+        :return: The number of layers described again.
+        :rtype: int
+        """
+        directory = os.path.abspath(directory)
+        cursor = self._cursor()
+        cursor.execute(
+            'SELECT source, mtime, xml_mtime FROM layers '
+            'WHERE source LIKE ?', (os.path.join(directory, '%'), ))
+        # The underscore is a wildcard for LIKE, we check the prefix again.
+        known = dict(
+            (row[0], tuple(row[1:])) for row in cursor.fetchall()
+            if row[0].startswith(os.path.join(directory, '')))
+
+        extensions = RASTER_EXTENSIONS + VECTOR_EXTENSIONS
+        updated = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if stopped and stopped():
+                    self._connection.commit()
+                    return updated
+                if os.path.splitext(name)[1][1:].lower() not in extensions:
+                    continue
+                source = os.path.join(root, name)
+                times = known.pop(source, None)
+                if times == modification_times(source):
+                    continue
+                # noinspection PyBroadException
+                try:
+                    record = describe_layer(source)
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception('Could not describe %s.' % source)
+                    continue
+                if record is not None:
+                    self._store(record)
+                    updated += 1
+                    if updated % COMMIT_BATCH_SIZE == 0:
+                        self._connection.commit()
+
+        for source in known:
+            cursor.execute('DELETE FROM layers WHERE source = ?', (source, ))
+        self._connection.commit()
+        return updated
+
+    def layers(self, layer_purpose=None):
+        """Get the records of the layers in the catalog.
+
+        :param layer_purpose: Only the layers with this layer purpose.
+        :type layer_purpose: basestring
+
+        :return: List of records.
+        :rtype: list
+        """
+        cursor = self._cursor()
+        if layer_purpose:
+            cursor.execute(
+                'SELECT * FROM layers WHERE layer_purpose = ?',
+                (layer_purpose, ))
+        else:
+            cursor.execute('SELECT * FROM layers')
+        return [self._record(row) for row in cursor.fetchall()]
+
+
+class LayerCatalogIndexer(QThread):
+
+    """Update the catalog with the directories of the settings.
+
+    The directories are in the layer_catalog_directories setting, separated
+    by the path separator of the system.
+
+    .. versionadded:: 4.2
+    """
+
+    # The number of layers described again.
+    indexed = pyqtSignal(int)
+
+    def __init__(self, directories=None, parent=None):
+        """Constructor.
+
+        :param directories: The directories to scan. Defaults to the
+            layer_catalog_directories setting.
+        :type directories: list
+
+        :param parent: The parent object.
+        :type parent: QObject
+        """
+        super(LayerCatalogIndexer, self).__init__(parent)
+        if directories is None:
+            directories = setting('layer_catalog_directories') or ''
+            directories = [
+                directory for directory in directories.split(os.pathsep)
+                if directory]
+        self.directories = directories
+        self.catalog_path = setting(
+            'layer_catalog_path', expected_type=unicode)
+        self._stopped = False
+
+    def stop(self):
+        """Stop the scan as soon as possible."""
+        self._stopped = True
+
+    def run(self):
+        """Scan the directories, in the thread."""
+        # A SQLite connection can only be used in its own thread.
+        catalog = LayerCatalog(self.catalog_path)
+        updated = 0
+        # noinspection PyBroadException
+        try:
+            for directory in self.directories:
+                if os.path.isdir(directory):
+                    updated += catalog.update_directory(
+                        directory, lambda: self._stopped)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Could not update the layer catalog.')
+        finally:
+            catalog.close()
+        self.indexed.emit(updated)
@@ -47,6 +47,28 @@ METADATA_CLASSES = {
 }
 
 
+def xml_metadata_path(layer_uri):
+    """Return the path of the xml file storing the metadata of a layer.
+
+    Layers inside a GeoPackage share the same file, so the layer name is
+    appended to the name of the xml file.
+
+    :param layer_uri: Uri to layer.
+    :type layer_uri: basestring
+
+    :returns: The path to the xml file.
+    :rtype: basestring
+
+    .. versionadded:: 4.2
+    """
+    path, _, options = layer_uri.partition('|')
+    for option in options.split('|'):
+        if option.startswith('layername='):
+            return '%s.%s.xml' % (
+                os.path.splitext(path)[0], option[len('layername='):])
+    return os.path.splitext(layer_uri)[0] + '.xml'
+
+
 def write_iso19115_metadata(layer_uri, keywords):
     """Create metadata  object from a layer path and keywords dictionary.
 
@@ -70,7 +92,7 @@ def write_iso19115_metadata(layer_uri, keywords):
     metadata.update_from_dict({'keyword_version': inasafe_keyword_version})
 
     if metadata.layer_is_file_based:
-        xml_file_path = os.path.splitext(layer_uri)[0] + '.xml'
+        xml_file_path = xml_metadata_path(layer_uri)
         metadata.write_to_file(xml_file_path)
     else:
         metadata.write_to_db()
@@ -90,7 +112,7 @@ def read_iso19115_metadata(layer_uri, keyword=None):
     :returns: Dictionary of keywords or value of key as string.
     :rtype: dict, basestring
     """
-    xml_uri = os.path.splitext(layer_uri)[0] + '.xml'
+    xml_uri = xml_metadata_path(layer_uri)
     if not os.path.exists(xml_uri):
         xml_uri = None
     if not xml_uri and os.path.exists(layer_uri):
@@ -109,7 +131,7 @@ def read_iso19115_metadata(layer_uri, keyword=None):
         message = 'No keyword version found. Metadata xml file is invalid.\n'
         message += 'Layer uri: %s\n' % layer_uri
         message += 'Keywords file: %s\n' % os.path.exists(
-            os.path.splitext(layer_uri)[0] + '.xml')
+            xml_metadata_path(layer_uri))
         message += 'keywords:\n'
         for k, v in keywords.iteritems():
             message += '%s: %s\n' % (k, v)
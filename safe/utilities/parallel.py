@@ -0,0 +1,159 @@
+# coding=utf-8
+"""Run pure Python work, without QGIS objects, in a pool of processes.
+
+The pool is only used if the parallel_processing setting is enabled.
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+from multiprocessing import TimeoutError
+
+from safe.utilities.settings import setting
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Seconds to wait for the processes, before running the chunks serially.
+PARALLEL_TIMEOUT = 600
+
+
+def split_in_chunks(items, chunk_count):
+    """Split a list in chunks of the same size.
+
+    :param items: The list to split.
+    :type items: list
+
+    :param chunk_count: The maximum number of chunks.
+    :type chunk_count: int
+
+    :return: The list of chunks, without empty chunks.
+    :rtype: list
+
+    .. versionadded:: 4.2
+    """
+    if not items:
+        return []
+    chunk_count = max(1, min(chunk_count, len(items)))
+    size = -(-len(items) // chunk_count)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def cpu_count():
+    """The number of CPU, for instance to size a pool of threads.
+
+    :rtype: int
+
+    .. versionadded:: 4.2
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def process_count():
+    """The number of processes to use, one per CPU.
+
+    It is one if the parallel_processing setting is disabled.
+
+    :rtype: int
+
+    .. versionadded:: 4.2
+    """
+    if not setting('parallel_processing', expected_type=bool):
+        return 1
+    return cpu_count()
+
+
+def python_executable():
+    """The Python interpreter to start new processes with.
+
+    In QGIS, sys.executable is QGIS itself on Windows and it may be empty on
+    other platforms.
+
+    :rtype: str
+
+    .. versionadded:: 4.2
+    """
+    if sys.platform.startswith('win'):
+        return os.path.join(sys.exec_prefix, 'pythonw.exe')
+    if os.path.basename(sys.executable or '').startswith('python'):
+        return sys.executable
+    return os.path.join(sys.exec_prefix, 'bin', 'python')
+
+
+def parallel_map(function, chunks, timeout=PARALLEL_TIMEOUT):
+    """Apply a function on each chunk in a pool of processes.
+
+    The function must be defined at the top level of a module and the chunks
+    and the results must be picklable, so they can not be QGIS objects. Use
+    WKB for the geometries. If there is only one chunk or one process, the
+    chunks are processed in this process. They are processed in this process
+    too if the pool can not be started, if a process fails or if the
+    processes do not finish before the timeout, for instance because a
+    process died.
+
+    :param function: The function to apply.
+    :type function: function
+
+    :param chunks: The arguments of each call.
+    :type chunks: list
+
+    :param timeout: Seconds to wait for the processes.
+    :type timeout: float
+
+    :return: The results, in the same order as the chunks.
+    :rtype: list
+
+    .. versionadded:: 4.2
+    """
+    processes = min(process_count(), len(chunks))
+    if processes <= 1:
+        return [function(chunk) for chunk in chunks]
+
+    previous_executable = None
+    if sys.platform.startswith('win'):
+        # In QGIS, sys.executable is QGIS itself. The new processes must be
+        # started with the Python interpreter shipped with QGIS.
+        from multiprocessing import forking
+        # noinspection PyProtectedMember
+        previous_executable = forking._python_exe
+        multiprocessing.set_executable(python_executable())
+
+    try:
+        try:
+            pool = multiprocessing.Pool(processes)
+        except (OSError, ImportError):
+            LOGGER.exception(
+                'Could not start the processes, running serially.')
+            return [function(chunk) for chunk in chunks]
+
+        try:
+            # map_async, so we do not wait forever for a dead process.
+            results = pool.map_async(function, chunks).get(timeout)
+        except TimeoutError:
+            LOGGER.error(
+                'The processes did not finish in %s s, running serially.'
+                % timeout)
+            pool.terminate()
+            results = None
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('A process failed, running serially.')
+            pool.terminate()
+            results = None
+        else:
+            pool.close()
+        pool.join()
+    finally:
+        if previous_executable is not None:
+            multiprocessing.set_executable(previous_executable)
+
+    if results is None:
+        return [function(chunk) for chunk in chunks]
+    return results
@@ -2,16 +2,37 @@
 
 """This module contains logic for performance profiling.
 
-This code was taken from http://stackoverflow.com/a/3620972
-
+Each profiled function or block is recorded as a span. The current span of
+each thread is kept on a thread local stack, so entering and leaving a span
+does not inspect the Python stack nor read any setting. A span records its
+wall time, CPU time, the number of features of the layer given to the
+function and of the layer returned, and the peak memory of the process.
+
+Spans are recorded only while a trace is active, between `start_trace` and
+`stop_trace`, or in a recorded span. Spans without a parent, for instance the
+first span of a thread, are roots. The first root is the analysis tree
+displayed in the profiling table. All
+spans can be exported as Chrome trace events, which can be opened in
+chrome://tracing. A worker process records its own spans: it can send its
+trace events back to the main process which adds them with
+`add_trace_events`.
+
+The original idea of this module was taken from
+http://stackoverflow.com/a/3620972
 """
 
+import json
+import os
+import sys
+import threading
 import time
-import inspect
 from functools import wraps
-from safe.utilities.memory_checker import get_free_memory
-from safe.utilities.settings import setting
 
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
 
 __copyright__ = "Vadim Shender (original poster in stack overflow), InaSAFE"
 __license__ = "Creative Commons"
@@ -19,35 +40,151 @@ __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
 
-class Tree(object):
+def _cpu_time():
+    """CPU time used by the process, user and system, in seconds."""
+    times = os.times()
+    return times[0] + times[1]
+
+
+def _peak_memory():
+    """Peak resident memory of the process in MB, None if not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Bytes on Mac OS, kilobytes on Linux.
+        return peak / 1024.0 / 1024.0
+    return peak / 1024.0
+
+
+def _feature_count(value):
+    """Number of features if the value is a vector layer, else None."""
+    try:
+        count = value.featureCount()
+    except (AttributeError, TypeError):
+        return None
+    if count < 0:
+        return None
+    return count
+
+
+class _State(threading.local):
+
+    """Stack of the current spans of a thread."""
+
+    def __init__(self):
+        self.stack = []
+
+
+# State of the process. It is reset in a forked worker process.
+_PID = os.getpid()
+_LOCK = threading.Lock()
+_STATE = _State()
+_ROOTS = []
+_FOREIGN_EVENTS = []
+# True between start_trace and stop_trace. A forked worker keeps it.
+_TRACING = False
+
+
+def _check_process():
+    """Forget the spans inherited from the parent in a forked process."""
+    global _PID, _LOCK, _STATE
+    if os.getpid() != _PID:
+        _PID = os.getpid()
+        _LOCK = threading.Lock()
+        _STATE = _State()
+        del _ROOTS[:]
+        del _FOREIGN_EVENTS[:]
+
+
+def _recording():
+    """Check if a span started now in this thread would be recorded."""
+    _check_process()
+    return _TRACING or bool(_STATE.stack)
+
+
+class Span(object):
+
+    """A profiled function or block of code.
+
+    It can be used as a context manager.
+
+    .. versionadded:: 4.2
+    """
+
     def __init__(self, key):
+        """Constructor.
 
-        # Name of the current function
+        :param key: Name of the function or of the block.
+        :type key: basestring
+        """
         self.key = key
         self.parent = None
+        self.children = []
+        self.thread_id = None
+        # False if the span has been started outside of a trace.
+        self.recorded = False
 
-        # Time of creation
-        self._start_time = time.time()
+        # Number of features of the input and output layers, if any.
+        self.features_in = None
+        self.features_out = None
 
-        # Time at the end.
+        self._start_time = None
         self._end_time = None
+        self._start_cpu_time = None
+        self._end_cpu_time = None
+        self._start_memory = None
+        self._end_memory = None
 
-        if setting(key='memory_profile', expected_type=bool):
-            # memory at creation
-            self._start_memory = get_free_memory()
+    def start(self):
+        """Start the span as a child of the current span of the thread.
 
-            # memory at termination
-            self._end_memory = None
+        Without a current span, it is a new root if a trace is active.
+        Otherwise it is not recorded.
 
-        # Children
-        self.children = []
+        :return: The span itself.
+        :rtype: Span
+        """
+        _check_process()
+        stack = _STATE.stack
+        if stack:
+            self.parent = stack[-1]
+            self.parent.children.append(self)
+        elif _TRACING:
+            with _LOCK:
+                _ROOTS.append(self)
+        else:
+            return self
+        stack.append(self)
+        self.recorded = True
+
+        self.thread_id = threading.current_thread().ident
+        self._start_memory = _peak_memory()
+        self._start_cpu_time = _cpu_time()
+        self._start_time = time.time()
+        return self
 
     def ended(self):
         """We call this method when the function is finished."""
+        if not self.recorded:
+            return
         self._end_time = time.time()
+        self._end_cpu_time = _cpu_time()
+        self._end_memory = _peak_memory()
+
+        stack = _STATE.stack
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            # A child has not been ended, we close it too.
+            del stack[stack.index(self):]
+
+    def __enter__(self):
+        return self.start()
 
-        if setting(key='memory_profile', expected_type=bool):
-            self._end_memory = get_free_memory()
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.ended()
+        return False
 
     @property
     def elapsed_time(self):
@@ -61,9 +198,29 @@ class Tree(object):
         else:
             return None
 
+    @property
+    def cpu_time(self):
+        """CPU time used by the process during the function.
+
+        This property might return None if the function is still running.
+        """
+        if self._end_cpu_time is not None:
+            return round(self._end_cpu_time - self._start_cpu_time, 3)
+        else:
+            return None
+
+    @property
+    def peak_memory(self):
+        """Peak memory of the process in MB at function termination.
+
+        This property might return None if the function is still running or
+        if the platform does not provide it.
+        """
+        return self._end_memory
+
     @property
     def memory_used(self):
-        """To know the allocated memory at function termination.
+        """To know how much the function raised the peak memory, in MB.
 
         ..versionadded:: 4.1
 
@@ -71,21 +228,38 @@ class Tree(object):
 
         This function should help to show memory leaks or ram greedy code.
         """
-        if self._end_memory:
-            memory_used = self._end_memory - self._start_memory
-            return memory_used
+        if self._end_memory is not None and self._start_memory is not None:
+            return round(self._end_memory - self._start_memory, 1)
         else:
             return None
 
-    def append(self, node):
-        """To append a new child."""
-        if node.parent == self.key and not self.elapsed_time:
-            self.children.append(node)
-        else:
-            # Recursive call
-            for child in self.children:
-                if not child.elapsed_time:
-                    child.append(node)
+    def trace_events(self):
+        """Chrome trace events of this span and its children.
+
+        :return: List of complete events.
+        :rtype: list
+        """
+        events = []
+        if self._end_time is not None:
+            events.append({
+                'name': str(self),
+                'cat': 'InaSAFE',
+                'ph': 'X',
+                'ts': int(self._start_time * 10 ** 6),
+                'dur': int((self._end_time - self._start_time) * 10 ** 6),
+                'pid': _PID,
+                'tid': self.thread_id,
+                'args': {
+                    'function': self.key,
+                    'cpu_time': self.cpu_time,
+                    'features_in': self.features_in,
+                    'features_out': self.features_out,
+                    'peak_memory': self.peak_memory,
+                }
+            })
+        for child in self.children:
+            events.extend(child.trace_events())
+        return events
 
     def __str__(self):
         # It might be a private function.
@@ -99,29 +273,45 @@ class Tree(object):
 
         return step
 
-ROOT = None
 
+def span(key):
+    """Profile a block of code.
 
-def profile(fn):
-    @wraps(fn)
-    def with_profiling(*args, **kwargs):
-        global ROOT
+    with span('my_step') as current_span:
+        current_span.features_in = layer.featureCount()
 
-        current_frame = inspect.currentframe()
-        parent_frame = inspect.getouterframes(current_frame)[1]
-        parent_name = parent_frame[3]
+    :param key: Name of the block.
+    :type key: basestring
 
-        current_step = Tree(fn.__name__)
+    :return: The span, to use as a context manager.
+    :rtype: Span
 
-        if ROOT:
-            current_step.parent = parent_name
-            ROOT.append(current_step)
-        else:
-            ROOT = current_step
+    .. versionadded:: 4.2
+    """
+    return Span(key)
 
-        ret = fn(*args, **kwargs)
 
-        current_step.ended()
+def profile(fn):
+    key = fn.__name__
+
+    @wraps(fn)
+    def with_profiling(*args, **kwargs):
+        current_step = Span(key)
+        # Counting the features may be slow, only for a recorded span.
+        if _recording():
+            for arg in args:
+                current_step.features_in = _feature_count(arg)
+                if current_step.features_in is not None:
+                    break
+
+        current_step.start()
+        try:
+            ret = fn(*args, **kwargs)
+        finally:
+            current_step.ended()
+
+        if current_step.recorded:
+            current_step.features_out = _feature_count(ret)
         return ret
 
     return with_profiling
@@ -129,10 +319,83 @@ def profile(fn):
 
 def profiling_log():
     """Get the profiling logs."""
-    global ROOT
-    return ROOT
+    _check_process()
+    with _LOCK:
+        if _ROOTS:
+            return _ROOTS[0]
+    return None
 
 
 def clear_prof_data():
-    global ROOT
-    ROOT = None
+    """Forget all spans of the process."""
+    _check_process()
+    del _STATE.stack[:]
+    with _LOCK:
+        del _ROOTS[:]
+        del _FOREIGN_EVENTS[:]
+
+
+def start_trace():
+    """Forget all spans of the process and record the new ones.
+
+    .. versionadded:: 4.2
+    """
+    global _TRACING
+    clear_prof_data()
+    _TRACING = True
+
+
+def stop_trace():
+    """Stop recording new root spans.
+
+    The spans recorded are kept until the next trace starts.
+
+    .. versionadded:: 4.2
+    """
+    global _TRACING
+    _TRACING = False
+
+
+def add_trace_events(events):
+    """Add trace events recorded by a worker process.
+
+    :param events: List of events returned by `trace_events` in the worker.
+    :type events: list
+
+    .. versionadded:: 4.2
+    """
+    with _LOCK:
+        _FOREIGN_EVENTS.extend(events)
+
+
+def trace_events():
+    """Chrome trace events of all spans recorded in this process.
+
+    The events can be pickled, to be sent from a worker process.
+
+    :return: List of events.
+    :rtype: list
+
+    .. versionadded:: 4.2
+    """
+    _check_process()
+    with _LOCK:
+        roots = list(_ROOTS)
+        events = list(_FOREIGN_EVENTS)
+    for root in roots:
+        events.extend(root.trace_events())
+    return events
+
+
+def write_chrome_trace(path):
+    """Write all spans in the Chrome trace event format.
+
+    :param path: Path of the JSON file.
+    :type path: basestring
+
+    .. versionadded:: 4.2
+    """
+    with open(path, 'w') as json_file:
+        json.dump(
+            {'traceEvents': trace_events(), 'displayTimeUnit': 'ms'},
+            json_file)
@@ -6,7 +6,6 @@ from decimal import Decimal
 from math import ceil, log
 from PyQt4.QtCore import QPyNullVariant
 
-from safe.definitions.units import unit_mapping, nominal_mapping
 from safe.utilities.i18n import locale
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -194,6 +193,8 @@ def convert_unit(number, input_unit, expected_unit):
     :return: The new number in the expected unit.
     :rtype: int
     """
+    # Imported here so that the definitions are not loaded with the plugin.
+    from safe.definitions.units import unit_mapping
     for mapping in unit_mapping:
         if input_unit == mapping[0] and expected_unit == mapping[1]:
             return number * mapping[2]
@@ -215,6 +216,7 @@ def coefficient_between_units(unit_a, unit_b):
     :return: The coefficient between these two units.
     :rtype: float
     """
+    from safe.definitions.units import unit_mapping
     for mapping in unit_mapping:
         if unit_a == mapping[0] and unit_b == mapping[1]:
             return mapping[2]
@@ -301,6 +303,7 @@ def denomination(value, min_nominal=None):
     :return: The new value and the denomination as a unit definition.
     :rtype: list(int, safe.unit.definition)
     """
+    from safe.definitions.units import nominal_mapping
     if isinstance(value, QPyNullVariant):
         return None
 
@@ -0,0 +1,129 @@
+# coding=utf-8
+
+import glob
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import qgis  # pylint: disable=unused-import
+from qgis.core import QgsVectorLayer
+
+from safe.common.utilities import temp_dir
+from safe.test.utilities import (
+    get_qgis_app, load_test_vector_layer, standard_data_path)
+from safe.utilities.column_statistics import (
+    STATISTICS_CACHE_SIZE,
+    ColumnStatistics,
+    _store,
+    cached_column_statistics,
+    column_statistics,
+    compute_column_statistics)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class TestColumnStatistics(unittest.TestCase):
+
+    """Tests for the statistics of a field."""
+
+    def test_column_statistics(self):
+        """Test the statistics are the same as the layer values.
+
+        .. versionadded:: 4.2
+        """
+        layer = load_test_vector_layer('exposure', 'buildings.shp')
+        index = layer.fieldNameIndex('TYPE')
+        expected = sorted(
+            value for value in layer.uniqueValues(index) if value)
+
+        statistics = compute_column_statistics(layer, 'TYPE')
+        self.assertTrue(statistics.complete)
+        self.assertFalse(statistics.sampled)
+        self.assertEqual(expected, statistics.distinct_values)
+        self.assertEqual(layer.featureCount(), statistics.count)
+        self.assertEqual(
+            statistics.count,
+            sum(statistics.value_counts.values()) + statistics.null_count)
+        self.assertEqual(expected[0], statistics.minimum)
+        self.assertEqual(expected[-1], statistics.maximum)
+
+        # The scan stops when there are too many distinct values.
+        preview = compute_column_statistics(layer, 'TYPE', limit=2)
+        self.assertFalse(preview.complete)
+        self.assertEqual(2, len(preview.distinct_values))
+
+        # A sample is smaller than the layer.
+        sample = compute_column_statistics(layer, 'TYPE', sample_size=10)
+        self.assertTrue(sample.sampled)
+        self.assertEqual(10, sample.count)
+
+        # Complete statistics are cached with the layer file.
+        first = column_statistics(layer, 'TYPE')
+        self.assertIs(first, column_statistics(layer, 'TYPE'))
+        self.assertIs(first, column_statistics(layer, 'TYPE', limit=2))
+
+        # A scan can be stopped.
+        stopped = compute_column_statistics(
+            layer, 'TYPE', stopped=lambda: True)
+        self.assertFalse(stopped.complete)
+        self.assertEqual(0, stopped.count)
+
+    def test_column_statistics_sidecar(self):
+        """Test the cache is invalid when the attributes are modified.
+
+        .. versionadded:: 4.2
+        """
+        # The special characters of glob are escaped.
+        directory = mkdtemp(prefix='[statistics]', dir=temp_dir('test'))
+        for path in glob.glob(standard_data_path('exposure', 'buildings.*')):
+            shutil.copy(path, directory)
+        path = os.path.join(directory, 'buildings.shp')
+        layer = QgsVectorLayer(path, 'buildings', 'ogr')
+        first = column_statistics(layer, 'TYPE')
+        self.assertIs(first, column_statistics(layer, 'TYPE'))
+
+        # Only the dbf file is modified.
+        dbf_path = os.path.join(directory, 'buildings.dbf')
+        dbf_time = os.path.getmtime(dbf_path) + 10
+        os.utime(dbf_path, (dbf_time, dbf_time))
+        self.assertIsNot(first, column_statistics(layer, 'TYPE'))
+
+        # Edits which are not saved are not cached.
+        index = layer.fieldNameIndex('TYPE')
+        feature = next(layer.getFeatures())
+        layer.startEditing()
+        layer.changeAttributeValue(feature.id(), index, 'edited')
+        statistics = column_statistics(layer, 'TYPE')
+        self.assertIn('edited', statistics.distinct_values)
+        self.assertIsNone(cached_column_statistics(layer, 'TYPE'))
+        layer.rollBack()
+        del layer
+        shutil.rmtree(directory)
+
+    def test_column_statistics_cache_size(self):
+        """Test the fields not used for the longest time leave the cache.
+
+        .. versionadded:: 4.2
+        """
+        layer = load_test_vector_layer('exposure', 'buildings.shp')
+        column_statistics(layer, 'TYPE')
+        for i in range(STATISTICS_CACHE_SIZE - 1):
+            _store(('source', '', str(i)), (0, ), ColumnStatistics(str(i)))
+        # The field is used again, it is the most recent one.
+        self.assertIsNotNone(cached_column_statistics(layer, 'TYPE'))
+
+        _store(('source', '', 'new'), (0, ), ColumnStatistics('new'))
+        self.assertIsNotNone(cached_column_statistics(layer, 'TYPE'))
+        for i in range(STATISTICS_CACHE_SIZE):
+            _store(('other', '', str(i)), (0, ), ColumnStatistics(str(i)))
+        self.assertIsNone(cached_column_statistics(layer, 'TYPE'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# coding=utf-8
+
+import glob
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from safe.common.utilities import temp_dir
+from safe.definitions.layer_geometry import layer_geometry_polygon
+from safe.definitions.layer_purposes import (
+    layer_purpose_exposure, layer_purpose_hazard)
+from safe.test.utilities import standard_data_path
+from safe.utilities.layer_catalog import LayerCatalog
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestLayerCatalog(unittest.TestCase):
+
+    """Tests for the local layer catalog."""
+
+    def setUp(self):
+        """Copy a hazard layer in a new directory."""
+        self.directory = mkdtemp(dir=temp_dir('test'))
+        for path in glob.glob(
+                standard_data_path('hazard', 'classified_generic_polygon.*')):
+            shutil.copy(path, self.directory)
+        self.source = os.path.join(
+            self.directory, 'classified_generic_polygon.shp')
+        self.catalog = LayerCatalog(
+            os.path.join(self.directory, 'catalog.db'))
+
+    def tearDown(self):
+        """Remove the directory."""
+        self.catalog.close()
+        shutil.rmtree(self.directory)
+
+    def test_update_directory(self):
+        """Test the layers are described only if they are modified.
+
+        .. versionadded:: 4.2
+        """
+        # The readers do not describe the layers.
+        self.assertIsNone(self.catalog.record(self.source, describe=False))
+
+        self.assertEqual(1, self.catalog.update_directory(self.directory))
+        self.assertEqual(0, self.catalog.update_directory(self.directory))
+
+        records = self.catalog.layers(layer_purpose_hazard['key'])
+        self.assertEqual(1, len(records))
+        record = records[0]
+        self.assertEqual(self.source, record['source'])
+        self.assertEqual(
+            layer_geometry_polygon['key'], record['layer_geometry'])
+        self.assertEqual(
+            layer_purpose_hazard['key'], record['keywords']['layer_purpose'])
+        self.assertEqual(
+            [], self.catalog.layers(layer_purpose_exposure['key']))
+
+        # The record is read from the catalog.
+        self.assertEqual(
+            record, self.catalog.record(self.source, describe=False))
+
+        # Removed layers are removed from the catalog.
+        for path in glob.glob(
+                os.path.join(self.directory, 'classified_generic_polygon.*')):
+            os.remove(path)
+        self.assertEqual(0, self.catalog.update_directory(self.directory))
+        self.assertEqual([], self.catalog.layers())
+
+
+if __name__ == '__main__':
+    unittest.main()
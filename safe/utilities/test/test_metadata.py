@@ -13,7 +13,8 @@ from safe.utilities.metadata import (
     read_iso19115_metadata,
     active_classification,
     active_thresholds_value_maps,
-    copy_layer_keywords
+    copy_layer_keywords,
+    xml_metadata_path
 )
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -188,5 +189,16 @@ class TestMetadataUtilities(unittest.TestCase):
         self.assertEqual(
             keywords['date'].date().isoformat(), copy_keywords['date'])
 
+    def test_xml_metadata_path(self):
+        """Test for xml_metadata_path."""
+        self.assertEqual(
+            xml_metadata_path('/tmp/buildings.shp'), '/tmp/buildings.xml')
+        self.assertEqual(
+            xml_metadata_path('/tmp/buildings.shp|layerid=0'),
+            '/tmp/buildings.xml')
+        self.assertEqual(
+            xml_metadata_path('/tmp/analysis.gpkg|layername=buildings'),
+            '/tmp/analysis.buildings.xml')
+
 if __name__ == '__main__':
     unittest.main()
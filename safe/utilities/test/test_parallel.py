@@ -0,0 +1,70 @@
+# coding=utf-8
+
+import multiprocessing
+import time
+import unittest
+
+from safe.utilities.parallel import parallel_map, split_in_chunks
+from safe.utilities.settings import set_setting, setting
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+def square_all(numbers):
+    """Worker used by the test, it must be at the top level."""
+    return [number ** 2 for number in numbers]
+
+
+def square_all_slowly(numbers):
+    """Worker which is too slow in the processes."""
+    if multiprocessing.current_process().name != 'MainProcess':
+        time.sleep(60)
+    return square_all(numbers)
+
+
+class TestParallel(unittest.TestCase):
+
+    """Tests for the process pool helpers."""
+
+    def test_split_in_chunks(self):
+        """Test we split a list in chunks."""
+        self.assertEqual(
+            split_in_chunks(range(5), 2), [[0, 1, 2], [3, 4]])
+        self.assertEqual(
+            split_in_chunks(range(2), 4), [[0], [1]])
+        self.assertEqual(split_in_chunks([], 4), [])
+
+    def setUp(self):
+        """Enable the processes."""
+        self.parallel_processing = setting(
+            'parallel_processing', expected_type=bool)
+        set_setting('parallel_processing', True)
+
+    def tearDown(self):
+        """Restore the setting."""
+        set_setting('parallel_processing', self.parallel_processing)
+
+    def test_parallel_map(self):
+        """Test the results are in the order of the chunks."""
+        chunks = split_in_chunks(range(100), 8)
+        results = parallel_map(square_all, chunks)
+        self.assertEqual(
+            sum(results, []), [number ** 2 for number in range(100)])
+
+        # The same without processes.
+        set_setting('parallel_processing', False)
+        self.assertEqual(results, parallel_map(square_all, chunks))
+
+    def test_parallel_map_timeout(self):
+        """Test the chunks are processed serially after the timeout."""
+        chunks = split_in_chunks(range(10), 2)
+        results = parallel_map(square_all_slowly, chunks, timeout=1)
+        self.assertEqual(
+            sum(results, []), [number ** 2 for number in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
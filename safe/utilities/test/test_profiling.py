@@ -0,0 +1,122 @@
+# coding=utf-8
+
+import unittest
+from threading import Thread
+
+from safe.utilities.profiling import (
+    profile,
+    span,
+    profiling_log,
+    clear_prof_data,
+    start_trace,
+    stop_trace,
+    trace_events,
+    add_trace_events)
+
+__copyright__ = "Copyright 2017, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class FakeLayer(object):
+
+    """A layer with a number of features."""
+
+    def __init__(self, count):
+        self.count = count
+        self.counted = False
+
+    def featureCount(self):
+        self.counted = True
+        return self.count
+
+
+@profile
+def _filter_layer(layer):
+    return FakeLayer(layer.count - 1)
+
+
+@profile
+def run_analysis(layer):
+    with span('prepare_layer') as current_span:
+        current_span.features_in = layer.count
+    return _filter_layer(layer)
+
+
+class TestProfiling(unittest.TestCase):
+
+    """Tests for the profiling."""
+
+    def setUp(self):
+        start_trace()
+
+    def tearDown(self):
+        stop_trace()
+        clear_prof_data()
+
+    def test_profile(self):
+        """Test the spans are nested and record the features."""
+        run_analysis(FakeLayer(10))
+
+        root = profiling_log()
+        self.assertEqual(root.key, 'run_analysis')
+        self.assertEqual(str(root), 'Run analysis')
+        self.assertEqual(
+            [child.key for child in root.children],
+            ['prepare_layer', '_filter_layer'])
+        self.assertEqual(root.features_in, 10)
+        self.assertEqual(root.features_out, 9)
+        self.assertEqual(root.children[0].features_in, 10)
+        self.assertIsNotNone(root.elapsed_time)
+        self.assertIsNotNone(root.cpu_time)
+
+        # A second call is not a child of the first one.
+        run_analysis(FakeLayer(5))
+        self.assertIs(root, profiling_log())
+        self.assertEqual(len(root.children), 2)
+
+    def test_threads(self):
+        """Test a span in another thread does not go in the analysis tree."""
+        with span('analysis'):
+            thread = Thread(target=run_analysis, args=(FakeLayer(3),))
+            thread.start()
+            thread.join()
+
+        root = profiling_log()
+        self.assertEqual(root.key, 'analysis')
+        self.assertEqual(root.children, [])
+
+        events = trace_events()
+        self.assertEqual(
+            sorted(event['name'] for event in events),
+            ['Analysis', 'Filter layer', 'Prepare layer', 'Run analysis'])
+        self.assertEqual(
+            len(set(event['tid'] for event in events)), 2)
+
+        # Events from a worker process.
+        add_trace_events([dict(events[0], pid=-1)])
+        self.assertEqual(len(trace_events()), 5)
+
+    def test_no_trace(self):
+        """Test the spans are not recorded outside of a trace."""
+        run_analysis(FakeLayer(10))
+        stop_trace()
+
+        layer = FakeLayer(10)
+        run_analysis(layer)
+        self.assertFalse(layer.counted)
+        self.assertEqual(len(trace_events()), 3)
+
+        # The children of a recorded span are still recorded.
+        start_trace()
+        with span('analysis'):
+            stop_trace()
+            run_analysis(FakeLayer(2))
+        self.assertEqual(
+            [child.key for child in profiling_log().children],
+            ['run_analysis'])
+
+
+if __name__ == '__main__':
+    unittest.main()